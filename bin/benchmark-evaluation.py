@@ -0,0 +1,156 @@
+import argparse
+import contextlib
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+from configparser import ConfigParser
+from timeit import default_timer as timer
+from typing import List
+
+from helper.config_file_handler import EvaluationConfiguration
+from helper.database_helper import EvaluationDataBases, PublicDataBase, UniqueFileFolderEvaluator, \
+    ExpectedFolderStructureEvaluator
+from helper.parallel_evaluation import ParallelEvaluationEngine
+
+
+##################################################################################################
+
+
+def _md5(value: str) -> str:
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+##################################################################################################
+
+
+def create_synthetic_index(cfg: EvaluationConfiguration, num_files: int, num_roots: int = 4,
+                           files_per_content: int = 3, files_per_folder: int = 50):
+    """
+    Fills the public index database with num_files generated rows: num_roots roots, every content stored
+    files_per_content times on average, files_per_folder files per folder.
+    """
+    rng = random.Random(0)
+    index_db = PublicDataBase(cfg.public_index_db_cfg)
+    try:
+        index_db.reset()
+        num_contents = max(num_files // files_per_content, 1)
+        num_folders = max(num_files // files_per_folder, 1)
+        roots = [_md5("/root/{}".format(i)) for i in range(num_roots)]
+        batch = []
+        for i in range(num_files):
+            batch.append((rng.choice(roots), _md5("folder/{}".format(rng.randrange(num_folders))),
+                          _md5("file_{}".format(i)), _md5("path/{}".format(i)),
+                          _md5("content/{}".format(rng.randrange(num_contents))),
+                          "2020-01-01-00:00:00", "2020-01-01-00:00:00", rng.randrange(1 << 20), "full"))
+            if len(batch) >= 100000 or i == num_files - 1:
+                index_db.cursor().executemany(
+                    "INSERT OR IGNORE INTO {} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)".format(index_db.table_name()), batch)
+                batch = []
+        index_db.connection().commit()
+    finally:
+        index_db.close()
+
+
+##################################################################################################
+
+
+def run_evaluation(cfg: EvaluationConfiguration, num_workers: int) -> float:
+    """
+    Computes unique files/folders and the expected folder structure, with the SQL evaluators if num_workers is 0.
+    :return: Elapsed seconds
+    """
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        database = EvaluationDataBases(cfg.public_index_db_cfg, cfg.evaluation_db_cfg)
+        try:
+            start_timestamp = timer()
+            if num_workers == 0:
+                UniqueFileFolderEvaluator(database).evaluate()
+                ExpectedFolderStructureEvaluator(database).evaluate()
+            else:
+                ParallelEvaluationEngine(database, num_workers=num_workers).evaluate()
+            database.evaluation_db.connection().commit()
+            return timer() - start_timestamp
+        finally:
+            database.close()
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures how the parallel evaluation engine scales with the number of worker processes compared "
+                    "to the SQL evaluators (unique files/folders and expected folder structure).")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file, its public index database is evaluated. "
+                             "The results are written to a temporary evaluation database.")
+
+    parser.add_argument("-n", "--synthetic_files",
+                        required=False, type=int, dest="num_synthetic_files", default=0,
+                        help="Evaluate a generated public index of this many files instead of the configured one.")
+
+    parser.add_argument("-w", "--workers",
+                        required=False, nargs="+", type=int, dest="worker_counts", default=None,
+                        help="Numbers of worker processes to measure (default: 1, 2, 4, ... up to the number of "
+                             "CPUs).")
+
+    parser.add_argument("-r", "--repetitions",
+                        required=False, type=int, dest="repetitions", default=3,
+                        help="Runs per setting, the fastest one counts (default: 3).")
+
+    args = parser.parse_args()
+
+    cfg = EvaluationConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    worker_counts = args.worker_counts
+    if worker_counts is None:
+        worker_counts = [1]  # type: List[int]
+        while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != (os.cpu_count() or 1):
+            worker_counts.append(os.cpu_count() or 1)
+
+    work_directory = tempfile.mkdtemp(prefix="dirindex-benchmark-")
+    try:
+        benchmark_parser = ConfigParser(allow_no_value=True)
+        benchmark_parser.read_dict({
+            "public_index_db": {"database_file_path": cfg.public_index_db_cfg.get_database_path()},
+            "evaluation_db": {"database_file_path": os.path.join(work_directory, "evaluation.sqlite")}})
+        if args.num_synthetic_files > 0:
+            benchmark_parser.set("public_index_db", "database_file_path", os.path.join(work_directory, "public.sqlite"))
+        cfg_file = os.path.join(work_directory, "benchmark.cfg")
+        with open(cfg_file, mode='w') as f:
+            benchmark_parser.write(f)
+        with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+            benchmark_cfg = EvaluationConfiguration(cfg_file)
+            benchmark_cfg.read_config()
+        if args.num_synthetic_files > 0:
+            print("\nGenerating a public index of {} files ...".format(args.num_synthetic_files))
+            create_synthetic_index(benchmark_cfg, args.num_synthetic_files)
+
+        sql_seconds = min(run_evaluation(benchmark_cfg, 0) for _ in range(args.repetitions))
+        print("\n{:>10} {:>10} {:>14} {:>14} {:>12}".format("engine", "workers", "seconds", "vs. sql", "efficiency"))
+        print("{:>10} {:>10} {:>14.3f} {:>13.2f}x {:>12}".format("sql", 1, sql_seconds, 1.0, "-"))
+        single_worker_seconds = None
+        for num_workers in worker_counts:
+            seconds = min(run_evaluation(benchmark_cfg, num_workers) for _ in range(args.repetitions))
+            if single_worker_seconds is None:
+                single_worker_seconds = seconds * num_workers
+            # Efficiency: speedup over the first measurement scaled to one worker, divided by the workers.
+            print("{:>10} {:>10} {:>14.3f} {:>13.2f}x {:>11.0f}%".format(
+                "parallel", num_workers, seconds, sql_seconds / seconds,
+                100.0 * single_worker_seconds / seconds / num_workers))
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
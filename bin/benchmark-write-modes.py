@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+from configparser import ConfigParser
+from timeit import default_timer as timer
+from typing import List, Optional
+
+from helper.concurrency_config_mixin import ConcurrencyConfigMixin
+from helper.config_file_handler import IndexingConfiguration
+from helper.database_helper import DataBaseIndexHelper
+from helper.directory_indexer import DirectoryIndexer
+
+
+##################################################################################################
+
+
+def create_tree(directory: str, num_files: int, file_size: int, files_per_folder: int = 1000):
+    """
+    Creates num_files files of random content, files_per_folder files per folder.
+    """
+    for i in range(num_files):
+        folder = os.path.join(directory, "folder_{:05d}".format(i // files_per_folder))
+        if i % files_per_folder == 0:
+            os.makedirs(folder)
+        with open(os.path.join(folder, "file_{:07d}.bin".format(i)), mode='wb') as f:
+            f.write(os.urandom(file_size))
+
+
+##################################################################################################
+
+
+def run_indexing(base_parser: ConfigParser, work_directory: str, tree_directory: str, write_mode: str) -> float:
+    """
+    Indexes the tree into fresh databases with the given write mode.
+    :return: Elapsed seconds (indexing and storing)
+    """
+    parser = ConfigParser(allow_no_value=True)
+    parser.read_dict(base_parser)
+    for section in ["paths", "private_index_db", "public_index_db", ConcurrencyConfigMixin.SECTION_NAME]:
+        if not parser.has_section(section):
+            parser.add_section(section)
+    parser.set("paths", "folders", "\n" + tree_directory)
+    parser.set("private_index_db", "database_file_path", os.path.join(work_directory, "private.sqlite"))
+    parser.set("public_index_db", "database_file_path", os.path.join(work_directory, "public.sqlite"))
+    # One worker per CPU, the adaptive settings would differ between the runs.
+    parser.set(ConcurrencyConfigMixin.SECTION_NAME, ConcurrencyConfigMixin.ADAPTIVE_FIELD_NAME, "no")
+    parser.set(ConcurrencyConfigMixin.SECTION_NAME, ConcurrencyConfigMixin.WRITE_MODE_FIELD_NAME, write_mode)
+    cfg_file = os.path.join(work_directory, "benchmark.cfg")
+    with open(cfg_file, mode='w') as f:
+        parser.write(f)
+    for path in ["private.sqlite", "public.sqlite"]:
+        if os.path.exists(os.path.join(work_directory, path)):
+            os.remove(os.path.join(work_directory, path))
+
+    with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+        cfg = IndexingConfiguration(cfg_file)
+        cfg.read_config()
+        start_timestamp = timer()
+        indexer = DirectoryIndexer(cfg.paths_cfg, cfg.hashing_cfg, cfg.concurrency_cfg)
+        database = DataBaseIndexHelper(cfg.private_index_db_cfg, cfg.public_index_db_cfg)
+        try:
+            indexer.scan_directories_and_insert(database)
+        finally:
+            database.close()
+        return timer() - start_timestamp
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares the single writer with the sharded write mode ([concurrency] write_mode) by indexing "
+                    "generated trees of increasing size and reports where the sharded mode becomes faster.")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file, its [hashing] settings are used. "
+                             "Paths, databases and [concurrency] are replaced by the benchmark.")
+
+    parser.add_argument("-n", "--files",
+                        required=False, nargs="+", type=int, dest="file_counts",
+                        default=[1000, 5000, 20000, 50000],
+                        help="Numbers of files of the generated trees (default: 1000 5000 20000 50000).")
+
+    parser.add_argument("-s", "--file_size",
+                        required=False, type=int, dest="file_size", default=1024,
+                        help="Size of the generated files in bytes (default: 1024). The smaller the files, the more "
+                             "the storing dominates.")
+
+    parser.add_argument("-r", "--repetitions",
+                        required=False, type=int, dest="repetitions", default=3,
+                        help="Runs per write mode and tree, the fastest one counts (default: 3).")
+
+    parser.add_argument("-d", "--work_directory",
+                        required=False, type=str, dest="work_directory", default=None,
+                        help="Folder for the generated trees and databases (default: a temporary folder). "
+                             "Use a folder on the disk to be indexed.")
+
+    args = parser.parse_args()
+    args.file_counts = sorted(args.file_counts)
+
+    cfg = IndexingConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    work_directory = tempfile.mkdtemp(prefix="dirindex-benchmark-", dir=args.work_directory)
+    try:
+        print("\n{:>10} {:>12} {:>12} {:>10}".format("files", "single s", "sharded s", "speedup"))
+        sharded_is_faster = []  # type: List[bool]
+        for num_files in args.file_counts:
+            tree_directory = os.path.join(work_directory, "tree")
+            shutil.rmtree(tree_directory, ignore_errors=True)
+            create_tree(tree_directory, num_files, args.file_size)
+
+            results = {}
+            for write_mode in ConcurrencyConfigMixin.WRITE_MODES:
+                results[write_mode] = min(
+                    run_indexing(cfg.parser, work_directory, tree_directory, write_mode)
+                    for _ in range(args.repetitions))
+            single = results[ConcurrencyConfigMixin.WRITE_MODE_SINGLE]
+            sharded = results[ConcurrencyConfigMixin.WRITE_MODE_SHARDED]
+            print("{:>10} {:>12.3f} {:>12.3f} {:>9.2f}x".format(num_files, single, sharded, single / sharded))
+            sharded_is_faster.append(sharded < single)
+
+        # The smallest tree from which on the sharded mode was faster for all larger trees.
+        crossover = None  # type: Optional[int]
+        for num_files, is_faster in reversed(list(zip(args.file_counts, sharded_is_faster))):
+            if not is_faster:
+                break
+            crossover = num_files
+        if crossover is None:
+            print("\nThe single writer was faster for the largest tree.")
+        else:
+            print("\nThe sharded write mode is faster from {} files on ({} CPUs, {} byte files)."
+                  .format(crossover, os.cpu_count(), args.file_size))
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from timeit import default_timer as timer
 from helper.config_file_handler import IndexingConfiguration
 from helper.database_helper import DataBaseIndexHelper
 from helper.directory_indexer import DirectoryIndexer
+from helper.duplicate_verifier import DuplicateVerifier
+from helper.hash_backfill import HashBackfiller
 
 
 ##################################################################################################
@@ -17,17 +19,68 @@ def main():
                         metavar="Configuration",
                         help="Path to the configuration file to be loaded. "
                              "An example Configuration can be found in the 'configurations' folder.")
+
+    parser.add_argument("--retry-errors",
+                        required=False, action="store_true", dest="do_retry_errors",
+                        help="Keep the existing index and re-process only the files that could not be indexed "
+                             "in previous runs.")
+
+    parser.add_argument("--incremental",
+                        required=False, action="store_true", dest="do_incremental",
+                        help="Keep the existing index and re-index only the files changed since the last run. "
+                             "Unchanged folders are skipped, see [change_detection] paranoia_level.")
+
+    parser.add_argument("--verify-duplicates",
+                        required=False, action="store_true", dest="do_verify_duplicates",
+                        help="Keep the existing index and hash the files with shared quick content hashes "
+                             "(content_identity = quick) completely, the rows are upgraded in place.")
+
+    parser.add_argument("--metadata-only",
+                        required=False, action="store_true", dest="do_metadata_only",
+                        help="Metadata phase of the two-phase indexing: store the files (names, sizes, time stamps) "
+                             "without reading them, their contents are hashed by --backfill. Combined with "
+                             "--incremental only the new and modified files are stored this way.")
+
+    parser.add_argument("--backfill",
+                        required=False, action="store_true", dest="do_backfill",
+                        help="Hashing phase of the two-phase indexing: keep the existing index and hash the files "
+                             "stored by --metadata-only, in the order of [backfill] priority. Combined with "
+                             "--metadata-only both phases run one after the other.")
+
+    parser.add_argument("--backfill-folders",
+                        required=False, nargs="+", type=str, dest="backfill_folders", default=None,
+                        metavar="Folder",
+                        help="Hash the files below these folders first, overrides [backfill] priority_folders.")
+
     args = parser.parse_args()
 
     cfg = IndexingConfiguration(args.cfg_file[0])
     cfg.read_config()
 
-    indexer = DirectoryIndexer(cfg.paths_cfg, cfg.hashing_cfg)
-    database = DataBaseIndexHelper(cfg.private_index_db_cfg, cfg.public_index_db_cfg)
+    indexer = DirectoryIndexer(cfg.paths_cfg, cfg.hashing_cfg, cfg.concurrency_cfg, cfg.io_limits_cfg,
+                               cfg.archives_cfg)
+    database = DataBaseIndexHelper(cfg.private_index_db_cfg, cfg.public_index_db_cfg,
+                                   reset_tables=not (args.do_retry_errors or args.do_incremental
+                                                     or args.do_verify_duplicates
+                                                     or (args.do_backfill and not args.do_metadata_only)))
 
     try:
         start_timestamp = timer()
-        indexer.scan_directories_and_insert(database)
+        if args.do_retry_errors:
+            indexer.retry_errors_and_insert(database)
+        elif args.do_incremental:
+            indexer.scan_directories_incrementally_and_insert(database,
+                                                              cfg.change_detection_cfg.get_paranoia_level(),
+                                                              metadata_only=args.do_metadata_only)
+        elif args.do_metadata_only or not (args.do_verify_duplicates or args.do_backfill):
+            indexer.scan_directories_and_insert(database, metadata_only=args.do_metadata_only)
+        if args.do_backfill:
+            HashBackfiller(database, indexer, cfg.paths_cfg.get_folders(),
+                           cfg.backfill_cfg.get_priority(),
+                           args.backfill_folders or cfg.backfill_cfg.get_priority_folders(),
+                           cfg.backfill_cfg.get_batch_size()).backfill()
+        if args.do_verify_duplicates:
+            DuplicateVerifier(database, cfg.hashing_cfg, cfg.io_limits_cfg).verify()
     finally:
         database.close()
 
@@ -0,0 +1,55 @@
+import argparse
+import sys
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from helper.index_diff import IndexDiff, DIFF_FIELD_NAMES
+from helper.record_writer import RecordWriter, create_record_writer
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Computes the added, deleted, modified, moved and touched files between two index databases.")
+    parser.add_argument("old_database", type=str, metavar="OLD_DB",
+                        help="Path to the older private or public index database.")
+    parser.add_argument("new_database", type=str, metavar="NEW_DB",
+                        help="Path to the newer private or public index database.")
+
+    parser.add_argument("-f", "--format",
+                        required=False, type=str, dest="output_format", default="jsonl",
+                        choices=RecordWriter.FORMATS,
+                        help="Output format (default: jsonl).")
+
+    parser.add_argument("-o", "--output",
+                        required=False, type=str, dest="output_file", default="-",
+                        help="Output file (default: stdout).")
+
+    parser.add_argument("-u", "--unchanged",
+                        required=False, action="store_true", dest="report_unchanged",
+                        help="Also report unchanged files.")
+
+    parser.add_argument("-t", "--temp_directory",
+                        required=False, type=str, dest="temp_directory", default=None,
+                        help="Folder for the temporary spill database (default: system temp folder).")
+
+    args = parser.parse_args()
+
+    start_timestamp = timer()
+    diff = IndexDiff(args.old_database, args.new_database, args.report_unchanged, args.temp_directory)
+    with create_record_writer(args.output_format, args.output_file, DIFF_FIELD_NAMES) as writer:
+        diff.write(writer)
+
+    # Progress goes to stderr, stdout may carry the diff itself.
+    for change, count in sorted(diff.change_counts.items()):
+        print("{}: {}".format(change, count), file=sys.stderr)
+    print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)), file=sys.stderr)
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from helper.config_file_handler import EvaluationConfiguration
+from helper.database_helper import SqliteDbConnector
+from helper.federated_evaluation import FederatedEvaluator, parse_source
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluates the public index databases of several hosts together, e.g. collected from third "
+                    "parties. The databases are read in place, the results name the source of every file.")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file to be loaded, its evaluation database receives the "
+                             "results. An example Configuration can be found in the 'configurations' folder.")
+
+    parser.add_argument("sources",
+                        nargs="+", type=str, metavar="Source",
+                        help="Public index databases as 'name=path' or 'path' (named after the file).")
+
+    parser.add_argument("-p", "--partitions",
+                        required=False, type=int, dest="num_partitions", default=16,
+                        help="Number of hash ranges evaluated one after the other (default: 16). More partitions "
+                             "need less temporary space per pass but read the sources more often.")
+
+    args = parser.parse_args()
+
+    cfg = EvaluationConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    start_timestamp = timer()
+    evaluation_db = SqliteDbConnector(cfg.evaluation_db_cfg)
+    try:
+        FederatedEvaluator(evaluation_db, [parse_source(s) for s in args.sources], args.num_partitions).evaluate()
+    finally:
+        evaluation_db.close()
+
+    print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
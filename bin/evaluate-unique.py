@@ -1,10 +1,97 @@
 import argparse
+import os
 from datetime import timedelta
 from timeit import default_timer as timer
-from typing import List, Union
+from typing import Optional
 
+from helper.chunk_evaluator import SharedChunkEvaluator
+from helper.columnar_snapshot import ColumnarSnapshot
 from helper.config_file_handler import EvaluationConfiguration
-from helper.database_helper import EvaluationDataBases, UniqueFileFolderEvaluator, ExpectedFolderStructureEvaluator
+from helper.database_helper import EvaluationDataBases, UniqueFileFolderEvaluator, ExpectedFolderStructureEvaluator, \
+    IdenticalSubtreeEvaluator, QuickHashCandidateEvaluator, MissingFilesEvaluator
+from helper.evaluation_scheduler import EvaluationScheduler, EvaluatorRegistration, EvaluatorRegistry
+from helper.numpy_evaluation_engine import NumpyEvaluationEngine
+from helper.parallel_evaluation import ParallelEvaluationEngine
+from helper.similarity_evaluator import SimilarFolderEvaluator
+
+
+##################################################################################################
+
+EVALUATOR_NAMES = ["quick_hash_candidates", "unique_files_folders", "identical_subtrees", "similar_folders",
+                   "shared_chunks", "expected_folder_structure", "missing_files"]
+
+
+##################################################################################################
+
+
+def create_registry(cfg: EvaluationConfiguration, engine: str, use_snapshot: bool, num_workers: Optional[int],
+                    num_partitions: Optional[int]) -> EvaluatorRegistry:
+    """
+    Registers the evaluators with the tables they read and write. The numpy and parallel engines compute the unique
+    files/folders and the expected folder structure together as "unique_files_folders", which is selected by
+    "expected_folder_structure" too.
+    """
+    evaluation_cfg = cfg.evaluation_cfg
+    skip_identical_subtrees = evaluation_cfg.skip_identical_subtrees()
+    heavy_hitters = {"heavy_hitter_threshold": evaluation_cfg.get_heavy_hitter_threshold(),
+                     "heavy_hitter_policy": evaluation_cfg.get_heavy_hitter_policy()}
+    settled_folders = [IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME] if skip_identical_subtrees else []
+    index = EvaluatorRegistry.INDEX_INPUT
+
+    registry = EvaluatorRegistry()
+    registry.register(EvaluatorRegistration(
+        "quick_hash_candidates", QuickHashCandidateEvaluator, [index],
+        [QuickHashCandidateEvaluator.QUICK_HASH_CANDIDATES_TABLE_NAME]))
+    registry.register(EvaluatorRegistration(
+        "identical_subtrees", IdenticalSubtreeEvaluator, [index],
+        [IdenticalSubtreeEvaluator.IDENTICAL_SUBTREES_TABLE_NAME,
+         IdenticalSubtreeEvaluator.NEAR_IDENTICAL_SUBTREES_TABLE_NAME,
+         IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME]))
+    registry.register(EvaluatorRegistration(
+        "similar_folders", lambda databases: SimilarFolderEvaluator(databases, evaluation_cfg), [index],
+        [SimilarFolderEvaluator.SIMILAR_FOLDERS_TABLE_NAME],
+        {"threshold": evaluation_cfg.get_similarity_threshold(),
+         "permutations": evaluation_cfg.get_minhash_permutations(), "bands": evaluation_cfg.get_lsh_bands(),
+         "min_files": evaluation_cfg.get_similarity_min_files()}))
+    registry.register(EvaluatorRegistration(
+        "shared_chunks", lambda databases: SharedChunkEvaluator(databases, evaluation_cfg), [index],
+        [SharedChunkEvaluator.SHARED_CHUNK_FILES_TABLE_NAME],
+        {"threshold": evaluation_cfg.get_chunk_similarity_threshold()}))
+
+    unique_files_folders = [UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME,
+                            UniqueFileFolderEvaluator.UNIQUE_FOLDERS_TABLE_NAME]
+    expected_folder_structure = [ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME,
+                                 ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME]
+    if engine == "numpy":
+        snapshot = ColumnarSnapshot(ColumnarSnapshot.default_directory(cfg.public_index_db_cfg.get_database_path())) \
+            if use_snapshot else None
+        registry.register(EvaluatorRegistration(
+            "unique_files_folders", lambda databases: NumpyEvaluationEngine(
+                databases, skip_identical_subtrees=skip_identical_subtrees, snapshot=snapshot, **heavy_hitters),
+            [index] + settled_folders, unique_files_folders + expected_folder_structure,
+            dict(engine=engine, skip_identical_subtrees=skip_identical_subtrees, **heavy_hitters)))
+        registry.register_alias("expected_folder_structure", "unique_files_folders")
+    elif engine == "parallel":
+        registry.register(EvaluatorRegistration(
+            "unique_files_folders", lambda databases: ParallelEvaluationEngine(
+                databases, skip_identical_subtrees=skip_identical_subtrees, num_workers=num_workers,
+                num_partitions=num_partitions, **heavy_hitters),
+            [index] + settled_folders, unique_files_folders + expected_folder_structure,
+            dict(engine=engine, skip_identical_subtrees=skip_identical_subtrees, **heavy_hitters)))
+        registry.register_alias("expected_folder_structure", "unique_files_folders")
+    else:
+        registry.register(EvaluatorRegistration(
+            "unique_files_folders", UniqueFileFolderEvaluator, [index], unique_files_folders, {"engine": engine}))
+        registry.register(EvaluatorRegistration(
+            "expected_folder_structure", lambda databases: ExpectedFolderStructureEvaluator(
+                databases, skip_identical_subtrees=skip_identical_subtrees, **heavy_hitters),
+            [index, UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME] + settled_folders, expected_folder_structure,
+            dict(skip_identical_subtrees=skip_identical_subtrees, **heavy_hitters)))
+    registry.register(EvaluatorRegistration(
+        "missing_files", MissingFilesEvaluator,
+        [index, ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME],
+        [MissingFilesEvaluator.MISSING_FILES_TABLE_NAME]))
+    return registry
 
 
 ##################################################################################################
@@ -23,22 +110,56 @@ def main():
 
                         help="Drop and re-create empty all evaluation tables.")
 
+    parser.add_argument("-e", "--engine",
+                        required=False, type=str, dest="engine", default="sql", choices=["sql", "numpy", "parallel"],
+                        help="Compute unique files/folders and the expected folder structure with SQLite queries "
+                             "(sql, default), in memory with NumPy (numpy) or with SQLite queries per hash range in "
+                             "several processes (parallel).")
+
+    parser.add_argument("-s", "--snapshot",
+                        required=False, action="store_true", dest="use_snapshot",
+                        help="numpy engine only: load the public index from its columnar snapshot "
+                             "(<public index database>.snapshot), the snapshot is (re-)exported if missing or stale.")
+
+    parser.add_argument("-w", "--workers",
+                        required=False, type=int, dest="num_workers", default=None,
+                        help="parallel engine only: number of worker processes (default: number of CPUs).")
+
+    parser.add_argument("-p", "--partitions",
+                        required=False, type=int, dest="num_partitions", default=None,
+                        help="parallel engine only: number of hash ranges (default: 4 per worker).")
+
+    parser.add_argument("-o", "--only",
+                        required=False, nargs="+", type=str, dest="only", default=None, metavar="Evaluator",
+                        help="Run (or reset) only these evaluators and the ones they depend on: {}.".format(
+                            ", ".join(EVALUATOR_NAMES)))
+
+    parser.add_argument("-f", "--force",
+                        required=False, nargs="*", type=str, dest="force", default=None, metavar="Evaluator",
+                        help="Re-run these evaluators (all if none given) even if the public index did not change "
+                             "since their last run.")
+
+    parser.add_argument("-j", "--jobs",
+                        required=False, type=int, dest="num_jobs", default=os.cpu_count() or 1,
+                        help="Maximum number of independent evaluators running at the same time (default: number of "
+                             "CPUs).")
+
     args = parser.parse_args()
 
     cfg = EvaluationConfiguration(args.cfg_file[0])
     cfg.read_config()
 
-    database = EvaluationDataBases(cfg.public_index_db_cfg, cfg.evaluation_db_cfg)
-    evaluators = [UniqueFileFolderEvaluator(database), ExpectedFolderStructureEvaluator(database)]
-
-    try:
-        start_timestamp = timer()
-        if not args.do_reset_tables:
-            [e.evaluate() for e in evaluators]
-        else:
-            [e.reset() for e in evaluators]
-    finally:
-        database.close()
+    registry = create_registry(cfg, args.engine, args.use_snapshot, args.num_workers, args.num_partitions)
+    scheduler = EvaluationScheduler(
+        registry, lambda: EvaluationDataBases(cfg.public_index_db_cfg, cfg.evaluation_db_cfg), args.num_jobs)
+
+    start_timestamp = timer()
+    if not args.do_reset_tables:
+        scheduler.evaluate(only=args.only,
+                           force=None if args.force is None else args.force if len(args.force) > 0 else
+                           registry.names())
+    else:
+        scheduler.reset(only=args.only)
 
     print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)))
 
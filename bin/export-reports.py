@@ -0,0 +1,69 @@
+import argparse
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from helper.config_file_handler import ResolveConfiguration
+from helper.database_helper import PrivateDataBase
+from helper.output_config_mixin import OutputConfigMixin
+from helper.report_exporter import ReportExporter
+from helper.result_resolver import ResultResolver
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Writes the evaluation results with their real paths as report files (duplicates, unique files, "
+                    "expected folder structure, missing files per root), see the section [output].")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file naming the private index and the evaluation database. "
+                             "An example Configuration can be found in the 'configurations' folder.")
+
+    parser.add_argument("-r", "--reports",
+                        required=False, nargs="+", type=str, dest="reports", default=ReportExporter.REPORTS,
+                        choices=ReportExporter.REPORTS,
+                        help="Reports to write (default: all).")
+
+    parser.add_argument("-f", "--format",
+                        required=False, type=str, dest="output_format", default=None,
+                        choices=OutputConfigMixin.FORMATS,
+                        help="Overrides '[output] format'.")
+
+    parser.add_argument("-z", "--compression",
+                        required=False, type=str, dest="compression", default=None,
+                        choices=OutputConfigMixin.COMPRESSIONS,
+                        help="Overrides '[output] compression'.")
+
+    parser.add_argument("-o", "--output_directory",
+                        required=False, type=str, dest="output_directory", default=None,
+                        help="Overrides '[output] output_directory'.")
+
+    args = parser.parse_args()
+
+    cfg = ResolveConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    start_timestamp = timer()
+    private_db = PrivateDataBase(cfg.private_index_db_cfg)
+    try:
+        exporter = ReportExporter(ResultResolver(private_db, cfg.evaluation_db_cfg.get_database_path()),
+                                  args.output_directory or cfg.output_cfg.get_output_directory(),
+                                  args.output_format or cfg.output_cfg.get_format(),
+                                  args.compression or cfg.output_cfg.get_compression(),
+                                  cfg.output_cfg.get_fetch_size())
+        print("\nWriting reports ...")
+        [exporter.export(report) for report in args.reports]
+    finally:
+        private_db.close()
+
+    print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import json
+import math
+import os
+from collections import deque
+from timeit import default_timer as timer
+from typing import Dict, Optional
+
+from .concurrency_config_mixin import ConcurrencyConfigMixin
+
+
+##################################################################################################
+
+class ThroughputWindow(object):
+    """
+    Sliding window over completed files that reports bytes/s and files/s of the last window_seconds.
+    """
+
+    ##################################################################################################
+
+    def __init__(self, window_seconds: float):
+        self._window_seconds = window_seconds  # type: float
+        self._samples = deque()  # type: deque
+        self._window_bytes = 0  # type: int
+        self._started = timer()  # type: float
+
+    ##################################################################################################
+
+    def add(self, num_bytes: int, num_files: int = 1, timestamp: float = None):
+        timestamp = timer() if timestamp is None else timestamp
+        self._samples.append((timestamp, num_bytes, num_files))
+        self._window_bytes += num_bytes
+        self._purge(timestamp)
+
+    ##################################################################################################
+
+    def reset(self):
+        self._samples.clear()
+        self._window_bytes = 0
+        self._started = timer()
+
+    ##################################################################################################
+
+    def is_full(self, timestamp: float = None) -> bool:
+        """
+        A window is full once it has been observed for at least window_seconds.
+        """
+        timestamp = timer() if timestamp is None else timestamp
+        return timestamp - self._started >= self._window_seconds
+
+    ##################################################################################################
+
+    def rates(self, timestamp: float = None) -> (float, float):
+        """
+        :return: Tuple of (bytes per second, files per second) within the window.
+        """
+        timestamp = timer() if timestamp is None else timestamp
+        self._purge(timestamp)
+        duration = min(self._window_seconds, max(timestamp - self._started, 1e-6))
+        num_files = sum(s[2] for s in self._samples)
+        return self._window_bytes / duration, num_files / duration
+
+    ##################################################################################################
+
+    def _purge(self, timestamp: float):
+        while len(self._samples) > 0 and timestamp - self._samples[0][0] > self._window_seconds:
+            self._window_bytes -= self._samples.popleft()[1]
+
+
+##################################################################################################
+
+class HillClimber(object):
+    """
+    Pattern search on a single integer parameter: keep moving in the direction that improves the throughput,
+    try the other direction once it stops improving and halve the step when both directions failed.
+    The parameter is settled when the step size reaches 0.
+    """
+
+    ##################################################################################################
+
+    def __init__(self, value: int, lower: int, upper: int, step: int, tolerance: float = 0.05):
+        self.value = min(max(value, lower), upper)  # type: int
+        self.settled = False  # type: bool
+        self._lower = lower  # type: int
+        self._upper = upper  # type: int
+        self._step = max(step, 1)  # type: int
+        self._tolerance = tolerance  # type: float
+        self._direction = 1  # type: int
+        self._tried_other_direction = False  # type: bool
+        self._best_value = self.value  # type: int
+        self._best_throughput = None  # type: Optional[float]
+
+    ##################################################################################################
+
+    def update(self, throughput: float) -> int:
+        """
+        Feed the throughput measured with the current value and get the value to be measured next.
+        """
+        if self.settled:
+            return self.value
+
+        if self._best_throughput is None or throughput > self._best_throughput * (1.0 + self._tolerance):
+            self._best_value, self._best_throughput = self.value, throughput
+            self._tried_other_direction = False
+        else:
+            self._reject()
+
+        self.value = self._next_candidate()
+        return self.value
+
+    ##################################################################################################
+
+    def _reject(self):
+        if not self._tried_other_direction:
+            self._direction = -self._direction
+            self._tried_other_direction = True
+        else:
+            self._step //= 2
+            self._tried_other_direction = False
+
+    ##################################################################################################
+
+    def _next_candidate(self) -> int:
+        while self._step > 0:
+            candidate = self._best_value + self._direction * self._step
+            if self._lower <= candidate <= self._upper:
+                return candidate
+            self._reject()
+
+        self.settled = True
+        return self._best_value
+
+
+##################################################################################################
+
+class AdaptiveConcurrencyController(object):
+    """
+    Tunes the number of concurrently hashed files and the file block size of one device.
+    The worker count is tuned first, the block size (in powers of two) afterwards. Both are tuned by hill-climbing
+    on the bytes/s measured over a sliding window until the throughput plateaus.
+    """
+
+    ##################################################################################################
+
+    MIN_FILES_PER_WINDOW = 8
+
+    ##################################################################################################
+
+    def __init__(self, device_id: int, workers: int, block_size: int, concurrency_config: ConcurrencyConfigMixin):
+        self._device_id = device_id  # type: int
+        self._window = ThroughputWindow(concurrency_config.get_window_seconds())  # type: ThroughputWindow
+        self._files_in_window = 0  # type: int
+        self._best_rates = (0.0, 0.0)  # type: (float, float)
+
+        self._workers = HillClimber(
+            workers,
+            concurrency_config.get_min_workers(),
+            concurrency_config.get_max_workers(),
+            step=max(1, workers // 2))  # type: HillClimber
+        self._block_exponent = HillClimber(
+            int(round(math.log2(max(block_size, 1)))),
+            int(math.ceil(math.log2(concurrency_config.get_min_block_size()))),
+            int(math.floor(math.log2(concurrency_config.get_max_block_size()))),
+            step=2)  # type: HillClimber
+
+    ##################################################################################################
+
+    @property
+    def workers(self) -> int: return self._workers.value
+
+    ##################################################################################################
+
+    @property
+    def block_size(self) -> int: return 1 << self._block_exponent.value
+
+    ##################################################################################################
+
+    @property
+    def settled(self) -> bool: return self._workers.settled and self._block_exponent.settled
+
+    ##################################################################################################
+
+    def record(self, num_bytes: int, num_files: int = 1) -> bool:
+        """
+        Account a completed file and adjust the settings once a full window has been measured.
+        :return: True if the settings have been changed.
+        """
+        self._window.add(num_bytes, num_files)
+        self._files_in_window += num_files
+
+        if self.settled or self._files_in_window < AdaptiveConcurrencyController.MIN_FILES_PER_WINDOW \
+                or not self._window.is_full():
+            return False
+
+        bytes_per_second, files_per_second = self._window.rates()
+        if bytes_per_second >= self._best_rates[0]:
+            self._best_rates = (bytes_per_second, files_per_second)
+
+        if not self._workers.settled:
+            self._workers.update(bytes_per_second)
+        else:
+            self._block_exponent.update(bytes_per_second)
+
+        self._window.reset()
+        self._files_in_window = 0
+
+        print("\tDevice {d}: {b:.1f} MiB/s, {f:.1f} files/s -> workers={w}, block_size={s}{settled}"
+              .format(d=self._device_id, b=bytes_per_second / (1024 * 1024), f=files_per_second,
+                      w=self.workers, s=self.block_size, settled=" (settled)" if self.settled else ""))
+        return True
+
+    ##################################################################################################
+
+    def to_hint(self) -> dict:
+        return {"device_id": self._device_id,
+                "workers": self.workers,
+                "block_size": self.block_size,
+                "bytes_per_second": self._best_rates[0],
+                "files_per_second": self._best_rates[1],
+                "settled": self.settled}
+
+
+##################################################################################################
+
+class ConcurrencyHints(object):
+    """
+    Persisted settings of the previous runs, one entry per indexed root folder.
+    """
+
+    ##################################################################################################
+
+    def __init__(self, hints_file_path: str):
+        self._hints_file_path = hints_file_path  # type: str
+        self._hints = {}  # type: Dict[str, dict]
+
+    ##################################################################################################
+
+    def load(self):
+        if not os.path.isfile(self._hints_file_path):
+            return
+        try:
+            with open(self._hints_file_path, mode='r') as f:
+                self._hints = json.load(f)
+        except (OSError, ValueError) as e:
+            print("WARNING: Failed to load concurrency hints '{}' ({}). Ignoring them.".format(self._hints_file_path, e))
+            self._hints = {}
+
+    ##################################################################################################
+
+    def save(self):
+        try:
+            with open(self._hints_file_path, mode='w') as f:
+                json.dump(self._hints, f, indent=4, sort_keys=True)
+        except OSError as e:
+            print("WARNING: Failed to store concurrency hints '{}' ({}).".format(self._hints_file_path, e))
+
+    ##################################################################################################
+
+    def get(self, root_directory: str) -> Optional[dict]:
+        return self._hints.get(root_directory)
+
+    ##################################################################################################
+
+    def set(self, root_directory: str, hint: dict):
+        self._hints[root_directory] = hint
@@ -0,0 +1,321 @@
+import hashlib
+import io
+import lzma
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from magic import Magic
+
+from .content_chunking import ContentChunker
+from .io_throttle import worker_throttle
+
+
+##################################################################################################
+
+ARCHIVE_FORMAT_ZIP = "zip"
+ARCHIVE_FORMAT_TAR = "tar"
+
+# Archive file extensions (lower case, without the leading dot) and the format they are read as.
+ARCHIVE_FORMATS = {"zip": ARCHIVE_FORMAT_ZIP, "jar": ARCHIVE_FORMAT_ZIP, "war": ARCHIVE_FORMAT_ZIP,
+                   "ear": ARCHIVE_FORMAT_ZIP, "apk": ARCHIVE_FORMAT_ZIP, "whl": ARCHIVE_FORMAT_ZIP,
+                   "tar": ARCHIVE_FORMAT_TAR, "tar.gz": ARCHIVE_FORMAT_TAR, "tgz": ARCHIVE_FORMAT_TAR,
+                   "tar.bz2": ARCHIVE_FORMAT_TAR, "tbz2": ARCHIVE_FORMAT_TAR, "tar.xz": ARCHIVE_FORMAT_TAR,
+                   "txz": ARCHIVE_FORMAT_TAR}
+
+# Damaged or unsupported archives, e.g. encrypted zip members. I/O errors of the archive file are not caught.
+ARCHIVE_ERRORS = (tarfile.TarError, zipfile.BadZipFile, zipfile.LargeZipFile, EOFError, zlib.error, lzma.LZMAError,
+                  RuntimeError, NotImplementedError)
+
+# Bytes of the head of a member the mime type is detected from.
+MIME_SAMPLE_SIZE = 64 * 1024
+
+
+##################################################################################################
+
+def is_below_archive(root_path: str, relative_path: str) -> bool:
+    """
+    Helper function that tells whether an indexed folder is the virtual folder of an archive (or below it): one of its
+    ancestors is a file on disk, which a real folder cannot be.
+    """
+    parent = relative_path
+    while parent not in ("", ".", os.sep):
+        if os.path.isfile(os.path.join(root_path, parent)):
+            return True
+        parent = os.path.dirname(parent)
+    return False
+
+
+##################################################################################################
+
+class ArchiveSettings(object):
+    """
+    Parameters of the archive descent, passed to the indexing processes.
+    """
+
+    def __init__(self, extensions: List[str], max_archive_size: int, max_depth: int, max_buffered_size: int):
+        # Longest first, so that "tar.gz" wins over "gz".
+        self.extensions = sorted(extensions, key=len, reverse=True)  # type: List[str]
+        self.max_archive_size = max_archive_size  # type: int
+        self.max_depth = max_depth  # type: int
+        self.max_buffered_size = max_buffered_size  # type: int
+
+    ##################################################################################################
+
+    def is_archive(self, file_name: str) -> bool:
+        """
+        :return: True if the file has one of the configured archive extensions, regardless of its size
+        """
+        lower_name = file_name.lower()
+        return any(lower_name.endswith("." + e) for e in self.extensions)
+
+    ##################################################################################################
+
+    def archive_format(self, file_name: str, file_size: int, depth: int = 1) -> Optional[str]:
+        """
+        :param depth: Nesting depth of the archive, 1 for an archive on disk
+        :return: One of ARCHIVE_FORMATS if the members of the file are indexed, otherwise None
+        """
+        if depth > self.max_depth or (0 < self.max_archive_size < file_size):
+            return None
+        lower_name = file_name.lower()
+        for extension in self.extensions:
+            if lower_name.endswith("." + extension):
+                return ARCHIVE_FORMATS[extension]
+        return None
+
+
+##################################################################################################
+
+class ArchiveMember(object):
+    """
+    A regular file within an archive.
+    """
+
+    def __init__(self, path: str, size: int, mtime: float, content_hash_tag: str, mime_type: str):
+        # Path within the archive, "/" separated, the path of a nested archive as prefix
+        self.path = path  # type: str
+        self.size = size  # type: int
+        self.mtime = mtime  # type: float
+        # md5 of the content, the same as of the extracted file
+        self.content_hash_tag = content_hash_tag  # type: str
+        self.mime_type = mime_type  # type: str
+
+
+##################################################################################################
+
+class _HashingReader(object):
+    """
+    Read-only file object that feeds everything read through it into a hash (and a chunker), so that an archive
+    is hashed while its members are read.
+    """
+
+    def __init__(self, raw, hash_sum, chunker: ContentChunker = None, throttle=None):
+        self._raw = raw
+        self._hash_sum = hash_sum
+        self._chunker = chunker  # type: Optional[ContentChunker]
+        self._throttle = throttle
+
+    ##################################################################################################
+
+    def read(self, size: int = -1) -> bytes:
+        block = self._raw.read(size)
+        if self._throttle is not None:
+            self._throttle.acquire(len(block))
+        self._hash_sum.update(block)
+        if self._chunker is not None:
+            self._chunker.update(block)
+        return block
+
+    ##################################################################################################
+
+    def drain(self, block_size: int):
+        """
+        Reads the rest of the stream, e.g. the padding after the last tar member.
+        """
+        for _ in iter(lambda: self.read(block_size), b""):
+            pass
+
+
+##################################################################################################
+
+class ArchiveReader(object):
+    """
+    Streams the members of zip and tar archives without extracting them: every member is hashed while it is read,
+    nothing is written to disk. Tar archives (plain or compressed) are read in one sequential pass without any seek,
+    members of a tar within the archive are read from the same stream. Zip archives need their central directory,
+    their members are read in the order they are stored in; a zip within an archive is buffered in memory if it is
+    not larger than max_buffered_size, otherwise it is hashed as a plain member.
+
+    Damaged archives are indexed as plain files: a warning is printed and no member is returned. If a path occurs
+    more than once in an archive, the last member wins (like tar extracts it).
+    """
+
+    ##################################################################################################
+
+    def __init__(self, settings: ArchiveSettings, block_size: int):
+        self._settings = settings  # type: ArchiveSettings
+        self._block_size = block_size  # type: int
+        self._magic = Magic(mime=True)
+
+    ##################################################################################################
+
+    def read_tar_file(self, file_path: str, chunker: ContentChunker = None) -> Tuple[str, List[ArchiveMember]]:
+        """
+        Hashes the tar archive and its members in one pass.
+        :return: Tuple of (content hash tag of the archive, members)
+        """
+        throttle = worker_throttle()
+        if throttle is not None:
+            throttle.acquire(0, num_operations=1)
+        hash_sum = hashlib.md5()
+        with open(file_path, "rb") as f:
+            reader = _HashingReader(f, hash_sum, chunker, throttle)
+            members = self._read_archive(file_path, lambda: self._tar_members(reader, 1))
+            reader.drain(self._block_size)
+            if throttle is not None:
+                throttle.release_page_cache(f.fileno())
+        return hash_sum.hexdigest(), members
+
+    ##################################################################################################
+
+    def read_zip_file(self, file_path: str) -> List[ArchiveMember]:
+        throttle = worker_throttle()
+        if throttle is not None:
+            throttle.acquire(0, num_operations=1)
+        with open(file_path, "rb") as f:
+            members = self._read_archive(file_path, lambda: self._zip_members(zipfile.ZipFile(f), 1, throttle))
+            if throttle is not None:
+                throttle.release_page_cache(f.fileno())
+        return members
+
+    ##################################################################################################
+
+    def read_file(self, file_path: str, archive_format: str) -> List[ArchiveMember]:
+        """
+        Reads the members of an archive whose content hash is known already.
+        """
+        if archive_format == ARCHIVE_FORMAT_TAR:
+            return self.read_tar_file(file_path)[1]
+        return self.read_zip_file(file_path)
+
+    ##################################################################################################
+
+    @staticmethod
+    def _read_archive(name: str, read) -> List[ArchiveMember]:
+        try:
+            return read()
+        except ARCHIVE_ERRORS as e:
+            print("WARNING: Cannot read the members of archive '{}' ({}: {}), indexed as plain file.".format(
+                os.path.normpath(name), type(e).__name__, e))
+            return []
+
+    ##################################################################################################
+
+    def _tar_members(self, stream, depth: int) -> List[ArchiveMember]:
+        members = {}  # type: Dict[str, ArchiveMember]
+        # "r|*" reads the archive as a stream, compressed or not, the members must be read in order.
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            for info in tar:
+                path = _member_path(info.name)
+                if not info.isfile() or path is None:
+                    continue
+                for member in self._member(tar.extractfile(info), path, info.size, info.mtime, depth):
+                    members[member.path] = member
+        return list(members.values())
+
+    ##################################################################################################
+
+    def _zip_members(self, archive: zipfile.ZipFile, depth: int, throttle=None) -> List[ArchiveMember]:
+        members = {}  # type: Dict[str, ArchiveMember]
+        with archive:
+            for info in sorted(archive.infolist(), key=lambda i: i.header_offset):
+                path = _member_path(info.filename)
+                if info.is_dir() or path is None:
+                    continue
+                if throttle is not None:
+                    throttle.acquire(info.compress_size)
+                with archive.open(info) as stream:
+                    for member in self._member(stream, path, info.file_size, _zip_time(info.date_time), depth):
+                        members[member.path] = member
+        return list(members.values())
+
+    ##################################################################################################
+
+    def _member(self, stream, path: str, size: int, mtime: float, depth: int) -> List[ArchiveMember]:
+        """
+        Hashes a member, a nested archive is descended into while it is hashed.
+        :return: The member followed by the members of the nested archive
+        """
+        hash_sum = hashlib.md5()
+        head = stream.read(MIME_SAMPLE_SIZE)
+        hash_sum.update(head)
+        nested = []  # type: List[ArchiveMember]
+        archive_format = self._settings.archive_format(path.rsplit("/", 1)[-1], size, depth + 1)
+        if archive_format == ARCHIVE_FORMAT_TAR:
+            reader = _HashingReader(stream, hash_sum)
+            nested = self._read_archive(path, lambda: self._tar_members(_PrefixedStream(head, reader), depth + 1))
+            reader.drain(self._block_size)
+        elif archive_format == ARCHIVE_FORMAT_ZIP and size <= self._settings.max_buffered_size:
+            buffer = io.BytesIO(head)
+            buffer.seek(0, io.SEEK_END)
+            for block in iter(lambda: stream.read(self._block_size), b""):
+                hash_sum.update(block)
+                buffer.write(block)
+            nested = self._read_archive(path, lambda: self._zip_members(zipfile.ZipFile(buffer), depth + 1))
+        else:
+            for block in iter(lambda: stream.read(self._block_size), b""):
+                hash_sum.update(block)
+
+        member = ArchiveMember(path=path, size=size, mtime=mtime, content_hash_tag=hash_sum.hexdigest(),
+                               mime_type=self._magic.from_buffer(head))
+        return [member] + [ArchiveMember(path=path + "/" + m.path, size=m.size, mtime=m.mtime,
+                                         content_hash_tag=m.content_hash_tag, mime_type=m.mime_type) for m in nested]
+
+
+##################################################################################################
+
+class _PrefixedStream(object):
+    """
+    Read-only file object that returns the already read head of a stream before the rest of it.
+    """
+
+    def __init__(self, head: bytes, stream):
+        self._head = head  # type: bytes
+        self._stream = stream
+
+    ##################################################################################################
+
+    def read(self, size: int = -1) -> bytes:
+        if len(self._head) == 0:
+            return self._stream.read(size)
+        if size is None or size < 0:
+            block, self._head = self._head + self._stream.read(), b""
+        else:
+            block, self._head = self._head[:size], self._head[size:]
+        return block
+
+
+##################################################################################################
+
+def _member_path(name: str) -> Optional[str]:
+    """
+    :return: The member name as relative "/" separated path, without "..", None if nothing is left
+    """
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    return "/".join(parts) if len(parts) > 0 else None
+
+
+##################################################################################################
+
+def _zip_time(date_time: Tuple[int, int, int, int, int, int]) -> float:
+    """
+    :return: The local time stamp of a zip member, 0 if invalid
+    """
+    try:
+        return time.mktime(tuple(date_time) + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return 0.0
@@ -0,0 +1,88 @@
+from configparser import ConfigParser
+from typing import List, Optional
+
+from .archive_reader import ARCHIVE_FORMATS, ArchiveSettings
+
+
+##################################################################################################
+
+class ArchivesConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "archives"
+    ENABLED_FIELD_NAME = "enabled"
+    EXTENSIONS_FIELD_NAME = "extensions"
+    MAX_ARCHIVE_SIZE_FIELD_NAME = "max_archive_size"
+    MAX_DEPTH_FIELD_NAME = "max_depth"
+    MAX_BUFFERED_SIZE_FIELD_NAME = "max_buffered_size"
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._enabled = False  # type: bool
+        self._extensions = ["zip", "jar", "tar", "tar.gz", "tgz", "tar.bz2", "tbz2", "tar.xz", "txz"]  # type: List[str]
+        self._max_archive_size = 4 * 1024 * 1024 * 1024  # type: int
+        self._max_depth = 1  # type: int
+        self._max_buffered_size = 64 * 1024 * 1024  # type: int
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_archives_settings()
+
+        print("[{}]".format(ArchivesConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(ArchivesConfigMixin.ENABLED_FIELD_NAME, self._enabled))
+        print("\t{} = '{}'".format(ArchivesConfigMixin.EXTENSIONS_FIELD_NAME, ", ".join(self._extensions)))
+        print("\t{} = '{}'".format(ArchivesConfigMixin.MAX_ARCHIVE_SIZE_FIELD_NAME, self._max_archive_size))
+        print("\t{} = '{}'".format(ArchivesConfigMixin.MAX_DEPTH_FIELD_NAME, self._max_depth))
+        print("\t{} = '{}'".format(ArchivesConfigMixin.MAX_BUFFERED_SIZE_FIELD_NAME, self._max_buffered_size))
+
+    ##################################################################################################
+
+    def is_enabled(self): return self._enabled
+
+    ##################################################################################################
+
+    def get_archive_settings(self) -> Optional[ArchiveSettings]:
+        """
+        :return: The archive descent parameters if enabled, otherwise None
+        """
+        if not self._enabled:
+            return None
+        return ArchiveSettings(extensions=self._extensions, max_archive_size=self._max_archive_size,
+                               max_depth=self._max_depth, max_buffered_size=self._max_buffered_size)
+
+    ##################################################################################################
+
+    def __handle_archives_settings(self):
+        section = ArchivesConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            return
+
+        self._enabled = self._parser.getboolean(
+            section, ArchivesConfigMixin.ENABLED_FIELD_NAME, fallback=self._enabled)
+        extensions = self._parser.get(section, ArchivesConfigMixin.EXTENSIONS_FIELD_NAME, fallback=None)
+        if extensions is not None:
+            self._extensions = list(dict.fromkeys(
+                e.strip().lower().lstrip(".") for e in extensions.split(",") if len(e.strip()) > 0))
+        self._max_archive_size = self._parser.getint(
+            section, ArchivesConfigMixin.MAX_ARCHIVE_SIZE_FIELD_NAME, fallback=self._max_archive_size)
+        self._max_depth = self._parser.getint(
+            section, ArchivesConfigMixin.MAX_DEPTH_FIELD_NAME, fallback=self._max_depth)
+        self._max_buffered_size = self._parser.getint(
+            section, ArchivesConfigMixin.MAX_BUFFERED_SIZE_FIELD_NAME, fallback=self._max_buffered_size)
+
+        for e in self._extensions:
+            if e not in ARCHIVE_FORMATS:
+                raise ValueError("ERROR: '[{}]' {} must be a list of {}"
+                                 .format(section, ArchivesConfigMixin.EXTENSIONS_FIELD_NAME,
+                                         ", ".join(ARCHIVE_FORMATS.keys())))
+        if self._max_archive_size < 0 or self._max_buffered_size < 0:
+            raise ValueError("ERROR: '[{}]' {} and {} must not be negative"
+                             .format(section, ArchivesConfigMixin.MAX_ARCHIVE_SIZE_FIELD_NAME,
+                                     ArchivesConfigMixin.MAX_BUFFERED_SIZE_FIELD_NAME))
+        if self._max_depth < 1:
+            raise ValueError("ERROR: '[{}]' {} must be positive"
+                             .format(section, ArchivesConfigMixin.MAX_DEPTH_FIELD_NAME))
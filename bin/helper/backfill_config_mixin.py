@@ -0,0 +1,80 @@
+import os
+from configparser import ConfigParser
+from typing import List
+
+
+##################################################################################################
+
+class BackfillConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "backfill"
+    PRIORITY_FIELD_NAME = "priority"
+    PRIORITY_FOLDERS_FIELD_NAME = "priority_folders"
+    BATCH_SIZE_FIELD_NAME = "batch_size"
+
+    # folders:         files below priority_folders first.
+    # colliding_sizes: files sharing their size with another file first, a file of a unique size has no duplicate.
+    # smallest:        smallest files first, most files per second.
+    PRIORITY_FOLDERS = "folders"
+    PRIORITY_COLLIDING_SIZES = "colliding_sizes"
+    PRIORITY_SMALLEST = "smallest"
+    PRIORITIES = [PRIORITY_FOLDERS, PRIORITY_COLLIDING_SIZES, PRIORITY_SMALLEST]
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._priority = [BackfillConfigMixin.PRIORITY_FOLDERS, BackfillConfigMixin.PRIORITY_COLLIDING_SIZES,
+                          BackfillConfigMixin.PRIORITY_SMALLEST]  # type: List[str]
+        self._priority_folders = []  # type: List[str]
+        self._batch_size = 1000  # type: int
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_backfill_settings()
+
+        print("[{}]".format(BackfillConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(BackfillConfigMixin.PRIORITY_FIELD_NAME, ", ".join(self._priority)))
+        print("\t{} = '{}'".format(BackfillConfigMixin.PRIORITY_FOLDERS_FIELD_NAME, self._priority_folders))
+        print("\t{} = '{}'".format(BackfillConfigMixin.BATCH_SIZE_FIELD_NAME, self._batch_size))
+
+    ##################################################################################################
+
+    def get_priority(self): return self._priority
+
+    ##################################################################################################
+
+    def get_priority_folders(self): return self._priority_folders
+
+    ##################################################################################################
+
+    def get_batch_size(self): return self._batch_size
+
+    ##################################################################################################
+
+    def __handle_backfill_settings(self):
+        section = BackfillConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            return
+
+        priority = self._parser.get(section, BackfillConfigMixin.PRIORITY_FIELD_NAME, fallback=None)
+        if priority is not None:
+            self._priority = [p.strip().lower() for p in priority.split(",") if len(p.strip()) > 0]
+        priority_folders = self._parser.get(section, BackfillConfigMixin.PRIORITY_FOLDERS_FIELD_NAME, fallback=None)
+        if priority_folders is not None:
+            self._priority_folders = list(dict.fromkeys(
+                os.path.normpath(f.strip()) for f in priority_folders.split('\n') if len(f.strip()) > 0))
+        self._batch_size = self._parser.getint(
+            section, BackfillConfigMixin.BATCH_SIZE_FIELD_NAME, fallback=self._batch_size)
+
+        for p in self._priority:
+            if p not in BackfillConfigMixin.PRIORITIES:
+                raise ValueError("ERROR: '[{}]' {} must be a list of {}"
+                                 .format(section, BackfillConfigMixin.PRIORITY_FIELD_NAME,
+                                         ", ".join(BackfillConfigMixin.PRIORITIES)))
+        if self._batch_size < 1:
+            raise ValueError("ERROR: '[{}]' {} must be positive"
+                             .format(section, BackfillConfigMixin.BATCH_SIZE_FIELD_NAME))
@@ -0,0 +1,52 @@
+from configparser import ConfigParser
+
+
+##################################################################################################
+
+class ChangeDetectionConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "change_detection"
+    PARANOIA_LEVEL_FIELD_NAME = "paranoia_level"
+
+    # Folders whose modification time did not change are neither listed nor are their files checked.
+    PARANOIA_DIRECTORY = "directory"
+    # Folders are listed, unless modification time, entry count and entry names are the same the files are checked.
+    PARANOIA_LISTING = "listing"
+    # Files of all folders are checked (modification time and size), catches files edited in place.
+    PARANOIA_FILES = "files"
+    PARANOIA_LEVELS = [PARANOIA_DIRECTORY, PARANOIA_LISTING, PARANOIA_FILES]
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._paranoia_level = ChangeDetectionConfigMixin.PARANOIA_DIRECTORY  # type: str
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_change_detection_settings()
+
+        print("[{}]".format(ChangeDetectionConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(ChangeDetectionConfigMixin.PARANOIA_LEVEL_FIELD_NAME, self._paranoia_level))
+
+    ##################################################################################################
+
+    def get_paranoia_level(self): return self._paranoia_level
+
+    ##################################################################################################
+
+    def __handle_change_detection_settings(self):
+        section = ChangeDetectionConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            return
+
+        self._paranoia_level = self._parser.get(
+            section, ChangeDetectionConfigMixin.PARANOIA_LEVEL_FIELD_NAME, fallback=self._paranoia_level).strip()
+
+        if self._paranoia_level not in ChangeDetectionConfigMixin.PARANOIA_LEVELS:
+            raise ValueError("ERROR: '[{}]' {} must be one of {}"
+                             .format(section, ChangeDetectionConfigMixin.PARANOIA_LEVEL_FIELD_NAME,
+                                     ChangeDetectionConfigMixin.PARANOIA_LEVELS))
@@ -0,0 +1,200 @@
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from .database_helper import EvaluationDataBases, PublicDataBase
+from .evaluation_config_mixin import EvaluationConfigMixin
+
+
+######################################################################################################
+
+class SharedChunkEvaluator(object):
+    """
+    Evaluator that finds large files sharing content defined chunks, e.g. two disk images or mailbox files that differ
+    by a few bytes only. Requires an index created with [hashing] content_chunking enabled.
+
+    For every pair of chunked files sharing at least one chunk the shared bytes are summed over the distinct shared
+    chunks. shared_ratio = shared bytes / bytes of the union of both chunk sets. Pairs of identical files
+    (same file content hash tag) are left out, they are reported by the unique files already.
+    """
+    ##################################################################################################
+
+    SHARED_CHUNK_FILES_TABLE_NAME = "shared_chunk_files"
+
+    # Chunks contained in more files than this (e.g. runs of zero bytes) would create too many pairs and are ignored.
+    MAX_FILES_PER_CHUNK = 1000
+
+    ##################################################################################################
+
+    def __init__(self, databases: EvaluationDataBases, evaluation_config: EvaluationConfigMixin):
+        self.index_db = databases.index_db
+        self.evaluation_db = databases.evaluation_db
+        self._threshold = evaluation_config.get_chunk_similarity_threshold()  # type: float
+
+    ##################################################################################################
+
+    def evaluate(self):
+        print("\n[SharedChunkEvaluator START]")
+        start_timestamp = timer()
+
+        self.reset()
+        if self._has_chunk_tables():
+            self._create_temporary_tables()
+            self._insert_into_table_of_shared_chunk_files()
+            self._drop_temporary_tables()
+            print("\tFound {} file pairs sharing chunks (shared ratio >= {}).".format(
+                self.evaluation_db.cursor().execute("SELECT COUNT(*) FROM {}".format(
+                    SharedChunkEvaluator.SHARED_CHUNK_FILES_TABLE_NAME)).fetchone()[0], self._threshold))
+        else:
+            print("\tWARNING: The index does not contain chunk tables. Enable [hashing] content_chunking.")
+
+        print("[SharedChunkEvaluator END] Time elapsed {}".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def reset(self):
+        self.evaluation_db.cursor().execute(
+            "DROP TABLE IF EXISTS {}".format(SharedChunkEvaluator.SHARED_CHUNK_FILES_TABLE_NAME))
+        q = """
+        CREATE TABLE IF NOT EXISTS {tbl}
+        (
+            {prooth}_a TEXT NOT NULL,
+            {prelh}_a TEXT NOT NULL,
+            {fnameh}_a TEXT NOT NULL,
+            {prooth}_b TEXT NOT NULL,
+            {prelh}_b TEXT NOT NULL,
+            {fnameh}_b TEXT NOT NULL,
+            {fsize}_a INTEGER NOT NULL,
+            {fsize}_b INTEGER NOT NULL,
+            shared_bytes INTEGER NOT NULL,
+            shared_ratio REAL NOT NULL
+        )
+        """.format(tbl=SharedChunkEvaluator.SHARED_CHUNK_FILES_TABLE_NAME,
+                   prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+                   prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+                   fnameh=PublicDataBase.PublicIndexTableColumnNames.filename_hash_tag.value,
+                   fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value)
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _has_chunk_tables(self) -> bool:
+        return self.evaluation_db.cursor().execute(
+            "SELECT name FROM index_db.sqlite_master WHERE type = 'table' AND name = ?",
+            (self.index_db.file_chunk_table_name(),)).fetchone() is not None
+
+    ##################################################################################################
+
+    def _create_temporary_tables(self):
+        """
+        Numbers the chunked files and reduces the file chunk table to the distinct (file id, chunk) pairs.
+        """
+        self._drop_temporary_tables()
+        queries = ["""
+        CREATE TEMP TABLE chunked_files AS
+        SELECT
+            {prooth}, {prelh}, {fnameh}, COUNT(*) AS num_chunks
+        FROM
+            index_db.{file_chunk_tbl}
+        GROUP BY
+            {prooth}, {prelh}, {fnameh}
+        """, """
+        CREATE TEMP TABLE distinct_file_chunks AS
+        SELECT DISTINCT
+            f.rowid AS file_id, fc.{chh} AS {chh}, c.{chsize} AS {chsize}
+        FROM
+            index_db.{file_chunk_tbl} AS fc
+            JOIN chunked_files AS f
+                ON f.{prooth} = fc.{prooth} AND f.{prelh} = fc.{prelh} AND f.{fnameh} = fc.{fnameh}
+            JOIN index_db.{chunk_tbl} AS c
+                ON c.{chh} = fc.{chh}
+        """, """
+        CREATE TEMP TABLE file_chunk_bytes AS
+        SELECT
+            file_id, SUM({chsize}) AS distinct_bytes
+        FROM
+            distinct_file_chunks
+        GROUP BY
+            file_id
+        """, """
+        DELETE FROM
+            distinct_file_chunks
+        WHERE
+            {chh} IN (SELECT {chh} FROM distinct_file_chunks GROUP BY {chh} HAVING COUNT(*) > {max_files})
+        """, """
+        CREATE INDEX temp.distinct_file_chunks_{chh} ON distinct_file_chunks ({chh}, file_id)
+        """]
+        for q in queries:
+            q = q.format(
+                file_chunk_tbl=self.index_db.file_chunk_table_name(),
+                chunk_tbl=self.index_db.chunk_table_name(),
+                prooth=PublicDataBase.PublicFileChunkTableColumnNames.root_path_hash_tag.value,
+                prelh=PublicDataBase.PublicFileChunkTableColumnNames.relative_path_hash_tag.value,
+                fnameh=PublicDataBase.PublicFileChunkTableColumnNames.filename_hash_tag.value,
+                chh=PublicDataBase.PublicFileChunkTableColumnNames.chunk_hash_tag.value,
+                chsize=PublicDataBase.PublicChunkTableColumnNames.chunk_size.value,
+                max_files=SharedChunkEvaluator.MAX_FILES_PER_CHUNK)
+            try:
+                self.evaluation_db.cursor().execute(q)
+            except BaseException as e:
+                print(q)
+                raise e
+
+    ##################################################################################################
+
+    def _drop_temporary_tables(self):
+        for tbl in ["chunked_files", "distinct_file_chunks", "file_chunk_bytes"]:
+            self.evaluation_db.cursor().execute("DROP TABLE IF EXISTS temp.{}".format(tbl))
+
+    ##################################################################################################
+
+    def _insert_into_table_of_shared_chunk_files(self):
+        q = """
+        INSERT INTO
+            {tbl}
+        SELECT
+            fa.{prooth}, fa.{prelh}, fa.{fnameh},
+            fb.{prooth}, fb.{prelh}, fb.{fnameh},
+            ia.{fsize}, ib.{fsize},
+            p.shared_bytes,
+            CAST(p.shared_bytes AS REAL) / (ba.distinct_bytes + bb.distinct_bytes - p.shared_bytes)
+        FROM
+            (
+                SELECT
+                    a.file_id AS file_a, b.file_id AS file_b, SUM(a.{chsize}) AS shared_bytes
+                FROM
+                    distinct_file_chunks AS a
+                    JOIN distinct_file_chunks AS b
+                        ON a.{chh} = b.{chh} AND a.file_id < b.file_id
+                GROUP BY
+                    a.file_id, b.file_id
+            ) AS p
+            JOIN chunked_files AS fa ON fa.rowid = p.file_a
+            JOIN chunked_files AS fb ON fb.rowid = p.file_b
+            JOIN file_chunk_bytes AS ba ON ba.file_id = p.file_a
+            JOIN file_chunk_bytes AS bb ON bb.file_id = p.file_b
+            JOIN index_db.{index_tbl} AS ia
+                ON ia.{prooth} = fa.{prooth} AND ia.{prelh} = fa.{prelh} AND ia.{fnameh} = fa.{fnameh}
+            JOIN index_db.{index_tbl} AS ib
+                ON ib.{prooth} = fb.{prooth} AND ib.{prelh} = fb.{prelh} AND ib.{fnameh} = fb.{fnameh}
+        WHERE
+            ia.{fconth} != ib.{fconth}
+            AND CAST(p.shared_bytes AS REAL) / (ba.distinct_bytes + bb.distinct_bytes - p.shared_bytes) >= ?
+        """.format(
+            tbl=SharedChunkEvaluator.SHARED_CHUNK_FILES_TABLE_NAME,
+            index_tbl=self.index_db.table_name(),
+            prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+            prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+            fnameh=PublicDataBase.PublicIndexTableColumnNames.filename_hash_tag.value,
+            fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+            fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
+            chh=PublicDataBase.PublicFileChunkTableColumnNames.chunk_hash_tag.value,
+            chsize=PublicDataBase.PublicChunkTableColumnNames.chunk_size.value)
+        try:
+            self.evaluation_db.cursor().execute(q, (self._threshold,))
+        except BaseException as e:
+            print(q)
+            raise e
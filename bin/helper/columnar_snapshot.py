@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import Dict, List, Optional
+
+import numpy as np  # sudo pip install numpy
+
+from .database_helper import PublicDataBase, database_fingerprint
+from .hash_array_helper import hex_digests_to_array, unique_digests
+
+
+######################################################################################################
+
+class PublicIndexColumns(object):
+    """
+    Compact in-memory columns of the public index table.
+    Digests are stored as (n, 2) uint64 arrays, the root and relative paths are dictionary encoded: the *_ids arrays
+    index into the sorted unique digests of root_paths/relative_paths.
+    """
+
+    ##################################################################################################
+
+    def __init__(self, content: np.ndarray,
+                 root_path_ids: np.ndarray, root_paths: np.ndarray,
+                 relative_path_ids: np.ndarray, relative_paths: np.ndarray):
+        self.content = content  # type: np.ndarray
+        self.root_path_ids = root_path_ids  # type: np.ndarray
+        self.root_paths = root_paths  # type: np.ndarray
+        self.relative_path_ids = relative_path_ids  # type: np.ndarray
+        self.relative_paths = relative_paths  # type: np.ndarray
+
+    ##################################################################################################
+
+    def __len__(self): return self.content.shape[0]
+
+
+######################################################################################################
+
+def load_public_index_columns(index_db: PublicDataBase, batch_size: int = 100000) -> PublicIndexColumns:
+    """
+    Helper function that loads the hash columns of the public index table into a PublicIndexColumns object.
+    """
+    q = "SELECT {prooth}, {prelh}, {fconth} FROM {tbl}".format(
+        tbl=index_db.table_name(),
+        prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+        prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+        fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value)
+
+    roots, relative_paths, contents = [], [], []  # type: List[np.ndarray], List[np.ndarray], List[np.ndarray]
+    cursor = index_db.connection().execute(q)
+    for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+        columns = list(zip(*rows))
+        roots.append(hex_digests_to_array(list(columns[0])))
+        relative_paths.append(hex_digests_to_array(list(columns[1])))
+        contents.append(hex_digests_to_array(list(columns[2])))
+
+    def concatenate(batches: List[np.ndarray]) -> np.ndarray:
+        return np.concatenate(batches) if len(batches) > 0 else np.empty((0, 2), dtype=np.uint64)
+
+    root_dictionary, root_ids, _ = unique_digests(concatenate(roots))
+    relative_path_dictionary, relative_path_ids, _ = unique_digests(concatenate(relative_paths))
+    return PublicIndexColumns(content=concatenate(contents),
+                              root_path_ids=root_ids.astype(np.int32), root_paths=root_dictionary,
+                              relative_path_ids=relative_path_ids.astype(np.int32),
+                              relative_paths=relative_path_dictionary)
+
+
+######################################################################################################
+
+def _timestamps_to_seconds(timestamps) -> np.ndarray:
+    """
+    Helper function that converts the '%Y-%m-%d-%H:%M:%S' time stamps of the index to seconds since the epoch.
+    """
+    iso_timestamps = [t[:10] + "T" + t[11:] for t in timestamps]
+    return np.array(iso_timestamps, dtype="datetime64[s]").astype(np.int64)
+
+
+######################################################################################################
+
+class ColumnarSnapshot(object):
+    """
+    Columnar on-disk copy of the public index table: one .npy file per column plus a manifest.
+
+    Digest columns are (n, 2) uint64 arrays, time stamps (seconds since the epoch) and sizes are int64 and the root
+    and relative path hash tags are dictionary encoded (int32 ids into a sorted array of unique digests).
+    The columns are opened memory-mapped, so loading costs no parsing and pages are read on first access only.
+    The manifest stores the fingerprint of the source database, the snapshot is stale once the database changed.
+    """
+
+    ##################################################################################################
+
+    MANIFEST_FILE_NAME = "manifest.json"
+    FORMAT_VERSION = 1
+    BATCH_SIZE = 100000
+
+    DIGEST_COLUMNS = [PublicDataBase.PublicIndexTableColumnNames.filename_hash_tag.value,
+                      PublicDataBase.PublicIndexTableColumnNames.absolute_file_path_hash_tag.value,
+                      PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value]
+    DICTIONARY_COLUMNS = [PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+                          PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value]
+    TIME_COLUMNS = [PublicDataBase.PublicIndexTableColumnNames.creation_time.value,
+                    PublicDataBase.PublicIndexTableColumnNames.last_modification_time.value]
+    INTEGER_COLUMNS = [PublicDataBase.PublicIndexTableColumnNames.file_size.value]
+
+    ##################################################################################################
+
+    def __init__(self, snapshot_directory: str):
+        self._snapshot_directory = snapshot_directory  # type: str
+
+    ##################################################################################################
+
+    @staticmethod
+    def default_directory(database_path: str) -> str:
+        return database_path + ".snapshot"
+
+    ##################################################################################################
+
+    def directory(self): return self._snapshot_directory
+
+    ##################################################################################################
+
+    def is_valid(self, database_path: str) -> bool:
+        manifest = self._read_manifest()
+        return manifest is not None \
+            and manifest.get("format_version") == ColumnarSnapshot.FORMAT_VERSION \
+            and manifest.get("fingerprint") == database_fingerprint(database_path)
+
+    ##################################################################################################
+
+    def export(self, index_db: PublicDataBase):
+        """
+        Writes the snapshot of the given public index database. The columns are written into a temporary folder which
+        replaces the snapshot folder once complete.
+        """
+        print("Exporting columnar snapshot to '{}' ...".format(self._snapshot_directory))
+        start_timestamp = timer()
+        fingerprint = database_fingerprint(index_db.database_path())
+
+        temp_directory = self._snapshot_directory + ".tmp"
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        os.makedirs(temp_directory)
+
+        num_rows = index_db.connection().execute(
+            "SELECT COUNT(*) FROM {}".format(index_db.table_name())).fetchone()[0]
+        columns = {}  # type: Dict[str, np.ndarray]
+        for name in ColumnarSnapshot.DIGEST_COLUMNS + ColumnarSnapshot.DICTIONARY_COLUMNS:
+            columns[name] = np.lib.format.open_memmap(
+                os.path.join(temp_directory, name + ".raw.npy" if name in ColumnarSnapshot.DICTIONARY_COLUMNS
+                             else name + ".npy"), mode="w+", dtype=np.uint64, shape=(num_rows, 2))
+        for name in ColumnarSnapshot.TIME_COLUMNS + ColumnarSnapshot.INTEGER_COLUMNS:
+            columns[name] = np.lib.format.open_memmap(
+                os.path.join(temp_directory, name + ".npy"), mode="w+", dtype=np.int64, shape=(num_rows,))
+
+        names = list(columns.keys())
+        cursor = index_db.connection().execute(
+            "SELECT {} FROM {}".format(", ".join(names), index_db.table_name()))
+        offset = 0
+        for rows in iter(lambda: cursor.fetchmany(ColumnarSnapshot.BATCH_SIZE), []):
+            values = list(zip(*rows))
+            end = offset + len(rows)
+            for i, name in enumerate(names):
+                if name in ColumnarSnapshot.TIME_COLUMNS:
+                    columns[name][offset:end] = _timestamps_to_seconds(values[i])
+                elif name in ColumnarSnapshot.INTEGER_COLUMNS:
+                    columns[name][offset:end] = np.array(values[i], dtype=np.int64)
+                else:
+                    columns[name][offset:end] = hex_digests_to_array(list(values[i]))
+            offset = end
+
+        for name in ColumnarSnapshot.DICTIONARY_COLUMNS:
+            dictionary, ids, _ = unique_digests(np.asarray(columns[name]))
+            np.save(os.path.join(temp_directory, name + ".dict.npy"), dictionary)
+            np.save(os.path.join(temp_directory, name + ".ids.npy"), ids.astype(np.int32))
+            del columns[name]
+            os.remove(os.path.join(temp_directory, name + ".raw.npy"))
+        for column in columns.values():
+            column.flush()
+        del columns
+
+        with open(os.path.join(temp_directory, ColumnarSnapshot.MANIFEST_FILE_NAME), mode='w') as f:
+            json.dump({"format_version": ColumnarSnapshot.FORMAT_VERSION,
+                       "source_database": os.path.abspath(index_db.database_path()),
+                       "num_rows": num_rows,
+                       "fingerprint": fingerprint}, f, indent=4)
+
+        shutil.rmtree(self._snapshot_directory, ignore_errors=True)
+        os.rename(temp_directory, self._snapshot_directory)
+        print("Exported {} rows in {}.".format(num_rows, timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def load(self) -> Dict[str, np.ndarray]:
+        """
+        Opens all columns memory-mapped (read only).
+        :return: Dictionary column name -> array. Dictionary encoded columns are returned as <name>.ids and <name>.dict
+        """
+        columns = {}  # type: Dict[str, np.ndarray]
+        for name in ColumnarSnapshot.DIGEST_COLUMNS + ColumnarSnapshot.TIME_COLUMNS + ColumnarSnapshot.INTEGER_COLUMNS:
+            columns[name] = np.load(os.path.join(self._snapshot_directory, name + ".npy"), mmap_mode="r")
+        for name in ColumnarSnapshot.DICTIONARY_COLUMNS:
+            for suffix in ["ids", "dict"]:
+                columns[name + "." + suffix] = np.load(
+                    os.path.join(self._snapshot_directory, "{}.{}.npy".format(name, suffix)), mmap_mode="r")
+        return columns
+
+    ##################################################################################################
+
+    def load_public_index_columns(self) -> PublicIndexColumns:
+        columns = self.load()
+        root = PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value
+        relative_path = PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value
+        return PublicIndexColumns(
+            content=columns[PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value],
+            root_path_ids=columns[root + ".ids"], root_paths=columns[root + ".dict"],
+            relative_path_ids=columns[relative_path + ".ids"], relative_paths=columns[relative_path + ".dict"])
+
+    ##################################################################################################
+
+    def open_or_export(self, index_db: PublicDataBase) -> PublicIndexColumns:
+        """
+        Loads the snapshot, (re-)exporting it first if it is missing or stale.
+        """
+        if not self.is_valid(index_db.database_path()):
+            print("Columnar snapshot '{}' is missing or stale.".format(self._snapshot_directory))
+            self.export(index_db)
+        return self.load_public_index_columns()
+
+    ##################################################################################################
+
+    def _read_manifest(self) -> Optional[dict]:
+        manifest_path = os.path.join(self._snapshot_directory, ColumnarSnapshot.MANIFEST_FILE_NAME)
+        if not os.path.isfile(manifest_path):
+            return None
+        try:
+            with open(manifest_path, mode='r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
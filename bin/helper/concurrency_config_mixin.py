@@ -0,0 +1,129 @@
+import os
+from configparser import ConfigParser
+
+from .databases_config_mixin import get_configured_db_file_path
+
+
+##################################################################################################
+
+class ConcurrencyConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "concurrency"
+    ADAPTIVE_FIELD_NAME = "adaptive"
+    MIN_WORKERS_FIELD_NAME = "min_workers"
+    MAX_WORKERS_FIELD_NAME = "max_workers"
+    MIN_BLOCK_SIZE_FIELD_NAME = "min_file_block_size"
+    MAX_BLOCK_SIZE_FIELD_NAME = "max_file_block_size"
+    WINDOW_SECONDS_FIELD_NAME = "window_seconds"
+    HINTS_FILE_FIELD_NAME = "hints_file_path"
+    DEFAULT_HINTS_FILE_NAME = "concurrency_hints.json"
+    WRITE_MODE_FIELD_NAME = "write_mode"
+
+    # single:  the workers return the indexed files, the main process writes them to the databases.
+    # sharded: every worker writes its files to its own shard database, the shards are merged at the end.
+    WRITE_MODE_SINGLE = "single"
+    WRITE_MODE_SHARDED = "sharded"
+    WRITE_MODES = [WRITE_MODE_SINGLE, WRITE_MODE_SHARDED]
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._adaptive = False  # type: bool
+        self._min_workers = 1  # type: int
+        self._max_workers = 2 * (os.cpu_count() or 1)  # type: int
+        self._min_block_size = 4096  # type: int
+        self._max_block_size = 8 * 1024 * 1024  # type: int
+        self._window_seconds = 5.0  # type: float
+        self._hints_file_path = os.getcwd() + "/{}".format(ConcurrencyConfigMixin.DEFAULT_HINTS_FILE_NAME)  # type: str
+        self._write_mode = ConcurrencyConfigMixin.WRITE_MODE_SINGLE  # type: str
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_concurrency_settings()
+
+        print("[{}]".format(ConcurrencyConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.ADAPTIVE_FIELD_NAME, self._adaptive))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.MIN_WORKERS_FIELD_NAME, self._min_workers))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.MAX_WORKERS_FIELD_NAME, self._max_workers))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.MIN_BLOCK_SIZE_FIELD_NAME, self._min_block_size))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.MAX_BLOCK_SIZE_FIELD_NAME, self._max_block_size))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.WINDOW_SECONDS_FIELD_NAME, self._window_seconds))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.HINTS_FILE_FIELD_NAME, self._hints_file_path))
+        print("\t{} = '{}'".format(ConcurrencyConfigMixin.WRITE_MODE_FIELD_NAME, self._write_mode))
+
+    ##################################################################################################
+
+    def is_adaptive(self): return self._adaptive
+
+    ##################################################################################################
+
+    def get_min_workers(self): return self._min_workers
+
+    ##################################################################################################
+
+    def get_max_workers(self): return self._max_workers
+
+    ##################################################################################################
+
+    def get_min_block_size(self): return self._min_block_size
+
+    ##################################################################################################
+
+    def get_max_block_size(self): return self._max_block_size
+
+    ##################################################################################################
+
+    def get_window_seconds(self): return self._window_seconds
+
+    ##################################################################################################
+
+    def get_hints_file_path(self): return self._hints_file_path
+
+    ##################################################################################################
+
+    def get_write_mode(self): return self._write_mode
+
+    ##################################################################################################
+
+    def __handle_concurrency_settings(self):
+        section = ConcurrencyConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            print("WARNING: '[{}]' - not set in the loaded configuration. Adaptive concurrency disabled."
+                  .format(section))
+            return
+
+        self._adaptive = self._parser.getboolean(
+            section, ConcurrencyConfigMixin.ADAPTIVE_FIELD_NAME, fallback=self._adaptive)
+        self._min_workers = self._parser.getint(
+            section, ConcurrencyConfigMixin.MIN_WORKERS_FIELD_NAME, fallback=self._min_workers)
+        self._max_workers = self._parser.getint(
+            section, ConcurrencyConfigMixin.MAX_WORKERS_FIELD_NAME, fallback=self._max_workers)
+        self._min_block_size = self._parser.getint(
+            section, ConcurrencyConfigMixin.MIN_BLOCK_SIZE_FIELD_NAME, fallback=self._min_block_size)
+        self._max_block_size = self._parser.getint(
+            section, ConcurrencyConfigMixin.MAX_BLOCK_SIZE_FIELD_NAME, fallback=self._max_block_size)
+        self._window_seconds = self._parser.getfloat(
+            section, ConcurrencyConfigMixin.WINDOW_SECONDS_FIELD_NAME, fallback=self._window_seconds)
+        self._hints_file_path = get_configured_db_file_path(
+            self._parser, section,
+            ConcurrencyConfigMixin.HINTS_FILE_FIELD_NAME,
+            ConcurrencyConfigMixin.DEFAULT_HINTS_FILE_NAME)
+        self._write_mode = self._parser.get(
+            section, ConcurrencyConfigMixin.WRITE_MODE_FIELD_NAME, fallback=self._write_mode).strip().lower()
+
+        if not 1 <= self._min_workers <= self._max_workers:
+            raise ValueError("ERROR: '[{}]' requires 1 <= {} <= {}"
+                             .format(section, ConcurrencyConfigMixin.MIN_WORKERS_FIELD_NAME,
+                                     ConcurrencyConfigMixin.MAX_WORKERS_FIELD_NAME))
+        if not 1 <= self._min_block_size <= self._max_block_size:
+            raise ValueError("ERROR: '[{}]' requires 1 <= {} <= {}"
+                             .format(section, ConcurrencyConfigMixin.MIN_BLOCK_SIZE_FIELD_NAME,
+                                     ConcurrencyConfigMixin.MAX_BLOCK_SIZE_FIELD_NAME))
+        if self._write_mode not in ConcurrencyConfigMixin.WRITE_MODES:
+            raise ValueError("ERROR: '[{}]' {} must be one of {}"
+                             .format(section, ConcurrencyConfigMixin.WRITE_MODE_FIELD_NAME,
+                                     ", ".join(ConcurrencyConfigMixin.WRITE_MODES)))
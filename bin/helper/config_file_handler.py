@@ -2,10 +2,18 @@ import os
 from configparser import ConfigParser
 
 ######################################################################################################
+from .archives_config_mixin import ArchivesConfigMixin
+from .backfill_config_mixin import BackfillConfigMixin
+from .change_detection_config_mixin import ChangeDetectionConfigMixin
+from .concurrency_config_mixin import ConcurrencyConfigMixin
 from .databases_config_mixin import DatabaseConfigMixin
 from .evaluation_config_mixin import EvaluationConfigMixin
 from .hashing_config_mixin import HashingConfigMixin
+from .io_limits_config_mixin import IoLimitsConfigMixin
+from .output_config_mixin import OutputConfigMixin
 from .path_config_mixin import PathConfigMixin
+from .serve_config_mixin import ServeConfigMixin
+from .watch_config_mixin import WatchConfigMixin
 
 
 ######################################################################################################
@@ -60,8 +68,17 @@ class IndexingConfiguration(IniConfigBase):
             default_db_name="private_database.sqlite")
         self.paths_cfg = PathConfigMixin(self.parser)
         self.hashing_cfg = HashingConfigMixin(self.parser)
+        self.concurrency_cfg = ConcurrencyConfigMixin(self.parser)
+        self.io_limits_cfg = IoLimitsConfigMixin(self.parser)
+        self.watch_cfg = WatchConfigMixin(self.parser)
+        self.change_detection_cfg = ChangeDetectionConfigMixin(self.parser)
+        self.serve_cfg = ServeConfigMixin(self.parser)
+        self.backfill_cfg = BackfillConfigMixin(self.parser)
+        self.archives_cfg = ArchivesConfigMixin(self.parser)
 
-        self.configs = [self.public_index_db_cfg, self.private_index_db_cfg, self.paths_cfg, self.hashing_cfg]
+        self.configs = [self.public_index_db_cfg, self.private_index_db_cfg, self.paths_cfg, self.hashing_cfg,
+                        self.concurrency_cfg, self.io_limits_cfg, self.watch_cfg, self.change_detection_cfg,
+                        self.serve_cfg, self.backfill_cfg, self.archives_cfg]
 
 
 ######################################################################################################
@@ -83,5 +100,30 @@ class EvaluationConfiguration(IniConfigBase):
             section_name="evaluation_db",
             field_name="database_file_path",
             default_db_name="evaluation_database.sqlite")
+        self.evaluation_cfg = EvaluationConfigMixin(self.parser)
 
-        self.configs = [self.public_index_db_cfg, self.evaluation_db_cfg]
+        self.configs = [self.public_index_db_cfg, self.evaluation_db_cfg, self.evaluation_cfg]
+
+
+######################################################################################################
+
+class ResolveConfiguration(IniConfigBase):
+
+    ##################################################################################################
+
+    def __init__(self, config_file_path: str):
+        super().__init__(config_file_path)
+
+        self.private_index_db_cfg = DatabaseConfigMixin(
+            self.parser,
+            section_name="private_index_db",
+            field_name="database_file_path",
+            default_db_name="private_database.sqlite")
+        self.evaluation_db_cfg = DatabaseConfigMixin(
+            self.parser,
+            section_name="evaluation_db",
+            field_name="database_file_path",
+            default_db_name="evaluation_database.sqlite")
+        self.output_cfg = OutputConfigMixin(self.parser)
+
+        self.configs = [self.private_index_db_cfg, self.evaluation_db_cfg, self.output_cfg]
@@ -0,0 +1,193 @@
+import hashlib
+from typing import List, Tuple
+
+import numpy as np  # sudo pip install numpy
+
+
+##################################################################################################
+
+# Bytes that influence the rolling hash of a position: h = (h << 1) + GEAR[byte] on 32 bit.
+WINDOW_SIZE = 32
+
+
+##################################################################################################
+
+def _gear_table() -> np.ndarray:
+    # Fixed pseudo random table, the chunk boundaries must not change between runs.
+    state = np.random.RandomState(0x5eed)
+    return state.randint(0, 2 ** 32, size=256, dtype=np.uint64).astype(np.uint32)
+
+
+GEAR = _gear_table()
+
+
+##################################################################################################
+
+def _top_bits_mask(num_bits: int) -> np.uint32:
+    # The upper bits of the rolling hash depend on the whole window, the lower ones on the last bytes only.
+    return np.uint32(((1 << num_bits) - 1) << (32 - num_bits))
+
+
+##################################################################################################
+
+class ChunkerSettings(object):
+    """
+    Parameters of the content defined chunking, passed to the indexing processes.
+    """
+
+    def __init__(self, min_file_size: int, min_size: int, average_size: int, max_size: int):
+        self.min_file_size = min_file_size  # type: int
+        self.min_size = min_size  # type: int
+        self.average_size = average_size  # type: int
+        self.max_size = max_size  # type: int
+
+
+##################################################################################################
+
+class ContentChunker(object):
+    """
+    Content defined chunking (FastCDC style) of a byte stream fed block by block, e.g. while hashing a file.
+
+    The gear rolling hash of every position is computed for a whole block at once with NumPy: since the hash only
+    depends on the last WINDOW_SIZE bytes it can be built by doubling the window (1, 2, 4, ... 32 bytes) in 5 vectorized
+    steps. Cut points follow FastCDC's normalized chunking: no cut before min_size, a stricter mask up to
+    average_size, a looser one after it and a forced cut at max_size. The fed blocks are collected into a buffer of
+    buffer_size bytes which is processed at once, all work buffers are allocated once.
+    Chunks are reported as (offset, length, md5 hex digest).
+    """
+
+    ##################################################################################################
+
+    def __init__(self, settings: ChunkerSettings, buffer_size: int = 1024 * 1024):
+        if not WINDOW_SIZE <= settings.min_size <= settings.average_size <= settings.max_size:
+            raise ValueError("Chunk sizes must satisfy {} <= min <= average <= max.".format(WINDOW_SIZE))
+
+        self._min_size = settings.min_size  # type: int
+        self._average_size = settings.average_size  # type: int
+        self._max_size = settings.max_size  # type: int
+        average_bits = max(int(settings.average_size).bit_length() - 1, 2)
+        self._mask_small = _top_bits_mask(min(average_bits + 1, 32))  # type: np.uint32
+        self._mask_large = _top_bits_mask(average_bits - 1)  # type: np.uint32
+
+        self._capacity = max(buffer_size, WINDOW_SIZE)  # type: int
+        self._fill = 0  # type: int
+        size = self._capacity + WINDOW_SIZE - 1
+        # History of WINDOW_SIZE - 1 bytes followed by the current block.
+        self._bytes = np.zeros(size, dtype=np.uint8)  # type: np.ndarray
+        self._hash = np.empty(size, dtype=np.uint32)  # type: np.ndarray
+        self._work = np.empty(size, dtype=np.uint32)  # type: np.ndarray
+        self._shifted = np.empty(size, dtype=np.uint32)  # type: np.ndarray
+        self._is_candidate = np.empty(self._capacity, dtype=bool)  # type: np.ndarray
+
+        self._position = 0  # type: int
+        self._chunk_start = 0  # type: int
+        self._chunk_hash = hashlib.md5()
+        self.chunks = []  # type: List[Tuple[int, int, str]]
+
+    ##################################################################################################
+
+    def update(self, block: bytes):
+        history = WINDOW_SIZE - 1
+        data = np.frombuffer(block, dtype=np.uint8)
+        start = 0
+        while start < len(data):
+            size = min(self._capacity - self._fill, len(data) - start)
+            self._bytes[history + self._fill:history + self._fill + size] = data[start:start + size]
+            self._fill += size
+            start += size
+            if self._fill == self._capacity:
+                self._process()
+
+    ##################################################################################################
+
+    def finish(self) -> List[Tuple[int, int, str]]:
+        if self._fill > 0:
+            self._process()
+        if self._position > self._chunk_start:
+            self._add_chunk(self._position)
+        return self.chunks
+
+    ##################################################################################################
+
+    def _process(self):
+        history = WINDOW_SIZE - 1
+        n = self._fill
+        m = history + n
+        data = self._bytes[:m]
+
+        # Rolling hash of all positions by window doubling, ping-pong between two buffers.
+        current, other = self._hash[:m], self._work[:m]
+        np.take(GEAR, data, out=current)
+        width = 1
+        while width < WINDOW_SIZE:
+            np.left_shift(current[:m - width], width, out=self._shifted[width:m])
+            np.add(current[width:], self._shifted[width:m], out=other[width:])
+            current, other = other, current
+            width *= 2
+        hashes = current[history:]
+
+        # mask_large is a subset of mask_small, candidates of the small mask are candidates of the large one.
+        is_candidate = self._is_candidate[:n]
+        np.bitwise_and(hashes, self._mask_large, out=self._shifted[:n])
+        np.equal(self._shifted[:n], 0, out=is_candidate)
+        large_candidates = np.flatnonzero(is_candidate)
+        small_candidates = large_candidates[(hashes[large_candidates] & self._mask_small) == 0]
+
+        block_start = self._position
+        block_end = block_start + n
+        pending = block_start
+        while True:
+            cut = self._find_cut(block_start, block_end, small_candidates, large_candidates)
+            if cut is None:
+                break
+            self._chunk_hash.update(data[history + pending - block_start:history + cut - block_start])
+            self._add_chunk(cut)
+            pending = cut
+        self._chunk_hash.update(data[history + pending - block_start:])
+        self._position = block_end
+
+        # Keep the last bytes as history of the next block.
+        data[:history] = data[m - history:m]
+        self._fill = 0
+
+    ##################################################################################################
+
+    def _find_cut(self, block_start: int, block_end: int, small_candidates: np.ndarray,
+                  large_candidates: np.ndarray):
+        """
+        :return: Absolute end position (exclusive) of the current chunk if it ends within the block, otherwise None
+        """
+        # A cut after the byte at position p, i.e. the chunk ends at p + 1.
+        lower = self._chunk_start + self._min_size - 1
+        middle = self._chunk_start + self._average_size - 1
+        upper = self._chunk_start + self._max_size - 1
+
+        position = self._first_candidate(small_candidates, block_start, lower, min(middle, block_end))
+        if position is not None:
+            return position + 1
+        if block_end <= middle:
+            return None
+        position = self._first_candidate(large_candidates, block_start, middle, min(upper, block_end))
+        if position is not None:
+            return position + 1
+        if upper < block_end:
+            return upper + 1
+        return None
+
+    ##################################################################################################
+
+    @staticmethod
+    def _first_candidate(candidates: np.ndarray, block_start: int, begin: int, end: int):
+        if begin >= end:
+            return None
+        i = np.searchsorted(candidates, begin - block_start)
+        if i < len(candidates) and candidates[i] + block_start < end:
+            return int(candidates[i]) + block_start
+        return None
+
+    ##################################################################################################
+
+    def _add_chunk(self, end: int):
+        self.chunks.append((self._chunk_start, end - self._chunk_start, self._chunk_hash.hexdigest()))
+        self._chunk_start = end
+        self._chunk_hash = hashlib.md5()
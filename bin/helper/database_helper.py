@@ -1,13 +1,18 @@
+import hashlib
+import os
+import pathlib
 import sqlite3
 from abc import abstractmethod
 from datetime import timedelta
 from timeit import default_timer as timer
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from backports.strenum import StrEnum  # sudo pip install backports.strenum
 
 from .databases_config_mixin import DatabaseConfigMixin
-from .file_type import FileType
+from .evaluation_config_mixin import EvaluationConfigMixin
+from .file_type import FileType, FileIndexingError, DirectoryState
+from .hashing_config_mixin import HashingConfigMixin
 
 
 ######################################################################################################
@@ -17,7 +22,7 @@ def convert_file_type_to_sql_entry(file: FileType) -> str:
     """
     Helper function that converts a FileType object to the SQL row entry
     """
-    return "('{}','{}','{}','{}','{}','{}','{}','{}','{}','{}','{}','{}','{}')" \
+    return "('{}','{}','{}','{}','{}','{}','{}','{}','{}','{}','{}','{}','{}','{}')" \
         .format(file.root_path,
                 file.relative_path,
                 file.filename,
@@ -30,13 +35,14 @@ def convert_file_type_to_sql_entry(file: FileType) -> str:
                 file.file_content_hash_tag,
                 file.creation_time,
                 file.last_modification_time,
-                file.file_size)
+                file.file_size,
+                file.file_content_hash_mode)
 
 
 ######################################################################################################
 
 def convert_file_type_list_to_tuple_list(files: List[FileType]) \
-        -> List[Tuple[str, str, str, str, str, str, str, str, str, str, str, str, int]]:
+        -> List[Tuple[str, str, str, str, str, str, str, str, str, str, str, str, int, str]]:
     """
     Helper function that converts a List[FileType] to List[Tuple] for sqlite3.cursor.executemany().
     """
@@ -52,7 +58,97 @@ def convert_file_type_list_to_tuple_list(files: List[FileType]) \
              f.file_content_hash_tag,
              f.creation_time,
              f.last_modification_time,
-             f.file_size) for f in files]
+             f.file_size,
+             f.file_content_hash_mode) for f in files]
+
+
+######################################################################################################
+
+def convert_file_type_list_to_public_tuple_list(files: List[FileType]) \
+        -> List[Tuple[str, str, str, str, str, str, str, int, str]]:
+    """
+    Helper function that converts a List[FileType] to the List[Tuple] of the public index table columns.
+    """
+    return [(f.root_path_hash_tag,
+             f.relative_path_hash_tag,
+             f.filename_hash_tag,
+             f.absolute_file_path_hash_tag,
+             f.file_content_hash_tag,
+             f.creation_time,
+             f.last_modification_time,
+             f.file_size,
+             f.file_content_hash_mode) for f in files]
+
+
+######################################################################################################
+
+def connect_read_only(database_path: str, **kwargs) -> sqlite3.Connection:
+    """
+    Helper function that opens an existing database in read only mode.
+    """
+    if not pathlib.Path(database_path).is_file():
+        raise ValueError("Database '{}' does not exist.".format(database_path))
+    uri = "{}?mode=ro".format(pathlib.Path(database_path).resolve().as_uri())
+    return sqlite3.connect(uri, uri=True, **kwargs)
+
+
+######################################################################################################
+
+def database_fingerprint(database_path: str) -> Dict[str, int]:
+    """
+    Helper function that identifies the state of an SQLite database file without opening it.
+    Uses the file change counter of the database header (bytes 24..27), which SQLite increments on every committed
+    change, together with size and modification time of the database and its write-ahead log.
+    """
+    with open(database_path, mode='rb') as f:
+        header = f.read(100)
+    database_stat = os.stat(database_path)
+    fingerprint = {"change_counter": int.from_bytes(header[24:28], byteorder="big") if len(header) >= 28 else 0,
+                   "size": database_stat.st_size,
+                   "mtime_ns": database_stat.st_mtime_ns,
+                   "wal_size": 0,
+                   "wal_mtime_ns": 0}
+    wal_path = database_path + "-wal"
+    if os.path.isfile(wal_path):
+        wal_stat = os.stat(wal_path)
+        fingerprint["wal_size"] = wal_stat.st_size
+        fingerprint["wal_mtime_ns"] = wal_stat.st_mtime_ns
+    return fingerprint
+
+
+######################################################################################################
+
+def find_index_table_name(connection: sqlite3.Connection) -> str:
+    """
+    Helper function that returns the name of the index table of a private or public index database.
+    """
+    for table_name in ["inp_pub_index_table", "inp_priv_index_table"]:
+        row = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (table_name,)).fetchone()
+        if row is not None:
+            return table_name
+    raise ValueError("Database does not contain an index table.")
+
+
+######################################################################################################
+
+def add_missing_column(cursor: sqlite3.Cursor, table_name: str, column_name: str, column_definition: str) -> None:
+    """
+    Helper function that adds a column to an existing table unless the table already has it.
+    """
+    if column_name in [r[1] for r in cursor.execute("PRAGMA table_info({})".format(table_name)).fetchall()]:
+        return
+    cursor.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table_name, column_name, column_definition))
+
+
+######################################################################################################
+
+def path_hash_tag(path: str) -> str:
+    """
+    Helper function that returns the hash tag of a root path, relative path or filename as stored in the index, the
+    same as calculate_hash(path, hash_content=False) of the indexer.
+    """
+    return hashlib.md5(path.encode()).hexdigest()
 
 
 ######################################################################################################
@@ -135,17 +231,86 @@ class PrivateDataBase(IndexDataBaseHelper):
         creation_time = "creation_time"
         last_modification_time = "last_modification_time"
         file_size = "file_size"
+        file_content_hash_mode = "file_content_hash_mode"
 
     ##################################################################################################
 
-    def __init__(self, database_config: DatabaseConfigMixin, private_index_table_name: str = "priv_index_table"):
+    class IndexErrorsTableColumnNames(StrEnum):
+        """
+        Enum containing all the column names in the table of files that could not be indexed.
+        """
+        root_path = "absolute_path"
+        relative_path = "relative_path"
+        filename = "filename"
+        stage = "stage"
+        error_number = "errno"
+        error_message = "error_message"
+        attempts = "attempts"
+
+    ##################################################################################################
+
+    class DirectoryStatesTableColumnNames(StrEnum):
+        """
+        Enum containing all the column names in the table of folder states, used to skip unchanged folders.
+        """
+        root_path = "absolute_path"
+        relative_path = "relative_path"
+        mtime_ns = "mtime_ns"
+        entry_count = "entry_count"
+        entry_names_digest = "entry_names_digest"
+
+    ##################################################################################################
+
+    def __init__(self, database_config: DatabaseConfigMixin, private_index_table_name: str = "priv_index_table",
+                 index_errors_table_name: str = "index_errors",
+                 directory_states_table_name: str = "directory_states"):
         super().__init__(database_config, table_name=private_index_table_name)
+        self._index_errors_table_name = "inp_" + index_errors_table_name  # type: str
+        self._directory_states_table_name = "inp_" + directory_states_table_name  # type: str
+
+    ##################################################################################################
+
+    def index_errors_table_name(self): return self._index_errors_table_name
+
+    ##################################################################################################
+
+    def directory_states_table_name(self): return self._directory_states_table_name
 
     ##################################################################################################
 
     def reset(self):
         self.drop_all_tables_and_views()
+        self.create_tables()
+
+    ##################################################################################################
+
+    def create_tables(self):
         self._create_index_table()
+        self._create_index_errors_table()
+        self._create_directory_states_table()
+
+    ##################################################################################################
+
+    def drop_all_tables_and_views(self):
+        super().drop_all_tables_and_views()
+        self._db_cursor.execute("DROP TABLE IF EXISTS {}".format(self.index_errors_table_name()))
+        self._db_cursor.execute("DROP TABLE IF EXISTS {}".format(self.directory_states_table_name()))
+
+    ##################################################################################################
+
+    def create_lookup_indexes(self):
+        """
+        Creates the indexes used to look up files by content hash (and root), by size and by folder hash tag, e.g. by
+        the query service and by ResultResolver. Created after the bulk insert of a full indexing, afterwards
+        maintained by every change.
+        """
+        for name, columns in [("content", [PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_tag.value,
+                                           PrivateDataBase.PrivateIndexTableColumnNames.root_path.value]),
+                              ("size", [PrivateDataBase.PrivateIndexTableColumnNames.file_size.value]),
+                              ("folder", [PrivateDataBase.PrivateIndexTableColumnNames.relative_path_hash_tag.value,
+                                          PrivateDataBase.PrivateIndexTableColumnNames.root_path_hash_tag.value])]:
+            self.cursor().execute("CREATE INDEX IF NOT EXISTS {tbl}_{name} ON {tbl} ({columns})".format(
+                tbl=self.table_name(), name=name, columns=", ".join(columns)))
 
     ##################################################################################################
 
@@ -168,6 +333,7 @@ class PrivateDataBase(IndexDataBaseHelper):
             {ctime} TEXT NOT NULL,
             {mtime} TEXT NOT NULL,
             {fsize} INTEGER NOT NULL,
+            {fhmode} TEXT NOT NULL DEFAULT '{full}',
 
             PRIMARY KEY
             (
@@ -193,7 +359,84 @@ class PrivateDataBase(IndexDataBaseHelper):
 
             ctime=PrivateDataBase.PrivateIndexTableColumnNames.creation_time.value,
             mtime=PrivateDataBase.PrivateIndexTableColumnNames.last_modification_time.value,
-            fsize=PrivateDataBase.PrivateIndexTableColumnNames.file_size.value
+            fsize=PrivateDataBase.PrivateIndexTableColumnNames.file_size.value,
+            fhmode=PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_mode.value,
+            full=HashingConfigMixin.CONTENT_IDENTITY_FULL
+        )
+        try:
+            self.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+        # Index tables created before the quick content identity mode lack the hash mode column.
+        add_missing_column(self.cursor(), self.table_name(),
+                           PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_mode.value,
+                           "TEXT NOT NULL DEFAULT '{}'".format(HashingConfigMixin.CONTENT_IDENTITY_FULL))
+
+    ##################################################################################################
+
+    def _create_index_errors_table(self):
+        q = """
+        CREATE TABLE IF NOT EXISTS {tbl}
+        (
+            {proot} TEXT NOT NULL,
+            {prel} TEXT NOT NULL,
+            {fname} TEXT NOT NULL,
+            {stage} TEXT NOT NULL,
+            {errno} INTEGER,
+            {msg} TEXT,
+            {attempts} INTEGER NOT NULL,
+
+            PRIMARY KEY
+            (
+                {proot},
+                {prel},
+                {fname}
+            )
+        )
+        """.format(
+            tbl=self.index_errors_table_name(),
+
+            proot=PrivateDataBase.IndexErrorsTableColumnNames.root_path.value,
+            prel=PrivateDataBase.IndexErrorsTableColumnNames.relative_path.value,
+            fname=PrivateDataBase.IndexErrorsTableColumnNames.filename.value,
+            stage=PrivateDataBase.IndexErrorsTableColumnNames.stage.value,
+            errno=PrivateDataBase.IndexErrorsTableColumnNames.error_number.value,
+            msg=PrivateDataBase.IndexErrorsTableColumnNames.error_message.value,
+            attempts=PrivateDataBase.IndexErrorsTableColumnNames.attempts.value
+        )
+        try:
+            self.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _create_directory_states_table(self):
+        q = """
+        CREATE TABLE IF NOT EXISTS {tbl}
+        (
+            {proot} TEXT NOT NULL,
+            {prel} TEXT NOT NULL,
+            {mtime} INTEGER NOT NULL,
+            {count} INTEGER NOT NULL,
+            {digest} TEXT NOT NULL,
+
+            PRIMARY KEY
+            (
+                {proot},
+                {prel}
+            )
+        )
+        """.format(
+            tbl=self.directory_states_table_name(),
+
+            proot=PrivateDataBase.DirectoryStatesTableColumnNames.root_path.value,
+            prel=PrivateDataBase.DirectoryStatesTableColumnNames.relative_path.value,
+            mtime=PrivateDataBase.DirectoryStatesTableColumnNames.mtime_ns.value,
+            count=PrivateDataBase.DirectoryStatesTableColumnNames.entry_count.value,
+            digest=PrivateDataBase.DirectoryStatesTableColumnNames.entry_names_digest.value
         )
         try:
             self.cursor().execute(q)
@@ -219,17 +462,324 @@ class PublicDataBase(IndexDataBaseHelper):
         creation_time = "creation_time"
         last_modification_time = "last_modification_time"
         file_size = "file_size"
+        file_content_hash_mode = "file_content_hash_mode"
+
+    ##################################################################################################
+
+    class PublicFolderTableColumnNames(StrEnum):
+        """
+        Enum containing all the column names in the public folder table.
+        """
+        root_path_hash_tag = "root_path_hash_tag"
+        relative_path_hash_tag = "rel_path_hash_tag"
+        parent_path_hash_tag = "parent_rel_path_hash_tag"
+        folder_name_hash_tag = "folder_name_hash_tag"
+        folder_content_hash_tag = "folder_content_hash_tag"
+        folder_structure_hash_tag = "folder_structure_hash_tag"
+        depth = "depth"
+        file_count = "file_count"
+        folder_count = "folder_count"
+        total_size = "total_size"
+
+    ##################################################################################################
+
+    class PublicChunkTableColumnNames(StrEnum):
+        """
+        Enum containing all the column names in the public chunk table.
+        """
+        chunk_hash_tag = "chunk_hash_tag"
+        chunk_size = "chunk_size"
+
+    ##################################################################################################
+
+    class PublicFileChunkTableColumnNames(StrEnum):
+        """
+        Enum containing all the column names in the public file chunk table, which maps files to their chunks.
+        """
+        root_path_hash_tag = "root_path_hash_tag"
+        relative_path_hash_tag = "rel_path_hash_tag"
+        filename_hash_tag = "filename_hash_tag"
+        chunk_index = "chunk_index"
+        chunk_offset = "chunk_offset"
+        chunk_hash_tag = "chunk_hash_tag"
+
+    ##################################################################################################
+
+    class PublicPendingTableColumnNames(StrEnum):
+        """
+        Enum containing all the column names in the public table of the files whose content is not hashed yet.
+        """
+        root_path_hash_tag = "root_path_hash_tag"
+        relative_path_hash_tag = "rel_path_hash_tag"
+        filename_hash_tag = "filename_hash_tag"
+        file_size = "file_size"
+
+    ##################################################################################################
+
+    class PublicContentChangelogColumnNames(StrEnum):
+        """
+        Enum containing all the column names in the public table logging the content hashes added to and removed from
+        the index table, see create_content_changelog().
+        """
+        change_id = "change_id"
+        operation = "operation"
+        file_content_hash_tag = "file_content_hash_tag"
+
+    # Values of the operation column.
+    CHANGELOG_INSERT = "I"
+    CHANGELOG_DELETE = "D"
 
     ##################################################################################################
 
-    def __init__(self, database_config: DatabaseConfigMixin, public_index_table_name: str = "pub_index_table"):
+    def __init__(self, database_config: DatabaseConfigMixin, public_index_table_name: str = "pub_index_table",
+                 public_folder_table_name: str = "pub_folder_table",
+                 public_chunk_table_name: str = "pub_chunk_table",
+                 public_file_chunk_table_name: str = "pub_file_chunk_table",
+                 public_pending_table_name: str = "pub_pending_table",
+                 public_content_changelog_table_name: str = "pub_content_changelog_table"):
         super().__init__(database_config, table_name=public_index_table_name)
+        self._folder_table_name = "inp_" + public_folder_table_name  # type: str
+        self._chunk_table_name = "inp_" + public_chunk_table_name  # type: str
+        self._file_chunk_table_name = "inp_" + public_file_chunk_table_name  # type: str
+        self._pending_table_name = "inp_" + public_pending_table_name  # type: str
+        self._content_changelog_table_name = "inp_" + public_content_changelog_table_name  # type: str
+
+    ##################################################################################################
+
+    def folder_table_name(self): return self._folder_table_name
+
+    ##################################################################################################
+
+    def chunk_table_name(self): return self._chunk_table_name
+
+    ##################################################################################################
+
+    def file_chunk_table_name(self): return self._file_chunk_table_name
+
+    ##################################################################################################
+
+    def pending_table_name(self): return self._pending_table_name
+
+    ##################################################################################################
+
+    def content_changelog_table_name(self): return self._content_changelog_table_name
 
     ##################################################################################################
 
     def reset(self):
         self.drop_all_tables_and_views()
+        self.create_tables()
+
+    ##################################################################################################
+
+    def create_tables(self):
         self._create_index_table()
+        self._create_folder_table()
+        self._create_chunk_tables()
+        self._create_pending_table()
+
+    ##################################################################################################
+
+    def drop_all_tables_and_views(self):
+        super().drop_all_tables_and_views()
+        self._db_cursor.execute("DROP TABLE IF EXISTS {}".format(self.folder_table_name()))
+        self._db_cursor.execute("DROP TABLE IF EXISTS {}".format(self.chunk_table_name()))
+        self._db_cursor.execute("DROP TABLE IF EXISTS {}".format(self.file_chunk_table_name()))
+        self._db_cursor.execute("DROP TABLE IF EXISTS {}".format(self.pending_table_name()))
+        self._db_cursor.execute("DROP TABLE IF EXISTS {}".format(self.content_changelog_table_name()))
+
+    ##################################################################################################
+
+    def get_pending_file_statistics(self) -> Tuple[int, int]:
+        """
+        :return: Tuple of (number of files, total size) of the files whose content is not hashed yet
+        """
+        if self.cursor().execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (self.pending_table_name(),)).fetchone() is None:
+            return 0, 0
+        num_files, total_size = self.cursor().execute("SELECT COUNT(*), TOTAL({fsize}) FROM {tbl}".format(
+            fsize=PublicDataBase.PublicPendingTableColumnNames.file_size.value,
+            tbl=self.pending_table_name())).fetchone()
+        return num_files, int(total_size)
+
+    ##################################################################################################
+
+    def create_content_changelog(self):
+        """
+        Creates the changelog table and the triggers that log every content hash inserted into, deleted from or
+        replaced in the index table, whatever the rowid, for consumers updating derived data incrementally (see
+        MembershipFilter). The triggers are dropped with the index table.
+        """
+        changelog_columns = PublicDataBase.PublicContentChangelogColumnNames
+        q = """
+          CREATE TABLE IF NOT EXISTS {tbl}
+          (
+              {cid} INTEGER PRIMARY KEY,
+              {op} TEXT NOT NULL,
+              {fconth} TEXT NOT NULL
+          )
+          """.format(tbl=self.content_changelog_table_name(), cid=changelog_columns.change_id.value,
+                     op=changelog_columns.operation.value, fconth=changelog_columns.file_content_hash_tag.value)
+        log = "INSERT INTO {tbl} ({op}, {fconth}) VALUES ('{{op}}', {{row}}.{fconth});".format(
+            tbl=self.content_changelog_table_name(), op=changelog_columns.operation.value,
+            fconth=changelog_columns.file_content_hash_tag.value)
+        triggers = [("insert", "AFTER INSERT", log.format(op=PublicDataBase.CHANGELOG_INSERT, row="NEW")),
+                    ("delete", "AFTER DELETE", log.format(op=PublicDataBase.CHANGELOG_DELETE, row="OLD")),
+                    ("update", "AFTER UPDATE OF {}".format(
+                        PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value),
+                     log.format(op=PublicDataBase.CHANGELOG_DELETE, row="OLD")
+                     + log.format(op=PublicDataBase.CHANGELOG_INSERT, row="NEW"))]
+        try:
+            self.cursor().execute(q)
+            for name, event, statements in triggers:
+                q = "CREATE TRIGGER IF NOT EXISTS {tbl}_changelog_{name} {event} ON {tbl} BEGIN {statements} END" \
+                    .format(tbl=self.table_name(), name=name, event=event, statements=statements)
+                self.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def has_content_changelog(self) -> bool:
+        return self.cursor().execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                                     (self.table_name() + "_changelog_update",)).fetchone() is not None
+
+    ##################################################################################################
+
+    def has_folder_table(self) -> bool:
+        return self.cursor().execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                     (self.folder_table_name(),)).fetchone() is not None
+
+    ##################################################################################################
+
+    def _create_pending_table(self):
+        q = """
+          CREATE TABLE IF NOT EXISTS {tbl}
+          (
+              {prooth} TEXT NOT NULL,
+              {prelh} TEXT NOT NULL,
+              {fnameh} TEXT NOT NULL,
+              {fsize} INTEGER NOT NULL,
+
+              PRIMARY KEY
+              (
+                  {prooth},
+                  {prelh},
+                  {fnameh}
+              )
+          )
+          """.format(
+            tbl=self.pending_table_name(),
+            prooth=PublicDataBase.PublicPendingTableColumnNames.root_path_hash_tag.value,
+            prelh=PublicDataBase.PublicPendingTableColumnNames.relative_path_hash_tag.value,
+            fnameh=PublicDataBase.PublicPendingTableColumnNames.filename_hash_tag.value,
+            fsize=PublicDataBase.PublicPendingTableColumnNames.file_size.value)
+        try:
+            self.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _create_chunk_tables(self):
+        q = """
+          CREATE TABLE IF NOT EXISTS {tbl}
+          (
+              {chh} TEXT NOT NULL PRIMARY KEY,
+              {chsize} INTEGER NOT NULL
+          )
+          """.format(
+            tbl=self.chunk_table_name(),
+            chh=PublicDataBase.PublicChunkTableColumnNames.chunk_hash_tag.value,
+            chsize=PublicDataBase.PublicChunkTableColumnNames.chunk_size.value)
+        try:
+            self.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+        q = """
+          CREATE TABLE IF NOT EXISTS {tbl}
+          (
+              {prooth} TEXT NOT NULL,
+              {prelh} TEXT NOT NULL,
+              {fnameh} TEXT NOT NULL,
+              {chidx} INTEGER NOT NULL,
+              {choff} INTEGER NOT NULL,
+              {chh} TEXT NOT NULL,
+
+              PRIMARY KEY
+              (
+                  {prooth},
+                  {prelh},
+                  {fnameh},
+                  {chidx}
+              )
+          )
+          """.format(
+            tbl=self.file_chunk_table_name(),
+            prooth=PublicDataBase.PublicFileChunkTableColumnNames.root_path_hash_tag.value,
+            prelh=PublicDataBase.PublicFileChunkTableColumnNames.relative_path_hash_tag.value,
+            fnameh=PublicDataBase.PublicFileChunkTableColumnNames.filename_hash_tag.value,
+            chidx=PublicDataBase.PublicFileChunkTableColumnNames.chunk_index.value,
+            choff=PublicDataBase.PublicFileChunkTableColumnNames.chunk_offset.value,
+            chh=PublicDataBase.PublicFileChunkTableColumnNames.chunk_hash_tag.value)
+        try:
+            self.cursor().execute(q)
+            self.cursor().execute("CREATE INDEX IF NOT EXISTS {tbl}_{chh} ON {tbl} ({chh})".format(
+                tbl=self.file_chunk_table_name(),
+                chh=PublicDataBase.PublicFileChunkTableColumnNames.chunk_hash_tag.value))
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _create_folder_table(self):
+        q = """
+          CREATE TABLE IF NOT EXISTS {tbl}
+          (
+              {prooth} TEXT NOT NULL,
+              {prelh} TEXT NOT NULL,
+              {pparh} TEXT,
+              {fnameh} TEXT NOT NULL,
+              {fconth} TEXT NOT NULL,
+              {fstrh} TEXT NOT NULL,
+
+              {depth} INTEGER NOT NULL,
+              {fcnt} INTEGER NOT NULL,
+              {dcnt} INTEGER NOT NULL,
+              {fsize} INTEGER NOT NULL,
+
+              PRIMARY KEY
+              (
+                  {prooth},
+                  {prelh}
+              )
+          )
+          """.format(
+            tbl=self.folder_table_name(),
+
+            prooth=PublicDataBase.PublicFolderTableColumnNames.root_path_hash_tag.value,
+            prelh=PublicDataBase.PublicFolderTableColumnNames.relative_path_hash_tag.value,
+            pparh=PublicDataBase.PublicFolderTableColumnNames.parent_path_hash_tag.value,
+            fnameh=PublicDataBase.PublicFolderTableColumnNames.folder_name_hash_tag.value,
+            fconth=PublicDataBase.PublicFolderTableColumnNames.folder_content_hash_tag.value,
+            fstrh=PublicDataBase.PublicFolderTableColumnNames.folder_structure_hash_tag.value,
+
+            depth=PublicDataBase.PublicFolderTableColumnNames.depth.value,
+            fcnt=PublicDataBase.PublicFolderTableColumnNames.file_count.value,
+            dcnt=PublicDataBase.PublicFolderTableColumnNames.folder_count.value,
+            fsize=PublicDataBase.PublicFolderTableColumnNames.total_size.value
+        )
+
+        try:
+            self.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
 
     ##################################################################################################
 
@@ -246,6 +796,7 @@ class PublicDataBase(IndexDataBaseHelper):
               {ctime} TEXT NOT NULL,
               {mtime} TEXT NOT NULL,
               {fsize} INTEGER NOT NULL,
+              {fhmode} TEXT NOT NULL DEFAULT '{full}',
 
               PRIMARY KEY
               (
@@ -265,7 +816,9 @@ class PublicDataBase(IndexDataBaseHelper):
 
             ctime=PublicDataBase.PublicIndexTableColumnNames.creation_time.value,
             mtime=PublicDataBase.PublicIndexTableColumnNames.last_modification_time.value,
-            fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value
+            fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
+            fhmode=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_mode.value,
+            full=HashingConfigMixin.CONTENT_IDENTITY_FULL
         )
 
         try:
@@ -273,6 +826,10 @@ class PublicDataBase(IndexDataBaseHelper):
         except BaseException as e:
             print(q)
             raise e
+        # Index tables created before the quick content identity mode lack the hash mode column.
+        add_missing_column(self.cursor(), self.table_name(),
+                           PublicDataBase.PublicIndexTableColumnNames.file_content_hash_mode.value,
+                           "TEXT NOT NULL DEFAULT '{}'".format(HashingConfigMixin.CONTENT_IDENTITY_FULL))
 
 
 ##################################################################################################
@@ -287,7 +844,7 @@ class IndexDataBases(object):
         self._dbs = [self.private_db, self.public_db]
 
         # Attach the public database to the private db. to allow db-spanning queries by use of the private db cursor.
-        self.private_db.cursor().execute("ATTACH DATABASE \"{db}\" AS public".format(db=self.public_db.database_path()))
+        self._attach_public_database()
 
     ##################################################################################################
 
@@ -295,7 +852,24 @@ class IndexDataBases(object):
 
     ##################################################################################################
 
-    def reset(self):  [db.reset() for db in self._dbs]
+    def reset(self):
+        [db.reset() for db in self._dbs]
+        self._attach_public_database()
+
+    ##################################################################################################
+
+    def create_tables(self):
+        [db.create_tables() for db in self._dbs]
+        self._attach_public_database()
+
+    ##################################################################################################
+
+    def _attach_public_database(self):
+        # (Re-)attaching makes the private connection reload the schema of the public database, which might have been
+        # changed by the public connection, e.g. when re-creating its tables.
+        if "public" in [r[1] for r in self.private_db.cursor().execute("PRAGMA database_list").fetchall()]:
+            self.private_db.cursor().execute("DETACH DATABASE public")
+        self.private_db.cursor().execute("ATTACH DATABASE \"{db}\" AS public".format(db=self.public_db.database_path()))
 
     ##################################################################################################
 
@@ -308,58 +882,44 @@ class DataBaseIndexHelper(IndexDataBases):
 
     ##################################################################################################
 
-    def __init__(self, private_db_config: DatabaseConfigMixin, public_db_config: DatabaseConfigMixin, **kwargs):
+    # Files per transaction when storing the index.
+    INSERT_BATCH_SIZE = 10000
+
+    ##################################################################################################
+
+    def __init__(self, private_db_config: DatabaseConfigMixin, public_db_config: DatabaseConfigMixin,
+                 reset_tables: bool = True, **kwargs):
+        """
+        :param reset_tables: Drop and re-create all tables (True) or keep the existing data (False)
+        """
         super().__init__(private_db_config, public_db_config, **kwargs)
-        self.reset()
+        if reset_tables:
+            self.reset()
+        else:
+            self.create_tables()
 
     ##################################################################################################
 
     def insert_files_in_both_databases(self, files: [FileType]):
         """
-        Helper function that accepts a list of file objects to be inserted in the database with a single insert command.
+        Helper function that accepts a list of file objects to be inserted in the database.
+        Each batch of files is written to the private and the public table from the same in-memory rows and
+        committed, so the journal of a transaction never exceeds one batch.
+        Files whose content is not hashed yet (hash mode "pending") are stored in the public pending table instead of
+        the public index table, so that the evaluators only see hashed contents.
         :param files: List of FileType objects
         :return:
         """
-        print("Storing data sets to private database ...")
-        if len(files) > 0:
-            self._insert_files_in_private_table(files)
-
-            print("Storing data sets to public database ...")
-
-            q = """
-            INSERT INTO 
-                {pub_tbl}
-            SELECT 
-                {prooth},
-                {prelh},
-                {fnameh},
-                {pabsfnameh},
-                {fconth},
-                {ctime},
-                {mtime},
-                {fsize}
-            FROM
-                {priv_tbl} 
-            """.format(
-                pub_tbl="public.{}".format(self.public_db.table_name()),
-
-                prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
-                prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
-                fnameh=PublicDataBase.PublicIndexTableColumnNames.filename_hash_tag.value,
-                pabsfnameh=PublicDataBase.PublicIndexTableColumnNames.absolute_file_path_hash_tag.value,
-                fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
-
-                ctime=PublicDataBase.PublicIndexTableColumnNames.creation_time.value,
-                mtime=PublicDataBase.PublicIndexTableColumnNames.last_modification_time.value,
-                fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
-
-                priv_tbl=self.private_db.table_name())
-
-            try:
-                self.private_db.connection().execute(q)
-            except BaseException as e:
-                print(q)
-                raise e
+        print("Storing data sets to private and public database ...")
+        for start in range(0, len(files), DataBaseIndexHelper.INSERT_BATCH_SIZE):
+            batch = files[start:start + DataBaseIndexHelper.INSERT_BATCH_SIZE]
+            hashed = [f for f in batch if f.file_content_hash_mode != HashingConfigMixin.CONTENT_IDENTITY_PENDING]
+            self._insert_files_in_private_table(batch)
+            self._insert_files_in_public_table(hashed)
+            self._insert_files_in_public_pending_table(
+                [f for f in batch if f.file_content_hash_mode == HashingConfigMixin.CONTENT_IDENTITY_PENDING])
+            self._insert_file_chunks_in_public_tables(hashed)
+            self.private_db.connection().commit()
 
         print("Storing data to database done.")
 
@@ -390,20 +950,387 @@ class DataBaseIndexHelper(IndexDataBases):
     def _insert_files_in_private_table(self, files: List[FileType]) -> None:
         if files is None:
             return
-        q = """
-        INSERT INTO 
-            {tbl}
-        VALUES 
-            (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """.format(tbl=self.private_db.table_name())
-        try:
-            self.private_db.cursor().executemany(q, convert_file_type_list_to_tuple_list(files))
-        except sqlite3.Error as e:
-            print(q)
-            raise e
-        except BaseException as e:
-            print(e)
-            assert False
+        q = """
+        INSERT INTO 
+            {tbl}
+        VALUES 
+            (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """.format(tbl=self.private_db.table_name())
+        try:
+            self.private_db.cursor().executemany(q, convert_file_type_list_to_tuple_list(files))
+        except sqlite3.Error as e:
+            print(q)
+            raise e
+        except BaseException as e:
+            print(e)
+            assert False
+
+    ##################################################################################################
+
+    def _insert_files_in_public_table(self, files: List[FileType]) -> None:
+        if files is None:
+            return
+        # Rows of previous runs (e.g. when retrying failed files) are already present in the public table.
+        q = """
+        INSERT OR IGNORE INTO 
+            public.{tbl}
+        VALUES 
+            (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """.format(tbl=self.public_db.table_name())
+        try:
+            self.private_db.cursor().executemany(q, convert_file_type_list_to_public_tuple_list(files))
+        except sqlite3.Error as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _insert_files_in_public_pending_table(self, files: List[FileType]) -> None:
+        if len(files) <= 0:
+            return
+        q = """
+        INSERT OR REPLACE INTO
+            public.{tbl}
+        VALUES
+            (?, ?, ?, ?)
+        """.format(tbl=self.public_db.pending_table_name())
+        try:
+            self.private_db.cursor().executemany(
+                q, [(f.root_path_hash_tag, f.relative_path_hash_tag, f.filename_hash_tag, f.file_size) for f in files])
+        except sqlite3.Error as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def get_pending_files(self, order_by: List[str], parameters: tuple = ()) -> List[int]:
+        """
+        Helper function that returns the files whose content is not hashed yet (hash mode "pending").
+        :param order_by: SQL expressions on the private index table "p" the files are sorted by
+        :param parameters: Parameters of the expressions
+        :return: Row ids of the private index table, see get_files_by_row_ids()
+        """
+        q = """
+        SELECT
+            p.rowid
+        FROM
+            {tbl} AS p
+        WHERE
+            p.{fhmode} = ?
+        ORDER BY
+            {order_by}
+        """.format(tbl=self.private_db.table_name(),
+                   fhmode=PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_mode.value,
+                   order_by=", ".join(order_by + ["p.rowid"]))
+        try:
+            return [r[0] for r in self.private_db.cursor().execute(
+                q, (HashingConfigMixin.CONTENT_IDENTITY_PENDING,) + tuple(parameters))]
+        except sqlite3.Error as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def get_files_by_row_ids(self, row_ids: List[int]) -> List[Tuple[str, str, str]]:
+        """
+        :return: List of (root path, relative path, filename) of the still existing rows
+        """
+        q = "SELECT {proot}, {prel}, {fname} FROM {tbl} WHERE rowid = ?".format(
+            tbl=self.private_db.table_name(), **self._private_key_columns())
+        files = []  # type: List[Tuple[str, str, str]]
+        for row_id in row_ids:
+            files.extend(self.private_db.cursor().execute(q, (row_id,)).fetchall())
+        return files
+
+    ##################################################################################################
+
+    def _insert_file_chunks_in_public_tables(self, files: List[FileType]) -> None:
+        chunked_files = [f for f in files if f.chunks is not None]
+        if len(chunked_files) <= 0:
+            return
+        q_chunks = "INSERT OR IGNORE INTO public.{tbl} VALUES (?, ?)".format(tbl=self.public_db.chunk_table_name())
+        q_file_chunks = "INSERT OR REPLACE INTO public.{tbl} VALUES (?, ?, ?, ?, ?, ?)".format(
+            tbl=self.public_db.file_chunk_table_name())
+        try:
+            for f in chunked_files:
+                self.private_db.cursor().executemany(
+                    q_chunks, [(chunk_hash_tag, length) for _, length, chunk_hash_tag in f.chunks])
+                self.private_db.cursor().executemany(
+                    q_file_chunks,
+                    [(f.root_path_hash_tag, f.relative_path_hash_tag, f.filename_hash_tag, i, offset, chunk_hash_tag)
+                     for i, (offset, _, chunk_hash_tag) in enumerate(f.chunks)])
+        except sqlite3.Error as e:
+            print(q_file_chunks)
+            raise e
+
+    ##################################################################################################
+
+    def insert_index_errors(self, errors: List[FileIndexingError]) -> None:
+        """
+        Helper function that stores (or updates) the files that could not be indexed.
+        :param errors: List of FileIndexingError objects
+        """
+        if errors is None or len(errors) <= 0:
+            return
+        q = """
+        INSERT OR REPLACE INTO
+            {tbl}
+        VALUES
+            (?, ?, ?, ?, ?, ?, ?)
+        """.format(tbl=self.private_db.index_errors_table_name())
+        try:
+            self.private_db.cursor().executemany(
+                q, [(e.root_path, e.relative_path, e.filename, e.stage, e.error_number, e.error_message, e.attempts)
+                    for e in errors])
+        except sqlite3.Error as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def get_index_errors(self) -> List[FileIndexingError]:
+        """
+        Helper function that returns all files that could not be indexed so far.
+        """
+        q = """
+        SELECT
+            {proot}, {prel}, {fname}, {stage}, {errno}, {msg}, {attempts}
+        FROM
+            {tbl}
+        """.format(
+            tbl=self.private_db.index_errors_table_name(),
+            proot=PrivateDataBase.IndexErrorsTableColumnNames.root_path.value,
+            prel=PrivateDataBase.IndexErrorsTableColumnNames.relative_path.value,
+            fname=PrivateDataBase.IndexErrorsTableColumnNames.filename.value,
+            stage=PrivateDataBase.IndexErrorsTableColumnNames.stage.value,
+            errno=PrivateDataBase.IndexErrorsTableColumnNames.error_number.value,
+            msg=PrivateDataBase.IndexErrorsTableColumnNames.error_message.value,
+            attempts=PrivateDataBase.IndexErrorsTableColumnNames.attempts.value)
+        return [FileIndexingError(root_path=r[0], relative_path=r[1], filename=r[2], stage=r[3],
+                                  error_number=r[4], error_message=r[5], attempts=r[6])
+                for r in self.private_db.cursor().execute(q).fetchall()]
+
+    ##################################################################################################
+
+    def delete_index_errors(self, errors: List[FileIndexingError]) -> None:
+        """
+        Helper function that removes files from the error table, e.g. after they have been indexed successfully.
+        """
+        if errors is None or len(errors) <= 0:
+            return
+        q = """
+        DELETE FROM
+            {tbl}
+        WHERE
+            {proot} = ? AND {prel} = ? AND {fname} = ?
+        """.format(
+            tbl=self.private_db.index_errors_table_name(),
+            proot=PrivateDataBase.IndexErrorsTableColumnNames.root_path.value,
+            prel=PrivateDataBase.IndexErrorsTableColumnNames.relative_path.value,
+            fname=PrivateDataBase.IndexErrorsTableColumnNames.filename.value)
+        self.private_db.cursor().executemany(q, [(e.root_path, e.relative_path, e.filename) for e in errors])
+
+    ##################################################################################################
+
+    def upsert_files_in_both_databases(self, files: List[FileType]) -> None:
+        """
+        Helper function that inserts or replaces the given files, e.g. when they changed after the last indexing.
+        """
+        self._delete_rows_by_hash_tags([(f.root_path_hash_tag, f.relative_path_hash_tag, f.filename_hash_tag)
+                                        for f in files])
+        self.insert_files_in_both_databases(files)
+
+    ##################################################################################################
+
+    def delete_files(self, files: List[Tuple[str, str, str]]) -> None:
+        """
+        Helper function that removes files from the private and the public tables, looked up by their hash tags (primary
+        key).
+        :param files: List of (root path, relative path, filename)
+        """
+        self._delete_rows_by_hash_tags([(path_hash_tag(root_path), path_hash_tag(relative_path), path_hash_tag(filename))
+                                        for root_path, relative_path, filename in files])
+
+    ##################################################################################################
+
+    def delete_folder(self, root_path: str, relative_path: str) -> None:
+        """
+        Helper function that removes all files in and below a folder from the private and the public tables.
+        """
+        q = """
+        SELECT
+            {prooth}, {prelh}, {fnameh}
+        FROM
+            {tbl}
+        WHERE
+            {proot} = ?
+        """.format(tbl=self.private_db.table_name(), **self._private_key_columns())
+        if relative_path == ".":
+            hash_tags = self.private_db.cursor().execute(q, (root_path,)).fetchall()
+        else:
+            prefix = relative_path + os.sep
+            q += " AND ({prel} = ? OR substr({prel}, 1, ?) = ?)".format(
+                prel=PrivateDataBase.PrivateIndexTableColumnNames.relative_path.value)
+            hash_tags = self.private_db.cursor().execute(
+                q, (root_path, relative_path, len(prefix), prefix)).fetchall()
+        self._delete_rows_by_hash_tags(hash_tags)
+
+    ##################################################################################################
+
+    def get_indexed_file_states(self, root_path: str, relative_paths: Optional[List[str]] = None) \
+            -> Dict[Tuple[str, str], Tuple[str, int]]:
+        """
+        Helper function that returns the indexed files directly in the given folders of a root. The rows are looked up
+        by the hash tags of root and folder, a prefix of the primary key.
+        :param relative_paths: The folders, None for all files of the root
+        :return: Dictionary (relative path, filename) -> (last modification time, file size)
+        """
+        q = """
+        SELECT
+            {prel}, {fname}, {mtime}, {fsize}
+        FROM
+            {tbl}
+        WHERE
+            {prooth} = ?
+        """.format(tbl=self.private_db.table_name(),
+                   mtime=PrivateDataBase.PrivateIndexTableColumnNames.last_modification_time.value,
+                   fsize=PrivateDataBase.PrivateIndexTableColumnNames.file_size.value,
+                   **self._private_key_columns())
+        root_path_hash_tag = path_hash_tag(root_path)
+        if relative_paths is None:
+            parameters = [(root_path_hash_tag,)]
+        else:
+            q += " AND {} = ?".format(PrivateDataBase.PrivateIndexTableColumnNames.relative_path_hash_tag.value)
+            parameters = [(root_path_hash_tag, path_hash_tag(rel)) for rel in relative_paths]
+        states = {}  # type: Dict[Tuple[str, str], Tuple[str, int]]
+        for p in parameters:
+            cursor = self.private_db.connection().execute(q, p)
+            for rows in iter(lambda: cursor.fetchmany(10000), []):
+                for rel, fname, mtime, fsize in rows:
+                    states[(rel, fname)] = (mtime, fsize)
+        return states
+
+    ##################################################################################################
+
+    def get_indexed_file_states_in_folder(self, root_path_hash_tag: str, relative_path_hash_tag: str) \
+            -> Dict[str, Tuple[str, int, str]]:
+        """
+        Helper function that returns the indexed files directly in a folder. The folder is given by its hash tags, so
+        that the lookup uses the primary key.
+        :return: Dictionary filename -> (last modification time, file size, filename hash tag)
+        """
+        q = """
+        SELECT
+            {fname}, {mtime}, {fsize}, {fnameh}
+        FROM
+            {tbl}
+        WHERE
+            {prooth} = ? AND {prelh} = ?
+        """.format(tbl=self.private_db.table_name(),
+                   mtime=PrivateDataBase.PrivateIndexTableColumnNames.last_modification_time.value,
+                   fsize=PrivateDataBase.PrivateIndexTableColumnNames.file_size.value,
+                   **self._private_key_columns())
+        return {fname: (mtime, fsize, fnameh) for fname, mtime, fsize, fnameh in
+                self.private_db.cursor().execute(q, (root_path_hash_tag, relative_path_hash_tag)).fetchall()}
+
+    ##################################################################################################
+
+    def delete_files_by_hash_tags(self, hash_tags: List[Tuple[str, str, str]]) -> None:
+        """
+        Helper function that removes files from the private and the public tables.
+        :param hash_tags: List of (root path hash tag, relative path hash tag, filename hash tag)
+        """
+        self._delete_rows_by_hash_tags(hash_tags)
+
+    ##################################################################################################
+
+    def insert_directory_states(self, states: List[DirectoryState]) -> None:
+        """
+        Helper function that stores (or updates) the states of indexed folders.
+        """
+        q = """
+        INSERT OR REPLACE INTO
+            {tbl}
+        VALUES
+            (?, ?, ?, ?, ?)
+        """.format(tbl=self.private_db.directory_states_table_name())
+        try:
+            self.private_db.cursor().executemany(
+                q, [(s.root_path, s.relative_path, s.mtime_ns, s.entry_count, s.entry_names_digest) for s in states])
+        except sqlite3.Error as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def get_directory_states(self, root_path: str) -> Dict[str, DirectoryState]:
+        """
+        Helper function that returns the stored states of the folders below a root.
+        :return: Dictionary relative path -> DirectoryState
+        """
+        q = """
+        SELECT
+            {proot}, {prel}, {mtime}, {count}, {digest}
+        FROM
+            {tbl}
+        WHERE
+            {proot} = ?
+        """.format(
+            tbl=self.private_db.directory_states_table_name(),
+            proot=PrivateDataBase.DirectoryStatesTableColumnNames.root_path.value,
+            prel=PrivateDataBase.DirectoryStatesTableColumnNames.relative_path.value,
+            mtime=PrivateDataBase.DirectoryStatesTableColumnNames.mtime_ns.value,
+            count=PrivateDataBase.DirectoryStatesTableColumnNames.entry_count.value,
+            digest=PrivateDataBase.DirectoryStatesTableColumnNames.entry_names_digest.value)
+        return {r[1]: DirectoryState(root_path=r[0], relative_path=r[1], mtime_ns=r[2], entry_count=r[3],
+                                     entry_names_digest=r[4])
+                for r in self.private_db.cursor().execute(q, (root_path,)).fetchall()}
+
+    ##################################################################################################
+
+    def delete_directory_states(self, root_path: str) -> None:
+        """
+        Helper function that removes the stored states of all folders below a root.
+        """
+        self.private_db.cursor().execute(
+            "DELETE FROM {tbl} WHERE {proot} = ?".format(
+                tbl=self.private_db.directory_states_table_name(),
+                proot=PrivateDataBase.DirectoryStatesTableColumnNames.root_path.value), (root_path,))
+
+    ##################################################################################################
+
+    @staticmethod
+    def _private_key_columns() -> Dict[str, str]:
+        return dict(proot=PrivateDataBase.PrivateIndexTableColumnNames.root_path.value,
+                    prel=PrivateDataBase.PrivateIndexTableColumnNames.relative_path.value,
+                    fname=PrivateDataBase.PrivateIndexTableColumnNames.filename.value,
+                    prooth=PrivateDataBase.PrivateIndexTableColumnNames.root_path_hash_tag.value,
+                    prelh=PrivateDataBase.PrivateIndexTableColumnNames.relative_path_hash_tag.value,
+                    fnameh=PrivateDataBase.PrivateIndexTableColumnNames.filename_hash_tag.value)
+
+    ##################################################################################################
+
+    def _delete_rows_by_hash_tags(self, hash_tags: List[Tuple[str, str, str]]) -> None:
+        """
+        :param hash_tags: List of (root path hash tag, relative path hash tag, filename hash tag)
+        """
+        if len(hash_tags) <= 0:
+            return
+        for tbl in [self.private_db.table_name(),
+                    "public." + self.public_db.table_name(),
+                    "public." + self.public_db.file_chunk_table_name(),
+                    "public." + self.public_db.pending_table_name()]:
+            q = """
+            DELETE FROM
+                {tbl}
+            WHERE
+                {prooth} = ? AND {prelh} = ? AND {fnameh} = ?
+            """.format(tbl=tbl, **self._private_key_columns())
+            try:
+                self.private_db.cursor().executemany(q, hash_tags)
+            except sqlite3.Error as e:
+                print(q)
+                raise e
 
     ##################################################################################################
 
@@ -585,23 +1512,333 @@ class UniqueFileFolderEvaluator(object):
             raise e
 
 
+######################################################################################################
+
+class QuickHashCandidateEvaluator(object):
+    """
+    Evaluator that lists the quick content hash tags shared by more than one file. Files indexed in the content
+    identity mode "quick" are duplicates only if their full hashes match as well, these groups are the candidates
+    to be verified with create-index.py --verify-duplicates.
+    """
+    ##################################################################################################
+
+    QUICK_HASH_CANDIDATES_TABLE_NAME = "quick_hash_candidates"
+
+    ##################################################################################################
+
+    def __init__(self, databases: EvaluationDataBases, evaluation_table_name: str = "quick_hash_candidates"):
+        self.index_db = databases.index_db
+        self.evaluation_db = databases.evaluation_db
+        self._evaluation_table_name = "eval_" + evaluation_table_name  # type: str
+
+    ##################################################################################################
+
+    def evaluate(self):
+        print("\n[QuickHashCandidateEvaluator START]")
+        start_timestamp = timer()
+
+        self.reset()
+        self._insert_into_table_of_quick_hash_candidates()
+        num_candidates = self.evaluation_db.cursor().execute(
+            "SELECT COUNT(*) FROM {}".format(QuickHashCandidateEvaluator.QUICK_HASH_CANDIDATES_TABLE_NAME)).fetchone()[0]
+        if num_candidates > 0:
+            print("\tWARNING: {} quick content hash tags are shared by several files and need verification "
+                  "(create-index.py --verify-duplicates).".format(num_candidates))
+
+        print("[QuickHashCandidateEvaluator END] Time elapsed {}".format(
+            timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def reset(self):
+        self.evaluation_db.cursor().execute(
+            "DROP TABLE IF EXISTS {}".format(QuickHashCandidateEvaluator.QUICK_HASH_CANDIDATES_TABLE_NAME))
+        q = """
+        CREATE TABLE IF NOT EXISTS {tbl}
+        (
+            {fconth} TEXT NOT NULL,
+            {fsize} INTEGER NOT NULL,
+            {cnt} INTEGER NOT NULL
+        )
+        """.format(tbl=QuickHashCandidateEvaluator.QUICK_HASH_CANDIDATES_TABLE_NAME,
+                   fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+                   fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
+                   cnt="cnt")
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _insert_into_table_of_quick_hash_candidates(self):
+        columns = [r[1] for r in self.evaluation_db.cursor().execute(
+            "PRAGMA index_db.table_info({})".format(self.index_db.table_name())).fetchall()]
+        if PublicDataBase.PublicIndexTableColumnNames.file_content_hash_mode.value not in columns:
+            # Index created before the quick content identity mode existed: all hashes are full hashes.
+            return
+
+        q = """
+        INSERT INTO
+            {tbl}
+        SELECT
+            {fconth}, MIN({fsize}), COUNT(*)
+        FROM
+            {pub_index_tbl}
+        WHERE
+            {fhmode} = ?
+        GROUP BY
+            {fconth}
+        HAVING
+            COUNT(*) > 1
+        """.format(
+            tbl=QuickHashCandidateEvaluator.QUICK_HASH_CANDIDATES_TABLE_NAME,
+            fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+            fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
+            fhmode=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_mode.value,
+            pub_index_tbl="index_db.{}".format(self.index_db.table_name()))
+        try:
+            self.evaluation_db.cursor().execute(q, (HashingConfigMixin.CONTENT_IDENTITY_QUICK,))
+        except BaseException as e:
+            print(q)
+            raise e
+
+
+######################################################################################################
+
+class IdenticalSubtreeEvaluator(object):
+    """
+    Evaluator that reports identical and near-identical subtrees based on the folder hashes of the index.
+    Identical subtrees share the same folder content hash, near-identical subtrees share the same folder structure
+    hash (same names) but differ in content. Only the top-most folders of identical subtrees are reported.
+    Additionally, the folders that are identical in all indexed roots are stored as settled folders, which allows
+    ExpectedFolderStructureEvaluator to only look inside the subtrees that differ.
+    """
+    ##################################################################################################
+
+    IDENTICAL_SUBTREES_TABLE_NAME = "identical_subtrees"
+    NEAR_IDENTICAL_SUBTREES_TABLE_NAME = "near_identical_subtrees"
+    SETTLED_FOLDERS_TABLE_NAME = "settled_folders"
+
+    ##################################################################################################
+
+    def __init__(self, databases: EvaluationDataBases, evaluation_table_name: str = "identical_subtrees"):
+        self.index_db = databases.index_db
+        self.evaluation_db = databases.evaluation_db
+        self._evaluation_table_name = "eval_" + evaluation_table_name  # type: str
+
+    ##################################################################################################
+
+    def evaluate(self):
+        print("\n[IdenticalSubtreeEvaluator START]")
+        start_timestamp = timer()
+
+        self.reset()
+        if not self.index_db.has_folder_table():
+            print("WARNING: Index database does not contain folder hashes. Re-index to evaluate subtrees.")
+        else:
+            self._insert_into_table_of_identical_subtrees()
+            self._insert_into_table_of_near_identical_subtrees()
+            self._insert_into_table_of_settled_folders()
+
+            for tbl in [IdenticalSubtreeEvaluator.IDENTICAL_SUBTREES_TABLE_NAME,
+                        IdenticalSubtreeEvaluator.NEAR_IDENTICAL_SUBTREES_TABLE_NAME,
+                        IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME]:
+                print("\t{}: {} rows".format(
+                    tbl, self.evaluation_db.cursor().execute("SELECT COUNT(*) FROM {}".format(tbl)).fetchone()[0]))
+
+        print("[IdenticalSubtreeEvaluator END] Time elapsed {}".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def reset(self):
+        self._drop_all_tables_and_views()
+        self._create_tables()
+
+    ##################################################################################################
+
+    def _drop_all_tables_and_views(self):
+        for tbl in [IdenticalSubtreeEvaluator.IDENTICAL_SUBTREES_TABLE_NAME,
+                    IdenticalSubtreeEvaluator.NEAR_IDENTICAL_SUBTREES_TABLE_NAME,
+                    IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME]:
+            self.evaluation_db.cursor().execute("DROP TABLE IF EXISTS {}".format(tbl))
+
+    ##################################################################################################
+
+    def _create_tables(self):
+        q = """
+        CREATE TABLE IF NOT EXISTS {identical_tbl}
+        (
+            {fconth} TEXT NOT NULL,
+            {cnt} INTEGER NOT NULL,
+            {fcnt} INTEGER NOT NULL,
+            {fsize} INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS {near_identical_tbl}
+        (
+            {fstrh} TEXT NOT NULL,
+            {cnt} INTEGER NOT NULL,
+            variants INTEGER NOT NULL,
+            {fcnt} INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS {settled_tbl}
+        (
+            {prelh} TEXT NOT NULL PRIMARY KEY
+        );
+        """.format(
+            identical_tbl=IdenticalSubtreeEvaluator.IDENTICAL_SUBTREES_TABLE_NAME,
+            near_identical_tbl=IdenticalSubtreeEvaluator.NEAR_IDENTICAL_SUBTREES_TABLE_NAME,
+            settled_tbl=IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME,
+            fconth=PublicDataBase.PublicFolderTableColumnNames.folder_content_hash_tag.value,
+            fstrh=PublicDataBase.PublicFolderTableColumnNames.folder_structure_hash_tag.value,
+            prelh=PublicDataBase.PublicFolderTableColumnNames.relative_path_hash_tag.value,
+            fcnt=PublicDataBase.PublicFolderTableColumnNames.file_count.value,
+            fsize=PublicDataBase.PublicFolderTableColumnNames.total_size.value,
+            cnt="cnt")
+
+        try:
+            self.evaluation_db.cursor().executescript(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _insert_into_table_of_identical_subtrees(self):
+        # A group of identical folders is not reported if their (distinct) parents form an identical group as well.
+        q = """
+        INSERT INTO
+            {identical_tbl}
+        SELECT
+            folder_tbl.{fconth}, COUNT(*) AS cnt, MAX(folder_tbl.{fcnt}), MAX(folder_tbl.{fsize})
+        FROM
+            {folder_tbl} AS folder_tbl
+        LEFT JOIN
+            {folder_tbl} AS parent_tbl
+            ON parent_tbl.{prooth} = folder_tbl.{prooth} AND parent_tbl.{prelh} = folder_tbl.{pparh}
+        WHERE
+            folder_tbl.{fcnt} > 0
+        GROUP BY
+            folder_tbl.{fconth}
+        HAVING
+            COUNT(*) > 1
+            AND NOT (COUNT(parent_tbl.{fconth}) = COUNT(*)
+                     AND COUNT(DISTINCT parent_tbl.{fconth}) = 1
+                     AND COUNT(DISTINCT parent_tbl.{prooth} || parent_tbl.{prelh}) = COUNT(*))
+        ORDER BY
+            MAX(folder_tbl.{fsize}) DESC
+        """.format(
+            identical_tbl=IdenticalSubtreeEvaluator.IDENTICAL_SUBTREES_TABLE_NAME,
+            folder_tbl="index_db.{}".format(self.index_db.folder_table_name()),
+            prooth=PublicDataBase.PublicFolderTableColumnNames.root_path_hash_tag.value,
+            prelh=PublicDataBase.PublicFolderTableColumnNames.relative_path_hash_tag.value,
+            pparh=PublicDataBase.PublicFolderTableColumnNames.parent_path_hash_tag.value,
+            fconth=PublicDataBase.PublicFolderTableColumnNames.folder_content_hash_tag.value,
+            fcnt=PublicDataBase.PublicFolderTableColumnNames.file_count.value,
+            fsize=PublicDataBase.PublicFolderTableColumnNames.total_size.value)
+
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _insert_into_table_of_near_identical_subtrees(self):
+        q = """
+        INSERT INTO
+            {near_identical_tbl}
+        SELECT
+            {fstrh}, COUNT(*), COUNT(DISTINCT {fconth}), MAX({fcnt})
+        FROM
+            {folder_tbl}
+        WHERE
+            {fcnt} > 0
+        GROUP BY
+            {fstrh}
+        HAVING
+            COUNT(DISTINCT {fconth}) > 1
+        ORDER BY
+            MAX({fcnt}) DESC
+        """.format(
+            near_identical_tbl=IdenticalSubtreeEvaluator.NEAR_IDENTICAL_SUBTREES_TABLE_NAME,
+            folder_tbl="index_db.{}".format(self.index_db.folder_table_name()),
+            fconth=PublicDataBase.PublicFolderTableColumnNames.folder_content_hash_tag.value,
+            fstrh=PublicDataBase.PublicFolderTableColumnNames.folder_structure_hash_tag.value,
+            fcnt=PublicDataBase.PublicFolderTableColumnNames.file_count.value)
+
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _insert_into_table_of_settled_folders(self):
+        # Settled: the folder exists in every root and its subtree is identical everywhere.
+        q = """
+        INSERT INTO
+            {settled_tbl}
+        SELECT
+            {prelh}
+        FROM
+            {folder_tbl}
+        GROUP BY
+            {prelh}
+        HAVING
+            COUNT(DISTINCT {fconth}) = 1
+            AND COUNT(DISTINCT {prooth}) = (SELECT COUNT(DISTINCT {prooth}) FROM {folder_tbl})
+        """.format(
+            settled_tbl=IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME,
+            folder_tbl="index_db.{}".format(self.index_db.folder_table_name()),
+            prooth=PublicDataBase.PublicFolderTableColumnNames.root_path_hash_tag.value,
+            prelh=PublicDataBase.PublicFolderTableColumnNames.relative_path_hash_tag.value,
+            fconth=PublicDataBase.PublicFolderTableColumnNames.folder_content_hash_tag.value)
+
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+
 ######################################################################################################
 
 class ExpectedFolderStructureEvaluator(object):
     """
     Evaluator that constructs the union of all folders (expected folder structure).
     The evaluator depends on the result of UniqueFileFolderEvaluator.evaluate().
+
+    Contents stored more than heavy_hitter_threshold times (empty files, __init__.py, Thumbs.db, ...) are heavy
+    hitters: joined with the index they would fan out into an intermediate result of all their copies before DISTINCT
+    collapses it. They are reported in their own table and, depending on the policy, their folders are computed by a
+    dedicated query that collapses the copies before joining (separate) or they are left out (exclude).
     """
     ##################################################################################################
 
     EXPECTED_FOLDER_STRUCTURE_TABLE_NAME = "expected_folder_structure"
+    HEAVY_HITTER_FILES_TABLE_NAME = "heavy_hitter_files"
 
     ##################################################################################################
 
-    def __init__(self, databases: EvaluationDataBases, evaluation_table_name: str = "expected_folder_structure"):
+    def __init__(self, databases: EvaluationDataBases, evaluation_table_name: str = "expected_folder_structure",
+                 skip_identical_subtrees: bool = False, heavy_hitter_threshold: int = 0,
+                 heavy_hitter_policy: str = EvaluationConfigMixin.HEAVY_HITTER_POLICY_SEPARATE):
+        """
+        :param skip_identical_subtrees: Leave out the folders that are identical in all roots, requires the result of
+                                        IdenticalSubtreeEvaluator.evaluate()
+        :param heavy_hitter_threshold: Contents stored more often are heavy hitters, 0 disables the detection
+        :param heavy_hitter_policy: One of EvaluationConfigMixin.HEAVY_HITTER_POLICIES
+        """
         self.index_db = databases.index_db
         self.evaluation_db = databases.evaluation_db
         self._evaluation_table_name = "eval_" + evaluation_table_name  # type: str
+        self._skip_identical_subtrees = skip_identical_subtrees  # type: bool
+        self._heavy_hitter_threshold = heavy_hitter_threshold  # type: int
+        self._heavy_hitter_policy = heavy_hitter_policy  # type: str
 
     ##################################################################################################
 
@@ -610,6 +1847,8 @@ class ExpectedFolderStructureEvaluator(object):
         start_timestamp = timer()
 
         self.reset()
+        if self._heavy_hitter_threshold > 0:
+            self.insert_into_table_of_heavy_hitter_files()
         self._insert_into_table_of_expected_folder_structure()
 
         print("[ExpectedFolderStructureEvaluator END] Time elapsed {}"
@@ -626,6 +1865,56 @@ class ExpectedFolderStructureEvaluator(object):
     def drop_all_tables_and_views(self):
         self.evaluation_db.cursor().execute(
             "DROP TABLE IF EXISTS " + ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME)
+        self.evaluation_db.cursor().execute(
+            "DROP TABLE IF EXISTS " + ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME)
+
+    ##################################################################################################
+
+    def heavy_hitter_threshold(self) -> int: return self._heavy_hitter_threshold
+
+    ##################################################################################################
+
+    def heavy_hitter_policy(self) -> str: return self._heavy_hitter_policy
+
+    ##################################################################################################
+
+    def insert_into_table_of_heavy_hitter_files(self):
+        """
+        Reports the heavy hitter contents with the number of files, of distinct folders and their size.
+        Requires the result of UniqueFileFolderEvaluator.evaluate(), the index is scanned once.
+        """
+        q = """
+        INSERT INTO
+            {heavy_hitter_files_table}
+        SELECT
+            {fcntht}, COUNT(*), COUNT(DISTINCT {rpht}), MAX({fsize})
+        FROM
+            index_db.{index_tbl}
+        WHERE
+            {fcntht} IN (SELECT {fcntht} FROM {unique_files_table} WHERE {cnt} > ?)
+        GROUP BY
+            {fcntht}
+        """.format(
+            heavy_hitter_files_table=ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME,
+            index_tbl=self.index_db.table_name(),
+            rpht=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+            fcntht=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+            fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
+            cnt="cnt",
+            unique_files_table="unique_files")
+        try:
+            self.evaluation_db.cursor().execute(q, (self._heavy_hitter_threshold,))
+        except BaseException as e:
+            print(q)
+            raise e
+
+        num_heavy_hitters, num_files = self.evaluation_db.cursor().execute(
+            "SELECT COUNT(*), IFNULL(SUM(cnt), 0) FROM {}".format(
+                ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME)).fetchone()
+        if num_heavy_hitters > 0:
+            print("\t{} heavy hitter contents (more than {} files each, {} files in total), policy '{}', see table "
+                  "'{}'.".format(num_heavy_hitters, self._heavy_hitter_threshold, num_files,
+                                 self._heavy_hitter_policy, ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME))
 
     ##################################################################################################
 
@@ -644,10 +1933,37 @@ class ExpectedFolderStructureEvaluator(object):
                 fcntht=PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_tag.value,
                 cnt="cnt")
         )
+        self.evaluation_db.cursor().execute(
+            """
+            CREATE TABLE IF NOT EXISTS {tbl}
+            (
+                {fcntht} TEXT NOT NULL,
+                {cnt} INTEGER NOT NULL,
+                folder_cnt INTEGER NOT NULL,
+                {fsize} INTEGER NOT NULL
+            )
+            """.format(
+                tbl=ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME,
+                fcntht=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+                fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
+                cnt="cnt")
+        )
 
     ##################################################################################################
 
     def _insert_into_table_of_expected_folder_structure(self):
+        index_tbl = "index_db.{}".format(self.index_db.table_name())
+        if self._skip_identical_subtrees:
+            if self._has_settled_folders():
+                index_tbl = """
+                (SELECT * FROM index_db.{tbl} WHERE {rpht} NOT IN (SELECT {rpht} FROM {settled_tbl}))
+                """.format(tbl=self.index_db.table_name(),
+                           rpht=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+                           settled_tbl=IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME)
+            else:
+                print("WARNING: No settled folders available. Run IdenticalSubtreeEvaluator first.")
+
+        # Inner join: with settled folders left out, content only found in settled folders has no folder to go to.
         q = """ 
         INSERT INTO 
             {expected_folder_structure_table}
@@ -658,36 +1974,72 @@ class ExpectedFolderStructureEvaluator(object):
                 index_tbl.{rpht}, unique_files_tbl.{fcntht}, unique_files_tbl.{cnt}
             FROM 
                 {unique_files_table} AS unique_files_tbl
-            LEFT JOIN
-            {index_tbl} AS index_tbl ON unique_files_tbl.{fcntht} = index_tbl.{fcntht}) 
-        """.format(
-            expected_folder_structure_table=ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME,
-            rpht=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
-            fcntht=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
-            cnt="cnt",
-            unique_files_table="unique_files",
-            index_tbl="index_db.{}".format(self.index_db.table_name()))
+            JOIN
+            {index_tbl} AS index_tbl ON unique_files_tbl.{fcntht} = index_tbl.{fcntht}
+            {heavy_hitter_condition}) 
+        """
+        # Heavy hitters: the copies are collapsed to distinct folders first, the join adds the count only.
+        q_heavy_hitters = """
+        INSERT INTO
+            {expected_folder_structure_table}
+        SELECT
+            pairs.{rpht}, pairs.{fcntht}, heavy_hitter_files_tbl.{cnt}
+        FROM
+            (SELECT
+                DISTINCT {rpht}, {fcntht}
+            FROM
+                {index_tbl}
+            WHERE
+                {fcntht} IN (SELECT {fcntht} FROM {heavy_hitter_files_table})) AS pairs
+            JOIN
+            {heavy_hitter_files_table} AS heavy_hitter_files_tbl ON heavy_hitter_files_tbl.{fcntht} = pairs.{fcntht}
+        """
+        queries = [q]
+        if self._heavy_hitter_threshold > 0 \
+                and self._heavy_hitter_policy == EvaluationConfigMixin.HEAVY_HITTER_POLICY_SEPARATE:
+            queries.append(q_heavy_hitters)
+        for q in queries:
+            q = q.format(
+                expected_folder_structure_table=ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME,
+                rpht=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+                fcntht=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+                cnt="cnt",
+                unique_files_table="unique_files",
+                heavy_hitter_files_table=ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME,
+                heavy_hitter_condition="WHERE unique_files_tbl.cnt <= {}".format(self._heavy_hitter_threshold)
+                if self._heavy_hitter_threshold > 0 else "",
+                index_tbl=index_tbl)
 
-        try:
-            self.evaluation_db.cursor().execute(q)
-        except BaseException as e:
-            print(q)
-            raise e
+            try:
+                self.evaluation_db.cursor().execute(q)
+            except BaseException as e:
+                print(q)
+                raise e
+
+    ##################################################################################################
+
+    def _has_settled_folders(self) -> bool:
+        return self.evaluation_db.cursor().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME,)).fetchone() is not None
 
 
 ######################################################################################################
 
-class TODOEvaluator(object):
+class MissingFilesEvaluator(object):
+    """
+    Evaluator that compares the expected folder structure with every indexed root: a file is missing in a root if the
+    root has no file of the expected content in the expected folder (including folders missing entirely).
+    The evaluator depends on the result of ExpectedFolderStructureEvaluator.evaluate(), the real folder and file names
+    are reconstructed with the private database by ResultResolver.
+    """
     ##################################################################################################
 
-    EXPECTED_FOLDER_STRUCTURE_VIEW_NAME = "expected_folder_structure"
+    MISSING_FILES_TABLE_NAME = "missing_files"
 
     ##################################################################################################
-    """
-    Helper class that helps evaluating the file information.
-    """
 
-    def __init__(self, databases: EvaluationDataBases, evaluation_table_name: str = "expected_folder_structure"):
+    def __init__(self, databases: EvaluationDataBases, evaluation_table_name: str = "missing_files"):
         self.index_db = databases.index_db
         self.evaluation_db = databases.evaluation_db
         self._evaluation_table_name = "eval_" + evaluation_table_name  # type: str
@@ -695,80 +2047,71 @@ class TODOEvaluator(object):
     ##################################################################################################
 
     def evaluate(self):
-        self.drop_all_tables_and_views()
+        print("\n[MissingFilesEvaluator START]")
+        start_timestamp = timer()
+
+        self.reset()
+        self._insert_into_table_of_missing_files()
+        for root_path_hash_tag, num_files in self.evaluation_db.cursor().execute(
+                "SELECT {prooth}, COUNT(*) FROM {tbl} GROUP BY {prooth}".format(
+                    prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+                    tbl=MissingFilesEvaluator.MISSING_FILES_TABLE_NAME)).fetchall():
+            print("\tRoot {}: {} files missing".format(root_path_hash_tag, num_files))
+
+        print("[MissingFilesEvaluator END] Time elapsed {}".format(timedelta(seconds=timer() - start_timestamp)))
 
     ##################################################################################################
 
-    def drop_all_tables_and_views(self):
-        pass
-        # self._data_base.private_db_cursor.execute(
-        #    "DROP VIEW IF EXISTS " + UniqueFileFolderEvaluator.EXPECTED_FOLDER_STRUCTURE_VIEW_NAME)
-
-    ##################################################################################################
-
-    def create_private_result_table(self):
-        """
-        This function compares the complete (expected) folder structure with the existing one and creates a table with
-        the following columns:
-        [folder absolute path; filename of missing file from the folder; hash of missing file from the folder]
-        :return: None
-        """
-
-        # self._create_view_of_all_possible_combinations_files_folders()
-
-        # print("Create result table ...")
-        # sys.stdout.flush()
-        # self._data_base.private_db_cursor.execute(
-        #    "CREATE TABLE IF NOT EXISTS " + self._data_base.private_result_table_name +
-        #    " AS SELECT DISTINCT " +
-        #    TODOEvaluator.EXPECTED_FOLDER_STRUCTURE_VIEW_NAME + ".*" + " FROM " +
-
-        #    TODOEvaluator.EXPECTED_FOLDER_STRUCTURE_VIEW_NAME +
-
-        #    " WHERE NOT EXISTS (SELECT * FROM " +
-        #    self._data_base.private_index_table_name +
-        #    " WHERE " +
-        #    TODOEvaluator.EXPECTED_FOLDER_STRUCTURE_VIEW_NAME + "." +
-        #    DataBase.privateIndexTableColumnNames.file_hash_tag.value + " = " +
-        #    self._data_base.private_index_table_name + "." +
-        #    DataBase.privateIndexTableColumnNames.file_hash_tag.value +
-
-        #    " AND " +
-
-        #    TODOEvaluator.EXPECTED_FOLDER_STRUCTURE_VIEW_NAME + "." +
-        #    DataBase.privateIndexTableColumnNames.absolute_path.value + " = " +
-        #    self._data_base.private_index_table_name + "." +
-        #    DataBase.privateIndexTableColumnNames.absolute_path.value +
-
-        #    " );")
-
-        # --
-        #
-        # self.public_db_cursor.execute("ALTER TABLE " + self._public_result_table_name +
-        #                                " ADD COLUMN " + PublicIndexTableColumnNames.last_modification_time.value +
-        #                                " text;")
-        #
-        # self.public_db_cursor.execute("ALTER TABLE " + self._public_result_table_name +
-        #                                " ADD COLUMN " + PublicIndexTableColumnNames.creation_time.value +
-        #                                " text")
-        #
-        # self.public_db_cursor.execute(
-        #     "UPDATE " + self._public_result_table_name +
-        #
-        #     " SET " +
-        #
-        #     self._public_result_table_name + "." + PublicIndexTableColumnNames.last_modification_time.value + " = " +
-        #     self._public_index_table_name + "." + PublicIndexTableColumnNames.last_modification_time.value +
-        #
-        #     " , " +
-        #
-        #     self._public_result_table_name + "." + PublicIndexTableColumnNames.creation_time.value + " = " +
-        #     self._public_index_table_name + "." + PublicIndexTableColumnNames.creation_time.value +
-        #
-        #     " WHERE " +
-        #
-        #     self._public_index_table_name + "." + PublicIndexTableColumnNames.file_hash_tag.value +
-        #     " = " +
-        #     self._public_result_table_name + "." + PublicIndexTableColumnNames.file_hash_tag.value
-        # )
-        #
+    def reset(self):
+        self.evaluation_db.cursor().execute(
+            "DROP TABLE IF EXISTS {}".format(MissingFilesEvaluator.MISSING_FILES_TABLE_NAME))
+        q = """
+        CREATE TABLE IF NOT EXISTS {tbl}
+        (
+            {prooth} TEXT NOT NULL,
+            {prelh} TEXT NOT NULL,
+            {fconth} TEXT NOT NULL,
+            {cnt} INTEGER NOT NULL
+        )
+        """.format(tbl=MissingFilesEvaluator.MISSING_FILES_TABLE_NAME,
+                   prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+                   prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+                   fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+                   cnt="cnt")
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _insert_into_table_of_missing_files(self):
+        # The primary key of the index table (root, folder, file name) finds the files of a folder in a root.
+        q = """
+        INSERT INTO
+            {tbl}
+        SELECT
+            roots_tbl.{prooth}, expected_tbl.{prelh}, expected_tbl.{fconth}, expected_tbl.{cnt}
+        FROM
+            (SELECT DISTINCT {prooth} FROM {pub_index_tbl}) AS roots_tbl
+            CROSS JOIN
+            {expected_folder_structure_table} AS expected_tbl
+        WHERE
+            NOT EXISTS (SELECT 1 FROM {pub_index_tbl} AS index_tbl
+                        WHERE index_tbl.{prooth} = roots_tbl.{prooth}
+                            AND index_tbl.{prelh} = expected_tbl.{prelh}
+                            AND index_tbl.{fconth} = expected_tbl.{fconth})
+        """.format(
+            tbl=MissingFilesEvaluator.MISSING_FILES_TABLE_NAME,
+            expected_folder_structure_table=ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME,
+            prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+            prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+            fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value,
+            cnt="cnt",
+            pub_index_tbl="index_db.{}".format(self.index_db.table_name()))
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
@@ -1,22 +1,57 @@
 import concurrent
 import concurrent.futures
+import errno
 import hashlib
 import os
+import shutil
+import signal
 import sys
+import time
 from datetime import datetime, timedelta
 from timeit import default_timer as timer
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from magic import Magic
 
+from .adaptive_concurrency import AdaptiveConcurrencyController, ConcurrencyHints
+from .archive_reader import ARCHIVE_FORMAT_TAR, ArchiveMember, ArchiveReader, ArchiveSettings
+from .archives_config_mixin import ArchivesConfigMixin
+from .concurrency_config_mixin import ConcurrencyConfigMixin
+from .content_chunking import ChunkerSettings, ContentChunker
 from .database_helper import DataBaseIndexHelper
-from .file_type import FileType
+from .change_detection_config_mixin import ChangeDetectionConfigMixin
+from .file_type import FileType, FileIndexingError, DirectoryState, ShardedFile
+from .folder_hashing import FolderHashBuilder
 from .hashing_config_mixin import HashingConfigMixin
+from .index_shards import ShardMerger, default_shard_directory, write_to_shard
+from .io_limits_config_mixin import IoLimitsConfigMixin
+from .io_throttle import IoThrottle, init_worker, worker_throttle
 from .path_config_mixin import PathConfigMixin
+from .xattr_cache import read_cached_hash, write_cached_hash
 
 
 ##################################################################################################
 
-def calculate_hash(file_path: str, block_size: int = 10240, hash_content=True):
+# Errors worth another try, e.g. flaky USB disks or network mounts. Everything else fails immediately.
+TRANSIENT_ERRNOS = {errno.EIO, errno.EAGAIN, errno.EBUSY, errno.EINTR, errno.ETIMEDOUT, errno.ESTALE}
+
+# Attempts per file within a regular run and within a --retry-errors run.
+MAX_ATTEMPTS = 2
+RETRY_MAX_ATTEMPTS = 5
+
+# Delay before the 2nd attempt, doubled for each further attempt.
+BACKOFF_SECONDS = 0.5
+
+# Folders modified less than this before the walk started are not trusted to be unchanged in the next run: a change
+# within the same time stamp granularity (2 s on FAT) would not alter the modification time.
+RACY_MTIME_NS = 2 * 1000 * 1000 * 1000
+
+# Prefix of the content hash tag of files indexed by the metadata phase, followed by the absolute file path hash tag.
+PENDING_HASH_TAG_PREFIX = "pending:"
+
+
+##################################################################################################
+
+def calculate_hash(file_path: str, block_size: int = 10240, hash_content=True, chunker: ContentChunker = None):
     """
     Helper function that calculates the hash of a file/folder.
     If the given path is a folder: the hash of the string absolute path will be calculated
@@ -24,6 +59,7 @@ def calculate_hash(file_path: str, block_size: int = 10240, hash_content=True):
     :param file_path: complete path to file with extension
     :param block_size:
     :param hash_content: Hash the file content (True) or the file_path string (False)
+    :param chunker: Optional chunker that is fed with the same blocks as the content hash
     :return: 
     """
     hash_sum = hashlib.md5()
@@ -31,13 +67,76 @@ def calculate_hash(file_path: str, block_size: int = 10240, hash_content=True):
     if not hash_content:
         hash_sum.update(file_path.encode())
     else:
+        throttle = worker_throttle()
+        if throttle is not None:
+            throttle.acquire(0, num_operations=1)
         with open(file_path, "rb") as f:
             for block in iter(lambda: f.read(block_size), b""):
+                if throttle is not None:
+                    throttle.acquire(len(block))
                 hash_sum.update(block)
+                if chunker is not None:
+                    chunker.update(block)
+            if throttle is not None:
+                throttle.release_page_cache(f.fileno())
+
+    return hash_sum.hexdigest()
+
+
+##################################################################################################
+
+def calculate_quick_hash(file_path: str, file_size: int, sample_size: int, sample_count: int = 0):
+    """
+    Helper function that calculates the hash of the file size and a few samples of the content: head, middle, tail
+    and sample_count evenly spaced samples in between. Much faster than calculate_hash() for large files, but two
+    files with the same quick hash are duplicate candidates only.
+    :param file_path: complete path to file with extension
+    :param file_size: size of the file in bytes
+    :param sample_size: number of bytes per sample
+    :param sample_count: number of additional evenly spaced samples
+    :return:
+    """
+    hash_sum = hashlib.md5()
+    hash_sum.update("{}".format(file_size).encode())
+
+    last_offset = max(file_size - sample_size, 0)
+    offsets = {0, last_offset // 2, last_offset}
+    offsets.update(i * last_offset // (sample_count + 1) for i in range(1, sample_count + 1))
+    throttle = worker_throttle()
+    with open(file_path, "rb") as f:
+        for offset in sorted(offsets):
+            f.seek(offset)
+            sample = f.read(sample_size)
+            if throttle is not None:
+                # Every sample is a seek.
+                throttle.acquire(len(sample), num_operations=1)
+            hash_sum.update(sample)
+        if throttle is not None:
+            throttle.release_page_cache(f.fileno())
 
     return hash_sum.hexdigest()
 
 
+##################################################################################################
+
+def calculate_entry_names_digest(names: List[str]) -> str:
+    """
+    Helper function that calculates the hash of the sorted names of the files and folders in a folder.
+    """
+    hash_sum = hashlib.md5()
+    hash_sum.update(b"\0".join(sorted(os.fsencode(name) for name in names)))
+    return hash_sum.hexdigest()
+
+
+##################################################################################################
+
+def format_file_time(timestamp: float) -> str:
+    """
+    Helper function that formats a time stamp of os.stat() the way it is stored in the index.
+    """
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d-%H:%M:%S')
+
+
 ##################################################################################################
 
 class DirectoryIndexer:
@@ -45,11 +144,38 @@ class DirectoryIndexer:
     helper class that indexes all the folders found in self._directory_list.
     """
 
-    def __init__(self, paths_config: PathConfigMixin, hash_config: HashingConfigMixin):
+    def __init__(self, paths_config: PathConfigMixin, hash_config: HashingConfigMixin,
+                 concurrency_config: ConcurrencyConfigMixin = None, io_limits_config: IoLimitsConfigMixin = None,
+                 archives_config: ArchivesConfigMixin = None):
         self._directory_list = paths_config.get_folders()  # type: List[str]
         self.files_found_in_directories = []  # type: List[FileType]
+        self.file_errors = []  # type: List[FileIndexingError]
+        self.directory_states = []  # type: List[DirectoryState]
         self._hash_file_name_block_size = hash_config.get_hash_file_name_block_size()  # type: int
         self._hash_file_block_size = hash_config.get_hash_file_block_size()  # type: int
+        self._content_identity = hash_config.get_content_identity()  # type: str
+        self._quick_sample_size = hash_config.get_quick_sample_size()  # type: int
+        self._quick_sample_count = hash_config.get_quick_sample_count()  # type: int
+        self._chunker_settings = hash_config.get_chunker_settings()  # type: Optional[ChunkerSettings]
+        self._xattr_cache = hash_config.is_xattr_cache()  # type: bool
+        self._archive_settings = None if archives_config is None \
+            else archives_config.get_archive_settings()  # type: Optional[ArchiveSettings]
+
+        self._concurrency_config = concurrency_config  # type: Optional[ConcurrencyConfigMixin]
+        self._write_mode = ConcurrencyConfigMixin.WRITE_MODE_SINGLE if concurrency_config is None \
+            else concurrency_config.get_write_mode()  # type: str
+        # Set while indexing in the sharded write mode: the workers store the files there instead of returning them.
+        self._shard_directory = None  # type: Optional[str]
+        self._num_sharded_files = 0  # type: int
+        # Set while running the metadata phase of the two-phase indexing: the files are stat-ed, not read.
+        self._metadata_only = False  # type: bool
+        self._controllers = {}  # type: Dict[int, AdaptiveConcurrencyController]
+        self._concurrency_hints = None  # type: Optional[ConcurrencyHints]
+        if concurrency_config is not None and concurrency_config.is_adaptive():
+            self._concurrency_hints = ConcurrencyHints(concurrency_config.get_hints_file_path())
+        self._io_throttle = None  # type: Optional[IoThrottle]
+        if io_limits_config is not None and io_limits_config.is_limited():
+            self._io_throttle = IoThrottle(io_limits_config)
 
     ##################################################################################################
 
@@ -70,22 +196,292 @@ class DirectoryIndexer:
 
     ##################################################################################################
 
-    def scan_directories_and_insert(self, database: DataBaseIndexHelper):
+    def scan_directories_and_insert(self, database: DataBaseIndexHelper, metadata_only: bool = False):
         """
-        This function triggers the directory indexing, and inserts all the files in the provided database
+        This function triggers the directory indexing, and inserts all the files in the provided database.
+        Files that could not be indexed are stored in the error table of the private database.
+        In the sharded write mode the workers store the files in shard databases, which are merged afterwards.
         :param database:
+        :param metadata_only: Metadata phase of the two-phase indexing: the files are stored with the hash mode
+                              "pending" without reading them, see HashBackfiller
         :return:
         """
 
         print("\n[INDEXING START]")
         start_timestamp = timer()
-        print("Indexing files. This might take a few minutes. Please wait... ")
+        print("Indexing files{}. This might take a few minutes. Please wait... ".format(
+            " (metadata only)" if metadata_only else ""))
+        self._metadata_only = metadata_only
+        if self._write_mode == ConcurrencyConfigMixin.WRITE_MODE_SHARDED and not metadata_only:
+            self._shard_directory = default_shard_directory(database.private_db.database_path())
+            # Shards left over by an aborted run must not be merged.
+            shutil.rmtree(self._shard_directory, ignore_errors=True)
+            os.makedirs(self._shard_directory)
+            self._num_sharded_files = 0
         self._index_folders()
         print("[INDEXING END] Time elapsed {}.".format(timedelta(seconds=timer() - start_timestamp)))
 
+        self._insert(database)
+
+    ##################################################################################################
+
+    def retry_errors_and_insert(self, database: DataBaseIndexHelper):
+        """
+        This function re-processes only the files (and folders) stored in the error table of the database.
+        Files indexed successfully are inserted and removed from the error table, the others are updated.
+        :param database:
+        :return:
+        """
+        errors = database.get_index_errors()
+
+        print("\n[RETRY START]")
+        start_timestamp = timer()
+        self._metadata_only = False
+        print("Retrying {} files and folders that could not be indexed ...".format(len(errors)))
+
+        with self.create_executor() as executor:
+            fs = set()
+            for error in errors:
+                if error.stage == "walk":
+                    # Listing the folder failed, nothing below it has been indexed.
+                    fs, _, _ = self._walk_and_submit(executor, error.root_path, error.relative_path, fs, None,
+                                                     previous_attempts=error.attempts)
+                else:
+                    fs.add(self._submit(executor, error.root_path, error.relative_path, error.filename,
+                                        self._hash_file_block_size, RETRY_MAX_ATTEMPTS, error.attempts))
+            self._collect_results(fs, None, concurrent.futures.ALL_COMPLETED)
+            self._print_io_limits()
+
+        print("Recovered {} files, {} still failing.".format(len(self.files_found_in_directories),
+                                                             len(self.file_errors)))
+        print("[RETRY END] Time elapsed {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+        database.delete_index_errors(errors)
+        self._insert(database)
+
+    ##################################################################################################
+
+    def scan_directories_incrementally_and_insert(self, database: DataBaseIndexHelper, paranoia_level: str,
+                                                  metadata_only: bool = False):
+        """
+        This function updates the existing index with the files changed since the last run.
+        The state of every folder (modification time, number and names of its entries) is compared with the one stored
+        by the last run. Depending on the paranoia level unchanged folders are not listed and/or their files are not
+        checked, only their sub folders are visited. The files of the other folders are compared with the index by
+        modification time and size, only new and modified files are hashed. Files and folders that disappeared are
+        removed from the index.
+        :param database:
+        :param paranoia_level: One of ChangeDetectionConfigMixin.PARANOIA_LEVELS
+        :param metadata_only: Store new and modified files with the hash mode "pending" without reading them
+        :return:
+        """
+        print("\n[INCREMENTAL INDEXING START]")
+        start_timestamp = timer()
+        self._metadata_only = metadata_only
+
+        max_workers = None
+        if self._concurrency_hints is not None:
+            self._concurrency_hints.load()
+            max_workers = self._concurrency_config.get_max_workers()
+
+        with self.create_executor(max_workers) as executor:
+            for root_directory in self._directory_list:
+                print("Checking folder {} for changes ...".format(root_directory))
+                sys.stdout.flush()
+                self.files_found_in_directories = []
+                self.file_errors = []
+                self.directory_states = []
+
+                # Nothing is read in the metadata phase, its throughput says nothing about the device.
+                controller = None if self._metadata_only else self._get_controller(root_directory)
+                if len(self.file_errors) > 0:
+                    # The root folder cannot be accessed, the error is recorded already.
+                    deleted_files, deleted_folders, replaced_files = [], [], []
+                else:
+                    deleted_files, deleted_folders, replaced_files = self._walk_changed_folders_and_submit(
+                        executor, database, root_directory, controller, paranoia_level)
+                if controller is not None:
+                    self._concurrency_hints.set(root_directory, controller.to_hint())
+
+                self.delete_archive_members(database, replaced_files)
+                database.delete_files_by_hash_tags(deleted_files)
+                for relative_directory in deleted_folders:
+                    database.delete_folder(root_directory, relative_directory)
+                if len(self.files_found_in_directories) > 0:
+                    database.upsert_files_in_both_databases(self.files_found_in_directories)
+                database.delete_index_errors(self.file_errors)
+                database.insert_index_errors(self.file_errors)
+                database.delete_directory_states(root_directory)
+                database.insert_directory_states(self.directory_states)
+                if len(self.files_found_in_directories) > 0 or len(deleted_files) > 0 or len(deleted_folders) > 0:
+                    FolderHashBuilder(database).build([root_directory])
+                database.private_db.connection().commit()
+
+                print("\t{} new or modified files, {} deleted files, {} deleted folders, {} errors.".format(
+                    len(self.files_found_in_directories), len(deleted_files), len(deleted_folders),
+                    len(self.file_errors)))
+                self._print_io_limits()
+                sys.stdout.flush()
+
+        if self._concurrency_hints is not None:
+            self._concurrency_hints.save()
+        print("[INCREMENTAL INDEXING END] Time elapsed {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def _walk_changed_folders_and_submit(self, executor: concurrent.futures.Executor, database: DataBaseIndexHelper,
+                                         root_directory: str, controller: Optional[AdaptiveConcurrencyController],
+                                         paranoia_level: str) \
+            -> Tuple[List[Tuple[str, str, str]], List[str], List[Tuple[str, str, str]]]:
+        """
+        Walks the root folder, skipping unchanged folders, and submits the new and modified files for indexing.
+        :return: Tuple of (hash tags of the deleted files, relative paths of the deleted folders, modified and deleted
+                 files as (root path, relative path, filename))
+        """
+        walk_start_ns = time.time_ns()
+        previous_states = database.get_directory_states(root_directory)
+        sub_folders = {}  # type: Dict[str, List[str]]
+        for relative_directory in previous_states.keys():
+            if relative_directory != ".":
+                sub_folders.setdefault(os.path.dirname(relative_directory) or ".", []).append(relative_directory)
+
+        root_path_hash_tag = calculate_hash(root_directory, self._hash_file_name_block_size, hash_content=False)
+        deleted_files = []  # type: List[Tuple[str, str, str]]
+        deleted_folders = []  # type: List[str]
+        replaced_files = []  # type: List[Tuple[str, str, str]]
+        num_skipped = 0
+        num_listed = 0
+        num_checked_files = 0
+        fs = set()
+
+        pending = ["."]
+        while len(pending) > 0:
+            relative_directory = pending.pop()
+            folder = os.path.join(root_directory, relative_directory)
+            previous = previous_states.get(relative_directory)
+            try:
+                folder_stat = os.stat(folder)
+                if paranoia_level == ChangeDetectionConfigMixin.PARANOIA_DIRECTORY and previous is not None \
+                        and previous.mtime_ns == folder_stat.st_mtime_ns:
+                    # Nothing was added, removed or renamed in the folder, its files are not even listed.
+                    self.directory_states.append(previous)
+                    pending.extend(sub_folders.get(relative_directory, []))
+                    num_skipped += 1
+                    continue
+                with os.scandir(folder) as it:
+                    entries = list(it)
+            except OSError as e:
+                self._record_walk_error(root_directory, relative_directory, e)
+                continue
+            num_listed += 1
+
+            state = self._directory_state(root_directory, relative_directory, folder_stat,
+                                          [entry.name for entry in entries], walk_start_ns)
+            self.directory_states.append(state)
+            # Same walk as os.walk(): symbolic links to folders are neither followed nor indexed.
+            folder_names = set()
+            files = []
+            for entry in entries:
+                try:
+                    is_folder = entry.is_dir()
+                except OSError:
+                    is_folder = False
+                if not is_folder:
+                    files.append(entry.name)
+                elif not entry.is_symlink():
+                    folder_names.add(entry.name)
+            pending.extend(os.path.normpath(os.path.join(relative_directory, name)) for name in folder_names)
+            deleted_folders.extend(path for path in sub_folders.get(relative_directory, [])
+                                   if os.path.basename(path) not in folder_names)
+
+            if paranoia_level != ChangeDetectionConfigMixin.PARANOIA_FILES and previous is not None \
+                    and previous.mtime_ns == folder_stat.st_mtime_ns \
+                    and previous.entry_count == state.entry_count \
+                    and previous.entry_names_digest == state.entry_names_digest:
+                continue
+
+            relative_path_hash_tag = calculate_hash(relative_directory, self._hash_file_name_block_size,
+                                                    hash_content=False)
+            indexed = database.get_indexed_file_states_in_folder(root_path_hash_tag, relative_path_hash_tag)
+            for file_name in files:
+                num_checked_files += 1
+                indexed_state = indexed.pop(file_name, None)
+                if indexed_state is not None:
+                    try:
+                        file_stat = os.stat(os.path.join(folder, file_name))
+                        if indexed_state[:2] == (format_file_time(file_stat.st_mtime), file_stat.st_size):
+                            continue
+                    except OSError:
+                        # Reported by the indexing of the file.
+                        pass
+                    replaced_files.append((root_directory, relative_directory, file_name))
+                if controller is not None:
+                    while len(fs) >= controller.workers:
+                        fs = self._collect_results(fs, controller, concurrent.futures.FIRST_COMPLETED)
+                block_size = self._hash_file_block_size if controller is None else controller.block_size
+                fs.add(self._submit(executor, root_directory, relative_directory, file_name, block_size,
+                                    MAX_ATTEMPTS, 0))
+            deleted_files.extend((root_path_hash_tag, relative_path_hash_tag, fnameh)
+                                 for _, _, fnameh in indexed.values())
+            replaced_files.extend((root_directory, relative_directory, file_name) for file_name in indexed.keys())
+
+        self._collect_results(fs, controller, concurrent.futures.ALL_COMPLETED)
+        print("\t{} unchanged folders skipped, {} folders listed, {} files checked.".format(
+            num_skipped, num_listed, num_checked_files))
+        return deleted_files, deleted_folders, replaced_files
+
+    ##################################################################################################
+
+    def index_files(self, executor: concurrent.futures.Executor, files: List[Tuple[str, str, str]]) \
+            -> Tuple[List[FileType], List[FileIndexingError]]:
+        """
+        Indexes the given files only, e.g. the files changed since the last indexing.
+        :param files: List of (root path, relative path, filename)
+        :return: Tuple of (indexed files, files that could not be indexed)
+        """
+        self.files_found_in_directories = []
+        self.file_errors = []
+        self._metadata_only = False
+        fs = {self._submit(executor, root_directory, relative_directory, file_name, self._hash_file_block_size,
+                           MAX_ATTEMPTS, 0)
+              for root_directory, relative_directory, file_name in files}
+        self._collect_results(fs, None, concurrent.futures.ALL_COMPLETED)
+        return self.files_found_in_directories, self.file_errors
+
+    ##################################################################################################
+
+    def delete_archive_members(self, database: DataBaseIndexHelper, files: List[Tuple[str, str, str]]):
+        """
+        Removes the indexed members of the given files that are archives, e.g. before the archives are indexed again or
+        after they were deleted. The members are stored below the virtual folder named like the archive.
+        :param files: List of (root path, relative path, filename)
+        """
+        if self._archive_settings is None:
+            return
+        for root_directory, relative_directory, file_name in files:
+            if self._archive_settings.is_archive(file_name):
+                database.delete_folder(root_directory, os.path.normpath(os.path.join(relative_directory, file_name)))
+
+    ##################################################################################################
+
+    def _insert(self, database: DataBaseIndexHelper):
         print("\n[DATABASE TRANSACTIONS START]")
         start_timestamp = timer()
-        database.insert_files_in_both_databases(self.files_found_in_directories)
+        if self._shard_directory is not None:
+            num_merged_files = ShardMerger(database).merge(self._shard_directory)
+            if num_merged_files != self._num_sharded_files:
+                print("WARNING: {} files were indexed, but {} files were merged from the shards."
+                      .format(self._num_sharded_files, num_merged_files))
+            self._shard_directory = None
+        if len(self.files_found_in_directories) > 0:
+            database.insert_files_in_both_databases(self.files_found_in_directories)
+        database.insert_index_errors(self.file_errors)
+        database.insert_directory_states(self.directory_states)
+        database.private_db.create_lookup_indexes()
+        FolderHashBuilder(database).build()
+        if len(self.file_errors) > 0:
+            print("WARNING: {} files or folders could not be indexed. See table '{}' and use --retry-errors."
+                  .format(len(self.file_errors), database.private_db.index_errors_table_name()))
         print("[DATABASE TRANSACTIONS END] Time elapsed {}.".format(timedelta(seconds=timer() - start_timestamp)))
 
     ##################################################################################################
@@ -93,67 +489,393 @@ class DirectoryIndexer:
     def _index_folders(self):
         """
         This function indexes all the directories found in self._directory_list. The output is a list of
-        FileType objects.
+        FileType objects and a list of FileIndexingError objects for the files that could not be indexed.
+        If adaptive concurrency is configured the number of files hashed concurrently and the block size are tuned
+        per device at runtime, otherwise all files are submitted at once to the default process pool.
         :return: int Number of files indexed
         """
 
         num_total_processed_files = 0
         num_total_folders = 0
 
-        with concurrent.futures.ProcessPoolExecutor() as executor:
+        max_workers = None
+        if self._concurrency_hints is not None:
+            self._concurrency_hints.load()
+            max_workers = self._concurrency_config.get_max_workers()
+
+        with self.create_executor(max_workers) as executor:
             for root_directory in self._directory_list:
-                fs = []
-                num_processed_files = 0
-                num_folders = 0
-                num_results = 0
-                num_tasks = 0
                 print("Indexing folder {} ...".format(root_directory))
                 sys.stdout.flush()
-                for rel_dir, dirs, files in os.walk(root_directory):
-                    rel_dir = os.path.relpath(rel_dir, root_directory)
-
-                    # index files in top level in the current directory
-                    for file_name in files:
-                        num_tasks += 1
-                        fs.append(executor.submit(
-                            _generate_file_information, root_directory, rel_dir, file_name,
-                            self._hash_file_name_block_size, self._hash_file_block_size))
-
-                    num_processed_files += len(files)
-                    num_folders += len(dirs)
-
-                for future in concurrent.futures.as_completed(fs):
-                    assert not future.cancelled()
-                    self.files_found_in_directories.append(future.result())
-                    num_results += 1
+                num_errors = len(self.file_errors)
+                # Nothing is read in the metadata phase, its throughput says nothing about the device.
+                controller = None if self._metadata_only else self._get_controller(root_directory)
+                if len(self.file_errors) > num_errors:
+                    # The root folder cannot be accessed, the error is recorded already.
+                    num_processed_files, num_folders = 0, 0
+                else:
+                    fs, num_processed_files, num_folders = self._walk_and_submit(
+                        executor, root_directory, ".", set(), controller)
+                    self._collect_results(fs, controller, concurrent.futures.ALL_COMPLETED)
 
                 print("\tProcessed {} files in {} folders.".format(num_processed_files, num_folders))
+                if controller is not None:
+                    print("\tSettings for {}: workers={}, block_size={}."
+                          .format(root_directory, controller.workers, controller.block_size))
+                    self._concurrency_hints.set(root_directory, controller.to_hint())
+                self._print_io_limits()
                 sys.stdout.flush()
                 num_total_processed_files += num_processed_files
                 num_total_folders += num_folders
 
-        print("Indexed overall {o} files in {f} folders ({i} items total)."
+        if self._concurrency_hints is not None:
+            self._concurrency_hints.save()
+
+        print("Indexed overall {o} files in {f} folders ({i} items total), {e} errors."
               .format(o=num_total_processed_files,
                       f=num_total_folders,
-                      i=(num_total_processed_files + num_total_folders)))
+                      i=(num_total_processed_files + num_total_folders),
+                      e=len(self.file_errors)))
 
     ##################################################################################################
 
+    def _walk_and_submit(self, executor: concurrent.futures.Executor, root_directory: str, relative_directory: str,
+                         fs: set, controller: Optional[AdaptiveConcurrencyController], previous_attempts: int = 0):
+        """
+        Walks the folder relative_directory below root_directory and submits all files found for indexing.
+        Folders that cannot be listed are recorded as errors of the stage "walk".
+        :return: Tuple of (pending futures, number of files, number of folders)
+        """
+        num_processed_files = 0
+        num_folders = 0
+        walk_start_ns = time.time_ns()
+
+        def on_walk_error(e: OSError):
+            self._record_walk_error(root_directory, os.path.relpath(e.filename, root_directory), e, previous_attempts)
+
+        for rel_dir, dirs, files in os.walk(os.path.join(root_directory, relative_directory), onerror=on_walk_error):
+            try:
+                folder_stat = os.stat(rel_dir)
+            except OSError:
+                folder_stat = None
+            rel_dir = os.path.relpath(rel_dir, root_directory)
+            self.directory_states.append(
+                self._directory_state(root_directory, rel_dir, folder_stat, dirs + files, walk_start_ns))
+
+            # index files in top level in the current directory
+            for file_name in files:
+                if controller is not None:
+                    while len(fs) >= controller.workers:
+                        fs = self._collect_results(fs, controller, concurrent.futures.FIRST_COMPLETED)
+                block_size = self._hash_file_block_size if controller is None else controller.block_size
+                fs.add(self._submit(executor, root_directory, rel_dir, file_name, block_size,
+                                    RETRY_MAX_ATTEMPTS if previous_attempts > 0 else MAX_ATTEMPTS, previous_attempts))
+
+            num_processed_files += len(files)
+            num_folders += len(dirs)
+
+        return fs, num_processed_files, num_folders
+
+    ##################################################################################################
+
+    def _record_walk_error(self, root_directory: str, relative_directory: str, e: OSError, previous_attempts: int = 0):
+        """
+        Records a folder that cannot be listed. Its state is stored as untrusted, so that it is listed again by the
+        next incremental run.
+        """
+        print("\tERROR: Cannot list folder '{}' ({}).".format(os.path.join(root_directory, relative_directory), e))
+        self.file_errors.append(FileIndexingError(
+            root_path=root_directory,
+            relative_path=relative_directory,
+            filename="",
+            stage="walk",
+            error_number=e.errno,
+            error_message=str(e),
+            attempts=previous_attempts + 1))
+        self.directory_states.append(DirectoryState(root_path=root_directory, relative_path=relative_directory))
+
+    ##################################################################################################
+
+    @staticmethod
+    def _directory_state(root_directory: str, relative_directory: str, folder_stat: Optional[os.stat_result],
+                         names: List[str], walk_start_ns: int) -> DirectoryState:
+        mtime_ns = -1
+        if folder_stat is not None and folder_stat.st_mtime_ns < walk_start_ns - RACY_MTIME_NS:
+            mtime_ns = folder_stat.st_mtime_ns
+        return DirectoryState(root_path=root_directory,
+                              relative_path=relative_directory,
+                              mtime_ns=mtime_ns,
+                              entry_count=len(names),
+                              entry_names_digest=calculate_entry_names_digest(names))
+
+    ##################################################################################################
+
+    def create_executor(self, max_workers: int = None, ignore_signals: bool = False) \
+            -> concurrent.futures.ProcessPoolExecutor:
+        """
+        Creates the process pool hashing the files, its workers are throttled if I/O limits are configured.
+        :param ignore_signals: The workers ignore SIGINT and SIGTERM, e.g. so that a service stopped by a signal to its
+                               process group can still index the pending changes before it exits
+        """
+        if self._io_throttle is None and not ignore_signals:
+            return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        if self._io_throttle is not None:
+            print("\tI/O limits: {}.".format(self._io_throttle.describe()))
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                                      initargs=(self._io_throttle, ignore_signals))
+
+    ##################################################################################################
+
+    def _print_io_limits(self):
+        if self._io_throttle is not None:
+            print("\tI/O limits: {}, workers throttled for {} so far.".format(
+                self._io_throttle.describe(), timedelta(seconds=self._io_throttle.throttled_seconds())))
+
+    ##################################################################################################
+
+    def _submit(self, executor: concurrent.futures.Executor, root_directory: str, relative_directory: str,
+                file_name: str, block_size: int, max_attempts: int, previous_attempts: int) -> concurrent.futures.Future:
+        if self._metadata_only:
+            # A stat() is cheaper than handing the file to a worker process.
+            future = concurrent.futures.Future()
+            future.set_result(_index_file(root_directory, relative_directory, file_name,
+                                          self._hash_file_name_block_size, block_size, max_attempts, previous_attempts,
+                                          HashingConfigMixin.CONTENT_IDENTITY_PENDING))
+            return future
+        if self._shard_directory is not None:
+            return executor.submit(
+                _index_file_into_shard, self._shard_directory, root_directory, relative_directory, file_name,
+                self._hash_file_name_block_size, block_size, max_attempts, previous_attempts,
+                self._content_identity, self._quick_sample_size, self._quick_sample_count, self._chunker_settings,
+                self._xattr_cache, self._archive_settings)
+        return executor.submit(
+            _index_file, root_directory, relative_directory, file_name,
+            self._hash_file_name_block_size, block_size, max_attempts, previous_attempts,
+            self._content_identity, self._quick_sample_size, self._quick_sample_count, self._chunker_settings,
+            self._xattr_cache, self._archive_settings)
+
+    ##################################################################################################
+
+    def _collect_results(self, fs: set, controller: Optional[AdaptiveConcurrencyController], return_when: str) -> set:
+        """
+        Waits for the submitted futures and stores their results.
+        :return: Set of futures that are still pending
+        """
+        done, pending = concurrent.futures.wait(fs, return_when=return_when)
+        for future in done:
+            assert not future.cancelled()
+            file_information = future.result()
+            if isinstance(file_information, FileIndexingError):
+                print("\tERROR: Cannot index '{}' ({}: {}).".format(
+                    os.path.join(file_information.root_path, file_information.relative_path,
+                                 file_information.filename),
+                    file_information.stage, file_information.error_message))
+                self.file_errors.append(file_information)
+                continue
+            if isinstance(file_information, ShardedFile):
+                self._num_sharded_files += file_information.file_count
+            else:
+                self.files_found_in_directories.append(file_information)
+                if file_information.archive_members is not None:
+                    self.files_found_in_directories.extend(file_information.archive_members)
+            if controller is not None:
+                controller.record(file_information.file_size)
+        return pending
+
+    ##################################################################################################
+
+    def _get_controller(self, root_directory: str) -> Optional[AdaptiveConcurrencyController]:
+        """
+        Returns the concurrency controller of the device the root folder resides on. Folders on the same device share
+        one controller. The initial settings are taken from the hints of the previous run if available.
+        A root folder that cannot be accessed is recorded as error of the stage "walk" and gets no controller.
+        """
+        if self._concurrency_hints is None:
+            return None
+
+        try:
+            device_id = os.stat(root_directory).st_dev
+        except OSError as e:
+            self._record_walk_error(root_directory, ".", e)
+            return None
+        if device_id not in self._controllers:
+            hint = self._concurrency_hints.get(root_directory) or {}
+            self._controllers[device_id] = AdaptiveConcurrencyController(
+                device_id,
+                workers=hint.get("workers", os.cpu_count() or 1),
+                block_size=hint.get("block_size", self._hash_file_block_size),
+                concurrency_config=self._concurrency_config)
+            print("\tDevice {}: starting with workers={}, block_size={}{}."
+                  .format(device_id, self._controllers[device_id].workers, self._controllers[device_id].block_size,
+                          " (from hints)" if len(hint) > 0 else ""))
+        return self._controllers[device_id]
+
+    ##################################################################################################
+
+
+def _init_worker(throttle: Optional[IoThrottle], ignore_signals: bool):
+    """
+    Process pool initializer, see DirectoryIndexer.create_executor().
+    """
+    if ignore_signals:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if throttle is not None:
+        init_worker(throttle)
+
+
+##################################################################################################
+
+class IndexingStageError(Exception):
+    """
+    Raised by _generate_file_information(), tells in which stage the indexing of a file failed.
+    """
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__("{}: {}".format(stage, error))
+        self.stage = stage
+        self.error = error
+
+
+##################################################################################################
+
+def _index_file(root_directory: str, relative_directory: str, file_name: str,
+                hash_file_name_block_size: int,
+                hash_file_block_size: int,
+                max_attempts: int = MAX_ATTEMPTS,
+                previous_attempts: int = 0,
+                content_identity: str = HashingConfigMixin.CONTENT_IDENTITY_FULL,
+                quick_sample_size: int = 0,
+                quick_sample_count: int = 0,
+                chunker_settings: ChunkerSettings = None,
+                xattr_cache: bool = False,
+                archive_settings: ArchiveSettings = None):
+    """
+    Process pool entry point: indexes a single file and never raises.
+    Transient I/O errors are retried with exponential backoff.
+    In the content identity mode "quick" files larger than the samples get a quick hash only.
+    In the content identity mode "pending" (metadata phase) neither mime type nor content are read.
+    With chunker settings, fully hashed files of at least chunker_settings.min_file_size bytes are chunked as well.
+    With the xattr cache the content hash stored in the extended attribute of an unchanged file is used instead of
+    reading the file, newly calculated content hashes are stored there.
+    With archive settings the members of archives are indexed as well, see FileType.archive_members.
+    :return: FileType on success, FileIndexingError otherwise
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return _generate_file_information(root_directory, relative_directory, file_name,
+                                              hash_file_name_block_size, hash_file_block_size,
+                                              content_identity, quick_sample_size, quick_sample_count,
+                                              chunker_settings, xattr_cache, archive_settings)
+        except IndexingStageError as e:
+            error_number = getattr(e.error, "errno", None)
+            if error_number in TRANSIENT_ERRNOS and attempt < max_attempts:
+                time.sleep(BACKOFF_SECONDS * (2 ** (attempt - 1)))
+                continue
+            return FileIndexingError(
+                root_path=root_directory,
+                relative_path=relative_directory,
+                filename=file_name,
+                stage=e.stage,
+                error_number=error_number,
+                error_message=str(e.error),
+                attempts=previous_attempts + attempt)
+
+
+##################################################################################################
+
+def _index_file_into_shard(shard_directory: str, *args):
+    """
+    Process pool entry point of the sharded write mode: indexes a single file like _index_file() and stores it in the
+    shard database of the worker process.
+    :return: ShardedFile on success, FileIndexingError otherwise
+    """
+    file_information = _index_file(*args)
+    if isinstance(file_information, FileIndexingError):
+        return file_information
+    write_to_shard(shard_directory, file_information)
+    for member in file_information.archive_members or []:
+        write_to_shard(shard_directory, member)
+    return ShardedFile(file_size=file_information.file_size,
+                       file_count=1 + len(file_information.archive_members or []))
+
+
+##################################################################################################
 
 def _generate_file_information(root_directory: str, relative_directory: str, file_name: str,
                                hash_file_name_block_size: int,
-                               hash_file_block_size: int):
+                               hash_file_block_size: int,
+                               content_identity: str = HashingConfigMixin.CONTENT_IDENTITY_FULL,
+                               quick_sample_size: int = 0,
+                               quick_sample_count: int = 0,
+                               chunker_settings: ChunkerSettings = None,
+                               xattr_cache: bool = False,
+                               archive_settings: ArchiveSettings = None):
     folder_absolute_path = os.path.join(root_directory, relative_directory)
     file_absoute_path = os.path.join(folder_absolute_path, file_name)
 
-    # fbasename = file_name.split('.')[0],
-    fext = ["" if len(fext) <= 1 else fext[-1] for fext in [file_name.split('.')]][0]
-    fmime = Magic(mime=True).from_file(file_absoute_path)
-    file_size_bytes = os.stat(file_absoute_path).st_size
-    ctime = datetime.fromtimestamp(
-        os.stat(file_absoute_path).st_ctime).strftime('%Y-%m-%d-%H:%M:%S')
-    mtime = datetime.fromtimestamp(
-        os.stat(file_absoute_path).st_mtime).strftime('%Y-%m-%d-%H:%M:%S')
+    stage = "stat"
+    try:
+        # fbasename = file_name.split('.')[0],
+        fext = ["" if len(fext) <= 1 else fext[-1] for fext in [file_name.split('.')]][0]
+        file_stat = os.stat(file_absoute_path)
+        file_size_bytes = file_stat.st_size
+        ctime = format_file_time(file_stat.st_ctime)
+        mtime = format_file_time(file_stat.st_mtime)
+
+        is_pending = content_identity == HashingConfigMixin.CONTENT_IDENTITY_PENDING
+
+        stage = "mime"
+        fmime = "" if is_pending else Magic(mime=True).from_file(file_absoute_path)
+
+        stage = "hash"
+        chunks = None
+        members = None  # type: Optional[List[ArchiveMember]]
+        archive_format = None if archive_settings is None or is_pending \
+            else archive_settings.archive_format(file_name, file_size_bytes)
+        archive_reader = None if archive_format is None else ArchiveReader(archive_settings, hash_file_block_size)
+        is_chunked = chunker_settings is not None and file_size_bytes >= chunker_settings.min_file_size
+        # Files not larger than the samples are hashed completely anyway.
+        is_quick = content_identity == HashingConfigMixin.CONTENT_IDENTITY_QUICK \
+            and file_size_bytes > quick_sample_size * (quick_sample_count + 3)
+        # The cache holds full hashes: a quick hash of an identical copy without the attribute would never match it.
+        cached_hash_tag = read_cached_hash(file_absoute_path, file_stat) \
+            if xattr_cache and not is_pending and not is_quick else None
+        if is_pending:
+            # Unique per file, so that neither files nor folders with pending contents are taken as identical.
+            file_content_hash_mode = HashingConfigMixin.CONTENT_IDENTITY_PENDING
+            file_content_hash_tag = PENDING_HASH_TAG_PREFIX + calculate_hash(
+                file_absoute_path, hash_file_name_block_size, hash_content=False)
+        elif cached_hash_tag is not None and not is_chunked:
+            # Hashed completely before and not modified since, the chunks however require reading the file.
+            file_content_hash_mode = HashingConfigMixin.CONTENT_IDENTITY_FULL
+            file_content_hash_tag = cached_hash_tag
+        elif is_quick:
+            file_content_hash_mode = HashingConfigMixin.CONTENT_IDENTITY_QUICK
+            file_content_hash_tag = calculate_quick_hash(file_absoute_path, file_size_bytes,
+                                                         quick_sample_size, quick_sample_count)
+        else:
+            file_content_hash_mode = HashingConfigMixin.CONTENT_IDENTITY_FULL
+            chunker = ContentChunker(chunker_settings) if is_chunked else None
+            if archive_format == ARCHIVE_FORMAT_TAR:
+                # The archive is hashed in the same sequential pass as its members.
+                stage = "archive"
+                file_content_hash_tag, members = archive_reader.read_tar_file(file_absoute_path, chunker)
+            else:
+                file_content_hash_tag = calculate_hash(file_absoute_path, hash_file_block_size, hash_content=True,
+                                                       chunker=chunker)
+            if chunker is not None:
+                chunks = chunker.finish()
+            if xattr_cache and file_content_hash_tag != cached_hash_tag:
+                write_cached_hash(file_absoute_path, file_content_hash_tag, file_stat)
+
+        if archive_format is not None and members is None:
+            stage = "archive"
+            members = archive_reader.read_file(file_absoute_path, archive_format)
+    except Exception as e:
+        raise IndexingStageError(stage, e)
 
     return FileType(
         root_path=root_directory,
@@ -166,9 +888,46 @@ def _generate_file_information(root_directory: str, relative_directory: str, fil
         relative_path_hash_tag=calculate_hash(relative_directory, hash_file_name_block_size, hash_content=False),
         filename_hash_tag=calculate_hash(file_name, hash_file_name_block_size, hash_content=False),
         absolute_file_path_hash_tag=calculate_hash(file_absoute_path, hash_file_name_block_size, hash_content=False),
-        file_content_hash_tag=calculate_hash(file_absoute_path, hash_file_block_size, hash_content=True),
+        file_content_hash_tag=file_content_hash_tag,
 
         creation_time=ctime,
         last_modification_time=mtime,
-        file_size=file_size_bytes
+        file_size=file_size_bytes,
+        file_content_hash_mode=file_content_hash_mode,
+        chunks=chunks,
+        archive_members=None if members is None else [
+            _archive_member_information(root_directory, os.path.join(relative_directory, file_name), m,
+                                        hash_file_name_block_size) for m in members]
+    )
+
+
+##################################################################################################
+
+def _archive_member_information(root_directory: str, archive_path: str, member: ArchiveMember,
+                                hash_file_name_block_size: int) -> FileType:
+    """
+    Helper function that turns a member of an archive into a file of the virtual folder named like the archive,
+    e.g. member "docs/a.txt" of "x/backup.zip" into "a.txt" in "x/backup.zip/docs".
+    """
+    relative_directory, file_name = os.path.split(os.path.normpath(os.path.join(archive_path, *member.path.split("/"))))
+    file_absoute_path = os.path.join(root_directory, relative_directory, file_name)
+    mtime = format_file_time(member.mtime)
+    return FileType(
+        root_path=root_directory,
+        relative_path=relative_directory,
+        filename=file_name,
+        file_extension=["" if len(fext) <= 1 else fext[-1] for fext in [file_name.split('.')]][0],
+        file_mime_type=member.mime_type,
+
+        root_path_hash_tag=calculate_hash(root_directory, hash_file_name_block_size, hash_content=False),
+        relative_path_hash_tag=calculate_hash(relative_directory, hash_file_name_block_size, hash_content=False),
+        filename_hash_tag=calculate_hash(file_name, hash_file_name_block_size, hash_content=False),
+        absolute_file_path_hash_tag=calculate_hash(file_absoute_path, hash_file_name_block_size, hash_content=False),
+        file_content_hash_tag=member.content_hash_tag,
+
+        # An archive keeps the modification time of its members only.
+        creation_time=mtime,
+        last_modification_time=mtime,
+        file_size=member.size,
+        file_content_hash_mode=HashingConfigMixin.CONTENT_IDENTITY_ARCHIVED
     )
@@ -0,0 +1,158 @@
+import concurrent
+import concurrent.futures
+import os
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import List, Optional, Tuple
+
+from .database_helper import DataBaseIndexHelper, PrivateDataBase, PublicDataBase
+from .directory_indexer import calculate_hash
+from .folder_hashing import FolderHashBuilder
+from .hashing_config_mixin import HashingConfigMixin
+from .io_limits_config_mixin import IoLimitsConfigMixin
+from .io_throttle import IoThrottle, init_worker
+from .xattr_cache import read_cached_hash, write_cached_hash
+
+
+##################################################################################################
+
+def _full_hash(file_path: str, block_size: int, xattr_cache: bool = False) -> Optional[str]:
+    """
+    Process pool entry point: full content hash of a file, None if the file cannot be read (anymore).
+    """
+    try:
+        if not xattr_cache:
+            return calculate_hash(file_path, block_size, hash_content=True)
+        file_stat = os.stat(file_path)
+        file_content_hash_tag = read_cached_hash(file_path, file_stat)
+        if file_content_hash_tag is None:
+            file_content_hash_tag = calculate_hash(file_path, block_size, hash_content=True)
+            write_cached_hash(file_path, file_content_hash_tag, file_stat)
+        return file_content_hash_tag
+    except OSError as e:
+        print("\tERROR: Cannot verify '{}' ({}).".format(file_path, e))
+        return None
+
+
+##################################################################################################
+
+class DuplicateVerifier(object):
+    """
+    Upgrades the rows indexed in the content identity mode "quick" whose quick hash is shared with other files or
+    whose size is shared with a fully hashed file (e.g. upgraded before, indexed in the mode "full" or an archive
+    member): the candidates are hashed completely and the rows are updated in place in the private and the public
+    table (file_content_hash_tag and file_content_hash_mode = "full"). Quick hashes that are unique are left as they
+    are, a file without any candidate cannot have a duplicate. The folder hashes are rebuilt afterwards.
+    """
+
+    ##################################################################################################
+
+    BATCH_SIZE = 1000
+
+    ##################################################################################################
+
+    def __init__(self, database: DataBaseIndexHelper, hash_config: HashingConfigMixin,
+                 io_limits_config: IoLimitsConfigMixin = None):
+        self._database = database  # type: DataBaseIndexHelper
+        self._hash_file_block_size = hash_config.get_hash_file_block_size()  # type: int
+        self._xattr_cache = hash_config.is_xattr_cache()  # type: bool
+        self._io_throttle = None  # type: Optional[IoThrottle]
+        if io_limits_config is not None and io_limits_config.is_limited():
+            self._io_throttle = IoThrottle(io_limits_config)
+
+    ##################################################################################################
+
+    def verify(self):
+        print("\n[VERIFY DUPLICATES START]")
+        start_timestamp = timer()
+
+        candidates = self._get_candidates()
+        print("Hashing {} duplicate candidates completely ...".format(len(candidates)))
+
+        num_upgraded = 0
+        executor_arguments = {}
+        if self._io_throttle is not None:
+            print("\tI/O limits: {}.".format(self._io_throttle.describe()))
+            executor_arguments = {"initializer": init_worker, "initargs": (self._io_throttle,)}
+        with concurrent.futures.ProcessPoolExecutor(**executor_arguments) as executor:
+            for start in range(0, len(candidates), DuplicateVerifier.BATCH_SIZE):
+                batch = candidates[start:start + DuplicateVerifier.BATCH_SIZE]
+                hashes = executor.map(_full_hash,
+                                      [os.path.join(c[0], c[1], c[2]) for c in batch],
+                                      [self._hash_file_block_size] * len(batch),
+                                      [self._xattr_cache] * len(batch))
+                rows = [(h, c[3], c[4], c[5]) for c, h in zip(batch, hashes) if h is not None]
+                self._upgrade_rows(rows)
+                num_upgraded += len(rows)
+
+        print("Upgraded {} rows to full hashes, {} could not be verified.".format(
+            num_upgraded, len(candidates) - num_upgraded))
+        if num_upgraded > 0:
+            FolderHashBuilder(self._database).build()
+        print("[VERIFY DUPLICATES END] Time elapsed {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def _get_candidates(self) -> List[Tuple[str, str, str, str, str, str]]:
+        """
+        :return: List of (root path, relative path, filename, root path hash tag, relative path hash tag,
+                 filename hash tag) of the quick hashed files whose quick hash is not unique or whose size is the one
+                 of a fully hashed file
+        """
+        q = """
+        SELECT
+            {proot}, {prel}, {fname}, {prooth}, {prelh}, {fnameh}
+        FROM
+            {tbl}
+        WHERE
+            {fhmode} = ?
+            AND ({fconth} IN (
+                    SELECT {fconth} FROM {tbl} WHERE {fhmode} = ? GROUP BY {fconth} HAVING COUNT(*) > 1)
+                OR {fsize} IN (SELECT {fsize} FROM {tbl} WHERE {fhmode} IN (?, ?)))
+        ORDER BY
+            {fconth}
+        """.format(
+            tbl=self._database.private_db.table_name(),
+            proot=PrivateDataBase.PrivateIndexTableColumnNames.root_path.value,
+            prel=PrivateDataBase.PrivateIndexTableColumnNames.relative_path.value,
+            fname=PrivateDataBase.PrivateIndexTableColumnNames.filename.value,
+            prooth=PrivateDataBase.PrivateIndexTableColumnNames.root_path_hash_tag.value,
+            prelh=PrivateDataBase.PrivateIndexTableColumnNames.relative_path_hash_tag.value,
+            fnameh=PrivateDataBase.PrivateIndexTableColumnNames.filename_hash_tag.value,
+            fconth=PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_tag.value,
+            fsize=PrivateDataBase.PrivateIndexTableColumnNames.file_size.value,
+            fhmode=PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_mode.value)
+        return self._database.private_db.cursor().execute(
+            q, (HashingConfigMixin.CONTENT_IDENTITY_QUICK, HashingConfigMixin.CONTENT_IDENTITY_QUICK,
+                HashingConfigMixin.CONTENT_IDENTITY_FULL, HashingConfigMixin.CONTENT_IDENTITY_ARCHIVED)).fetchall()
+
+    ##################################################################################################
+
+    def _upgrade_rows(self, rows: List[Tuple[str, str, str, str]]):
+        """
+        :param rows: List of (full hash, root path hash tag, relative path hash tag, filename hash tag)
+        """
+        for tbl, column_names in [(self._database.private_db.table_name(), PrivateDataBase.PrivateIndexTableColumnNames),
+                                  ("public." + self._database.public_db.table_name(),
+                                   PublicDataBase.PublicIndexTableColumnNames)]:
+            q = """
+            UPDATE
+                {tbl}
+            SET
+                {fconth} = ?, {fhmode} = ?
+            WHERE
+                {prooth} = ? AND {prelh} = ? AND {fnameh} = ?
+            """.format(
+                tbl=tbl,
+                fconth=column_names.file_content_hash_tag.value,
+                fhmode=column_names.file_content_hash_mode.value,
+                prooth=column_names.root_path_hash_tag.value,
+                prelh=column_names.relative_path_hash_tag.value,
+                fnameh=column_names.filename_hash_tag.value)
+            try:
+                self._database.private_db.cursor().executemany(
+                    q, [(row[0], HashingConfigMixin.CONTENT_IDENTITY_FULL) + tuple(row[1:]) for row in rows])
+            except BaseException as e:
+                print(q)
+                raise e
+        self._database.private_db.connection().commit()
@@ -10,11 +10,51 @@ class EvaluationConfigMixin(object):
     SECTION_NAME = "evaluation"
     EVALUATION_DB_CONFIG_FIELD_NAME = "evaluation_database_file_path"
     DEFAULT_EVALUATION_DB_NAME = "evaluation_database.sqlite"
+    SKIP_IDENTICAL_SUBTREES_FIELD_NAME = "skip_identical_subtrees"
+    SIMILARITY_THRESHOLD_FIELD_NAME = "similarity_threshold"
+    MINHASH_PERMUTATIONS_FIELD_NAME = "minhash_permutations"
+    LSH_BANDS_FIELD_NAME = "lsh_bands"
+    SIMILARITY_MIN_FILES_FIELD_NAME = "similarity_min_files"
+    CHUNK_SIMILARITY_THRESHOLD_FIELD_NAME = "chunk_similarity_threshold"
+    HEAVY_HITTER_THRESHOLD_FIELD_NAME = "heavy_hitter_threshold"
+    HEAVY_HITTER_POLICY_FIELD_NAME = "heavy_hitter_policy"
+
+    # separate: the folders of heavy hitter contents are computed by a dedicated query and kept in the results.
+    # exclude:  heavy hitter contents are left out of the expected folder structure, they are only reported.
+    HEAVY_HITTER_POLICY_SEPARATE = "separate"
+    HEAVY_HITTER_POLICY_EXCLUDE = "exclude"
+    HEAVY_HITTER_POLICIES = [HEAVY_HITTER_POLICY_SEPARATE, HEAVY_HITTER_POLICY_EXCLUDE]
 
     ##################################################################################################
     def __init__(self, config_parser: ConfigParser):
         self._parser = config_parser  # type: ConfigParser
         self._evaluation_database_file_path = ""  # type: str
+        self._skip_identical_subtrees = False  # type: bool
+        self._similarity_threshold = 0.9  # type: float
+        self._minhash_permutations = 128  # type: int
+        self._lsh_bands = 16  # type: int
+        self._similarity_min_files = 2  # type: int
+        self._chunk_similarity_threshold = 0.5  # type: float
+        self._heavy_hitter_threshold = 10000  # type: int
+        self._heavy_hitter_policy = EvaluationConfigMixin.HEAVY_HITTER_POLICY_SEPARATE  # type: str
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.read_evaluation_config()
+        self.__handle_evaluation_settings()
+
+        print("\t{} = '{}'".format(EvaluationConfigMixin.SKIP_IDENTICAL_SUBTREES_FIELD_NAME,
+                                   self._skip_identical_subtrees))
+        print("\t{} = '{}'".format(EvaluationConfigMixin.SIMILARITY_THRESHOLD_FIELD_NAME, self._similarity_threshold))
+        print("\t{} = '{}'".format(EvaluationConfigMixin.MINHASH_PERMUTATIONS_FIELD_NAME, self._minhash_permutations))
+        print("\t{} = '{}'".format(EvaluationConfigMixin.LSH_BANDS_FIELD_NAME, self._lsh_bands))
+        print("\t{} = '{}'".format(EvaluationConfigMixin.SIMILARITY_MIN_FILES_FIELD_NAME, self._similarity_min_files))
+        print("\t{} = '{}'".format(EvaluationConfigMixin.CHUNK_SIMILARITY_THRESHOLD_FIELD_NAME,
+                                   self._chunk_similarity_threshold))
+        print("\t{} = '{}'".format(EvaluationConfigMixin.HEAVY_HITTER_THRESHOLD_FIELD_NAME,
+                                   self._heavy_hitter_threshold))
+        print("\t{} = '{}'".format(EvaluationConfigMixin.HEAVY_HITTER_POLICY_FIELD_NAME, self._heavy_hitter_policy))
 
     ##################################################################################################
 
@@ -32,9 +72,111 @@ class EvaluationConfigMixin(object):
 
     ##################################################################################################
 
+    def skip_identical_subtrees(self) -> bool:
+        return self._skip_identical_subtrees
+
+    ##################################################################################################
+
+    def get_similarity_threshold(self) -> float:
+        return self._similarity_threshold
+
+    ##################################################################################################
+
+    def get_minhash_permutations(self) -> int:
+        return self._minhash_permutations
+
+    ##################################################################################################
+
+    def get_lsh_bands(self) -> int:
+        return self._lsh_bands
+
+    ##################################################################################################
+
+    def get_similarity_min_files(self) -> int:
+        return self._similarity_min_files
+
+    ##################################################################################################
+
+    def get_chunk_similarity_threshold(self) -> float:
+        return self._chunk_similarity_threshold
+
+    ##################################################################################################
+
+    def get_heavy_hitter_threshold(self) -> int:
+        return self._heavy_hitter_threshold
+
+    ##################################################################################################
+
+    def get_heavy_hitter_policy(self) -> str:
+        return self._heavy_hitter_policy
+
+    ##################################################################################################
+
     def __handle_evaluation_database_path(self):
         self._evaluation_database_file_path = get_configured_db_file_path(
             self._parser,
             EvaluationConfigMixin.SECTION_NAME,
             EvaluationConfigMixin.EVALUATION_DB_CONFIG_FIELD_NAME,
             EvaluationConfigMixin.DEFAULT_EVALUATION_DB_NAME)
+
+    ##################################################################################################
+
+    def __handle_evaluation_settings(self):
+        if not self._parser.has_section(EvaluationConfigMixin.SECTION_NAME):
+            return
+
+        self._skip_identical_subtrees = self._parser.getboolean(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.SKIP_IDENTICAL_SUBTREES_FIELD_NAME,
+            fallback=self._skip_identical_subtrees)
+        self._similarity_threshold = self._parser.getfloat(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.SIMILARITY_THRESHOLD_FIELD_NAME,
+            fallback=self._similarity_threshold)
+        self._minhash_permutations = self._parser.getint(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.MINHASH_PERMUTATIONS_FIELD_NAME,
+            fallback=self._minhash_permutations)
+        self._lsh_bands = self._parser.getint(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.LSH_BANDS_FIELD_NAME,
+            fallback=self._lsh_bands)
+        self._similarity_min_files = self._parser.getint(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.SIMILARITY_MIN_FILES_FIELD_NAME,
+            fallback=self._similarity_min_files)
+        self._chunk_similarity_threshold = self._parser.getfloat(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.CHUNK_SIMILARITY_THRESHOLD_FIELD_NAME,
+            fallback=self._chunk_similarity_threshold)
+        self._heavy_hitter_threshold = self._parser.getint(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.HEAVY_HITTER_THRESHOLD_FIELD_NAME,
+            fallback=self._heavy_hitter_threshold)
+        self._heavy_hitter_policy = self._parser.get(
+            EvaluationConfigMixin.SECTION_NAME,
+            EvaluationConfigMixin.HEAVY_HITTER_POLICY_FIELD_NAME,
+            fallback=self._heavy_hitter_policy).strip().lower()
+
+        if not 0.0 < self._similarity_threshold <= 1.0:
+            raise ValueError("ERROR: '[{}]' {} must be within (0, 1]"
+                             .format(EvaluationConfigMixin.SECTION_NAME,
+                                     EvaluationConfigMixin.SIMILARITY_THRESHOLD_FIELD_NAME))
+        if not 0.0 < self._chunk_similarity_threshold <= 1.0:
+            raise ValueError("ERROR: '[{}]' {} must be within (0, 1]"
+                             .format(EvaluationConfigMixin.SECTION_NAME,
+                                     EvaluationConfigMixin.CHUNK_SIMILARITY_THRESHOLD_FIELD_NAME))
+        if self._lsh_bands <= 0 or self._minhash_permutations % self._lsh_bands != 0:
+            raise ValueError("ERROR: '[{}]' {} must be a multiple of {}"
+                             .format(EvaluationConfigMixin.SECTION_NAME,
+                                     EvaluationConfigMixin.MINHASH_PERMUTATIONS_FIELD_NAME,
+                                     EvaluationConfigMixin.LSH_BANDS_FIELD_NAME))
+        if self._heavy_hitter_threshold < 0:
+            raise ValueError("ERROR: '[{}]' {} must not be negative (0 disables it)"
+                             .format(EvaluationConfigMixin.SECTION_NAME,
+                                     EvaluationConfigMixin.HEAVY_HITTER_THRESHOLD_FIELD_NAME))
+        if self._heavy_hitter_policy not in EvaluationConfigMixin.HEAVY_HITTER_POLICIES:
+            raise ValueError("ERROR: '[{}]' {} must be one of {}"
+                             .format(EvaluationConfigMixin.SECTION_NAME,
+                                     EvaluationConfigMixin.HEAVY_HITTER_POLICY_FIELD_NAME,
+                                     ", ".join(EvaluationConfigMixin.HEAVY_HITTER_POLICIES)))
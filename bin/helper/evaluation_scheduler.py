@@ -0,0 +1,362 @@
+import concurrent
+import concurrent.futures
+import hashlib
+import json
+from datetime import datetime, timedelta
+from timeit import default_timer as timer
+from typing import Callable, Dict, List, Optional, Set
+
+from .database_helper import EvaluationDataBases, PublicDataBase, database_fingerprint
+
+
+######################################################################################################
+
+class EvaluatorRegistration(object):
+    """
+    Declares one evaluator: how to create it, which tables it reads and which tables it writes.
+    Tables read are evaluation tables written by other evaluators or EvaluatorRegistry.INDEX_INPUT.
+    """
+    ##################################################################################################
+
+    def __init__(self, name: str, factory: Callable[[EvaluationDataBases], object], inputs: List[str],
+                 outputs: List[str], parameters: Optional[Dict[str, object]] = None):
+        """
+        :param factory: Creates the evaluator (evaluate() and reset()) for the given database connections
+        :param parameters: Settings changing the result, part of the cache key
+        """
+        self.name = name  # type: str
+        self.factory = factory  # type: Callable[[EvaluationDataBases], object]
+        self.inputs = inputs  # type: List[str]
+        self.outputs = outputs  # type: List[str]
+        self.parameters = parameters or {}  # type: Dict[str, object]
+
+
+######################################################################################################
+
+class EvaluatorRegistry(object):
+    """
+    Evaluators in registration order, the dependencies are derived from the tables they read and write. Evaluators
+    depending on each other are rejected when they are registered. An evaluator computing the results of several
+    evaluators at once can be selected by their names as well (aliases).
+    """
+    ##################################################################################################
+
+    INDEX_INPUT = "index_db"
+
+    ##################################################################################################
+
+    def __init__(self):
+        self._registrations = []  # type: List[EvaluatorRegistration]
+        self._aliases = {}  # type: Dict[str, str]
+
+    ##################################################################################################
+
+    def register(self, registration: EvaluatorRegistration):
+        for other in self._registrations:
+            if other.name == registration.name or registration.name in self._aliases:
+                raise ValueError("ERROR: Evaluator '{}' is registered twice.".format(registration.name))
+            shared_outputs = set(other.outputs) & set(registration.outputs)
+            if len(shared_outputs) > 0:
+                raise ValueError("ERROR: Evaluators '{}' and '{}' both write {}.".format(
+                    other.name, registration.name, ", ".join(sorted(shared_outputs))))
+        self._registrations.append(registration)
+        # A cycle created by the registration passes through it.
+        cycle = self._dependency_cycle(registration.name)
+        if cycle is not None:
+            self._registrations.pop()
+            raise ValueError("ERROR: Evaluators depend on each other: {}.".format(" -> ".join(cycle)))
+
+    ##################################################################################################
+
+    def register_alias(self, alias: str, name: str):
+        """
+        Selects the registered evaluator name by alias too, e.g. if it writes the tables of the evaluator alias.
+        """
+        self.get(name)
+        if alias in self._aliases or alias in self.names():
+            raise ValueError("ERROR: Evaluator '{}' is registered twice.".format(alias))
+        self._aliases[alias] = self.resolve(name)
+
+    ##################################################################################################
+
+    def names(self) -> List[str]: return [r.name for r in self._registrations]
+
+    ##################################################################################################
+
+    def resolve(self, name: str) -> str:
+        """
+        :return: Name of the registered evaluator selected by the name or alias
+        """
+        return self._aliases.get(name, name)
+
+    ##################################################################################################
+
+    def get(self, name: str) -> EvaluatorRegistration:
+        name = self.resolve(name)
+        for registration in self._registrations:
+            if registration.name == name:
+                return registration
+        raise ValueError("ERROR: Unknown evaluator '{}', known are: {}.".format(
+            name, ", ".join(self.names() + sorted(self._aliases))))
+
+    ##################################################################################################
+
+    def dependencies(self, name: str) -> List[str]:
+        """
+        :return: Names of the evaluators writing the tables read by the evaluator
+        """
+        inputs = set(self.get(name).inputs)
+        return [r.name for r in self._registrations if r.name != name and len(inputs & set(r.outputs)) > 0]
+
+    ##################################################################################################
+
+    def with_dependencies(self, names: List[str]) -> List[str]:
+        """
+        :return: The evaluators and all evaluators they depend on (transitively), in registration order
+        """
+        selected = set()  # type: Set[str]
+        pending = [self.resolve(name) for name in names]
+        while len(pending) > 0:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.dependencies(name))
+        return [n for n in self.names() if n in selected]
+
+    ##################################################################################################
+
+    def _dependency_cycle(self, name: str) -> Optional[List[str]]:
+        """
+        :return: Evaluators from the evaluator via its dependencies back to itself, None if it does not depend on itself
+        """
+        visited = set()  # type: Set[str]
+        pending = [[name]]
+        while len(pending) > 0:
+            path = pending.pop()
+            for dependency in self.dependencies(path[-1]):
+                if dependency == name:
+                    return path + [dependency]
+                if dependency not in visited:
+                    visited.add(dependency)
+                    pending.append(path + [dependency])
+        return None
+
+
+######################################################################################################
+
+class EvaluationCache(object):
+    """
+    Remembers the input fingerprint of every successful evaluator run in the evaluation database. An evaluator whose
+    inputs did not change since is skipped, as long as its output tables still exist.
+
+    The key of an evaluator combines the fingerprint of the public index database, the evaluator's parameters and the
+    keys of the evaluators it depends on, so a changed upstream result invalidates everything downstream.
+    """
+    ##################################################################################################
+
+    CACHE_TABLE_NAME = "evaluation_cache"
+
+    ##################################################################################################
+
+    def __init__(self, databases: EvaluationDataBases):
+        self.index_db = databases.index_db
+        self.evaluation_db = databases.evaluation_db
+        self.evaluation_db.cursor().execute(
+            "CREATE TABLE IF NOT EXISTS {} (evaluator TEXT NOT NULL PRIMARY KEY, cache_key TEXT NOT NULL, "
+            "finished TEXT NOT NULL, elapsed_seconds REAL NOT NULL)".format(EvaluationCache.CACHE_TABLE_NAME))
+        self.evaluation_db.connection().commit()
+
+    ##################################################################################################
+
+    def index_fingerprint(self) -> Dict[str, object]:
+        """
+        Fingerprint of the public index: the file change counter of the database header (incremented by every commit,
+        the persistent counterpart of PRAGMA data_version), the database size, number of files and total file size.
+        """
+        fingerprint = database_fingerprint(self.index_db.database_path())
+        num_files, total_size = self.evaluation_db.cursor().execute(
+            "SELECT COUNT(*), TOTAL({fsize}) FROM index_db.{tbl}".format(
+                fsize=PublicDataBase.PublicIndexTableColumnNames.file_size.value,
+                tbl=self.index_db.table_name())).fetchone()
+        return {"change_counter": fingerprint["change_counter"],
+                "size": fingerprint["size"],
+                "wal_size": fingerprint["wal_size"],
+                "num_files": num_files,
+                "total_file_size": total_size}
+
+    ##################################################################################################
+
+    def compute_key(self, registration: EvaluatorRegistration, index_fingerprint: Dict[str, object],
+                    dependency_keys: Dict[str, str]) -> str:
+        key = {"index": index_fingerprint if EvaluatorRegistry.INDEX_INPUT in registration.inputs else None,
+               "inputs": sorted(registration.inputs),
+               "parameters": registration.parameters,
+               "dependencies": dependency_keys}
+        return hashlib.md5(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    ##################################################################################################
+
+    def is_up_to_date(self, registration: EvaluatorRegistration, cache_key: str) -> bool:
+        row = self.evaluation_db.cursor().execute(
+            "SELECT cache_key FROM {} WHERE evaluator = ?".format(EvaluationCache.CACHE_TABLE_NAME),
+            (registration.name,)).fetchone()
+        if row is None or row[0] != cache_key:
+            return False
+        for tbl in registration.outputs:
+            if self.evaluation_db.cursor().execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                                   (tbl,)).fetchone() is None:
+                return False
+        return True
+
+    ##################################################################################################
+
+    def store(self, registration: EvaluatorRegistration, cache_key: str, elapsed_seconds: float):
+        """
+        Not committed: the entry is committed by the caller together with the results of the evaluator.
+        """
+        self.evaluation_db.cursor().execute(
+            "INSERT OR REPLACE INTO {} VALUES (?, ?, ?, ?)".format(EvaluationCache.CACHE_TABLE_NAME),
+            (registration.name, cache_key, datetime.now().strftime("%Y-%m-%d-%H:%M:%S"), elapsed_seconds))
+
+    ##################################################################################################
+
+    def invalidate(self, name: str):
+        self.evaluation_db.cursor().execute(
+            "DELETE FROM {} WHERE evaluator = ?".format(EvaluationCache.CACHE_TABLE_NAME), (name,))
+        self.evaluation_db.connection().commit()
+
+
+######################################################################################################
+
+class EvaluationScheduler(object):
+    """
+    Runs the registered evaluators in dependency order. Evaluators whose dependencies are done run at the same time in
+    threads, each with its own database connections. SQLite allows one writer per database: the statements writing the
+    evaluation database wait for each other (busy timeout), reading the index and computing overlap.
+    """
+    ##################################################################################################
+
+    # Milliseconds to wait for the write lock of the evaluation database held by another evaluator.
+    BUSY_TIMEOUT_MS = 24 * 60 * 60 * 1000
+
+    ##################################################################################################
+
+    def __init__(self, registry: EvaluatorRegistry, create_databases: Callable[[], EvaluationDataBases],
+                 num_jobs: int = 1):
+        """
+        :param create_databases: Opens new connections to the public index and evaluation databases
+        :param num_jobs: Maximum number of evaluators running at the same time
+        """
+        self._registry = registry  # type: EvaluatorRegistry
+        self._create_databases = create_databases  # type: Callable[[], EvaluationDataBases]
+        self._num_jobs = max(num_jobs, 1)  # type: int
+
+    ##################################################################################################
+
+    def evaluate(self, only: Optional[List[str]] = None, force: Optional[List[str]] = None):
+        """
+        :param only: Evaluators to run (with the evaluators they depend on), None for all
+        :param force: Evaluators to run even if their results are up to date, None for none
+        """
+        names = self._registry.with_dependencies(only if only is not None else self._registry.names())
+        force = set(self._registry.get(name).name for name in force or [])
+
+        databases = self._connect()
+        try:
+            num_pending_files, pending_size = databases.index_db.get_pending_file_statistics()
+            if num_pending_files > 0:
+                print("WARNING: {} files ({} bytes) are not hashed yet (create-index.py --backfill), the results cover "
+                      "the hashed files only.".format(num_pending_files, pending_size))
+            cache = EvaluationCache(databases)
+            index_fingerprint = cache.index_fingerprint()
+            keys = {}  # type: Dict[str, str]
+            done = set()  # type: Set[str]
+            running = {}  # type: Dict[concurrent.futures.Future, str]
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self._num_jobs) as executor:
+                while len(done) < len(names):
+                    for name in names:
+                        if name in done or name in running.values() \
+                                or any(d not in done for d in self._registry.dependencies(name) if d in names):
+                            continue
+                        registration = self._registry.get(name)
+                        keys[name] = cache.compute_key(registration, index_fingerprint, {
+                            d: keys.get(d, "") for d in self._registry.dependencies(name)})
+                        if name not in force and cache.is_up_to_date(registration, keys[name]):
+                            print("\n[{}] Up to date, skipped.".format(name))
+                            done.add(name)
+                            continue
+                        running[executor.submit(self._run, registration, keys[name])] = name
+
+                    if len(running) == 0:
+                        # Nothing started: fine if evaluators were skipped meanwhile, so that others are ready now
+                        # or all are done.
+                        if len(done) < len(names) and not any(
+                                name not in done
+                                and all(d in done for d in self._registry.dependencies(name) if d in names)
+                                for name in names):
+                            raise ValueError("ERROR: The evaluators {} depend on each other.".format(
+                                ", ".join(n for n in names if n not in done)))
+                        continue
+                    finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for f in finished:
+                        name = running.pop(f)
+                        try:
+                            f.result()
+                        except BaseException as e:
+                            # Let the running evaluators finish, the ones not started yet are dropped.
+                            [other.cancel() for other in running]
+                            raise e
+                        done.add(name)
+        finally:
+            databases.close()
+
+    ##################################################################################################
+
+    def reset(self, only: Optional[List[str]] = None):
+        """
+        Drops and re-creates empty the tables of the evaluators (all if only is None) and forgets their results.
+        """
+        databases = self._connect()
+        try:
+            cache = EvaluationCache(databases)
+            # An evaluator selected by its name and an alias is reset once.
+            names = dict.fromkeys(self._registry.get(name).name
+                                  for name in (only if only is not None else self._registry.names()))
+            for name in names:
+                self._registry.get(name).factory(databases).reset()
+                cache.invalidate(name)
+        finally:
+            databases.close()
+
+    ##################################################################################################
+
+    def _connect(self) -> EvaluationDataBases:
+        """
+        Opens new connections, writing the evaluation database waits for the other evaluators holding its write lock.
+        """
+        databases = self._create_databases()
+        databases.evaluation_db.cursor().execute(
+            "PRAGMA busy_timeout = {}".format(EvaluationScheduler.BUSY_TIMEOUT_MS))
+        return databases
+
+    ##################################################################################################
+
+    def _run(self, registration: EvaluatorRegistration, cache_key: str) -> float:
+        """
+        Thread entry point: runs one evaluator with its own connections and commits its results together with its
+        cache entry, so that a result is never committed without its entry or vice versa.
+        :return: Elapsed seconds
+        """
+        start_timestamp = timer()
+        databases = self._connect()
+        try:
+            cache = EvaluationCache(databases)
+            cache.invalidate(registration.name)
+            registration.factory(databases).evaluate()
+            elapsed_seconds = timer() - start_timestamp
+            cache.store(registration, cache_key, elapsed_seconds)
+            databases.evaluation_db.connection().commit()
+        finally:
+            databases.close()
+        print("\n[{}] Done in {}.".format(registration.name, timedelta(seconds=elapsed_seconds)))
+        return elapsed_seconds
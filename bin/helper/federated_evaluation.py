@@ -0,0 +1,245 @@
+import heapq
+import itertools
+import os
+import sqlite3
+from collections import Counter
+from datetime import timedelta
+from operator import itemgetter
+from timeit import default_timer as timer
+from typing import Iterator, List, Tuple
+
+from .database_helper import PublicDataBase, SqliteDbConnector, connect_read_only, database_fingerprint, \
+    find_index_table_name
+
+
+######################################################################################################
+
+Columns = PublicDataBase.PublicIndexTableColumnNames
+
+
+######################################################################################################
+
+def parse_source(source: str) -> Tuple[str, str]:
+    """
+    Helper function that splits a source given as "name=path" or "path" (the name is the file name without extension).
+    :return: Tuple of (source name, database path)
+    """
+    if "=" in source and not os.path.isfile(source):
+        name, path = source.split("=", 1)
+        return name, path
+    return os.path.splitext(os.path.basename(source))[0], source
+
+
+######################################################################################################
+
+def hash_range_partitions(num_partitions: int) -> List[Tuple[str, str]]:
+    """
+    Helper function that splits the range of hex encoded hash tags into num_partitions ranges of the same size.
+    :return: List of (lower bound inclusive, upper bound exclusive), the bounds are hex prefixes, "" means unbounded
+    """
+    bounds = ["{:08x}".format(i * (1 << 32) // num_partitions) for i in range(num_partitions)]
+    return list(zip([""] + bounds[1:], bounds[1:] + [""]))
+
+
+######################################################################################################
+
+class FederatedEvaluator(object):
+    """
+    Evaluates the public index databases of many hosts together without copying their rows into one database and
+    without attaching them (SQLite limits the number of attached databases).
+
+    The hash tag range is split into partitions. For each partition every source streams its rows ordered by the
+    grouping key through its own read only connection, heapq.merge() combines the N sorted streams and the groups are
+    aggregated one at a time. So only one group (all copies of one content or folder) and the batch of result rows
+    are held in memory, the sorting of a partition is done by SQLite per source.
+
+    Results (evaluation database), sources are referenced by their source_id:
+    - federated_sources: source_id, name, database path, number of files
+    - federated_unique_files: content hash tag, number of files, number of sources having it
+    - federated_file_sources: content hash tag, source_id, number of files of the source
+    - federated_unique_folders: relative path hash tag, number of files, number of sources having the folder
+    - federated_expected_folder_structure: like expected_folder_structure, per source having the pair
+    """
+    ##################################################################################################
+
+    SOURCES_TABLE_NAME = "federated_sources"
+    UNIQUE_FILES_TABLE_NAME = "federated_unique_files"
+    FILE_SOURCES_TABLE_NAME = "federated_file_sources"
+    UNIQUE_FOLDERS_TABLE_NAME = "federated_unique_folders"
+    EXPECTED_FOLDER_STRUCTURE_TABLE_NAME = "federated_expected_folder_structure"
+
+    FETCH_SIZE = 10000
+    BATCH_SIZE = 100000
+
+    ##################################################################################################
+
+    def __init__(self, evaluation_db: SqliteDbConnector, sources: List[Tuple[str, str]], num_partitions: int = 16):
+        """
+        :param sources: List of (source name, public index database path)
+        :param num_partitions: Number of hash tag ranges evaluated one after the other, more partitions mean smaller
+                               sorts per source but more scans of the sources
+        """
+        if len(set(name for name, _ in sources)) != len(sources):
+            raise ValueError("ERROR: The source names must be unique ({}).".format(", ".join(n for n, _ in sources)))
+        if num_partitions < 1:
+            raise ValueError("ERROR: The number of partitions must be at least 1.")
+        self.evaluation_db = evaluation_db
+        self._sources = sources  # type: List[Tuple[str, str]]
+        self._partitions = hash_range_partitions(num_partitions)  # type: List[Tuple[str, str]]
+
+    ##################################################################################################
+
+    def evaluate(self):
+        print("\n[FederatedEvaluator START]")
+        start_timestamp = timer()
+
+        self.reset()
+        connections = [connect_read_only(path) for _, path in self._sources]
+        try:
+            table_names = [find_index_table_name(c) for c in connections]
+            self._insert_sources(connections, table_names)
+            for i, (lower, upper) in enumerate(self._partitions):
+                partition_start_timestamp = timer()
+                num_files = self._evaluate_files(connections, table_names, lower, upper)
+                num_folders = self._evaluate_folders(connections, table_names, lower, upper)
+                self.evaluation_db.connection().commit()
+                print("\tPartition {}/{} [{}, {}): {} distinct contents, {} distinct folders ({}).".format(
+                    i + 1, len(self._partitions), lower or "-", upper or "-", num_files, num_folders,
+                    timedelta(seconds=timer() - partition_start_timestamp)))
+        finally:
+            [c.close() for c in connections]
+
+        print("[FederatedEvaluator END] Time elapsed {}".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def reset(self):
+        cursor = self.evaluation_db.cursor()
+        for tbl, columns in [
+            (FederatedEvaluator.SOURCES_TABLE_NAME,
+             "source_id INTEGER NOT NULL PRIMARY KEY, name TEXT NOT NULL, database_path TEXT NOT NULL, "
+             "change_counter INTEGER NOT NULL, file_count INTEGER NOT NULL"),
+            (FederatedEvaluator.UNIQUE_FILES_TABLE_NAME,
+             "{fconth} TEXT NOT NULL, cnt INTEGER NOT NULL, source_cnt INTEGER NOT NULL"),
+            (FederatedEvaluator.FILE_SOURCES_TABLE_NAME,
+             "{fconth} TEXT NOT NULL, source_id INTEGER NOT NULL, cnt INTEGER NOT NULL"),
+            (FederatedEvaluator.UNIQUE_FOLDERS_TABLE_NAME,
+             "{prelh} TEXT NOT NULL, cnt INTEGER NOT NULL, source_cnt INTEGER NOT NULL"),
+            (FederatedEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME,
+             "{prelh} TEXT NOT NULL, {fconth} TEXT NOT NULL, cnt INTEGER NOT NULL, source_id INTEGER NOT NULL")]:
+            cursor.execute("DROP TABLE IF EXISTS {}".format(tbl))
+            q = "CREATE TABLE {} ({})".format(tbl, columns.format(
+                fconth=Columns.file_content_hash_tag.value, prelh=Columns.relative_path_hash_tag.value))
+            try:
+                cursor.execute(q)
+            except BaseException as e:
+                print(q)
+                raise e
+
+    ##################################################################################################
+
+    def _insert_sources(self, connections: List[sqlite3.Connection], table_names: List[str]):
+        rows = []
+        for source_id, ((name, path), connection, tbl) in enumerate(zip(self._sources, connections, table_names)):
+            file_count = connection.execute("SELECT COUNT(*) FROM {}".format(tbl)).fetchone()[0]
+            rows.append((source_id, name, os.path.abspath(path), database_fingerprint(path)["change_counter"],
+                         file_count))
+            print("\tSource {} '{}': {} files ({}).".format(source_id, name, file_count, path))
+        self.evaluation_db.cursor().executemany(
+            "INSERT INTO {} VALUES (?, ?, ?, ?, ?)".format(FederatedEvaluator.SOURCES_TABLE_NAME), rows)
+
+    ##################################################################################################
+
+    def _merged_rows(self, connections: List[sqlite3.Connection], table_names: List[str], key_column: str,
+                     other_column: str, lower: str, upper: str) -> Iterator[Tuple[str, str, int]]:
+        """
+        Streams the rows of all sources in the partition ordered by key_column.
+        :return: Iterator of (key, other column, source_id)
+        """
+        def rows_of(source_id: int, connection: sqlite3.Connection, tbl: str) -> Iterator[Tuple[str, str, int]]:
+            conditions = []
+            parameters = []
+            if lower != "":
+                conditions.append("{} >= ?".format(key_column))
+                parameters.append(lower)
+            if upper != "":
+                conditions.append("{} < ?".format(key_column))
+                parameters.append(upper)
+            cursor = connection.execute("SELECT {key}, {other} FROM {tbl} {where} ORDER BY {key}".format(
+                key=key_column, other=other_column, tbl=tbl,
+                where="WHERE " + " AND ".join(conditions) if len(conditions) > 0 else ""), parameters)
+            while True:
+                rows = cursor.fetchmany(FederatedEvaluator.FETCH_SIZE)
+                if not rows:
+                    return
+                for key, other in rows:
+                    yield key, other, source_id
+
+        return heapq.merge(*[rows_of(source_id, connection, tbl)
+                             for source_id, (connection, tbl) in enumerate(zip(connections, table_names))],
+                           key=itemgetter(0))
+
+    ##################################################################################################
+
+    def _evaluate_files(self, connections: List[sqlite3.Connection], table_names: List[str],
+                        lower: str, upper: str) -> int:
+        unique_files = []
+        file_sources = []
+        expected_folder_structure = []
+        num_groups = 0
+        for content_hash_tag, group in itertools.groupby(
+                self._merged_rows(connections, table_names, Columns.file_content_hash_tag.value,
+                                  Columns.relative_path_hash_tag.value, lower, upper), key=itemgetter(0)):
+            group = list(group)
+            num_groups += 1
+            counts = Counter(source_id for _, _, source_id in group)
+            unique_files.append((content_hash_tag, len(group), len(counts)))
+            file_sources.extend((content_hash_tag, source_id, cnt) for source_id, cnt in sorted(counts.items()))
+            expected_folder_structure.extend(
+                (relative_path_hash_tag, content_hash_tag, len(group), source_id)
+                for relative_path_hash_tag, source_id in sorted(set((rel, source_id) for _, rel, source_id in group)))
+
+            if len(file_sources) + len(expected_folder_structure) >= FederatedEvaluator.BATCH_SIZE:
+                self._flush_files(unique_files, file_sources, expected_folder_structure)
+        self._flush_files(unique_files, file_sources, expected_folder_structure)
+        return num_groups
+
+    ##################################################################################################
+
+    def _flush_files(self, unique_files: list, file_sources: list, expected_folder_structure: list):
+        for tbl, rows, num_columns in [(FederatedEvaluator.UNIQUE_FILES_TABLE_NAME, unique_files, 3),
+                                       (FederatedEvaluator.FILE_SOURCES_TABLE_NAME, file_sources, 3),
+                                       (FederatedEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME,
+                                        expected_folder_structure, 4)]:
+            self.evaluation_db.cursor().executemany(
+                "INSERT INTO {} VALUES ({})".format(tbl, ", ".join(["?"] * num_columns)), rows)
+            rows.clear()
+
+    ##################################################################################################
+
+    def _evaluate_folders(self, connections: List[sqlite3.Connection], table_names: List[str],
+                          lower: str, upper: str) -> int:
+        unique_folders = []
+        num_groups = 0
+        for relative_path_hash_tag, group in itertools.groupby(
+                self._merged_rows(connections, table_names, Columns.relative_path_hash_tag.value,
+                                  Columns.root_path_hash_tag.value, lower, upper), key=itemgetter(0)):
+            num_files = 0
+            source_ids = set()
+            for _, _, source_id in group:
+                num_files += 1
+                source_ids.add(source_id)
+            unique_folders.append((relative_path_hash_tag, num_files, len(source_ids)))
+            num_groups += 1
+
+            if len(unique_folders) >= FederatedEvaluator.BATCH_SIZE:
+                self._flush_folders(unique_folders)
+        self._flush_folders(unique_folders)
+        return num_groups
+
+    ##################################################################################################
+
+    def _flush_folders(self, unique_folders: list):
+        self.evaluation_db.cursor().executemany(
+            "INSERT INTO {} VALUES (?, ?, ?)".format(FederatedEvaluator.UNIQUE_FOLDERS_TABLE_NAME), unique_folders)
+        unique_folders.clear()
@@ -13,7 +13,10 @@ class FileType:
                  file_content_hash_tag="",
                  creation_time="",
                  last_modification_time="",
-                 file_size=""):
+                 file_size="",
+                 file_content_hash_mode="full",
+                 chunks=None,
+                 archive_members=None):
         self.root_path = root_path
         self.relative_path = relative_path
         self.filename = filename
@@ -29,3 +32,63 @@ class FileType:
         self.creation_time = creation_time
         self.last_modification_time = last_modification_time
         self.file_size = file_size
+
+        # "full": file_content_hash_tag is the md5 of the whole content, "quick": of the size and some samples only,
+        # "pending": not hashed yet, file_content_hash_tag is a placeholder unique to the file, "archived": the md5 of
+        # the whole content of a member of an archive, its path is virtual (the archive is a file)
+        self.file_content_hash_mode = file_content_hash_mode
+
+        # Content defined chunks as list of (offset, length, chunk hash tag), None if the file was not chunked
+        self.chunks = chunks
+
+        # Files within the archive as FileType objects below the virtual folder of the archive, None if the file is not
+        # an archive whose members are indexed
+        self.archive_members = archive_members
+
+
+# Class that holds the information about a file (or folder) that could not be indexed.
+class FileIndexingError:
+    def __init__(self,
+                 root_path="",
+                 relative_path="",
+                 filename="",
+                 stage="",
+                 error_number=None,
+                 error_message="",
+                 attempts=1):
+        self.root_path = root_path
+        self.relative_path = relative_path
+        self.filename = filename
+
+        self.stage = stage
+        self.error_number = error_number
+        self.error_message = error_message
+        self.attempts = attempts
+
+
+# Class that holds the state of a folder when it was indexed, used to skip unchanged folders.
+class DirectoryState:
+    def __init__(self,
+                 root_path="",
+                 relative_path="",
+                 mtime_ns=-1,
+                 entry_count=0,
+                 entry_names_digest=""):
+        self.root_path = root_path
+        self.relative_path = relative_path
+
+        # Modification time of the folder itself, -1 if it must not be trusted (e.g. changed while indexing)
+        self.mtime_ns = mtime_ns
+        # Number of files and folders in the folder and the hash of their sorted names
+        self.entry_count = entry_count
+        self.entry_names_digest = entry_names_digest
+
+
+# Class that tells that a file was indexed and stored in the shard database of the worker process.
+class ShardedFile:
+    def __init__(self,
+                 file_size=0,
+                 file_count=1):
+        self.file_size = file_size
+        # Number of rows stored, the file and its archive members
+        self.file_count = file_count
@@ -0,0 +1,191 @@
+import hashlib
+import os
+from typing import Dict, List, Tuple
+
+from .database_helper import DataBaseIndexHelper, PrivateDataBase, PublicDataBase
+
+
+##################################################################################################
+
+def _hash_string(value: str) -> str:
+    # Same digest as calculate_hash(value, hash_content=False), so folder keys match the file rows.
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+##################################################################################################
+
+def _parent_relative_path(relative_path: str) -> str:
+    parent = os.path.dirname(relative_path)
+    return "." if parent == "" else parent
+
+
+##################################################################################################
+
+class _FolderNode(object):
+    """
+    Aggregated information of one folder while building the folder hashes of a root.
+    """
+
+    def __init__(self, relative_path: str):
+        self.relative_path = relative_path  # type: str
+        self.files = []  # type: List[Tuple[str, str]]
+        self.children = []  # type: List[_FolderNode]
+        self.content_hash_tag = ""  # type: str
+        self.structure_hash_tag = ""  # type: str
+        self.file_count = 0  # type: int
+        self.folder_count = 0  # type: int
+        self.total_size = 0  # type: int
+
+    ##################################################################################################
+
+    def depth(self) -> int:
+        return 0 if self.relative_path == "." else self.relative_path.count(os.sep) + 1
+
+    ##################################################################################################
+
+    def name_hash_tag(self) -> str:
+        return _hash_string("" if self.relative_path == "." else os.path.basename(self.relative_path))
+
+
+##################################################################################################
+
+class FolderHashBuilder(object):
+    """
+    Computes a Merkle-style hash for every indexed folder and stores it in the public folder table.
+
+    folder_content_hash_tag = md5 over the sorted (filename hash tag, file content hash tag) pairs of the immediate
+    files followed by the sorted (folder name hash tag, folder_content_hash_tag) pairs of the immediate sub folders.
+    Two folders with the same folder_content_hash_tag contain identical subtrees.
+    folder_structure_hash_tag is computed the same way from the names only, i.e. folders with the same structure hash
+    but different content hash contain the same file names with (partially) different content.
+
+    The files are streamed from the private index table one root at a time. Folders without any file below them are
+    not part of the index and therefore not part of the hashes.
+    """
+
+    ##################################################################################################
+
+    BATCH_SIZE = 10000
+
+    ##################################################################################################
+
+    def __init__(self, database: DataBaseIndexHelper):
+        self._database = database  # type: DataBaseIndexHelper
+
+    ##################################################################################################
+
+    def build(self, root_paths: List[str] = None):
+        """
+        :param root_paths: Rebuild the folder hashes of these roots only, e.g. after an incremental update (default:
+                           all roots)
+        """
+        print("Computing folder hashes ...")
+        if root_paths is None:
+            self._database.private_db.cursor().execute(
+                "DELETE FROM public.{}".format(self._database.public_db.folder_table_name()))
+            root_paths = [r[0] for r in self._database.private_db.connection().execute(
+                "SELECT DISTINCT {proot} FROM {tbl}".format(
+                    proot=PrivateDataBase.PrivateIndexTableColumnNames.root_path.value,
+                    tbl=self._database.private_db.table_name())).fetchall()]
+        else:
+            self._database.private_db.cursor().executemany(
+                "DELETE FROM public.{tbl} WHERE {prooth} = ?".format(
+                    tbl=self._database.public_db.folder_table_name(),
+                    prooth=PublicDataBase.PublicFolderTableColumnNames.root_path_hash_tag.value),
+                [(_hash_string(root_path),) for root_path in root_paths])
+
+        num_folders = 0
+        for root_path in root_paths:
+            folders = self._build_root(root_path)
+            self._insert(root_path, folders)
+            num_folders += len(folders)
+
+        print("Computed hashes of {} folders.".format(num_folders))
+
+    ##################################################################################################
+
+    def _build_root(self, root_path: str) -> Dict[str, _FolderNode]:
+        q = """
+        SELECT
+            {prel}, {fnameh}, {fconth}, {fsize}
+        FROM
+            {tbl}
+        WHERE
+            {proot} = ?
+        """.format(
+            tbl=self._database.private_db.table_name(),
+            proot=PrivateDataBase.PrivateIndexTableColumnNames.root_path.value,
+            prel=PrivateDataBase.PrivateIndexTableColumnNames.relative_path.value,
+            fnameh=PrivateDataBase.PrivateIndexTableColumnNames.filename_hash_tag.value,
+            fconth=PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_tag.value,
+            fsize=PrivateDataBase.PrivateIndexTableColumnNames.file_size.value)
+
+        folders = {}  # type: Dict[str, _FolderNode]
+        cursor = self._database.private_db.connection().execute(q, (root_path,))
+        for rows in iter(lambda: cursor.fetchmany(FolderHashBuilder.BATCH_SIZE), []):
+            for relative_path, filename_hash_tag, file_content_hash_tag, file_size in rows:
+                folder = self._get_or_add_folder(folders, relative_path)
+                folder.files.append((filename_hash_tag, file_content_hash_tag))
+                folder.file_count += 1
+                folder.total_size += file_size
+
+        # Bottom-up: children are always deeper than their parent.
+        for folder in sorted(folders.values(), key=lambda f: f.depth(), reverse=True):
+            content_hash = hashlib.md5()
+            structure_hash = hashlib.md5()
+            for filename_hash_tag, file_content_hash_tag in sorted(folder.files):
+                content_hash.update("F{}{}".format(filename_hash_tag, file_content_hash_tag).encode())
+                structure_hash.update("F{}".format(filename_hash_tag).encode())
+            for child in sorted(folder.children, key=lambda c: c.name_hash_tag()):
+                content_hash.update("D{}{}".format(child.name_hash_tag(), child.content_hash_tag).encode())
+                structure_hash.update("D{}{}".format(child.name_hash_tag(), child.structure_hash_tag).encode())
+                folder.file_count += child.file_count
+                folder.folder_count += child.folder_count + 1
+                folder.total_size += child.total_size
+            folder.content_hash_tag = content_hash.hexdigest()
+            folder.structure_hash_tag = structure_hash.hexdigest()
+            folder.files = []
+
+        return folders
+
+    ##################################################################################################
+
+    def _get_or_add_folder(self, folders: Dict[str, _FolderNode], relative_path: str) -> _FolderNode:
+        folder = folders.get(relative_path)
+        if folder is not None:
+            return folder
+
+        folder = _FolderNode(relative_path)
+        folders[relative_path] = folder
+        if relative_path != ".":
+            # Link to the parent, adding the parents without files on the way up.
+            self._get_or_add_folder(folders, _parent_relative_path(relative_path)).children.append(folder)
+        return folder
+
+    ##################################################################################################
+
+    def _insert(self, root_path: str, folders: Dict[str, _FolderNode]):
+        q = """
+        INSERT INTO
+            public.{tbl}
+        VALUES
+            (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """.format(tbl=self._database.public_db.folder_table_name())
+
+        root_path_hash_tag = _hash_string(root_path)
+        rows = [(root_path_hash_tag,
+                 _hash_string(f.relative_path),
+                 None if f.relative_path == "." else _hash_string(_parent_relative_path(f.relative_path)),
+                 f.name_hash_tag(),
+                 f.content_hash_tag,
+                 f.structure_hash_tag,
+                 f.depth(),
+                 f.file_count,
+                 f.folder_count,
+                 f.total_size) for f in folders.values()]
+        try:
+            self._database.private_db.cursor().executemany(q, rows)
+        except BaseException as e:
+            print(q)
+            raise e
+
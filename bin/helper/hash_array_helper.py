@@ -0,0 +1,76 @@
+from typing import List
+
+import numpy as np  # sudo pip install numpy
+
+
+##################################################################################################
+
+DIGEST_SIZE = 16  # md5
+
+
+##################################################################################################
+
+def hex_digests_to_array(hex_digests: List[str]) -> np.ndarray:
+    """
+    Helper function that converts hex encoded md5 digests to an array of shape (n, 2) and dtype uint64.
+    The rows compare (lexicographically) in the same order as the hex strings.
+    """
+    if len(hex_digests) == 0:
+        return np.empty((0, 2), dtype=np.uint64)
+    raw = bytes.fromhex("".join(hex_digests))
+    return np.frombuffer(raw, dtype=">u8").astype(np.uint64).reshape(-1, 2)
+
+
+##################################################################################################
+
+def array_to_hex_digests(digests: np.ndarray) -> List[str]:
+    """
+    Helper function that converts an array created by hex_digests_to_array() back to hex strings.
+    """
+    raw = np.ascontiguousarray(digests, dtype=">u8").tobytes()
+    return [raw[i:i + DIGEST_SIZE].hex() for i in range(0, len(raw), DIGEST_SIZE)]
+
+
+##################################################################################################
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """
+    Helper function that scrambles uint64 values (splitmix64 finalizer), vectorized.
+    """
+    z = values.astype(np.uint64, copy=True)
+    z ^= z >> np.uint64(30)
+    z *= np.uint64(0xbf58476d1ce4e5b9)
+    z ^= z >> np.uint64(27)
+    z *= np.uint64(0x94d049bb133111eb)
+    z ^= z >> np.uint64(31)
+    return z
+
+
+##################################################################################################
+
+def combine_digest_columns(digests: np.ndarray) -> np.ndarray:
+    """
+    Helper function that folds the (n, 2) uint64 digest array into one uint64 per digest, e.g. as hash key.
+    """
+    return mix64(digests[:, 0] ^ mix64(digests[:, 1]))
+
+
+##################################################################################################
+
+def unique_digests(digests: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Helper function that groups equal rows of a (n, 2) digest array by sorting, like np.unique(axis=0) but faster.
+    :return: Tuple of (sorted unique digests, inverse indices into the unique digests, counts per unique digest)
+    """
+    num_digests = digests.shape[0]
+    if num_digests == 0:
+        return digests, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    order = np.lexsort((digests[:, 1], digests[:, 0]))
+    sorted_digests = digests[order]
+    is_first = np.r_[True, np.any(sorted_digests[1:] != sorted_digests[:-1], axis=1)]
+
+    inverse = np.empty(num_digests, dtype=np.int64)
+    inverse[order] = np.cumsum(is_first) - 1
+    counts = np.diff(np.r_[np.flatnonzero(is_first), num_digests])
+    return sorted_digests[is_first], inverse, counts
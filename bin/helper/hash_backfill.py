@@ -0,0 +1,147 @@
+import errno
+import os
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import List, Set, Tuple
+
+from .backfill_config_mixin import BackfillConfigMixin
+from .database_helper import DataBaseIndexHelper, PrivateDataBase
+from .directory_indexer import DirectoryIndexer
+from .file_type import FileIndexingError, FileType
+from .folder_hashing import FolderHashBuilder
+
+
+##################################################################################################
+
+Columns = PrivateDataBase.PrivateIndexTableColumnNames
+
+
+##################################################################################################
+
+class HashBackfiller(object):
+    """
+    Hashing phase of the two-phase indexing: hashes the files stored by the metadata phase (hash mode "pending") and
+    upgrades their rows in place, the public index table gets them at the same time. Every batch is committed, so the
+    evaluators see a growing share of the index and an interrupted backfill continues where it stopped.
+
+    The pending files are hashed in the order of the configured priorities, e.g. the files below the priority folders
+    first, then the files sharing their size with another file (only these can have duplicates), then the smallest.
+    Files that cannot be indexed are removed from the index and stored in the error table, files deleted since the
+    metadata phase are removed only.
+    """
+
+    ##################################################################################################
+
+    def __init__(self, database: DataBaseIndexHelper, indexer: DirectoryIndexer, root_paths: List[str],
+                 priority: List[str], priority_folders: List[str], batch_size: int):
+        """
+        :param root_paths: Indexed root folders, the priority folders are resolved against them
+        :param priority: List of BackfillConfigMixin.PRIORITIES
+        """
+        self._database = database  # type: DataBaseIndexHelper
+        self._indexer = indexer  # type: DirectoryIndexer
+        self._root_paths = root_paths  # type: List[str]
+        self._priority = priority  # type: List[str]
+        self._priority_folders = priority_folders  # type: List[str]
+        self._batch_size = batch_size  # type: int
+
+    ##################################################################################################
+
+    def backfill(self):
+        print("\n[BACKFILL START]")
+        start_timestamp = timer()
+
+        order_by, parameters = self._order_by()
+        row_ids = self._database.get_pending_files(order_by, parameters)
+        print("Hashing {} pending files ...".format(len(row_ids)))
+
+        num_hashed = 0
+        num_errors = 0
+        num_bytes = 0
+        changed_roots = set()  # type: Set[str]
+        with self._indexer.create_executor() as executor:
+            for start in range(0, len(row_ids), self._batch_size):
+                files = self._database.get_files_by_row_ids(row_ids[start:start + self._batch_size])
+                indexed, errors = self._indexer.index_files(executor, files)
+                self._store(indexed, errors)
+
+                changed_roots.update(f.root_path for f in indexed)
+                changed_roots.update(e.root_path for e in errors)
+                # Without the members of archives, they are stored in addition to the pending files.
+                requested = set(files)
+                hashed = [f for f in indexed if (f.root_path, f.relative_path, f.filename) in requested]
+                num_hashed += len(hashed)
+                num_errors += len([e for e in errors if e.error_number != errno.ENOENT])
+                num_bytes += sum(f.file_size for f in hashed)
+                elapsed_seconds = max(timer() - start_timestamp, 1e-6)
+                print("\t{}/{} files hashed, {} errors ({:.1f} files/s, {:.1f} MiB/s).".format(
+                    num_hashed, len(row_ids), num_errors, num_hashed / elapsed_seconds,
+                    num_bytes / (1024 * 1024) / elapsed_seconds))
+
+        if len(changed_roots) > 0:
+            FolderHashBuilder(self._database).build(sorted(changed_roots))
+            self._database.private_db.connection().commit()
+        if num_errors > 0:
+            print("WARNING: {} files could not be indexed. See table '{}' and use --retry-errors."
+                  .format(num_errors, self._database.private_db.index_errors_table_name()))
+        print("[BACKFILL END] Time elapsed {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def _store(self, indexed: List[FileType], errors: List[FileIndexingError]):
+        if len(indexed) > 0:
+            self._database.upsert_files_in_both_databases(indexed)
+        self._database.delete_files([(e.root_path, e.relative_path, e.filename) for e in errors])
+        self._database.insert_index_errors([e for e in errors if e.error_number != errno.ENOENT])
+        self._database.private_db.connection().commit()
+
+    ##################################################################################################
+
+    def _order_by(self) -> Tuple[List[str], tuple]:
+        """
+        :return: Tuple of (SQL expressions on the private index table "p" in the order of the priorities, parameters)
+        """
+        order_by = []  # type: List[str]
+        parameters = []
+        for p in self._priority:
+            if p == BackfillConfigMixin.PRIORITY_FOLDERS:
+                conditions, folder_parameters = self._priority_folder_conditions()
+                if len(conditions) > 0:
+                    order_by.append("CASE WHEN {} THEN 0 ELSE 1 END".format(" OR ".join(conditions)))
+                    parameters.extend(folder_parameters)
+            elif p == BackfillConfigMixin.PRIORITY_COLLIDING_SIZES:
+                order_by.append(
+                    "CASE WHEN EXISTS (SELECT 1 FROM {tbl} AS o WHERE o.{fsize} = p.{fsize} AND o.rowid != p.rowid) "
+                    "THEN 0 ELSE 1 END".format(tbl=self._database.private_db.table_name(),
+                                               fsize=Columns.file_size.value))
+            elif p == BackfillConfigMixin.PRIORITY_SMALLEST:
+                order_by.append("p.{}".format(Columns.file_size.value))
+        return order_by, tuple(parameters)
+
+    ##################################################################################################
+
+    def _priority_folder_conditions(self) -> Tuple[List[str], list]:
+        """
+        :return: Tuple of (SQL conditions selecting the files below each priority folder, parameters)
+        """
+        conditions = []  # type: List[str]
+        parameters = []
+        for folder in self._priority_folders:
+            folder = os.path.normpath(os.path.abspath(folder))
+            roots = [r for r in self._root_paths
+                     if folder == os.path.normpath(r) or folder.startswith(os.path.normpath(r) + os.sep)]
+            if len(roots) == 0:
+                print("WARNING: Priority folder '{}' is not below an indexed root. Ignored.".format(folder))
+                continue
+            # The innermost root, in case roots are nested.
+            root_path = max(roots, key=len)
+            relative_path = os.path.relpath(folder, os.path.normpath(root_path))
+            if relative_path == ".":
+                conditions.append("p.{proot} = ?".format(proot=Columns.root_path.value))
+                parameters.append(root_path)
+            else:
+                prefix = relative_path + os.sep
+                conditions.append("(p.{proot} = ? AND (p.{prel} = ? OR substr(p.{prel}, 1, ?) = ?))".format(
+                    proot=Columns.root_path.value, prel=Columns.relative_path.value))
+                parameters.extend([root_path, relative_path, len(prefix), prefix])
+        return conditions, parameters
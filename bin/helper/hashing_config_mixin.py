@@ -1,4 +1,7 @@
 from configparser import ConfigParser
+from typing import Optional
+
+from .content_chunking import ChunkerSettings, WINDOW_SIZE
 
 
 ##################################################################################################
@@ -9,6 +12,23 @@ class HashingConfigMixin(object):
     SECTION_NAME = "hashing"
     BLOCK_SIZE_FIELD_NAME = "file_block_size"
     FILE_NAME_BLOCK_SIZE_FIELD_NAME = "file_name_block_size"
+    CONTENT_IDENTITY_FIELD_NAME = "content_identity"
+    QUICK_SAMPLE_SIZE_FIELD_NAME = "quick_sample_size"
+    QUICK_SAMPLE_COUNT_FIELD_NAME = "quick_sample_count"
+    CONTENT_CHUNKING_FIELD_NAME = "content_chunking"
+    CHUNKING_MIN_FILE_SIZE_FIELD_NAME = "chunking_min_file_size"
+    CHUNK_MIN_SIZE_FIELD_NAME = "chunk_min_size"
+    CHUNK_AVERAGE_SIZE_FIELD_NAME = "chunk_average_size"
+    CHUNK_MAX_SIZE_FIELD_NAME = "chunk_max_size"
+    XATTR_CACHE_FIELD_NAME = "xattr_cache"
+
+    CONTENT_IDENTITY_FULL = "full"
+    CONTENT_IDENTITY_QUICK = "quick"
+    CONTENT_IDENTITIES = [CONTENT_IDENTITY_FULL, CONTENT_IDENTITY_QUICK]
+    # Not configurable: set by the metadata phase of the two-phase indexing for files whose content is hashed later.
+    CONTENT_IDENTITY_PENDING = "pending"
+    # Not configurable: members of archives (see [archives]), fully hashed but not files on disk.
+    CONTENT_IDENTITY_ARCHIVED = "archived"
 
     ##################################################################################################
 
@@ -18,16 +38,37 @@ class HashingConfigMixin(object):
 
         self._hash_file_block_size = 0  # type: int
         self._hash_file_name_block_size = 0  # type: int
+        self._content_identity = HashingConfigMixin.CONTENT_IDENTITY_FULL  # type: str
+        self._quick_sample_size = 64 * 1024  # type: int
+        self._quick_sample_count = 0  # type: int
+        self._content_chunking = False  # type: bool
+        self._chunking_min_file_size = 64 * 1024 * 1024  # type: int
+        self._chunk_min_size = 256 * 1024  # type: int
+        self._chunk_average_size = 1024 * 1024  # type: int
+        self._chunk_max_size = 8 * 1024 * 1024  # type: int
+        self._xattr_cache = False  # type: bool
 
     ##################################################################################################
 
     def read_config(self):
         self.__handle_hash_file_block_size()
         self.__handle_hash_file_name_block_size()
+        self.__handle_content_identity()
+        self.__handle_content_chunking()
+        self.__handle_xattr_cache()
 
         print("[{}]".format(HashingConfigMixin.SECTION_NAME))
         print("\t{} = '{}'".format(HashingConfigMixin.BLOCK_SIZE_FIELD_NAME, self._hash_file_block_size))
         print("\t{} = '{}'".format(HashingConfigMixin.FILE_NAME_BLOCK_SIZE_FIELD_NAME, self._hash_file_name_block_size))
+        print("\t{} = '{}'".format(HashingConfigMixin.CONTENT_IDENTITY_FIELD_NAME, self._content_identity))
+        print("\t{} = '{}'".format(HashingConfigMixin.QUICK_SAMPLE_SIZE_FIELD_NAME, self._quick_sample_size))
+        print("\t{} = '{}'".format(HashingConfigMixin.QUICK_SAMPLE_COUNT_FIELD_NAME, self._quick_sample_count))
+        print("\t{} = '{}'".format(HashingConfigMixin.CONTENT_CHUNKING_FIELD_NAME, self._content_chunking))
+        print("\t{} = '{}'".format(HashingConfigMixin.CHUNKING_MIN_FILE_SIZE_FIELD_NAME, self._chunking_min_file_size))
+        print("\t{} = '{}'".format(HashingConfigMixin.CHUNK_MIN_SIZE_FIELD_NAME, self._chunk_min_size))
+        print("\t{} = '{}'".format(HashingConfigMixin.CHUNK_AVERAGE_SIZE_FIELD_NAME, self._chunk_average_size))
+        print("\t{} = '{}'".format(HashingConfigMixin.CHUNK_MAX_SIZE_FIELD_NAME, self._chunk_max_size))
+        print("\t{} = '{}'".format(HashingConfigMixin.XATTR_CACHE_FIELD_NAME, self._xattr_cache))
 
     ##################################################################################################
 
@@ -41,6 +82,42 @@ class HashingConfigMixin(object):
 
     ##################################################################################################
 
+    def get_content_identity(self):
+        return self._content_identity
+
+    ##################################################################################################
+
+    def get_quick_sample_size(self):
+        return self._quick_sample_size
+
+    ##################################################################################################
+
+    def get_quick_sample_count(self):
+        return self._quick_sample_count
+
+    ##################################################################################################
+
+    def is_content_chunking(self):
+        return self._content_chunking
+
+    ##################################################################################################
+
+    def get_chunker_settings(self) -> Optional[ChunkerSettings]:
+        """
+        :return: The chunking parameters if content chunking is enabled, otherwise None
+        """
+        if not self._content_chunking:
+            return None
+        return ChunkerSettings(min_file_size=self._chunking_min_file_size, min_size=self._chunk_min_size,
+                               average_size=self._chunk_average_size, max_size=self._chunk_max_size)
+
+    ##################################################################################################
+
+    def is_xattr_cache(self):
+        return self._xattr_cache
+
+    ##################################################################################################
+
     def __handle_hash_file_block_size(self):
         if not self._parser.has_section(HashingConfigMixin.SECTION_NAME):
             raise ValueError(
@@ -69,3 +146,52 @@ class HashingConfigMixin(object):
 
         self._hash_file_name_block_size = int(
             self._parser.get(HashingConfigMixin.SECTION_NAME, HashingConfigMixin.FILE_NAME_BLOCK_SIZE_FIELD_NAME))
+
+    ##################################################################################################
+
+    def __handle_content_identity(self):
+        section = HashingConfigMixin.SECTION_NAME
+        self._content_identity = self._parser.get(
+            section, HashingConfigMixin.CONTENT_IDENTITY_FIELD_NAME, fallback=self._content_identity).strip()
+        self._quick_sample_size = self._parser.getint(
+            section, HashingConfigMixin.QUICK_SAMPLE_SIZE_FIELD_NAME, fallback=self._quick_sample_size)
+        self._quick_sample_count = self._parser.getint(
+            section, HashingConfigMixin.QUICK_SAMPLE_COUNT_FIELD_NAME, fallback=self._quick_sample_count)
+
+        if self._content_identity not in HashingConfigMixin.CONTENT_IDENTITIES:
+            raise ValueError("ERROR: '[{}]' - '{}' must be one of {}"
+                             .format(section, HashingConfigMixin.CONTENT_IDENTITY_FIELD_NAME,
+                                     HashingConfigMixin.CONTENT_IDENTITIES))
+        if self._quick_sample_size < 1:
+            raise ValueError("ERROR: '[{}]' - '{}' must be positive"
+                             .format(section, HashingConfigMixin.QUICK_SAMPLE_SIZE_FIELD_NAME))
+        if self._quick_sample_count < 0:
+            raise ValueError("ERROR: '[{}]' - '{}' must not be negative"
+                             .format(section, HashingConfigMixin.QUICK_SAMPLE_COUNT_FIELD_NAME))
+
+    ##################################################################################################
+
+    def __handle_content_chunking(self):
+        section = HashingConfigMixin.SECTION_NAME
+        self._content_chunking = self._parser.getboolean(
+            section, HashingConfigMixin.CONTENT_CHUNKING_FIELD_NAME, fallback=self._content_chunking)
+        self._chunking_min_file_size = self._parser.getint(
+            section, HashingConfigMixin.CHUNKING_MIN_FILE_SIZE_FIELD_NAME, fallback=self._chunking_min_file_size)
+        self._chunk_min_size = self._parser.getint(
+            section, HashingConfigMixin.CHUNK_MIN_SIZE_FIELD_NAME, fallback=self._chunk_min_size)
+        self._chunk_average_size = self._parser.getint(
+            section, HashingConfigMixin.CHUNK_AVERAGE_SIZE_FIELD_NAME, fallback=self._chunk_average_size)
+        self._chunk_max_size = self._parser.getint(
+            section, HashingConfigMixin.CHUNK_MAX_SIZE_FIELD_NAME, fallback=self._chunk_max_size)
+
+        if not WINDOW_SIZE <= self._chunk_min_size <= self._chunk_average_size <= self._chunk_max_size:
+            raise ValueError("ERROR: '[{}]' requires {} <= {} <= {} <= {}"
+                             .format(section, WINDOW_SIZE, HashingConfigMixin.CHUNK_MIN_SIZE_FIELD_NAME,
+                                     HashingConfigMixin.CHUNK_AVERAGE_SIZE_FIELD_NAME,
+                                     HashingConfigMixin.CHUNK_MAX_SIZE_FIELD_NAME))
+
+    ##################################################################################################
+
+    def __handle_xattr_cache(self):
+        self._xattr_cache = self._parser.getboolean(
+            HashingConfigMixin.SECTION_NAME, HashingConfigMixin.XATTR_CACHE_FIELD_NAME, fallback=self._xattr_cache)
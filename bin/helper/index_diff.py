@@ -0,0 +1,210 @@
+import os
+import sqlite3
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+from .database_helper import PublicDataBase, connect_read_only, find_index_table_name
+from .record_writer import RecordWriter
+
+######################################################################################################
+
+Columns = PublicDataBase.PublicIndexTableColumnNames
+
+# Row layout used by the merge: key columns first, then the compared payload.
+ROW_COLUMNS = [Columns.root_path_hash_tag.value,
+               Columns.relative_path_hash_tag.value,
+               Columns.filename_hash_tag.value,
+               Columns.file_content_hash_tag.value,
+               Columns.last_modification_time.value,
+               Columns.file_size.value]
+
+ROOT, REL, FNAME, CONTENT, MTIME, SIZE = range(len(ROW_COLUMNS))
+
+DIFF_FIELD_NAMES = ["change",
+                    Columns.root_path_hash_tag.value,
+                    Columns.relative_path_hash_tag.value,
+                    Columns.filename_hash_tag.value,
+                    "old_" + Columns.root_path_hash_tag.value,
+                    "old_" + Columns.relative_path_hash_tag.value,
+                    "old_" + Columns.filename_hash_tag.value,
+                    "old_" + Columns.file_content_hash_tag.value,
+                    "new_" + Columns.file_content_hash_tag.value,
+                    "old_" + Columns.last_modification_time.value,
+                    "new_" + Columns.last_modification_time.value,
+                    "old_" + Columns.file_size.value,
+                    "new_" + Columns.file_size.value]
+
+
+######################################################################################################
+
+def _iterate_rows(cursor: sqlite3.Cursor, batch_size: int) -> Iterator[tuple]:
+    """
+    Helper generator that streams the result of an executed query in batches.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+######################################################################################################
+
+class IndexDiff(object):
+    """
+    Computes the changes between two index databases (private or public) of the same roots.
+
+    The files of both databases are streamed ordered by their primary key (root, relative path, filename hash tags)
+    and merged like a sort-merge join, so only one row per side is held in memory. Rows present on one side only are
+    spilled to a temporary database and merged a second time ordered by content hash tag to pair them up as moves.
+
+    Changes:
+        added       file key only present in the new index
+        deleted     file key only present in the old index
+        modified    same file key, different content
+        moved       content vanished at one file key and appeared at another one
+        touched     same file key and content, different modification time or size
+        unchanged   same file key, content and modification time (only reported on request)
+    """
+
+    ##################################################################################################
+
+    BATCH_SIZE = 10000
+
+    ##################################################################################################
+
+    def __init__(self, old_database_path: str, new_database_path: str, report_unchanged: bool = False,
+                 temp_directory: Optional[str] = None):
+        self._old_database_path = old_database_path  # type: str
+        self._new_database_path = new_database_path  # type: str
+        self._report_unchanged = report_unchanged  # type: bool
+        self._temp_directory = temp_directory  # type: Optional[str]
+        self.change_counts = {}  # type: dict
+
+    ##################################################################################################
+
+    def write(self, writer: RecordWriter):
+        """
+        Computes the diff and writes one record per change.
+        """
+        self.change_counts = {}
+        old_db = connect_read_only(self._old_database_path)
+        new_db = connect_read_only(self._new_database_path)
+
+        spill_file, spill_path = tempfile.mkstemp(suffix=".sqlite", prefix="diff-index-", dir=self._temp_directory)
+        os.close(spill_file)
+        spill_db = sqlite3.connect(spill_path)
+        try:
+            spill_db.execute("PRAGMA journal_mode = OFF")
+            spill_db.execute("PRAGMA synchronous = OFF")
+            for tbl in ["deleted", "added"]:
+                spill_db.execute("CREATE TABLE {tbl} ({cols})".format(tbl=tbl, cols=", ".join(ROW_COLUMNS)))
+
+            self._merge_by_file_key(old_db, new_db, spill_db, writer)
+            spill_db.commit()
+            self._merge_by_content(spill_db, writer)
+        finally:
+            spill_db.close()
+            os.remove(spill_path)
+            old_db.close()
+            new_db.close()
+
+    ##################################################################################################
+
+    def _select_ordered(self, connection: sqlite3.Connection) -> Iterator[tuple]:
+        # The ORDER BY matches the primary key, SQLite walks the primary key index instead of sorting.
+        q = """
+        SELECT
+            {cols}
+        FROM
+            {tbl}
+        ORDER BY
+            {root}, {rel}, {fname}
+        """.format(cols=", ".join(ROW_COLUMNS),
+                   tbl=find_index_table_name(connection),
+                   root=Columns.root_path_hash_tag.value,
+                   rel=Columns.relative_path_hash_tag.value,
+                   fname=Columns.filename_hash_tag.value)
+        return _iterate_rows(connection.execute(q), IndexDiff.BATCH_SIZE)
+
+    ##################################################################################################
+
+    def _merge_by_file_key(self, old_db: sqlite3.Connection, new_db: sqlite3.Connection,
+                           spill_db: sqlite3.Connection, writer: RecordWriter):
+        insert_q = "INSERT INTO {tbl} VALUES (?, ?, ?, ?, ?, ?)"
+        old_rows = self._select_ordered(old_db)
+        new_rows = self._select_ordered(new_db)
+        old_row = next(old_rows, None)
+        new_row = next(new_rows, None)
+
+        while old_row is not None or new_row is not None:
+            old_key = None if old_row is None else old_row[:CONTENT]
+            new_key = None if new_row is None else new_row[:CONTENT]
+
+            if new_key is None or (old_key is not None and old_key < new_key):
+                spill_db.execute(insert_q.format(tbl="deleted"), old_row)
+                old_row = next(old_rows, None)
+            elif old_key is None or new_key < old_key:
+                spill_db.execute(insert_q.format(tbl="added"), new_row)
+                new_row = next(new_rows, None)
+            else:
+                if old_row[CONTENT] != new_row[CONTENT]:
+                    self._emit(writer, "modified", old_row, new_row)
+                elif old_row[MTIME] != new_row[MTIME] or old_row[SIZE] != new_row[SIZE]:
+                    self._emit(writer, "touched", old_row, new_row)
+                elif self._report_unchanged:
+                    self._emit(writer, "unchanged", old_row, new_row)
+                old_row = next(old_rows, None)
+                new_row = next(new_rows, None)
+
+    ##################################################################################################
+
+    def _merge_by_content(self, spill_db: sqlite3.Connection, writer: RecordWriter):
+        q = "SELECT {cols} FROM {{tbl}} ORDER BY {content}, {root}, {rel}, {fname}".format(
+            cols=", ".join(ROW_COLUMNS),
+            content=Columns.file_content_hash_tag.value,
+            root=Columns.root_path_hash_tag.value,
+            rel=Columns.relative_path_hash_tag.value,
+            fname=Columns.filename_hash_tag.value)
+
+        # Two cursors on the same connection to walk both spill tables simultaneously.
+        deleted_rows = _iterate_rows(spill_db.cursor().execute(q.format(tbl="deleted")), IndexDiff.BATCH_SIZE)
+        added_rows = _iterate_rows(spill_db.cursor().execute(q.format(tbl="added")), IndexDiff.BATCH_SIZE)
+        deleted_row = next(deleted_rows, None)
+        added_row = next(added_rows, None)
+
+        while deleted_row is not None or added_row is not None:
+            if added_row is None or (deleted_row is not None and deleted_row[CONTENT] < added_row[CONTENT]):
+                self._emit(writer, "deleted", deleted_row, None)
+                deleted_row = next(deleted_rows, None)
+            elif deleted_row is None or added_row[CONTENT] < deleted_row[CONTENT]:
+                self._emit(writer, "added", None, added_row)
+                added_row = next(added_rows, None)
+            else:
+                self._emit(writer, "moved", deleted_row, added_row)
+                deleted_row = next(deleted_rows, None)
+                added_row = next(added_rows, None)
+
+    ##################################################################################################
+
+    def _emit(self, writer: RecordWriter, change: str, old_row: Optional[Tuple], new_row: Optional[Tuple]):
+        key_row = new_row if new_row is not None else old_row
+        record = {"change": change,
+                  Columns.root_path_hash_tag.value: key_row[ROOT],
+                  Columns.relative_path_hash_tag.value: key_row[REL],
+                  Columns.filename_hash_tag.value: key_row[FNAME]}
+        if change == "moved":
+            record["old_" + Columns.root_path_hash_tag.value] = old_row[ROOT]
+            record["old_" + Columns.relative_path_hash_tag.value] = old_row[REL]
+            record["old_" + Columns.filename_hash_tag.value] = old_row[FNAME]
+        if old_row is not None:
+            record["old_" + Columns.file_content_hash_tag.value] = old_row[CONTENT]
+            record["old_" + Columns.last_modification_time.value] = old_row[MTIME]
+            record["old_" + Columns.file_size.value] = old_row[SIZE]
+        if new_row is not None:
+            record["new_" + Columns.file_content_hash_tag.value] = new_row[CONTENT]
+            record["new_" + Columns.last_modification_time.value] = new_row[MTIME]
+            record["new_" + Columns.file_size.value] = new_row[SIZE]
+
+        writer.write(record)
+        self.change_counts[change] = self.change_counts.get(change, 0) + 1
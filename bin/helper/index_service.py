@@ -0,0 +1,421 @@
+import hashlib
+import http.client
+import http.server
+import json
+import os
+import queue
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .database_helper import PrivateDataBase, connect_read_only, database_fingerprint
+from .hashing_config_mixin import HashingConfigMixin
+from .serve_config_mixin import ServeConfigMixin
+
+
+##################################################################################################
+
+def _path_hash_tag(path: str) -> str:
+    # Same as calculate_hash(path, hash_content=False) of the indexer.
+    return hashlib.md5(path.encode()).hexdigest()
+
+
+##################################################################################################
+
+class ConnectionPool(object):
+    """
+    Pool of read only connections to an index database, shared by the request threads.
+    Every connection caches the prepared statements of the lookups (sqlite3 statement cache), so a lookup is parsed
+    once per connection only.
+    """
+
+    ##################################################################################################
+
+    STATEMENT_CACHE_SIZE = 32
+
+    ##################################################################################################
+
+    def __init__(self, database_path: str, size: int):
+        self._connections = queue.LifoQueue()  # type: queue.LifoQueue
+        self._all_connections = []  # type: List[sqlite3.Connection]
+        for _ in range(size):
+            connection = connect_read_only(database_path, check_same_thread=False,
+                                           cached_statements=ConnectionPool.STATEMENT_CACHE_SIZE)
+            self._all_connections.append(connection)
+            self._connections.put(connection)
+
+    ##################################################################################################
+
+    @contextmanager
+    def connection(self):
+        connection = self._connections.get()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+
+    ##################################################################################################
+
+    def size(self): return len(self._all_connections)
+
+    ##################################################################################################
+
+    def close(self):  [c.close() for c in self._all_connections]
+
+
+##################################################################################################
+
+class ResultCache(object):
+    """
+    Thread safe LRU cache of lookup results. The cache is cleared as soon as the database changed, which is checked
+    at most every CHECK_INTERVAL_SECONDS by the fingerprint of the database file.
+    """
+
+    ##################################################################################################
+
+    CHECK_INTERVAL_SECONDS = 1.0
+
+    ##################################################################################################
+
+    def __init__(self, database_path: str, max_entries: int):
+        self._database_path = database_path  # type: str
+        self._max_entries = max_entries  # type: int
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+        self._fingerprint = database_fingerprint(database_path)  # type: Dict[str, int]
+        self._last_check_timestamp = time.monotonic()  # type: float
+        self.hits = 0  # type: int
+        self.misses = 0  # type: int
+        self.invalidations = 0  # type: int
+
+    ##################################################################################################
+
+    def get(self, key: Tuple):
+        """
+        :return: The cached result or None
+        """
+        with self._lock:
+            self._check_database()
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    ##################################################################################################
+
+    def put(self, key: Tuple, result):
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    ##################################################################################################
+
+    def __len__(self): return len(self._entries)
+
+    ##################################################################################################
+
+    def _check_database(self):
+        now = time.monotonic()
+        if now - self._last_check_timestamp < ResultCache.CHECK_INTERVAL_SECONDS:
+            return
+        self._last_check_timestamp = now
+        fingerprint = database_fingerprint(self._database_path)
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self._entries.clear()
+            self.invalidations += 1
+
+
+##################################################################################################
+
+class IndexQueryService(object):
+    """
+    Lookups in the private index: files by content hash, by size, the duplicates of a file and the files missing in
+    a root (their content exists in other roots only).
+    All lookups use an index (see PrivateDataBase.create_lookup_indexes()), results are limited to max_results files
+    and cached. Members of archives are found by content and size with "in_archive": true, their path is virtual
+    (below the archive file), a root lacks a content if no real file has it and only real files are listed as missing.
+    """
+
+    ##################################################################################################
+
+    FILE_COLUMNS = [PrivateDataBase.PrivateIndexTableColumnNames.root_path.value,
+                    PrivateDataBase.PrivateIndexTableColumnNames.relative_path.value,
+                    PrivateDataBase.PrivateIndexTableColumnNames.filename.value,
+                    PrivateDataBase.PrivateIndexTableColumnNames.file_size.value,
+                    PrivateDataBase.PrivateIndexTableColumnNames.last_modification_time.value,
+                    PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_tag.value,
+                    PrivateDataBase.PrivateIndexTableColumnNames.file_content_hash_mode.value]
+
+    ##################################################################################################
+
+    def __init__(self, private_db: PrivateDataBase, root_paths: List[str], serve_config: ServeConfigMixin):
+        """
+        :param private_db: Database of the index, used to prepare it (lookup indexes, WAL mode) only
+        :param root_paths: Indexed root folders, the paths of files are resolved against them
+        """
+        private_db.create_lookup_indexes()
+        # Readers do not block the indexer writing (e.g. the watcher) and vice versa.
+        private_db.cursor().execute("PRAGMA journal_mode = WAL").fetchall()
+        private_db.connection().commit()
+
+        self._root_paths = root_paths  # type: List[str]
+        self._max_results = serve_config.get_max_results()  # type: int
+        self._pool = ConnectionPool(private_db.database_path(), serve_config.get_pool_size())  # type: ConnectionPool
+        self._cache = ResultCache(private_db.database_path(),
+                                  serve_config.get_cache_entries())  # type: ResultCache
+
+        columns = ", ".join(IndexQueryService.FILE_COLUMNS)
+        tbl = private_db.table_name()
+        c = PrivateDataBase.PrivateIndexTableColumnNames
+        self._q_content = "SELECT {} FROM {} WHERE {} = ? LIMIT ?".format(
+            columns, tbl, c.file_content_hash_tag.value)
+        self._q_size = "SELECT {} FROM {} WHERE {} = ? LIMIT ?".format(columns, tbl, c.file_size.value)
+        self._q_path = "SELECT {} FROM {} WHERE {} = ? AND {} = ? AND {} = ?".format(
+            columns, tbl, c.root_path_hash_tag.value, c.relative_path_hash_tag.value, c.filename_hash_tag.value)
+        self._q_missing = """
+        SELECT {columns} FROM {tbl} AS p
+        WHERE
+            p.{proot} != ?
+            AND p.{fhmode} NOT IN (?, ?)
+            AND NOT EXISTS (SELECT 1 FROM {tbl} AS q
+                            WHERE q.{fconth} = p.{fconth} AND q.{proot} = ? AND q.{fhmode} != ?)
+        ORDER BY p.rowid
+        LIMIT ? OFFSET ?
+        """.format(columns=", ".join("p." + column for column in IndexQueryService.FILE_COLUMNS), tbl=tbl,
+                   proot=c.root_path.value, fconth=c.file_content_hash_tag.value,
+                   fhmode=c.file_content_hash_mode.value)
+
+    ##################################################################################################
+
+    def close(self): self._pool.close()
+
+    ##################################################################################################
+
+    def find_by_content_hash(self, content_hash: str) -> dict:
+        content_hash = content_hash.strip().lower()
+        return {"content_hash": content_hash,
+                "files": self._query(("content", content_hash), self._q_content, (content_hash, self._max_results))}
+
+    ##################################################################################################
+
+    def find_by_size(self, file_size: int) -> dict:
+        return {"size": file_size,
+                "files": self._query(("size", file_size), self._q_size, (file_size, self._max_results))}
+
+    ##################################################################################################
+
+    def find_duplicates_of_path(self, file_path: str) -> dict:
+        """
+        :return: The indexed file of the path and all other files with the same content
+        """
+        file_path = os.path.normpath(os.path.abspath(file_path))
+        key = self._split_path(file_path)
+        files = [] if key is None else self._query(
+            ("path",) + key, self._q_path,
+            (_path_hash_tag(key[0]), _path_hash_tag(key[1]), _path_hash_tag(key[2])))
+        if len(files) == 0:
+            return {"path": file_path, "indexed": False, "file": None, "duplicates": []}
+        if files[0]["hash_mode"] == HashingConfigMixin.CONTENT_IDENTITY_PENDING:
+            # Not hashed yet (two-phase indexing), its duplicates are unknown.
+            return {"path": file_path, "indexed": True, "file": files[0], "duplicates": None}
+        duplicates = self.find_by_content_hash(files[0]["content_hash"])["files"]
+        return {"path": file_path,
+                "indexed": True,
+                "file": files[0],
+                "duplicates": [f for f in duplicates if f["path"] != files[0]["path"]]}
+
+    ##################################################################################################
+
+    def find_missing_in_root(self, root_path: str, offset: int = 0) -> dict:
+        """
+        :return: Files of the other roots whose content does not exist in the given root, max_results per page. Files
+                 not hashed yet and members of archives are left out.
+        """
+        if root_path not in self._root_paths:
+            raise ValueError("Unknown root '{}', indexed roots are {}.".format(root_path, self._root_paths))
+        return {"root": root_path,
+                "offset": offset,
+                "files": self._query(("missing", root_path, offset), self._q_missing,
+                                     (root_path, HashingConfigMixin.CONTENT_IDENTITY_PENDING,
+                                      HashingConfigMixin.CONTENT_IDENTITY_ARCHIVED, root_path,
+                                      HashingConfigMixin.CONTENT_IDENTITY_ARCHIVED, self._max_results, offset))}
+
+    ##################################################################################################
+
+    def get_statistics(self) -> dict:
+        return {"lookups": self._cache.hits + self._cache.misses,
+                "connections": self._pool.size(),
+                "cache_entries": len(self._cache),
+                "cache_hits": self._cache.hits,
+                "cache_misses": self._cache.misses,
+                "cache_invalidations": self._cache.invalidations}
+
+    ##################################################################################################
+
+    def _query(self, key: Tuple, q: str, parameters: Tuple) -> List[dict]:
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+        with self._pool.connection() as connection:
+            rows = connection.execute(q, parameters).fetchall()
+        result = [{"path": os.path.join(r[0], r[1], r[2]) if r[1] != "." else os.path.join(r[0], r[2]),
+                   "root": r[0],
+                   "size": r[3],
+                   "mtime": r[4],
+                   "content_hash": r[5],
+                   "hash_mode": r[6],
+                   "in_archive": r[6] == HashingConfigMixin.CONTENT_IDENTITY_ARCHIVED} for r in rows]
+        self._cache.put(key, result)
+        return result
+
+    ##################################################################################################
+
+    def _split_path(self, file_path: str) -> Optional[Tuple[str, str, str]]:
+        """
+        :return: (root path, relative path, filename) as stored in the index, None if the path is below no root
+        """
+        best = None
+        for root_path in self._root_paths:
+            normalized_root = os.path.normpath(os.path.abspath(root_path))
+            if file_path.startswith(normalized_root + os.sep) and (best is None or len(normalized_root) > best[1]):
+                best = (root_path, len(normalized_root))
+        if best is None:
+            return None
+        root_path = best[0]
+        relative_path = os.path.relpath(os.path.dirname(file_path), os.path.normpath(os.path.abspath(root_path)))
+        return root_path, relative_path, os.path.basename(file_path)
+
+
+##################################################################################################
+
+class IndexRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    JSON over HTTP/1.1 (keep-alive) for the IndexQueryService of the server:
+        GET /hash?value=<content hash>
+        GET /size?value=<bytes>
+        GET /duplicates?path=<absolute file path>
+        GET /missing?root=<indexed root>&offset=<n>
+        GET /stats
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are sent at once when the request is done: separate small writes stall keep-alive clients
+    # (Nagle's algorithm vs. delayed ACKs).
+    wbufsize = 64 * 1024
+
+    ##################################################################################################
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parameters = {k: v[0] for k, v in parse_qs(url.query).items()}
+        service = self.server.service  # type: IndexQueryService
+        try:
+            if url.path == "/hash":
+                result = service.find_by_content_hash(parameters["value"])
+            elif url.path == "/size":
+                result = service.find_by_size(int(parameters["value"]))
+            elif url.path == "/duplicates":
+                result = service.find_duplicates_of_path(parameters["path"])
+            elif url.path == "/missing":
+                result = service.find_missing_in_root(parameters["root"], int(parameters.get("offset", 0)))
+            elif url.path == "/stats":
+                result = service.get_statistics()
+            else:
+                self._send(404, {"error": "Unknown lookup '{}'.".format(url.path)})
+                return
+        except KeyError as e:
+            self._send(400, {"error": "Missing parameter {}.".format(e)})
+            return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except sqlite3.Error as e:
+            self._send(500, {"error": str(e)})
+            return
+        self._send(200, result)
+
+    ##################################################################################################
+
+    def _send(self, status: int, result: dict):
+        body = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    ##################################################################################################
+
+    def address_string(self):
+        # Unix domain socket clients have no address.
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    ##################################################################################################
+
+    def log_message(self, format, *args):
+        # Thousands of lookups per minute, errors only.
+        if len(args) >= 2 and str(args[1]).startswith("5"):
+            super().log_message(format, *args)
+
+
+##################################################################################################
+
+class ThreadingTCPHTTPServer(http.server.ThreadingHTTPServer):
+    # Many clients connecting at once must not overflow the listen queue (default 5).
+    request_queue_size = 128
+
+
+##################################################################################################
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+##################################################################################################
+
+def create_server(service: IndexQueryService, serve_config: ServeConfigMixin) -> socketserver.BaseServer:
+    """
+    Helper function that creates the HTTP server of the service, on the Unix domain socket if configured, otherwise on
+    host:port.
+    """
+    socket_path = serve_config.get_socket_path()
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, IndexRequestHandler)
+    else:
+        server = ThreadingTCPHTTPServer((serve_config.get_host(), serve_config.get_port()), IndexRequestHandler)
+    server.service = service
+    return server
+
+
+##################################################################################################
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    Client connection to the service served on a Unix domain socket.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path  # type: str
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
@@ -0,0 +1,203 @@
+import glob
+import os
+import shutil
+import sqlite3
+from datetime import timedelta
+from multiprocessing.util import Finalize
+from timeit import default_timer as timer
+from typing import List, Optional
+
+from .database_helper import DataBaseIndexHelper, PrivateDataBase, PublicDataBase, \
+    convert_file_type_list_to_tuple_list
+from .file_type import FileType
+
+
+##################################################################################################
+
+SHARD_FILES_TABLE_NAME = "shard_files"
+SHARD_CHUNKS_TABLE_NAME = "shard_chunks"
+SHARD_FILE_CHUNKS_TABLE_NAME = "shard_file_chunks"
+
+
+##################################################################################################
+
+def default_shard_directory(database_path: str) -> str:
+    return database_path + ".shards"
+
+
+##################################################################################################
+
+class ShardWriter(object):
+    """
+    Writes the indexed files of one worker process into its own SQLite file, so that the workers do not funnel their
+    results through the parent process and its single database connection.
+
+    The shard is a loading database: no journal, no syncing, no keys. Rows are written in transactions of BATCH_SIZE
+    files, the last transaction is committed when the worker process exits.
+    """
+
+    ##################################################################################################
+
+    BATCH_SIZE = 1000
+
+    ##################################################################################################
+
+    def __init__(self, shard_directory: str):
+        self._path = os.path.join(shard_directory, "shard-{}.sqlite".format(os.getpid()))  # type: str
+        self._connection = sqlite3.connect(self._path)  # type: sqlite3.Connection
+        for pragma in ["journal_mode = OFF", "synchronous = OFF", "locking_mode = EXCLUSIVE", "temp_store = MEMORY"]:
+            self._connection.execute("PRAGMA {}".format(pragma)).fetchall()
+        self._create_tables()
+        self._pending = []  # type: List[FileType]
+        # Runs when the pool shuts the worker process down.
+        Finalize(None, self.close, exitpriority=10)
+
+    ##################################################################################################
+
+    def write(self, file: FileType):
+        self._pending.append(file)
+        if len(self._pending) >= ShardWriter.BATCH_SIZE:
+            self.flush()
+
+    ##################################################################################################
+
+    def flush(self):
+        if len(self._pending) == 0:
+            return
+        cursor = self._connection.cursor()
+        cursor.executemany("INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)".format(
+            SHARD_FILES_TABLE_NAME), convert_file_type_list_to_tuple_list(self._pending))
+        for f in [f for f in self._pending if f.chunks is not None]:
+            cursor.executemany("INSERT INTO {} VALUES (?, ?)".format(SHARD_CHUNKS_TABLE_NAME),
+                               [(chunk_hash_tag, length) for _, length, chunk_hash_tag in f.chunks])
+            cursor.executemany(
+                "INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?)".format(SHARD_FILE_CHUNKS_TABLE_NAME),
+                [(f.root_path_hash_tag, f.relative_path_hash_tag, f.filename_hash_tag, i, offset, chunk_hash_tag)
+                 for i, (offset, _, chunk_hash_tag) in enumerate(f.chunks)])
+        self._connection.commit()
+        self._pending = []
+
+    ##################################################################################################
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    ##################################################################################################
+
+    def _create_tables(self):
+        self._connection.execute("CREATE TABLE IF NOT EXISTS {} ({})".format(
+            SHARD_FILES_TABLE_NAME, ", ".join(column.value for column in PrivateDataBase.PrivateIndexTableColumnNames)))
+        self._connection.execute("CREATE TABLE IF NOT EXISTS {} ({})".format(
+            SHARD_CHUNKS_TABLE_NAME, ", ".join(column.value for column in PublicDataBase.PublicChunkTableColumnNames)))
+        self._connection.execute("CREATE TABLE IF NOT EXISTS {} ({})".format(
+            SHARD_FILE_CHUNKS_TABLE_NAME,
+            ", ".join(column.value for column in PublicDataBase.PublicFileChunkTableColumnNames)))
+        self._connection.commit()
+
+
+##################################################################################################
+
+# The shard writer of the current worker process, created by the first file it indexes.
+_shard_writer = None  # type: Optional[ShardWriter]
+
+
+##################################################################################################
+
+def write_to_shard(shard_directory: str, file: FileType):
+    """
+    Process pool helper: stores the file in the shard of the calling worker process.
+    """
+    global _shard_writer
+    if _shard_writer is None:
+        _shard_writer = ShardWriter(shard_directory)
+    _shard_writer.write(file)
+
+
+##################################################################################################
+
+class ShardMerger(object):
+    """
+    Merges the shards written by the workers into the private and public databases.
+
+    Up to MAX_ATTACHED_SHARDS shards are attached to the private connection at a time, their rows are inserted with one
+    INSERT ... SELECT per table, sorted by the primary key: the B-trees of the keys are filled in order instead of by
+    random inserts, and all rows go through SQLite only, not through Python.
+    """
+
+    ##################################################################################################
+
+    # SQLite allows 10 attached databases by default, one is the public database.
+    MAX_ATTACHED_SHARDS = 8
+
+    ##################################################################################################
+
+    def __init__(self, database: DataBaseIndexHelper):
+        self.database = database
+
+    ##################################################################################################
+
+    def merge(self, shard_directory: str) -> int:
+        """
+        Merges all shards of the folder and removes them.
+        :return: Number of merged files
+        """
+        start_timestamp = timer()
+        shard_paths = sorted(glob.glob(os.path.join(shard_directory, "shard-*.sqlite")))
+        print("Merging {} shards into the private and public database ...".format(len(shard_paths)))
+
+        num_files = 0
+        connection = self.database.private_db.connection()
+        for start in range(0, len(shard_paths), ShardMerger.MAX_ATTACHED_SHARDS):
+            group = shard_paths[start:start + ShardMerger.MAX_ATTACHED_SHARDS]
+            # Attaching is not possible within a transaction.
+            connection.commit()
+            for i, path in enumerate(group):
+                connection.execute("ATTACH DATABASE ? AS shard_{}".format(i), (path,))
+            try:
+                num_files += self._merge_attached(len(group))
+                connection.commit()
+            finally:
+                for i in range(len(group)):
+                    connection.execute("DETACH DATABASE shard_{}".format(i))
+
+        shutil.rmtree(shard_directory, ignore_errors=True)
+        print("Merged {} files in {}.".format(num_files, timedelta(seconds=timer() - start_timestamp)))
+        return num_files
+
+    ##################################################################################################
+
+    def _merge_attached(self, num_shards: int) -> int:
+        def union(table: str) -> str:
+            return " UNION ALL ".join("SELECT * FROM shard_{}.{}".format(i, table) for i in range(num_shards))
+
+        private_columns = PrivateDataBase.PrivateIndexTableColumnNames
+        public_columns = ", ".join(column.value for column in PublicDataBase.PublicIndexTableColumnNames)
+        file_key = ", ".join([private_columns.root_path_hash_tag.value, private_columns.relative_path_hash_tag.value,
+                              private_columns.filename_hash_tag.value])
+        file_chunk_key = ", ".join([file_key, PublicDataBase.PublicFileChunkTableColumnNames.chunk_index.value])
+        chunk_key = PublicDataBase.PublicChunkTableColumnNames.chunk_hash_tag.value
+
+        queries = [
+            "INSERT INTO {tbl} SELECT * FROM ({rows}) ORDER BY {key}".format(
+                tbl=self.database.private_db.table_name(), rows=union(SHARD_FILES_TABLE_NAME), key=file_key),
+            # Same semantics as the single writer: rows of previous runs are kept in the public table.
+            "INSERT OR IGNORE INTO public.{tbl} SELECT {columns} FROM ({rows}) ORDER BY {key}".format(
+                tbl=self.database.public_db.table_name(), columns=public_columns,
+                rows=union(SHARD_FILES_TABLE_NAME), key=file_key),
+            "INSERT OR IGNORE INTO public.{tbl} SELECT * FROM ({rows}) ORDER BY {key}".format(
+                tbl=self.database.public_db.chunk_table_name(), rows=union(SHARD_CHUNKS_TABLE_NAME), key=chunk_key),
+            "INSERT OR REPLACE INTO public.{tbl} SELECT * FROM ({rows}) ORDER BY {key}".format(
+                tbl=self.database.public_db.file_chunk_table_name(), rows=union(SHARD_FILE_CHUNKS_TABLE_NAME),
+                key=file_chunk_key)]
+        cursor = self.database.private_db.cursor()
+        num_files = 0
+        for i, q in enumerate(queries):
+            try:
+                cursor.execute(q)
+            except sqlite3.Error as e:
+                print(q)
+                raise e
+            if i == 0:
+                num_files = cursor.rowcount
+        return num_files
@@ -0,0 +1,334 @@
+import concurrent
+import concurrent.futures
+import os
+import select
+import sys
+import time
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import Dict, List, Set, Tuple
+
+from .archive_reader import is_below_archive
+from .archives_config_mixin import ArchivesConfigMixin
+from .database_helper import DataBaseIndexHelper
+from .directory_indexer import DirectoryIndexer, format_file_time
+from .folder_hashing import FolderHashBuilder
+from .hashing_config_mixin import HashingConfigMixin
+from .io_limits_config_mixin import IoLimitsConfigMixin
+from .inotify import Inotify, InotifyEvent, INDEX_EVENTS, IN_ONLYDIR, IN_DONT_FOLLOW, IN_EXCL_UNLINK, IN_ISDIR, \
+    IN_Q_OVERFLOW, IN_IGNORED, IN_MOVED_FROM, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF
+from .path_config_mixin import PathConfigMixin
+from .watch_config_mixin import WatchConfigMixin
+
+
+##################################################################################################
+
+class IndexWatcher(object):
+    """
+    Keeps the index up to date by watching the configured folders with inotify.
+
+    Events are not applied immediately: the affected files and folders are collected and handled once they did not
+    change for debounce_seconds, so a file written in many steps is hashed once. Whether a file is re-indexed or removed
+    is decided by its state on disk at that time. Folders (created, moved, deleted) are handled by reconciling the
+    folder: the files on disk are compared with the indexed ones by modification time and size and only the differing
+    files are re-hashed, its sub folders are watched (again). The same reconciliation of all roots runs at start up, it
+    catches the changes made while the watcher was not running.
+    After a queue overflow the folders whose modification time changed since they were watched are reconciled, and
+    the files modified since the last events were read are re-indexed.
+    Changes are written in transactions of at most max_batch_size files, the folder hashes of the changed roots are
+    rebuilt every folder_hash_interval_seconds.
+    """
+
+    ##################################################################################################
+
+    WATCH_MASK = INDEX_EVENTS | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+    # Seconds files modified before the last read of the events are re-indexed after an overflow, covers coarse file
+    # system time stamps.
+    OVERFLOW_MARGIN_SECONDS = 2.0
+
+    ##################################################################################################
+
+    def __init__(self, paths_config: PathConfigMixin, hash_config: HashingConfigMixin,
+                 watch_config: WatchConfigMixin, io_limits_config: IoLimitsConfigMixin = None,
+                 archives_config: ArchivesConfigMixin = None):
+        self._directory_list = paths_config.get_folders()  # type: List[str]
+        self._indexer = DirectoryIndexer(paths_config, hash_config, io_limits_config=io_limits_config,
+                                         archives_config=archives_config)  # type: DirectoryIndexer
+        self._debounce_seconds = watch_config.get_debounce_seconds()  # type: float
+        self._max_batch_size = watch_config.get_max_batch_size()  # type: int
+        self._folder_hash_interval_seconds = watch_config.get_folder_hash_interval_seconds()  # type: float
+
+        self._inotify = None  # type: Inotify
+        # Watch descriptor -> (root path, relative path of the folder)
+        self._watches = {}  # type: Dict[int, Tuple[str, str]]
+        # (root path, relative path of the folder) -> st_mtime_ns when it was watched or reconciled, removed folders are
+        # kept until they are reconciled, so that their indexed files are found
+        self._folder_mtimes = {}  # type: Dict[Tuple[str, str], int]
+        # Wall clock time of the last read of the events, the events lost by an overflow are newer
+        self._events_read_timestamp = 0.0  # type: float
+        # (root path, relative path, filename) -> time of the last event
+        self._pending_files = {}  # type: Dict[Tuple[str, str, str], float]
+        # (root path, relative path) -> time of the last event
+        self._pending_folders = {}  # type: Dict[Tuple[str, str], float]
+        self._dirty_roots = set()  # type: Set[str]
+        self._last_folder_hash_timestamp = 0.0  # type: float
+        self._ignored_paths = set()  # type: Set[str]
+
+    ##################################################################################################
+
+    def run(self, database: DataBaseIndexHelper, reconcile: bool = True):
+        """
+        Watches until interrupted (Ctrl+C / SIGINT, or SIGTERM raising KeyboardInterrupt), pending changes are applied
+        before returning. The hashing processes ignore both signals, so they survive a signal to the process group.
+        :param reconcile: Reconcile all roots with the index before watching
+        """
+        # Changes of the databases themselves must not trigger indexing, e.g. if they are stored below a root.
+        for path in [database.private_db.database_path(), database.public_db.database_path()]:
+            path = os.path.abspath(path)
+            self._ignored_paths.update([path, path + "-journal", path + "-wal", path + "-shm"])
+
+        self._inotify = Inotify()
+        with self._indexer.create_executor(ignore_signals=True) as executor:
+            try:
+                # Watch first, so that no change made while reconciling gets lost.
+                self._events_read_timestamp = time.time()
+                for root_directory in self._directory_list:
+                    self._add_watches(root_directory, ".")
+                print("Watching {} folders below {} roots.".format(len(self._watches), len(self._directory_list)))
+                if reconcile:
+                    now = time.monotonic() - self._debounce_seconds
+                    for root_directory in self._directory_list:
+                        self._pending_folders[(root_directory, ".")] = now
+                self._last_folder_hash_timestamp = time.monotonic()
+
+                while True:
+                    readable, _, _ = select.select([self._inotify.fileno()], [], [], self._next_timeout())
+                    if len(readable) > 0:
+                        read_timestamp = time.time()
+                        for event in self._inotify.read_events():
+                            self._handle_event(event)
+                        self._events_read_timestamp = read_timestamp
+                    self._apply_due_changes(database, executor, force=False)
+            except KeyboardInterrupt:
+                print("\nStopping, applying pending changes ...")
+                self._apply_due_changes(database, executor, force=True)
+            finally:
+                self._build_folder_hashes(database, force=True)
+                self._inotify.close()
+
+    ##################################################################################################
+
+    def _next_timeout(self) -> float:
+        if len(self._pending_files) == 0 and len(self._pending_folders) == 0:
+            return self._folder_hash_interval_seconds if len(self._dirty_roots) > 0 else None
+        oldest = min(list(self._pending_files.values()) + list(self._pending_folders.values()))
+        return max(oldest + self._debounce_seconds - time.monotonic(), 0.0)
+
+    ##################################################################################################
+
+    def _add_watches(self, root_directory: str, relative_directory: str):
+        for folder, _, _ in os.walk(os.path.join(root_directory, relative_directory)):
+            self._add_watch(root_directory, folder)
+
+    ##################################################################################################
+
+    def _add_watch(self, root_directory: str, folder: str):
+        """
+        Watches the folder and remembers its modification time. Watching a folder again is harmless, inotify returns
+        the watch descriptor it already has.
+        """
+        try:
+            wd = self._inotify.add_watch(folder, IndexWatcher.WATCH_MASK)
+            # After adding the watch, a later change is reported by an event.
+            mtime_ns = os.stat(folder).st_mtime_ns
+        except OSError as e:
+            print("\tERROR: Cannot watch folder '{}' ({}).".format(folder, e))
+            return
+        relative_directory = os.path.relpath(folder, root_directory)
+        self._watches[wd] = (root_directory, relative_directory)
+        self._folder_mtimes[(root_directory, relative_directory)] = mtime_ns
+
+    ##################################################################################################
+
+    def _remove_watches(self, root_directory: str, relative_directory: str):
+        prefix = relative_directory + os.sep
+        for wd, (root, rel) in list(self._watches.items()):
+            if root == root_directory and (rel == relative_directory or rel.startswith(prefix)):
+                self._inotify.rm_watch(wd)
+                del self._watches[wd]
+
+    ##################################################################################################
+
+    def _handle_event(self, event: InotifyEvent):
+        now = time.monotonic()
+        if event.mask & IN_Q_OVERFLOW:
+            print("WARNING: inotify queue overflow, rescanning the changed folders.")
+            for root_directory in self._directory_list:
+                self._schedule_changed_folders(root_directory, now)
+            return
+
+        if event.wd not in self._watches:
+            return
+        root_directory, relative_directory = self._watches[event.wd]
+        if event.mask & IN_IGNORED:
+            del self._watches[event.wd]
+            return
+        if event.mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # Handled by the event of the parent folder, the root itself is reconciled.
+            if relative_directory == ".":
+                self._pending_folders[(root_directory, ".")] = now
+            return
+
+        if os.path.join(root_directory, relative_directory, event.name) in self._ignored_paths:
+            return
+        if event.mask & IN_ISDIR:
+            relative_path = os.path.normpath(os.path.join(relative_directory, event.name))
+            if event.mask & (IN_MOVED_FROM | IN_DELETE):
+                self._remove_watches(root_directory, relative_path)
+            else:
+                self._add_watches(root_directory, relative_path)
+            self._pending_folders[(root_directory, relative_path)] = now
+        else:
+            self._pending_files[(root_directory, relative_directory, event.name)] = now
+
+    ##################################################################################################
+
+    def _schedule_changed_folders(self, root_directory: str, now: float):
+        """
+        Schedules what may have changed while events were lost: a folder whose modification time differs from the
+        one it had when it was watched (files or folders added, removed or renamed) is reconciled with everything
+        below it, in the other folders the files modified since the last read of the events are re-indexed.
+        """
+        modified_since = self._events_read_timestamp - IndexWatcher.OVERFLOW_MARGIN_SECONDS
+        for folder, folders, files in os.walk(root_directory):
+            relative_directory = os.path.relpath(folder, root_directory)
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            if self._folder_mtimes.get((root_directory, relative_directory)) != mtime_ns:
+                self._pending_folders[(root_directory, relative_directory)] = now
+                folders[:] = []
+                continue
+            for file_name in files:
+                path = os.path.join(folder, file_name)
+                try:
+                    modified = os.stat(path).st_mtime >= modified_since
+                except OSError:
+                    continue
+                if modified and path not in self._ignored_paths:
+                    self._pending_files[(root_directory, relative_directory, file_name)] = now
+
+    ##################################################################################################
+
+    def _apply_due_changes(self, database: DataBaseIndexHelper, executor: concurrent.futures.Executor, force: bool):
+        deadline = time.monotonic() - self._debounce_seconds
+        due_folders = [k for k, t in self._pending_folders.items() if force or t <= deadline]
+        due_files = [k for k, t in self._pending_files.items() if force or t <= deadline]
+        reconciled_files = []  # type: List[Tuple[str, str, str]]
+
+        for root_directory, relative_directory in due_folders:
+            changed, deleted = self._reconcile_folder(database, root_directory, relative_directory)
+            reconciled_files.extend(changed)
+            if len(deleted) > 0:
+                self._apply(database, executor, [], deleted)
+
+        files = set(due_files + reconciled_files)
+        changed = [f for f in files if os.path.isfile(os.path.join(*f))]
+        deleted = [f for f in files if not os.path.isfile(os.path.join(*f))]
+        for start in range(0, max(len(changed), len(deleted)), self._max_batch_size):
+            self._apply(database, executor, changed[start:start + self._max_batch_size],
+                        deleted[start:start + self._max_batch_size])
+
+        # Removed only once applied: if a signal interrupts the changes, they are applied again before stopping.
+        # No event is read meanwhile, so the keys were not updated.
+        for key in due_folders:
+            del self._pending_folders[key]
+        for key in due_files:
+            del self._pending_files[key]
+
+        self._build_folder_hashes(database, force=False)
+
+    ##################################################################################################
+
+    def _reconcile_folder(self, database: DataBaseIndexHelper, root_directory: str, relative_directory: str) \
+            -> Tuple[List[Tuple[str, str, str]], List[Tuple[str, str, str]]]:
+        """
+        Compares the files in and below the folder with the index and watches its sub folders, e.g. the ones created
+        while events were lost.
+        :return: Tuple of (new or modified files, deleted files), each as (root path, relative path, filename)
+        """
+        start_timestamp = timer()
+        walked = []  # type: List[str]
+        on_disk = {}  # type: Dict[Tuple[str, str], Tuple[str, int]]
+        for folder, _, files in os.walk(os.path.join(root_directory, relative_directory)):
+            rel_dir = os.path.relpath(folder, root_directory)
+            walked.append(rel_dir)
+            self._add_watch(root_directory, folder)
+            for file_name in files:
+                path = os.path.join(folder, file_name)
+                if path in self._ignored_paths:
+                    continue
+                try:
+                    file_stat = os.stat(path)
+                except OSError:
+                    continue
+                on_disk[(rel_dir, file_name)] = (format_file_time(file_stat.st_mtime), file_stat.st_size)
+
+        # The indexed files are looked up per folder: the folders on disk and the removed ones known from watching them.
+        # A root is looked up as a whole, it also covers the folders removed while the watcher was not running.
+        prefix = relative_directory + os.sep
+        walked_folders = set(walked)
+        removed = [rel for root, rel in self._folder_mtimes.keys() if root == root_directory
+                   and (relative_directory == "." or rel == relative_directory or rel.startswith(prefix))
+                   and rel not in walked_folders]
+        indexed = database.get_indexed_file_states(
+            root_directory, None if relative_directory == "." else walked + removed)
+        for rel in removed:
+            del self._folder_mtimes[(root_directory, rel)]
+        changed = []  # type: List[Tuple[str, str, str]]
+        for key, state in on_disk.items():
+            if indexed.pop(key, None) != state:
+                changed.append((root_directory,) + key)
+        deleted = []  # type: List[Tuple[str, str, str]]
+        # The members of archives are not on disk, they are deleted with their archive.
+        below_archive = {}  # type: Dict[str, bool]
+        for rel, file_name in indexed.keys():
+            if rel not in below_archive:
+                below_archive[rel] = is_below_archive(root_directory, rel)
+            if not below_archive[rel]:
+                deleted.append((root_directory, rel, file_name))
+
+        if len(changed) > 0 or len(deleted) > 0:
+            print("Reconciled '{}': {} new or modified, {} deleted files ({}).".format(
+                os.path.join(root_directory, relative_directory), len(changed), len(deleted),
+                timedelta(seconds=timer() - start_timestamp)))
+        return changed, deleted
+
+    ##################################################################################################
+
+    def _apply(self, database: DataBaseIndexHelper, executor: concurrent.futures.Executor,
+               changed: List[Tuple[str, str, str]], deleted: List[Tuple[str, str, str]]):
+        files, errors = self._indexer.index_files(executor, changed) if len(changed) > 0 else ([], [])
+        self._indexer.delete_archive_members(database, changed + deleted)
+        database.delete_files(deleted)
+        database.upsert_files_in_both_databases(files)
+        database.delete_index_errors(errors)
+        database.insert_index_errors(errors)
+        database.private_db.connection().commit()
+
+        self._dirty_roots.update(f[0] for f in changed + deleted)
+        print("Applied {} updated, {} deleted files, {} errors.".format(len(files), len(deleted), len(errors)))
+        sys.stdout.flush()
+
+    ##################################################################################################
+
+    def _build_folder_hashes(self, database: DataBaseIndexHelper, force: bool):
+        if len(self._dirty_roots) == 0:
+            return
+        if not force and time.monotonic() - self._last_folder_hash_timestamp < self._folder_hash_interval_seconds:
+            return
+        FolderHashBuilder(database).build(sorted(self._dirty_roots))
+        database.private_db.connection().commit()
+        self._dirty_roots.clear()
+        self._last_folder_hash_timestamp = time.monotonic()
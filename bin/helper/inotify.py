@@ -0,0 +1,112 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+from typing import List, NamedTuple
+
+##################################################################################################
+
+# See inotify(7).
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# Events that change the content of the index.
+INDEX_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+##################################################################################################
+
+InotifyEvent = NamedTuple("InotifyEvent", [("wd", int), ("mask", int), ("cookie", int), ("name", str)])
+
+
+##################################################################################################
+
+class Inotify(object):
+    """
+    Minimal ctypes binding of the Linux inotify API, no third party package required.
+    """
+
+    ##################################################################################################
+
+    READ_SIZE = 64 * 1024
+
+    ##################################################################################################
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._libc.inotify_init1.argtypes = [ctypes.c_int]
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)  # type: int
+        if self._fd < 0:
+            self._raise_os_error("inotify_init1")
+
+    ##################################################################################################
+
+    def fileno(self): return self._fd
+
+    ##################################################################################################
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            self._raise_os_error("inotify_add_watch", path)
+        return wd
+
+    ##################################################################################################
+
+    def rm_watch(self, wd: int):
+        # Fails if the watch has been removed by the kernel already (deleted folder), which is fine.
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    ##################################################################################################
+
+    def read_events(self) -> List[InotifyEvent]:
+        """
+        Reads all pending events without blocking.
+        """
+        events = []  # type: List[InotifyEvent]
+        while True:
+            try:
+                buffer = os.read(self._fd, Inotify.READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                events.append(InotifyEvent(wd, mask, cookie, name))
+
+    ##################################################################################################
+
+    def close(self):
+        os.close(self._fd)
+
+    ##################################################################################################
+
+    def _raise_os_error(self, function: str, path: str = None):
+        error_number = ctypes.get_errno()
+        raise OSError(error_number, "{}: {}".format(function, os.strerror(error_number or errno.EINVAL)), path)
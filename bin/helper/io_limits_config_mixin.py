@@ -0,0 +1,135 @@
+from configparser import ConfigParser
+from typing import List, Tuple
+
+
+##################################################################################################
+
+def parse_hour_ranges(value: str) -> List[Tuple[int, int]]:
+    """
+    Helper function that parses comma separated hour ranges like "22-6, 12-13" into (first hour, end hour) tuples.
+    The end hour is exclusive, a range may wrap around midnight.
+    """
+    hour_ranges = []
+    for hour_range in [r.strip() for r in value.split(",") if len(r.strip()) > 0]:
+        first_hour, _, end_hour = hour_range.partition("-")
+        first_hour, end_hour = int(first_hour), int(end_hour)
+        if not (0 <= first_hour <= 23 and 0 <= end_hour <= 24) or first_hour == end_hour:
+            raise ValueError("invalid hour range '{}'".format(hour_range))
+        hour_ranges.append((first_hour, end_hour))
+    return hour_ranges
+
+
+##################################################################################################
+
+class IoLimitsConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "io_limits"
+    MAX_READ_MBPS_FIELD_NAME = "max_read_mbps"
+    MAX_IOPS_FIELD_NAME = "max_iops"
+    NICE_FIELD_NAME = "nice"
+    IONICE_CLASS_FIELD_NAME = "ionice_class"
+    DROP_PAGE_CACHE_FIELD_NAME = "drop_page_cache"
+    UNLIMITED_HOURS_FIELD_NAME = "unlimited_hours"
+
+    # none:        the I/O scheduling class of the workers is not changed.
+    # best-effort: lowest priority within the default class.
+    # idle:        the workers only get disk time when no other process needs it.
+    IONICE_CLASS_NONE = "none"
+    IONICE_CLASS_BEST_EFFORT = "best-effort"
+    IONICE_CLASS_IDLE = "idle"
+    IONICE_CLASSES = [IONICE_CLASS_NONE, IONICE_CLASS_BEST_EFFORT, IONICE_CLASS_IDLE]
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._max_read_mbps = 0.0  # type: float
+        self._max_iops = 0.0  # type: float
+        self._nice = 0  # type: int
+        self._ionice_class = IoLimitsConfigMixin.IONICE_CLASS_NONE  # type: str
+        self._drop_page_cache = False  # type: bool
+        self._unlimited_hours = ""  # type: str
+        self._unlimited_hour_ranges = []  # type: List[Tuple[int, int]]
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_io_limits_settings()
+
+        print("[{}]".format(IoLimitsConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(IoLimitsConfigMixin.MAX_READ_MBPS_FIELD_NAME, self._max_read_mbps))
+        print("\t{} = '{}'".format(IoLimitsConfigMixin.MAX_IOPS_FIELD_NAME, self._max_iops))
+        print("\t{} = '{}'".format(IoLimitsConfigMixin.NICE_FIELD_NAME, self._nice))
+        print("\t{} = '{}'".format(IoLimitsConfigMixin.IONICE_CLASS_FIELD_NAME, self._ionice_class))
+        print("\t{} = '{}'".format(IoLimitsConfigMixin.DROP_PAGE_CACHE_FIELD_NAME, self._drop_page_cache))
+        print("\t{} = '{}'".format(IoLimitsConfigMixin.UNLIMITED_HOURS_FIELD_NAME, self._unlimited_hours))
+
+    ##################################################################################################
+
+    def get_max_read_mbps(self): return self._max_read_mbps
+
+    ##################################################################################################
+
+    def get_max_iops(self): return self._max_iops
+
+    ##################################################################################################
+
+    def get_nice(self): return self._nice
+
+    ##################################################################################################
+
+    def get_ionice_class(self): return self._ionice_class
+
+    ##################################################################################################
+
+    def is_drop_page_cache(self): return self._drop_page_cache
+
+    ##################################################################################################
+
+    def get_unlimited_hour_ranges(self): return self._unlimited_hour_ranges
+
+    ##################################################################################################
+
+    def is_limited(self):
+        return self._max_read_mbps > 0 or self._max_iops > 0 or self._nice > 0 \
+               or self._ionice_class != IoLimitsConfigMixin.IONICE_CLASS_NONE or self._drop_page_cache
+
+    ##################################################################################################
+
+    def __handle_io_limits_settings(self):
+        section = IoLimitsConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            return
+
+        self._max_read_mbps = self._parser.getfloat(
+            section, IoLimitsConfigMixin.MAX_READ_MBPS_FIELD_NAME, fallback=self._max_read_mbps)
+        self._max_iops = self._parser.getfloat(
+            section, IoLimitsConfigMixin.MAX_IOPS_FIELD_NAME, fallback=self._max_iops)
+        self._nice = self._parser.getint(
+            section, IoLimitsConfigMixin.NICE_FIELD_NAME, fallback=self._nice)
+        self._ionice_class = self._parser.get(
+            section, IoLimitsConfigMixin.IONICE_CLASS_FIELD_NAME, fallback=self._ionice_class).strip().lower()
+        self._drop_page_cache = self._parser.getboolean(
+            section, IoLimitsConfigMixin.DROP_PAGE_CACHE_FIELD_NAME, fallback=self._drop_page_cache)
+        self._unlimited_hours = self._parser.get(
+            section, IoLimitsConfigMixin.UNLIMITED_HOURS_FIELD_NAME, fallback=self._unlimited_hours) or ""
+        self._unlimited_hours = self._unlimited_hours.strip()
+
+        if self._max_read_mbps < 0 or self._max_iops < 0:
+            raise ValueError("ERROR: '[{}]' {} and {} must not be negative (0 = unlimited)"
+                             .format(section, IoLimitsConfigMixin.MAX_READ_MBPS_FIELD_NAME,
+                                     IoLimitsConfigMixin.MAX_IOPS_FIELD_NAME))
+        if not 0 <= self._nice <= 19:
+            raise ValueError("ERROR: '[{}]' requires 0 <= {} <= 19"
+                             .format(section, IoLimitsConfigMixin.NICE_FIELD_NAME))
+        if self._ionice_class not in IoLimitsConfigMixin.IONICE_CLASSES:
+            raise ValueError("ERROR: '[{}]' {} must be one of {}"
+                             .format(section, IoLimitsConfigMixin.IONICE_CLASS_FIELD_NAME,
+                                     ", ".join(IoLimitsConfigMixin.IONICE_CLASSES)))
+        try:
+            self._unlimited_hour_ranges = parse_hour_ranges(self._unlimited_hours)
+        except ValueError as e:
+            raise ValueError("ERROR: '[{}]' {} must be hour ranges like '22-6, 12-13' ({})"
+                             .format(section, IoLimitsConfigMixin.UNLIMITED_HOURS_FIELD_NAME, e))
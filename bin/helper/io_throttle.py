@@ -0,0 +1,218 @@
+import ctypes
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from .io_limits_config_mixin import IoLimitsConfigMixin
+
+
+##################################################################################################
+
+# ioprio_set(2) has no wrapper in the os module, it is called by its system call number.
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273,
+                       "s390x": 282, "riscv64": 30}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASSES = {IoLimitsConfigMixin.IONICE_CLASS_BEST_EFFORT: (2, 7),
+                  IoLimitsConfigMixin.IONICE_CLASS_IDLE: (3, 0)}
+
+
+##################################################################################################
+
+def set_io_priority(ionice_class: str):
+    """
+    Helper function that sets the I/O scheduling class of the calling process like ionice(1) does.
+    :param ionice_class: One of IoLimitsConfigMixin.IONICE_CLASSES
+    """
+    if ionice_class == IoLimitsConfigMixin.IONICE_CLASS_NONE:
+        return
+    syscall_number = IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if not sys.platform.startswith("linux") or syscall_number is None:
+        raise OSError("ioprio_set is not supported on {} {}".format(sys.platform, platform.machine()))
+    io_class, io_data = IOPRIO_CLASSES[ionice_class]
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, (io_class << IOPRIO_CLASS_SHIFT) | io_data) != 0:
+        error_number = ctypes.get_errno()
+        raise OSError(error_number, os.strerror(error_number))
+
+
+##################################################################################################
+
+class TokenBucket(object):
+    """
+    Token bucket in shared memory, so that all worker processes draw from the same budget: refilled with rate tokens
+    per second up to the tokens of BURST_SECONDS. A consumer takes its tokens at once, even if that drives the stock
+    negative, and waits until the debt is refilled. Later consumers queue up behind the debt.
+    """
+
+    ##################################################################################################
+
+    BURST_SECONDS = 1.0
+
+    ##################################################################################################
+
+    def __init__(self, rate: float, lock):
+        """
+        :param rate: Tokens per second
+        :param lock: multiprocessing lock guarding the shared values
+        """
+        self._rate = rate  # type: float
+        self._capacity = rate * TokenBucket.BURST_SECONDS  # type: float
+        self._tokens = multiprocessing.RawValue("d", self._capacity)
+        self._timestamp = multiprocessing.RawValue("d", time.monotonic())
+        self._lock = lock
+
+    ##################################################################################################
+
+    def take(self, amount: float) -> float:
+        """
+        :return: Seconds to wait until the tokens taken are available
+        """
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self._capacity, self._tokens.value + (now - self._timestamp.value) * self._rate) - amount
+            self._tokens.value = tokens
+            self._timestamp.value = now
+        return max(0.0, -tokens / self._rate)
+
+
+##################################################################################################
+
+class IoThrottle(object):
+    """
+    I/O limits of the indexing worker processes, created by the main process and handed to every worker by the process
+    pool initializer (see init_worker()):
+    - read throughput (bytes/s) and I/O operations per second, one token bucket each shared by all workers. An
+      operation is a file opened or a seek to a sample, not a block read: a file read sequentially costs one.
+    - nice and ionice class of the workers, applied once when a worker starts
+    - POSIX_FADV_DONTNEED after a file has been hashed, so that indexing does not evict the page cache of the host
+    Within the unlimited hours the token buckets are bypassed. The priorities are kept, they cost nothing on an idle
+    host.
+    """
+
+    ##################################################################################################
+
+    def __init__(self, io_limits_config: IoLimitsConfigMixin):
+        self._lock = multiprocessing.Lock()
+        self._max_read_mbps = io_limits_config.get_max_read_mbps()  # type: float
+        self._max_iops = io_limits_config.get_max_iops()  # type: float
+        self._bytes = None  # type: Optional[TokenBucket]
+        if self._max_read_mbps > 0:
+            self._bytes = TokenBucket(self._max_read_mbps * 1024 * 1024, self._lock)
+        self._operations = None  # type: Optional[TokenBucket]
+        if self._max_iops > 0:
+            self._operations = TokenBucket(self._max_iops, self._lock)
+        self._nice = io_limits_config.get_nice()  # type: int
+        self._ionice_class = io_limits_config.get_ionice_class()  # type: str
+        self._drop_page_cache = io_limits_config.is_drop_page_cache() and hasattr(os, "posix_fadvise")  # type: bool
+        self._unlimited_hour_ranges = io_limits_config.get_unlimited_hour_ranges()  # type: List[Tuple[int, int]]
+        self._throttled_seconds = multiprocessing.RawValue("d", 0.0)
+
+    ##################################################################################################
+
+    def apply_priority(self):
+        """
+        Lowers the CPU and I/O priority of the calling process.
+        """
+        if self._nice > 0:
+            os.nice(self._nice)
+        try:
+            set_io_priority(self._ionice_class)
+        except OSError as e:
+            print("WARNING: Cannot set the I/O scheduling class '{}' of worker {} ({}).".format(
+                self._ionice_class, os.getpid(), e))
+
+    ##################################################################################################
+
+    def is_lifted(self, timestamp: float = None) -> bool:
+        """
+        :return: True within the unlimited hours
+        """
+        hour = time.localtime(timestamp).tm_hour
+        for first_hour, end_hour in self._unlimited_hour_ranges:
+            if (first_hour <= hour < end_hour) if first_hour < end_hour else (hour >= first_hour or hour < end_hour):
+                return True
+        return False
+
+    ##################################################################################################
+
+    def acquire(self, num_bytes: int, num_operations: int = 0):
+        """
+        Accounts a read and waits as long as the limits require.
+        :param num_operations: Files opened or seeks, 0 for a block read continuing the previous one
+        """
+        if (self._bytes is None and self._operations is None) or self.is_lifted():
+            return
+        wait_seconds = 0.0
+        if self._bytes is not None:
+            wait_seconds = self._bytes.take(num_bytes)
+        if self._operations is not None:
+            wait_seconds = max(wait_seconds, self._operations.take(num_operations))
+        if wait_seconds > 0:
+            with self._lock:
+                self._throttled_seconds.value += wait_seconds
+            time.sleep(wait_seconds)
+
+    ##################################################################################################
+
+    def release_page_cache(self, file_descriptor: int):
+        """
+        Tells the kernel that the pages of the file just read are not needed anymore.
+        """
+        if self._drop_page_cache:
+            try:
+                os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+
+    ##################################################################################################
+
+    def throttled_seconds(self) -> float:
+        """
+        :return: Seconds the workers waited for the limits, summed over all workers
+        """
+        with self._lock:
+            return self._throttled_seconds.value
+
+    ##################################################################################################
+
+    def describe(self) -> str:
+        limits = ["{:.1f} MiB/s".format(self._max_read_mbps) if self._bytes is not None else "unlimited MiB/s",
+                  "{:.0f} IOPS".format(self._max_iops) if self._operations is not None else "unlimited IOPS",
+                  "nice {}".format(self._nice),
+                  "ionice {}".format(self._ionice_class),
+                  "page cache {}".format("released" if self._drop_page_cache else "kept")]
+        if len(self._unlimited_hour_ranges) > 0:
+            limits.append("unlimited {} ({})".format(
+                ", ".join("{}-{}".format(first_hour, end_hour) for first_hour, end_hour in self._unlimited_hour_ranges),
+                "now" if self.is_lifted() else "not now"))
+        return ", ".join(limits)
+
+
+##################################################################################################
+
+# Set by init_worker() in the worker processes.
+_worker_throttle = None  # type: Optional[IoThrottle]
+
+
+##################################################################################################
+
+def init_worker(throttle: IoThrottle):
+    """
+    Process pool initializer: lowers the priority of the worker and installs the throttle used by the hash functions.
+    """
+    global _worker_throttle
+    _worker_throttle = throttle
+    throttle.apply_priority()
+
+
+##################################################################################################
+
+def worker_throttle() -> Optional[IoThrottle]:
+    """
+    :return: The throttle of the current worker process, None if the I/O is not limited
+    """
+    return _worker_throttle
@@ -0,0 +1,338 @@
+import json
+import math
+import os
+import shutil
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import List, Optional, Tuple
+
+import numpy as np  # sudo pip install numpy
+
+from .database_helper import PublicDataBase, database_fingerprint
+from .hash_array_helper import hex_digests_to_array, unique_digests
+
+
+##################################################################################################
+
+# Bits set per digest are taken from 6 bit slices of the second half of the digest.
+MAX_HASH_FUNCTIONS = 10
+
+
+##################################################################################################
+
+def _blocked_false_positive_rate(bits_per_item: float, num_hash_functions: int) -> float:
+    """
+    Helper function that estimates the false positive rate of a Bloom filter with 64 bit blocks: the number of digests
+    per block is Poisson distributed, within a block it is a classic Bloom filter of 64 bits.
+    """
+    mean_items_per_block = 64.0 / bits_per_item
+    rate = 0.0
+    probability = math.exp(-mean_items_per_block)
+    for items in range(0, int(mean_items_per_block * 4) + 20):
+        if items > 0:
+            probability *= mean_items_per_block / items
+        rate += probability * (1.0 - (1.0 - 1.0 / 64) ** (num_hash_functions * items)) ** num_hash_functions
+    return rate
+
+
+##################################################################################################
+
+def _filter_parameters(false_positive_rate: float) -> Tuple[float, int]:
+    """
+    :return: Tuple of (bits per digest, number of hash functions), the smallest filter reaching the false positive rate
+    """
+    bits_per_item = 4.0
+    while bits_per_item < 64.0:
+        for num_hash_functions in range(1, MAX_HASH_FUNCTIONS + 1):
+            if _blocked_false_positive_rate(bits_per_item, num_hash_functions) <= false_positive_rate:
+                return bits_per_item, num_hash_functions
+        bits_per_item += 0.5
+    return bits_per_item, MAX_HASH_FUNCTIONS
+
+
+##################################################################################################
+
+def _block_indices_and_masks(digests: np.ndarray, num_blocks: int, num_hash_functions: int) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    # md5 digests are uniformly distributed already: the first half selects the block, the second one the bits.
+    indices = (digests[:, 0] % np.uint64(num_blocks)).astype(np.int64)
+    masks = np.zeros(digests.shape[0], dtype=np.uint64)
+    for i in range(num_hash_functions):
+        masks |= np.uint64(1) << ((digests[:, 1] >> np.uint64(6 * i)) & np.uint64(63))
+    return indices, masks
+
+
+##################################################################################################
+
+class MembershipFilter(object):
+    """
+    Answers "is this content hash in the public index" without querying SQLite: a Bloom filter over the
+    file_content_hash_tag column (no false negatives, false positives at the configured rate) and optionally the
+    sorted unique digests for an exact answer by binary search.
+
+    The Bloom filter is blocked: all bits of a digest are in one 64 bit word, so a check reads a single word. The
+    files (.npy plus a manifest) are opened memory-mapped.
+    The filter is updated incrementally from the content changelog of the public database: triggers log every digest
+    inserted, deleted or replaced in the index table (see PublicDataBase.create_content_changelog()), also in-place
+    updates and rows re-using a rowid. Inserted digests are added, deleted ones remain in the Bloom filter (a few more
+    false positives) until it is full; the exact digests are rebuilt if digests were deleted. Re-created tables (schema
+    version changed) are rebuilt completely.
+    """
+
+    ##################################################################################################
+
+    MANIFEST_FILE_NAME = "manifest.json"
+    BLOOM_FILE_NAME = "bloom.npy"
+    DIGESTS_FILE_NAME = "digests.npy"
+    # 2: updated from the content changelog instead of the rowids.
+    FORMAT_VERSION = 2
+    BATCH_SIZE = 100000
+    # Capacity reserved for digests added by incremental updates.
+    GROWTH_FACTOR = 1.25
+    MIN_CAPACITY = 1024
+
+    ##################################################################################################
+
+    def __init__(self, filter_directory: str):
+        self._filter_directory = filter_directory  # type: str
+        self._manifest = None  # type: Optional[dict]
+        self._blocks = None  # type: Optional[np.ndarray]
+        self._digests = None  # type: Optional[np.ndarray]
+
+    ##################################################################################################
+
+    @staticmethod
+    def default_directory(database_path: str) -> str:
+        return database_path + ".filter"
+
+    ##################################################################################################
+
+    def directory(self): return self._filter_directory
+
+    ##################################################################################################
+
+    def is_valid(self, database_path: str) -> bool:
+        manifest = self._read_manifest()
+        return manifest is not None \
+            and manifest.get("format_version") == MembershipFilter.FORMAT_VERSION \
+            and manifest.get("fingerprint") == database_fingerprint(database_path)
+
+    ##################################################################################################
+
+    def build(self, index_db: PublicDataBase, false_positive_rate: float = 0.01, exact: bool = False):
+        """
+        Builds the filter of the given public index database from scratch.
+        :param exact: Store the sorted unique digests as well
+        """
+        print("Building membership filter '{}' ...".format(self._filter_directory))
+        start_timestamp = timer()
+        # Changes committed from now on are logged, changes before are part of the table read below. A change in
+        # between is in both, adding a digest twice does no harm.
+        index_db.create_content_changelog()
+        index_db.connection().execute("DELETE FROM {}".format(index_db.content_changelog_table_name()))
+        index_db.connection().commit()
+        fingerprint = database_fingerprint(index_db.database_path())
+        schema_version = self._schema_version(index_db)
+
+        num_rows = index_db.connection().execute("SELECT COUNT(*) FROM {}".format(index_db.table_name())).fetchone()[0]
+        bits_per_item, num_hash_functions = _filter_parameters(false_positive_rate)
+        capacity = max(int(num_rows * MembershipFilter.GROWTH_FACTOR), MembershipFilter.MIN_CAPACITY)
+        blocks = np.zeros(int(math.ceil(capacity * bits_per_item / 64)), dtype=np.uint64)
+
+        batches = []  # type: List[np.ndarray]
+        for digests in self._read_digests(index_db):
+            self._add(blocks, digests, num_hash_functions)
+            if exact:
+                batches.append(digests)
+
+        manifest = {"format_version": MembershipFilter.FORMAT_VERSION,
+                    "source_database": os.path.abspath(index_db.database_path()),
+                    "fingerprint": fingerprint,
+                    "schema_version": schema_version,
+                    "num_rows": num_rows,
+                    "num_items": num_rows,
+                    "capacity": capacity,
+                    "false_positive_rate": false_positive_rate,
+                    "num_hash_functions": num_hash_functions,
+                    "exact": exact}
+        digests = None
+        if exact:
+            digests, _, _ = unique_digests(np.concatenate(batches) if len(batches) > 0
+                                           else np.empty((0, 2), dtype=np.uint64))
+        self._write(manifest, blocks, digests)
+        print("Built filter of {} digests ({} bytes, {} hash functions{}) in {}.".format(
+            num_rows, blocks.nbytes, num_hash_functions, ", exact" if exact else "",
+            timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def update(self, index_db: PublicDataBase, false_positive_rate: float = 0.01, exact: bool = False):
+        """
+        Brings the filter up to date with the index, incrementally if possible. A missing filter is built with the
+        given parameters, an existing one keeps its parameters.
+        """
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get("format_version") != MembershipFilter.FORMAT_VERSION:
+            self.build(index_db, false_positive_rate, exact)
+            return
+        if manifest["fingerprint"] == database_fingerprint(index_db.database_path()):
+            print("Membership filter '{}' is up to date.".format(self._filter_directory))
+            return
+        false_positive_rate, exact = manifest["false_positive_rate"], manifest["exact"]
+        if manifest["schema_version"] != self._schema_version(index_db) or not index_db.has_content_changelog():
+            print("Index table re-created, rebuilding the membership filter.")
+            self.build(index_db, false_positive_rate, exact)
+            return
+
+        start_timestamp = timer()
+        changelog_columns = PublicDataBase.PublicContentChangelogColumnNames
+        last_change_id, num_deleted, num_inserted = index_db.connection().execute(
+            "SELECT IFNULL(MAX({cid}), 0), TOTAL({op} = ?), TOTAL({op} = ?) FROM {tbl}".format(
+                cid=changelog_columns.change_id.value, op=changelog_columns.operation.value,
+                tbl=index_db.content_changelog_table_name()),
+            (PublicDataBase.CHANGELOG_DELETE, PublicDataBase.CHANGELOG_INSERT)).fetchone()
+        num_deleted, num_inserted = int(num_deleted), int(num_inserted)
+        if manifest["num_items"] + num_inserted > manifest["capacity"] or (exact and num_deleted > 0):
+            print("Membership filter is full or digests were deleted, rebuilding it.")
+            self.build(index_db, false_positive_rate, exact)
+            return
+
+        blocks = np.array(np.load(os.path.join(self._filter_directory, MembershipFilter.BLOOM_FILE_NAME)))
+        new_digests = [d for d in self._read_inserted_digests(index_db, last_change_id)]
+        for digests in new_digests:
+            self._add(blocks, digests, manifest["num_hash_functions"])
+        digests = None
+        if exact:
+            digests, _, _ = unique_digests(np.concatenate(
+                [np.load(os.path.join(self._filter_directory, MembershipFilter.DIGESTS_FILE_NAME))] + new_digests))
+
+        index_db.connection().execute("DELETE FROM {} WHERE {} <= ?".format(
+            index_db.content_changelog_table_name(), changelog_columns.change_id.value), (last_change_id,))
+        index_db.connection().commit()
+        manifest.update({"fingerprint": database_fingerprint(index_db.database_path()),
+                         "num_rows": index_db.connection().execute(
+                             "SELECT COUNT(*) FROM {}".format(index_db.table_name())).fetchone()[0],
+                         "num_items": manifest["num_items"] + num_inserted})
+        self._write(manifest, blocks, digests)
+        print("Added {} digests to the membership filter ({} deleted digests kept) in {}.".format(
+            num_inserted, num_deleted, timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def load(self) -> "MembershipFilter":
+        """
+        Opens the filter memory-mapped (read only).
+        """
+        self._manifest = self._read_manifest()
+        if self._manifest is None:
+            raise ValueError("No membership filter in '{}'.".format(self._filter_directory))
+        self._blocks = np.load(os.path.join(self._filter_directory, MembershipFilter.BLOOM_FILE_NAME), mmap_mode="r")
+        self._digests = None
+        if self._manifest["exact"]:
+            self._digests = np.load(os.path.join(self._filter_directory, MembershipFilter.DIGESTS_FILE_NAME),
+                                    mmap_mode="r")
+        return self
+
+    ##################################################################################################
+
+    def is_exact(self) -> bool: return self._digests is not None
+
+    ##################################################################################################
+
+    def might_contain(self, hex_digest: str) -> bool:
+        """
+        Checks a single digest against the Bloom filter: False means not indexed, True means probably indexed.
+        """
+        value = int(hex_digest, 16)
+        high, low = value >> 64, value & 0xffffffffffffffff
+        mask = 0
+        for i in range(self._manifest["num_hash_functions"]):
+            mask |= 1 << ((low >> (6 * i)) & 63)
+        return int(self._blocks[high % len(self._blocks)]) & mask == mask
+
+    ##################################################################################################
+
+    def contains(self, hex_digests: List[str]) -> np.ndarray:
+        """
+        Checks a batch of digests.
+        :return: Boolean array, exact if the filter stores the digests, otherwise True means probably indexed
+        """
+        digests = hex_digests_to_array(hex_digests)
+        indices, masks = _block_indices_and_masks(digests, len(self._blocks), self._manifest["num_hash_functions"])
+        result = (self._blocks[indices] & masks) == masks
+        if self._digests is not None and np.any(result):
+            # Binary search for the Bloom filter positives only: first column, then the (rare) equal first columns.
+            candidates = np.flatnonzero(result)
+            left = np.searchsorted(self._digests[:, 0], digests[candidates, 0], side="left")
+            right = np.searchsorted(self._digests[:, 0], digests[candidates, 0], side="right")
+            for i, begin, end in zip(candidates, left, right):
+                result[i] = bool(np.any(self._digests[begin:end, 1] == digests[i, 1]))
+        return result
+
+    ##################################################################################################
+
+    @staticmethod
+    def _add(blocks: np.ndarray, digests: np.ndarray, num_hash_functions: int):
+        indices, masks = _block_indices_and_masks(digests, len(blocks), num_hash_functions)
+        np.bitwise_or.at(blocks, indices, masks)
+
+    ##################################################################################################
+
+    @staticmethod
+    def _schema_version(index_db: PublicDataBase) -> int:
+        return index_db.connection().execute("PRAGMA schema_version").fetchone()[0]
+
+    ##################################################################################################
+
+    @staticmethod
+    def _read_digests(index_db: PublicDataBase):
+        """
+        Yields the content digests of all rows as (n, 2) uint64 arrays.
+        """
+        cursor = index_db.connection().execute("SELECT {} FROM {}".format(
+            PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value, index_db.table_name()))
+        for rows in iter(lambda: cursor.fetchmany(MembershipFilter.BATCH_SIZE), []):
+            yield hex_digests_to_array([r[0] for r in rows])
+
+    ##################################################################################################
+
+    @staticmethod
+    def _read_inserted_digests(index_db: PublicDataBase, last_change_id: int):
+        """
+        Yields the content digests inserted according to the changelog up to last_change_id as (n, 2) uint64 arrays.
+        """
+        changelog_columns = PublicDataBase.PublicContentChangelogColumnNames
+        cursor = index_db.connection().execute(
+            "SELECT {fconth} FROM {tbl} WHERE {op} = ? AND {cid} <= ?".format(
+                fconth=changelog_columns.file_content_hash_tag.value, tbl=index_db.content_changelog_table_name(),
+                op=changelog_columns.operation.value, cid=changelog_columns.change_id.value),
+            (PublicDataBase.CHANGELOG_INSERT, last_change_id))
+        for rows in iter(lambda: cursor.fetchmany(MembershipFilter.BATCH_SIZE), []):
+            yield hex_digests_to_array([r[0] for r in rows])
+
+    ##################################################################################################
+
+    def _write(self, manifest: dict, blocks: np.ndarray, digests: Optional[np.ndarray]):
+        # Written into a temporary folder which replaces the filter once complete, readers never see a partial filter.
+        temp_directory = self._filter_directory + ".tmp"
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        os.makedirs(temp_directory)
+        np.save(os.path.join(temp_directory, MembershipFilter.BLOOM_FILE_NAME), blocks)
+        if digests is not None:
+            np.save(os.path.join(temp_directory, MembershipFilter.DIGESTS_FILE_NAME), digests)
+        with open(os.path.join(temp_directory, MembershipFilter.MANIFEST_FILE_NAME), mode='w') as f:
+            json.dump(manifest, f, indent=4)
+        shutil.rmtree(self._filter_directory, ignore_errors=True)
+        os.rename(temp_directory, self._filter_directory)
+
+    ##################################################################################################
+
+    def _read_manifest(self) -> Optional[dict]:
+        manifest_path = os.path.join(self._filter_directory, MembershipFilter.MANIFEST_FILE_NAME)
+        if not os.path.isfile(manifest_path):
+            return None
+        try:
+            with open(manifest_path, mode='r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,155 @@
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import List
+
+import numpy as np  # sudo pip install numpy
+
+from .columnar_snapshot import ColumnarSnapshot, PublicIndexColumns, load_public_index_columns
+from .database_helper import EvaluationDataBases, UniqueFileFolderEvaluator, ExpectedFolderStructureEvaluator, \
+    IdenticalSubtreeEvaluator
+from .evaluation_config_mixin import EvaluationConfigMixin
+from .hash_array_helper import hex_digests_to_array, array_to_hex_digests, unique_digests
+
+
+######################################################################################################
+
+class NumpyEvaluationEngine(object):
+    """
+    In-memory alternative to UniqueFileFolderEvaluator and ExpectedFolderStructureEvaluator.
+    The hash columns of the public index are loaded into NumPy arrays once and grouped by sorting instead of
+    SQLite GROUP BY/DISTINCT/JOIN on TEXT columns. The same evaluation tables are written.
+    If a columnar snapshot is given, the columns are memory-mapped from it instead of being read from SQLite.
+    """
+    ##################################################################################################
+
+    BATCH_SIZE = 100000
+
+    ##################################################################################################
+
+    def __init__(self, databases: EvaluationDataBases, skip_identical_subtrees: bool = False,
+                 snapshot: ColumnarSnapshot = None, heavy_hitter_threshold: int = 0,
+                 heavy_hitter_policy: str = EvaluationConfigMixin.HEAVY_HITTER_POLICY_SEPARATE):
+        """
+        :param skip_identical_subtrees: Leave out the folders that are identical in all roots, requires the result of
+                                        IdenticalSubtreeEvaluator.evaluate()
+        :param snapshot: Columnar snapshot of the public index, (re-)exported if missing or stale
+        :param heavy_hitter_threshold: See ExpectedFolderStructureEvaluator, 0 disables the detection
+        :param heavy_hitter_policy: One of EvaluationConfigMixin.HEAVY_HITTER_POLICIES
+        """
+        self.index_db = databases.index_db
+        self.evaluation_db = databases.evaluation_db
+        self._unique_file_folder_evaluator = UniqueFileFolderEvaluator(databases)
+        self._expected_folder_structure_evaluator = ExpectedFolderStructureEvaluator(
+            databases, heavy_hitter_threshold=heavy_hitter_threshold, heavy_hitter_policy=heavy_hitter_policy)
+        self._skip_identical_subtrees = skip_identical_subtrees  # type: bool
+        self._snapshot = snapshot  # type: ColumnarSnapshot
+
+    ##################################################################################################
+
+    def evaluate(self):
+        print("\n[NumpyEvaluationEngine START]")
+        start_timestamp = timer()
+
+        self.reset()
+        columns = self._load_columns()
+        print("\tLoaded {} rows in {}.".format(len(columns), timedelta(seconds=timer() - start_timestamp)))
+
+        content_dictionary, content_ids, content_counts = unique_digests(columns.content)
+        self._insert_into_table_of_unique_files(content_dictionary, content_counts)
+        if self._expected_folder_structure_evaluator.heavy_hitter_threshold() > 0:
+            self._expected_folder_structure_evaluator.insert_into_table_of_heavy_hitter_files()
+        self._insert_into_table_of_unique_folders(columns)
+        self._insert_into_table_of_expected_folder_structure(columns, content_dictionary, content_ids,
+                                                             content_counts)
+
+        print("[NumpyEvaluationEngine END] Time elapsed {}".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def reset(self):
+        self._unique_file_folder_evaluator.reset()
+        self._expected_folder_structure_evaluator.reset()
+
+    ##################################################################################################
+
+    def _load_columns(self) -> PublicIndexColumns:
+        if self._snapshot is not None:
+            return self._snapshot.open_or_export(self.index_db)
+        return load_public_index_columns(self.index_db, NumpyEvaluationEngine.BATCH_SIZE)
+
+    ##################################################################################################
+
+    def _insert_into_table_of_unique_files(self, content_dictionary: np.ndarray, content_counts: np.ndarray):
+        self._insert_rows("INSERT INTO {} VALUES (?, ?)".format(UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME),
+                          [content_dictionary], [content_counts])
+
+    ##################################################################################################
+
+    def _insert_into_table_of_unique_folders(self, columns: PublicIndexColumns):
+        counts = np.bincount(columns.relative_path_ids, minlength=columns.relative_paths.shape[0])
+        self._insert_rows("INSERT INTO {} VALUES (?, ?)".format(UniqueFileFolderEvaluator.UNIQUE_FOLDERS_TABLE_NAME),
+                          [columns.relative_paths], [counts])
+
+    ##################################################################################################
+
+    def _insert_into_table_of_expected_folder_structure(self, columns: PublicIndexColumns,
+                                                        content_dictionary: np.ndarray, content_ids: np.ndarray,
+                                                        content_counts: np.ndarray):
+        relative_path_ids = columns.relative_path_ids.astype(np.int64)
+        if self._skip_identical_subtrees:
+            keep = ~np.isin(relative_path_ids, self._get_settled_relative_path_ids(columns))
+            relative_path_ids, content_ids = relative_path_ids[keep], content_ids[keep]
+
+        # DISTINCT (relative path, content) pairs as one int64 key each.
+        num_relative_paths = columns.relative_paths.shape[0]
+        pairs = np.unique(content_ids * num_relative_paths + relative_path_ids)
+        pair_content_ids = pairs // num_relative_paths
+        pair_relative_path_ids = pairs % num_relative_paths
+        # Heavy hitters are collapsed by np.unique() like all other contents, only the exclude policy changes the result.
+        heavy_hitter_threshold = self._expected_folder_structure_evaluator.heavy_hitter_threshold()
+        if heavy_hitter_threshold > 0 and self._expected_folder_structure_evaluator.heavy_hitter_policy() == \
+                EvaluationConfigMixin.HEAVY_HITTER_POLICY_EXCLUDE:
+            keep = content_counts[pair_content_ids] <= heavy_hitter_threshold
+            pair_content_ids, pair_relative_path_ids = pair_content_ids[keep], pair_relative_path_ids[keep]
+
+        self._insert_rows(
+            "INSERT INTO {} VALUES (?, ?, ?)".format(
+                ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME),
+            [columns.relative_paths[pair_relative_path_ids], content_dictionary[pair_content_ids]],
+            [content_counts[pair_content_ids]])
+
+    ##################################################################################################
+
+    def _get_settled_relative_path_ids(self, columns: PublicIndexColumns) -> np.ndarray:
+        if self.evaluation_db.cursor().execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME,)).fetchone() is None:
+            print("WARNING: No settled folders available. Run IdenticalSubtreeEvaluator first.")
+            return np.empty(0, dtype=np.int64)
+
+        settled = hex_digests_to_array([r[0] for r in self.evaluation_db.cursor().execute(
+            "SELECT * FROM {}".format(IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME)).fetchall()])
+        # Group the dictionary together with the settled folders to map the settled folders to dictionary ids.
+        all_paths = np.concatenate([columns.relative_paths, settled])
+        _, inverse, _ = unique_digests(all_paths)
+        dictionary_ids = np.full(inverse.max() + 1 if len(inverse) > 0 else 0, -1, dtype=np.int64)
+        dictionary_ids[inverse[:columns.relative_paths.shape[0]]] = np.arange(columns.relative_paths.shape[0])
+        settled_ids = dictionary_ids[inverse[columns.relative_paths.shape[0]:]]
+        return settled_ids[settled_ids >= 0]
+
+    ##################################################################################################
+
+    def _insert_rows(self, q: str, digest_columns: List[np.ndarray], integer_columns: List[np.ndarray]):
+        """
+        Writes the rows batch-wise, digest columns are converted back to hex strings.
+        """
+        num_rows = 0 if len(integer_columns) == 0 else len(integer_columns[0])
+        for start in range(0, num_rows, NumpyEvaluationEngine.BATCH_SIZE):
+            end = min(start + NumpyEvaluationEngine.BATCH_SIZE, num_rows)
+            values = [array_to_hex_digests(c[start:end]) for c in digest_columns] + \
+                     [c[start:end].tolist() for c in integer_columns]
+            try:
+                self.evaluation_db.cursor().executemany(q, zip(*values))
+            except BaseException as e:
+                print(q)
+                raise e
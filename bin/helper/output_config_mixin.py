@@ -0,0 +1,90 @@
+from configparser import ConfigParser
+
+
+##################################################################################################
+
+class OutputConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "output"
+    OUTPUT_DIRECTORY_FIELD_NAME = "output_directory"
+    FORMAT_FIELD_NAME = "format"
+    COMPRESSION_FIELD_NAME = "compression"
+    FETCH_SIZE_FIELD_NAME = "fetch_size"
+
+    FORMAT_CSV = "csv"
+    FORMAT_JSONL = "jsonl"
+    FORMAT_SH = "sh"
+    FORMATS = [FORMAT_CSV, FORMAT_JSONL, FORMAT_SH]
+
+    COMPRESSION_NONE = "none"
+    COMPRESSION_GZIP = "gzip"
+    COMPRESSION_ZSTD = "zstd"
+    COMPRESSIONS = [COMPRESSION_NONE, COMPRESSION_GZIP, COMPRESSION_ZSTD]
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._output_directory = "reports"  # type: str
+        self._format = OutputConfigMixin.FORMAT_CSV  # type: str
+        self._compression = OutputConfigMixin.COMPRESSION_NONE  # type: str
+        self._fetch_size = 10000  # type: int
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_output_settings()
+
+        print("[{}]".format(OutputConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(OutputConfigMixin.OUTPUT_DIRECTORY_FIELD_NAME, self._output_directory))
+        print("\t{} = '{}'".format(OutputConfigMixin.FORMAT_FIELD_NAME, self._format))
+        print("\t{} = '{}'".format(OutputConfigMixin.COMPRESSION_FIELD_NAME, self._compression))
+        print("\t{} = '{}'".format(OutputConfigMixin.FETCH_SIZE_FIELD_NAME, self._fetch_size))
+
+    ##################################################################################################
+
+    def get_output_directory(self): return self._output_directory
+
+    ##################################################################################################
+
+    def get_format(self): return self._format
+
+    ##################################################################################################
+
+    def get_compression(self): return self._compression
+
+    ##################################################################################################
+
+    def get_fetch_size(self): return self._fetch_size
+
+    ##################################################################################################
+
+    def __handle_output_settings(self):
+        section = OutputConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            return
+
+        self._output_directory = self._parser.get(
+            section, OutputConfigMixin.OUTPUT_DIRECTORY_FIELD_NAME, fallback=self._output_directory).strip()
+        self._format = self._parser.get(
+            section, OutputConfigMixin.FORMAT_FIELD_NAME, fallback=self._format).strip().lower()
+        self._compression = self._parser.get(
+            section, OutputConfigMixin.COMPRESSION_FIELD_NAME, fallback=self._compression).strip().lower()
+        self._fetch_size = self._parser.getint(section, OutputConfigMixin.FETCH_SIZE_FIELD_NAME,
+                                               fallback=self._fetch_size)
+
+        if len(self._output_directory) == 0:
+            raise ValueError("ERROR: '[{}]' {} must not be empty"
+                             .format(section, OutputConfigMixin.OUTPUT_DIRECTORY_FIELD_NAME))
+        if self._format not in OutputConfigMixin.FORMATS:
+            raise ValueError("ERROR: '[{}]' {} must be one of {}"
+                             .format(section, OutputConfigMixin.FORMAT_FIELD_NAME, OutputConfigMixin.FORMATS))
+        if self._compression not in OutputConfigMixin.COMPRESSIONS:
+            raise ValueError("ERROR: '[{}]' {} must be one of {}"
+                             .format(section, OutputConfigMixin.COMPRESSION_FIELD_NAME,
+                                     OutputConfigMixin.COMPRESSIONS))
+        if self._fetch_size < 1:
+            raise ValueError("ERROR: '[{}]' {} must be positive"
+                             .format(section, OutputConfigMixin.FETCH_SIZE_FIELD_NAME))
@@ -0,0 +1,254 @@
+import concurrent
+import concurrent.futures
+import os
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import List, Optional, Tuple
+
+from .database_helper import EvaluationDataBases, PublicDataBase, UniqueFileFolderEvaluator, \
+    ExpectedFolderStructureEvaluator, IdenticalSubtreeEvaluator, connect_read_only
+from .evaluation_config_mixin import EvaluationConfigMixin
+from .federated_evaluation import hash_range_partitions
+
+
+######################################################################################################
+
+Columns = PublicDataBase.PublicIndexTableColumnNames
+
+
+######################################################################################################
+
+def _range_condition(column: str, lower: str, upper: str, alias: str = "") -> Tuple[str, List[str]]:
+    """
+    Helper function that builds the WHERE condition selecting one hash range.
+    :return: Tuple of (condition, parameters)
+    """
+    conditions = ["1"]
+    parameters = []
+    if lower != "":
+        conditions.append("{}{} >= ?".format(alias, column))
+        parameters.append(lower)
+    if upper != "":
+        conditions.append("{}{} < ?".format(alias, column))
+        parameters.append(upper)
+    return " AND ".join(conditions), parameters
+
+
+######################################################################################################
+
+def _evaluate_partition(index_database_path: str, index_table_name: str, evaluation_database_path: Optional[str],
+                        partition_database_path: str, lower: str, upper: str, heavy_hitter_threshold: int = 0,
+                        heavy_hitter_policy: str = EvaluationConfigMixin.HEAVY_HITTER_POLICY_SEPARATE):
+    """
+    Process pool entry point: evaluates one hash range of the public index into its own partition database.
+    The content hash range selects the unique files and the expected folder structure, the same range of relative path
+    hash tags selects the unique folders.
+    :param evaluation_database_path: Evaluation database holding the settled folders to be left out, None to keep all
+    :param heavy_hitter_threshold: See ExpectedFolderStructureEvaluator, 0 disables the detection
+    """
+    connection = connect_read_only(index_database_path)
+    try:
+        connection.execute("ATTACH DATABASE ? AS part", (partition_database_path,))
+        connection.execute("PRAGMA part.journal_mode = OFF").fetchall()
+        connection.execute("PRAGMA part.synchronous = OFF").fetchall()
+        index_tbl = index_table_name
+        if evaluation_database_path is not None:
+            connection.execute("ATTACH DATABASE ? AS eval", (
+                "{}?mode=ro".format(pathlib.Path(evaluation_database_path).resolve().as_uri()),))
+            index_tbl = "(SELECT * FROM {tbl} WHERE {rpht} NOT IN (SELECT {rpht} FROM eval.{settled_tbl}))".format(
+                tbl=index_table_name, rpht=Columns.relative_path_hash_tag.value,
+                settled_tbl=IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME)
+
+        content_condition, content_parameters = _range_condition(Columns.file_content_hash_tag.value, lower, upper)
+        folder_condition, folder_parameters = _range_condition(Columns.relative_path_hash_tag.value, lower, upper)
+        queries = [("""
+        CREATE TABLE part.unique_files AS
+        SELECT
+            {fcntht}, COUNT({fcntht}) AS cnt
+        FROM
+            {tbl}
+        WHERE
+            {content_condition}
+        GROUP BY
+            {fcntht}
+        """, content_parameters), ("""
+        CREATE TABLE part.unique_folders AS
+        SELECT
+            {rpht}, COUNT({rpht}) AS cnt
+        FROM
+            {tbl}
+        WHERE
+            {folder_condition}
+        GROUP BY
+            {rpht}
+        """, folder_parameters), ("""
+        CREATE TABLE part.heavy_hitter_files AS
+        SELECT
+            {fcntht}, COUNT(*) AS cnt, COUNT(DISTINCT {rpht}) AS folder_cnt, MAX({fsize}) AS {fsize}
+        FROM
+            {tbl}
+        WHERE
+            {fcntht} IN (SELECT {fcntht} FROM part.unique_files WHERE cnt > ?)
+        GROUP BY
+            {fcntht}
+        """, [heavy_hitter_threshold if heavy_hitter_threshold > 0 else None]), ("""
+        CREATE TABLE part.expected_folder_structure AS
+        SELECT
+            DISTINCT index_tbl.{rpht}, unique_files_tbl.{fcntht}, unique_files_tbl.cnt
+        FROM
+            part.unique_files AS unique_files_tbl
+            JOIN {index_tbl} AS index_tbl ON unique_files_tbl.{fcntht} = index_tbl.{fcntht}
+        WHERE
+            {index_content_condition} {heavy_hitter_condition}
+        """, content_parameters)]
+        if heavy_hitter_threshold > 0 and heavy_hitter_policy == EvaluationConfigMixin.HEAVY_HITTER_POLICY_SEPARATE:
+            queries.append(("""
+            INSERT INTO part.expected_folder_structure
+            SELECT
+                pairs.{rpht}, pairs.{fcntht}, heavy_hitter_files_tbl.cnt
+            FROM
+                (SELECT DISTINCT {rpht}, {fcntht} FROM {index_tbl}
+                 WHERE {fcntht} IN (SELECT {fcntht} FROM part.heavy_hitter_files)) AS pairs
+                JOIN part.heavy_hitter_files AS heavy_hitter_files_tbl
+                    ON heavy_hitter_files_tbl.{fcntht} = pairs.{fcntht}
+            """, []))
+        for q, parameters in queries:
+            q = q.format(
+                fcntht=Columns.file_content_hash_tag.value,
+                rpht=Columns.relative_path_hash_tag.value,
+                tbl=index_table_name,
+                index_tbl=index_tbl,
+                content_condition=content_condition,
+                folder_condition=folder_condition,
+                fsize=Columns.file_size.value,
+                heavy_hitter_condition="AND unique_files_tbl.cnt <= {}".format(heavy_hitter_threshold)
+                if heavy_hitter_threshold > 0 else "",
+                index_content_condition=_range_condition(Columns.file_content_hash_tag.value, lower, upper,
+                                                         alias="index_tbl.")[0])
+            try:
+                connection.execute(q, parameters)
+            except sqlite3.Error as e:
+                print(q)
+                raise e
+        connection.commit()
+    finally:
+        connection.close()
+
+
+######################################################################################################
+
+class ParallelEvaluationEngine(object):
+    """
+    Multi-process alternative to UniqueFileFolderEvaluator and ExpectedFolderStructureEvaluator, each of them is one
+    SQLite statement and uses one core only.
+
+    The hash tag range is split into partitions: grouping by content hash tag (and by relative path hash tag) never
+    crosses a partition boundary, so every partition is evaluated independently by a worker process with its own read
+    only connection. The workers write into partition databases, which are merged into the same evaluation tables by
+    INSERT ... SELECT.
+    """
+    ##################################################################################################
+
+    # SQLite allows 10 attached databases by default, one is the public index database.
+    MAX_ATTACHED_PARTITIONS = 8
+
+    ##################################################################################################
+
+    def __init__(self, databases: EvaluationDataBases, skip_identical_subtrees: bool = False,
+                 num_workers: Optional[int] = None, num_partitions: Optional[int] = None,
+                 heavy_hitter_threshold: int = 0,
+                 heavy_hitter_policy: str = EvaluationConfigMixin.HEAVY_HITTER_POLICY_SEPARATE):
+        """
+        :param skip_identical_subtrees: Leave out the folders that are identical in all roots, requires the result of
+                                        IdenticalSubtreeEvaluator.evaluate()
+        :param num_workers: Number of worker processes, default: number of CPUs
+        :param num_partitions: Number of hash ranges, default: 4 per worker so that uneven partitions even out
+        :param heavy_hitter_threshold: See ExpectedFolderStructureEvaluator, 0 disables the detection
+        :param heavy_hitter_policy: One of EvaluationConfigMixin.HEAVY_HITTER_POLICIES
+        """
+        self.index_db = databases.index_db
+        self.evaluation_db = databases.evaluation_db
+        self._unique_file_folder_evaluator = UniqueFileFolderEvaluator(databases)
+        self._expected_folder_structure_evaluator = ExpectedFolderStructureEvaluator(databases)
+        self._skip_identical_subtrees = skip_identical_subtrees  # type: bool
+        self._num_workers = num_workers or os.cpu_count() or 1  # type: int
+        self._num_partitions = num_partitions or 4 * self._num_workers  # type: int
+        self._heavy_hitter_threshold = heavy_hitter_threshold  # type: int
+        self._heavy_hitter_policy = heavy_hitter_policy  # type: str
+
+    ##################################################################################################
+
+    def evaluate(self):
+        print("\n[ParallelEvaluationEngine START]")
+        start_timestamp = timer()
+
+        self.reset()
+        evaluation_database_path = None
+        if self._skip_identical_subtrees:
+            if self.evaluation_db.cursor().execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (IdenticalSubtreeEvaluator.SETTLED_FOLDERS_TABLE_NAME,)).fetchone() is not None:
+                evaluation_database_path = self.evaluation_db.database_path()
+            else:
+                print("WARNING: No settled folders available. Run IdenticalSubtreeEvaluator first.")
+        # The workers read the committed state only.
+        self.evaluation_db.connection().commit()
+
+        partition_directory = tempfile.mkdtemp(prefix="evaluation-partitions-",
+                                               dir=os.path.dirname(os.path.abspath(self.evaluation_db.database_path())))
+        try:
+            partition_paths = [os.path.join(partition_directory, "partition-{:04d}.sqlite".format(i))
+                               for i in range(self._num_partitions)]
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self._num_workers) as executor:
+                fs = [executor.submit(_evaluate_partition, self.index_db.database_path(), self.index_db.table_name(),
+                                      evaluation_database_path, path, lower, upper, self._heavy_hitter_threshold,
+                                      self._heavy_hitter_policy)
+                      for path, (lower, upper) in zip(partition_paths, hash_range_partitions(self._num_partitions))]
+                [f.result() for f in fs]
+            print("\tEvaluated {} partitions with {} workers in {}.".format(
+                self._num_partitions, self._num_workers, timedelta(seconds=timer() - start_timestamp)))
+            self._merge_partitions(partition_paths)
+            if self._heavy_hitter_threshold > 0:
+                num_heavy_hitters = self.evaluation_db.cursor().execute("SELECT COUNT(*) FROM {}".format(
+                    ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME)).fetchone()[0]
+                if num_heavy_hitters > 0:
+                    print("\t{} heavy hitter contents (more than {} files each), policy '{}'.".format(
+                        num_heavy_hitters, self._heavy_hitter_threshold, self._heavy_hitter_policy))
+        finally:
+            shutil.rmtree(partition_directory, ignore_errors=True)
+
+        print("[ParallelEvaluationEngine END] Time elapsed {}".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def reset(self):
+        self._unique_file_folder_evaluator.reset()
+        self._expected_folder_structure_evaluator.reset()
+
+    ##################################################################################################
+
+    def _merge_partitions(self, partition_paths: List[str]):
+        connection = self.evaluation_db.connection()
+        for start in range(0, len(partition_paths), ParallelEvaluationEngine.MAX_ATTACHED_PARTITIONS):
+            group = partition_paths[start:start + ParallelEvaluationEngine.MAX_ATTACHED_PARTITIONS]
+            # Attaching is not possible within a transaction.
+            connection.commit()
+            for i, path in enumerate(group):
+                connection.execute("ATTACH DATABASE ? AS part_{}".format(i), (path,))
+            try:
+                for tbl, partition_tbl in [
+                    (UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME, "unique_files"),
+                    (UniqueFileFolderEvaluator.UNIQUE_FOLDERS_TABLE_NAME, "unique_folders"),
+                    (ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME,
+                     "expected_folder_structure"),
+                    (ExpectedFolderStructureEvaluator.HEAVY_HITTER_FILES_TABLE_NAME, "heavy_hitter_files")]:
+                    connection.execute("INSERT INTO {} {}".format(tbl, " UNION ALL ".join(
+                        "SELECT * FROM part_{}.{}".format(i, partition_tbl) for i in range(len(group)))))
+                connection.commit()
+            finally:
+                for i in range(len(group)):
+                    connection.execute("DETACH DATABASE part_{}".format(i))
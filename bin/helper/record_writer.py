@@ -0,0 +1,186 @@
+import csv
+import gzip
+import io
+import json
+import shlex
+import sys
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional, TextIO
+
+
+##################################################################################################
+
+class RecordWriter(ABC):
+    """
+    Base class of the streaming writers. Records are dictionaries that are written one by one, nothing is buffered
+    except by the underlying file object. Subclasses implement _write().
+    """
+
+    ##################################################################################################
+
+    FORMATS = ["jsonl", "csv"]
+    COMPRESSIONS = ["none", "gzip", "zstd"]
+
+    # gzip level 6 compresses about as well as 9 (the default of gzip.open) at a multiple of the speed.
+    GZIP_LEVEL = 6
+    ZSTD_LEVEL = 3
+
+    ##################################################################################################
+
+    def __init__(self, output_file_path: Optional[str], field_names: List[str], compression: str = "none"):
+        """
+        :param compression: One of COMPRESSIONS, ignored for stdout
+        """
+        if compression not in RecordWriter.COMPRESSIONS:
+            raise ValueError("Unknown compression '{}'. Expected one of {}.".format(
+                compression, RecordWriter.COMPRESSIONS))
+        self._output_file_path = output_file_path  # type: Optional[str]
+        self._field_names = field_names  # type: List[str]
+        self._compression = compression  # type: str
+        self._output = None  # type: Optional[TextIO]
+        self.num_records = 0  # type: int
+
+    ##################################################################################################
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    ##################################################################################################
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    ##################################################################################################
+
+    def open(self):
+        if self._output_file_path is None or self._output_file_path == "-":
+            self._output = sys.stdout
+        else:
+            self._output = _open_text_file(self._output_file_path, self._compression)
+
+    ##################################################################################################
+
+    def close(self):
+        if self._output is None:
+            return
+        self._output.flush()
+        if self._output is not sys.stdout:
+            self._output.close()
+        self._output = None
+
+    ##################################################################################################
+
+    def write(self, record: dict):
+        self._write(record)
+        self.num_records += 1
+
+    ##################################################################################################
+
+    @abstractmethod
+    def _write(self, record: dict):
+        pass
+
+
+##################################################################################################
+
+class JsonLinesWriter(RecordWriter):
+    ##################################################################################################
+
+    def _write(self, record: dict):
+        self._output.write(json.dumps(record, separators=(',', ':')))
+        self._output.write("\n")
+
+
+##################################################################################################
+
+class CsvWriter(RecordWriter):
+    ##################################################################################################
+
+    def open(self):
+        super().open()
+        # csv.writer with the values in column order, csv.DictWriter checks the keys of every record.
+        self._csv_writer = csv.writer(self._output)
+        self._csv_writer.writerow(self._field_names)
+
+    ##################################################################################################
+
+    def _write(self, record: dict):
+        self._csv_writer.writerow([record.get(f) for f in self._field_names])
+
+
+##################################################################################################
+
+class ShellScriptWriter(RecordWriter):
+    """
+    Writes one shell command per record, e.g. the cp commands that consolidate the missing files.
+    """
+    ##################################################################################################
+
+    def __init__(self, output_file_path: Optional[str], field_names: List[str], compression: str = "none",
+                 command: Optional[Callable[[dict], str]] = None):
+        """
+        :param command: Returns the command line(s) of a record, default: the path as comment
+        """
+        super().__init__(output_file_path, field_names, compression)
+        self._command = command or (lambda record: "# {}".format(record.get("path")))
+
+    ##################################################################################################
+
+    def open(self):
+        super().open()
+        self._output.write("#!/bin/sh\nset -e\n")
+
+    ##################################################################################################
+
+    def _write(self, record: dict):
+        self._output.write(self._command(record))
+        self._output.write("\n")
+
+
+##################################################################################################
+
+def shell_quote(value) -> str:
+    """
+    Helper function that quotes a value for the shell commands of ShellScriptWriter.
+    """
+    return shlex.quote(str(value))
+
+
+##################################################################################################
+
+def _open_text_file(output_file_path: str, compression: str) -> TextIO:
+    """
+    Helper function that opens the output file for writing text, compressed if requested.
+    """
+    if compression == "gzip":
+        return gzip.open(output_file_path, mode='wt', newline='', compresslevel=RecordWriter.GZIP_LEVEL)
+    if compression == "zstd":
+        try:
+            import zstandard  # sudo pip install zstandard
+        except ImportError:
+            raise ValueError("Compression 'zstd' needs the Python package 'zstandard'.")
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=RecordWriter.ZSTD_LEVEL).stream_writer(
+            open(output_file_path, mode='wb')), newline='')
+    return open(output_file_path, mode='w', newline='')
+
+
+##################################################################################################
+
+def create_record_writer(output_format: str, output_file_path: Optional[str], field_names: List[str],
+                         compression: str = "none", command: Optional[Callable[[dict], str]] = None) -> RecordWriter:
+    """
+    Helper function that creates the writer of the given format.
+    :param output_format: One of RecordWriter.FORMATS or "sh"
+    :param output_file_path: Output file or None/"-" for stdout
+    :param field_names: Fields of the records (column order for CSV)
+    :param compression: One of RecordWriter.COMPRESSIONS
+    :param command: Shell command of a record, "sh" only
+    """
+    if output_format == "jsonl":
+        return JsonLinesWriter(output_file_path, field_names, compression)
+    if output_format == "csv":
+        return CsvWriter(output_file_path, field_names, compression)
+    if output_format == "sh":
+        return ShellScriptWriter(output_file_path, field_names, compression, command)
+    raise ValueError("Unknown output format '{}'. Expected one of {}.".format(output_format, RecordWriter.FORMATS))
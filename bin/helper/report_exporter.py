@@ -0,0 +1,145 @@
+import os
+import re
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import Callable, List, Optional
+
+from .database_helper import PrivateDataBase, UniqueFileFolderEvaluator, ExpectedFolderStructureEvaluator, \
+    MissingFilesEvaluator
+from .output_config_mixin import OutputConfigMixin
+from .record_writer import create_record_writer, shell_quote
+from .result_resolver import ResultResolver
+
+
+######################################################################################################
+
+Columns = PrivateDataBase.PrivateIndexTableColumnNames
+
+
+######################################################################################################
+
+class _DuplicateCommands(object):
+    """
+    Shell commands of the duplicates report: the first file of a group is kept, the removal of the others is
+    prepared as comment.
+    """
+    ##################################################################################################
+
+    def __init__(self):
+        self._content_hash_tag = None  # type: Optional[str]
+
+    ##################################################################################################
+
+    def __call__(self, record: dict) -> str:
+        content_hash_tag = record[Columns.file_content_hash_tag.value]
+        if content_hash_tag != self._content_hash_tag:
+            self._content_hash_tag = content_hash_tag
+            return "\n# {} ({} files of {} bytes)\n# keep {}".format(
+                content_hash_tag, record["cnt"], record[Columns.file_size.value], shell_quote(record["path"]))
+        return "# rm -- {}".format(shell_quote(record["path"]))
+
+
+######################################################################################################
+
+def _missing_file_command(record: dict) -> str:
+    """
+    Shell command of the missing files report: copies the file from one of its copies to the expected path. A content
+    that exists within archives only has no source to copy from (see ResultResolver).
+    """
+    if record["path"] is None or record["source_path"] is None:
+        return "# unresolved: {} {}".format(record[Columns.relative_path_hash_tag.value],
+                                            record[Columns.file_content_hash_tag.value])
+    return "mkdir -p -- {} && cp -p -n -- {} {}".format(
+        shell_quote(os.path.dirname(record["path"])), shell_quote(record["source_path"]), shell_quote(record["path"]))
+
+
+######################################################################################################
+
+class ReportExporter(object):
+    """
+    Writes the evaluation results with their real paths (see ResultResolver) as report files in the configured format
+    and compression:
+    - duplicates: all copies of the contents stored more than once, grouped by content
+    - unique_files: the files without any copy
+    - expected_folder_structure: the files of the expected folder structure
+    - missing_files: one report per root, the files of the expected folder structure the root lacks
+    The rows are streamed from SQLite in batches of fetch_size rows and written one by one. Members of archives are not
+    reported, they have no real path.
+    """
+    ##################################################################################################
+
+    REPORT_DUPLICATES = "duplicates"
+    REPORT_UNIQUE_FILES = "unique_files"
+    REPORT_EXPECTED_FOLDER_STRUCTURE = "expected_folder_structure"
+    REPORT_MISSING_FILES = "missing_files"
+    REPORTS = [REPORT_DUPLICATES, REPORT_UNIQUE_FILES, REPORT_EXPECTED_FOLDER_STRUCTURE, REPORT_MISSING_FILES]
+
+    FILE_EXTENSIONS = {OutputConfigMixin.COMPRESSION_NONE: "",
+                       OutputConfigMixin.COMPRESSION_GZIP: ".gz",
+                       OutputConfigMixin.COMPRESSION_ZSTD: ".zst"}
+
+    ##################################################################################################
+
+    def __init__(self, resolver: ResultResolver, output_directory: str, output_format: str, compression: str,
+                 fetch_size: int):
+        """
+        :param output_format: One of OutputConfigMixin.FORMATS
+        :param compression: One of OutputConfigMixin.COMPRESSIONS
+        """
+        self._resolver = resolver  # type: ResultResolver
+        self._output_directory = output_directory  # type: str
+        self._format = output_format  # type: str
+        self._compression = compression  # type: str
+        self._fetch_size = fetch_size  # type: int
+
+    ##################################################################################################
+
+    def export(self, report: str) -> List[str]:
+        """
+        :return: Paths of the written report files
+        """
+        os.makedirs(self._output_directory, exist_ok=True)
+        if report == ReportExporter.REPORT_DUPLICATES:
+            return [self._export(report, UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME, "r.cnt > 1", (),
+                                 _DuplicateCommands())]
+        if report == ReportExporter.REPORT_UNIQUE_FILES:
+            return [self._export(report, UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME, "r.cnt = 1")]
+        if report == ReportExporter.REPORT_EXPECTED_FOLDER_STRUCTURE:
+            return [self._export(report, ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME)]
+        if report == ReportExporter.REPORT_MISSING_FILES:
+            file_paths = []
+            for root_path_hash_tag in self._missing_files_roots():
+                root_path = self._resolver.root_path(root_path_hash_tag) or ""
+                name = "{}_{}_{}".format(report, re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(root_path)),
+                                         root_path_hash_tag[:8])
+                file_paths.append(self._export(
+                    name, MissingFilesEvaluator.MISSING_FILES_TABLE_NAME,
+                    "r.{} = ?".format(Columns.root_path_hash_tag.value), (root_path_hash_tag,),
+                    _missing_file_command))
+            return file_paths
+        raise ValueError("ERROR: Unknown report '{}', known are: {}.".format(report, ", ".join(ReportExporter.REPORTS)))
+
+    ##################################################################################################
+
+    def _missing_files_roots(self) -> List[str]:
+        cursor = self._resolver.private_db.connection().cursor()
+        cursor.execute("SELECT DISTINCT {} FROM eval.{}".format(
+            Columns.root_path_hash_tag.value, MissingFilesEvaluator.MISSING_FILES_TABLE_NAME))
+        return [r[0] for r in cursor]
+
+    ##################################################################################################
+
+    def _export(self, name: str, table_name: str, condition: str = "1", parameters: tuple = (),
+                command: Optional[Callable[[dict], str]] = None) -> str:
+        start_timestamp = timer()
+        file_path = os.path.join(self._output_directory, "{}.{}{}".format(
+            name, self._format, ReportExporter.FILE_EXTENSIONS[self._compression]))
+        with create_record_writer(self._format, file_path, self._resolver.field_names(table_name), self._compression,
+                                  command) as writer:
+            for record in self._resolver.rows(table_name, condition, parameters, self._fetch_size):
+                writer.write(record)
+        elapsed_seconds = timer() - start_timestamp
+        print("\t{}: {} rows ({:.0f} rows/s) in {}.".format(
+            file_path, writer.num_records, writer.num_records / max(elapsed_seconds, 1e-6),
+            timedelta(seconds=elapsed_seconds)))
+        return file_path
@@ -0,0 +1,221 @@
+import os
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import Dict, Iterator, List, Optional
+
+from .database_helper import PrivateDataBase, UniqueFileFolderEvaluator, ExpectedFolderStructureEvaluator, \
+    MissingFilesEvaluator
+from .hashing_config_mixin import HashingConfigMixin
+
+
+######################################################################################################
+
+Columns = PrivateDataBase.PrivateIndexTableColumnNames
+
+
+######################################################################################################
+
+def _path_expression(root_path: str, relative_path: str, filename: Optional[str] = None) -> str:
+    """
+    Helper function that builds the SQL expression joining root, relative path (the root itself is ".") and file name.
+    Plain string operations, a Python SQL function would be called for every row. NULL if any part is NULL.
+    """
+    sep = "'{}'".format(os.sep)
+    relative_path = "CASE WHEN {rel} IN ('', '.') THEN '' ELSE {sep} || {rel} END".format(rel=relative_path, sep=sep)
+    expression = "RTRIM({root}, {sep}) || {rel}".format(root=root_path, sep=sep, rel=relative_path)
+    if filename is not None:
+        expression += " || {} || {}".format(sep, filename)
+    return expression
+
+
+######################################################################################################
+
+class ResultResolver(object):
+    """
+    Maps the rows of an evaluation table (hash tags only) back to the real paths of the private index database.
+
+    The evaluation database is attached to the private database and every evaluation row is looked up by the indexes
+    of the private index table (see PrivateDataBase.create_lookup_indexes()): the evaluation table is scanned once in
+    its own order (CROSS JOIN fixes the loop order), so the rows are produced one by one without sorting and are
+    fetched in batches. Alternatively the result is materialized into a table of the private database.
+
+    Members of archives (file_content_hash_mode "archived") have no real path, they are left out: a file or folder
+    that exists within archives only is not listed, a missing file is never expected in the virtual folder of an
+    archive and is not copied from one (its source is unresolved if the content exists within archives only).
+    """
+    ##################################################################################################
+
+    RESOLVED_TABLE_PREFIX = "resolved_"
+
+    FETCH_SIZE = 10000
+
+    # Resolved query per evaluation table, "r" is the evaluation row and "p" a matching row of the private index.
+    # One folder per root: the folder index delivers the rows of an evaluation row ordered by root, so the GROUP BY
+    # needs no temporary b-tree (DISTINCT would keep all result rows).
+    QUERIES = {
+        UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME: """
+        SELECT
+            r.{fconth} AS {fconth}, r.cnt AS cnt, {file_path} AS path, p.{fsize} AS {fsize}
+        FROM
+            eval.{tbl} AS r
+            CROSS JOIN {priv_tbl} AS p ON p.{fconth} = r.{fconth} AND p.{fhmode} != '{archived}'
+        WHERE
+            {condition}
+        """,
+        UniqueFileFolderEvaluator.UNIQUE_FOLDERS_TABLE_NAME: """
+        SELECT
+            r.{prelh} AS {prelh}, r.cnt AS cnt, {folder_path} AS path
+        FROM
+            eval.{tbl} AS r
+            CROSS JOIN {priv_tbl} AS p ON p.{prelh} = r.{prelh} AND p.{fhmode} != '{archived}'
+        WHERE
+            {condition}
+        GROUP BY
+            r.rowid, p.{prooth}
+        """,
+        ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME: """
+        SELECT
+            r.{prelh} AS {prelh}, r.{fconth} AS {fconth}, r.cnt AS cnt, {file_path} AS path
+        FROM
+            eval.{tbl} AS r
+            CROSS JOIN {priv_tbl} AS p ON p.{prelh} = r.{prelh} AND p.{fconth} = r.{fconth}
+                AND p.{fhmode} != '{archived}'
+        WHERE
+            {condition}
+        """,
+        # Target folder: root and relative folder name from any file having them, source: the first file of the
+        # content in the content index (the subqueries of the source find the same file). Both are real files, target
+        # folders that exist within archives only are left out.
+        MissingFilesEvaluator.MISSING_FILES_TABLE_NAME: """
+        SELECT
+            m.{prooth} AS {prooth}, m.{prelh} AS {prelh}, m.{fconth} AS {fconth}, m.cnt AS cnt,
+            {missing_file_path} AS path, {source_file_path} AS source_path
+        FROM
+            (SELECT
+                r.{prooth} AS {prooth}, r.{prelh} AS {prelh}, r.{fconth} AS {fconth}, r.cnt AS cnt,
+                (SELECT {proot} FROM {priv_tbl} WHERE {prooth} = r.{prooth} LIMIT 1) AS target_root,
+                (SELECT {prel} FROM {priv_tbl} WHERE {prelh} = r.{prelh} AND {fhmode} != '{archived}' LIMIT 1)
+                    AS target_rel,
+                (SELECT {proot} FROM {priv_tbl} WHERE {fconth} = r.{fconth} AND {fhmode} != '{archived}' LIMIT 1)
+                    AS source_root,
+                (SELECT {prel} FROM {priv_tbl} WHERE {fconth} = r.{fconth} AND {fhmode} != '{archived}' LIMIT 1)
+                    AS source_rel,
+                (SELECT {fname} FROM {priv_tbl} WHERE {fconth} = r.{fconth} AND {fhmode} != '{archived}' LIMIT 1)
+                    AS source_name
+            FROM
+                eval.{tbl} AS r
+            WHERE
+                {condition}) AS m
+        WHERE
+            m.target_rel IS NOT NULL OR NOT EXISTS (SELECT 1 FROM {priv_tbl} WHERE {prelh} = m.{prelh})
+        """}
+
+    FIELD_NAMES = {
+        UniqueFileFolderEvaluator.UNIQUE_FILES_TABLE_NAME:
+            [Columns.file_content_hash_tag.value, "cnt", "path", Columns.file_size.value],
+        UniqueFileFolderEvaluator.UNIQUE_FOLDERS_TABLE_NAME:
+            [Columns.relative_path_hash_tag.value, "cnt", "path"],
+        ExpectedFolderStructureEvaluator.EXPECTED_FOLDER_STRUCTURE_TABLE_NAME:
+            [Columns.relative_path_hash_tag.value, Columns.file_content_hash_tag.value, "cnt", "path"],
+        MissingFilesEvaluator.MISSING_FILES_TABLE_NAME:
+            [Columns.root_path_hash_tag.value, Columns.relative_path_hash_tag.value,
+             Columns.file_content_hash_tag.value, "cnt", "path", "source_path"]}
+
+    TABLES = list(QUERIES.keys())
+
+    ##################################################################################################
+
+    def __init__(self, private_db: PrivateDataBase, evaluation_database_path: str):
+        self.private_db = private_db
+        if not os.path.isfile(evaluation_database_path):
+            raise ValueError("ERROR: Evaluation database '{}' does not exist.".format(evaluation_database_path))
+
+        self.private_db.create_lookup_indexes()
+        self.private_db.connection().commit()
+        self.private_db.cursor().execute("ATTACH DATABASE ? AS eval", (evaluation_database_path,))
+
+    ##################################################################################################
+
+    def field_names(self, table_name: str) -> List[str]: return ResultResolver.FIELD_NAMES[table_name]
+
+    ##################################################################################################
+
+    def rows(self, table_name: str, condition: str = "1", parameters: tuple = (),
+             fetch_size: int = FETCH_SIZE) -> Iterator[Dict[str, object]]:
+        """
+        Streams the resolved rows of the evaluation table, one record per matching private file.
+        :param condition: SQL condition selecting the evaluation rows "r", e.g. "r.cnt > 1"
+        :param fetch_size: Number of rows fetched at once
+        """
+        cursor = self.private_db.connection().cursor()
+        cursor.execute(self._query(table_name, condition), parameters)
+        field_names = self.field_names(table_name)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(field_names, row))
+
+    ##################################################################################################
+
+    def materialize(self, table_name: str) -> int:
+        """
+        Writes the resolved rows into the table resolved_<table_name> of the private database.
+        :return: Number of rows
+        """
+        start_timestamp = timer()
+        resolved_table_name = ResultResolver.RESOLVED_TABLE_PREFIX + table_name
+        self.private_db.cursor().execute("DROP TABLE IF EXISTS main.{}".format(resolved_table_name))
+        q = "CREATE TABLE main.{} AS {}".format(resolved_table_name, self._query(table_name))
+        try:
+            self.private_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+        self.private_db.connection().commit()
+        num_rows = self.private_db.cursor().execute(
+            "SELECT COUNT(*) FROM main.{}".format(resolved_table_name)).fetchone()[0]
+        print("\tResolved {} rows of '{}' into '{}' in {}.".format(
+            num_rows, table_name, resolved_table_name, timedelta(seconds=timer() - start_timestamp)))
+        return num_rows
+
+    ##################################################################################################
+
+    def root_path(self, root_path_hash_tag: str) -> Optional[str]:
+        """
+        :return: Absolute path of the indexed root, None if unknown
+        """
+        row = self.private_db.cursor().execute("SELECT {proot} FROM main.{tbl} WHERE {prooth} = ? LIMIT 1".format(
+            proot=Columns.root_path.value, tbl=self.private_db.table_name(), prooth=Columns.root_path_hash_tag.value),
+            (root_path_hash_tag,)).fetchone()
+        return None if row is None else row[0]
+
+    ##################################################################################################
+
+    def _query(self, table_name: str, condition: str = "1") -> str:
+        if table_name not in ResultResolver.QUERIES:
+            raise ValueError("ERROR: Table '{}' cannot be resolved, resolvable are: {}.".format(
+                table_name, ", ".join(ResultResolver.TABLES)))
+        if self.private_db.cursor().execute("SELECT name FROM eval.sqlite_master WHERE type = 'table' AND name = ?",
+                                            (table_name,)).fetchone() is None:
+            raise ValueError("ERROR: The evaluation database does not contain the table '{}', run "
+                             "evaluate-unique.py first.".format(table_name))
+        return ResultResolver.QUERIES[table_name].format(
+            tbl=table_name,
+            condition=condition,
+            file_path=_path_expression("p." + Columns.root_path.value, "p." + Columns.relative_path.value,
+                                       "p." + Columns.filename.value),
+            folder_path=_path_expression("p." + Columns.root_path.value, "p." + Columns.relative_path.value),
+            missing_file_path=_path_expression("target_root", "target_rel", "source_name"),
+            source_file_path=_path_expression("source_root", "source_rel", "source_name"),
+            priv_tbl="main.{}".format(self.private_db.table_name()),
+            proot=Columns.root_path.value,
+            prel=Columns.relative_path.value,
+            fname=Columns.filename.value,
+            prooth=Columns.root_path_hash_tag.value,
+            prelh=Columns.relative_path_hash_tag.value,
+            fconth=Columns.file_content_hash_tag.value,
+            fsize=Columns.file_size.value,
+            fhmode=Columns.file_content_hash_mode.value,
+            archived=HashingConfigMixin.CONTENT_IDENTITY_ARCHIVED)
@@ -0,0 +1,95 @@
+from configparser import ConfigParser
+
+
+##################################################################################################
+
+class ServeConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "serve"
+    HOST_FIELD_NAME = "host"
+    PORT_FIELD_NAME = "port"
+    SOCKET_PATH_FIELD_NAME = "socket_path"
+    POOL_SIZE_FIELD_NAME = "pool_size"
+    CACHE_ENTRIES_FIELD_NAME = "cache_entries"
+    MAX_RESULTS_FIELD_NAME = "max_results"
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._host = "127.0.0.1"  # type: str
+        self._port = 8642  # type: int
+        self._socket_path = ""  # type: str
+        self._pool_size = 4  # type: int
+        self._cache_entries = 10000  # type: int
+        self._max_results = 1000  # type: int
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_serve_settings()
+
+        print("[{}]".format(ServeConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(ServeConfigMixin.HOST_FIELD_NAME, self._host))
+        print("\t{} = '{}'".format(ServeConfigMixin.PORT_FIELD_NAME, self._port))
+        print("\t{} = '{}'".format(ServeConfigMixin.SOCKET_PATH_FIELD_NAME, self._socket_path))
+        print("\t{} = '{}'".format(ServeConfigMixin.POOL_SIZE_FIELD_NAME, self._pool_size))
+        print("\t{} = '{}'".format(ServeConfigMixin.CACHE_ENTRIES_FIELD_NAME, self._cache_entries))
+        print("\t{} = '{}'".format(ServeConfigMixin.MAX_RESULTS_FIELD_NAME, self._max_results))
+
+    ##################################################################################################
+
+    def get_host(self): return self._host
+
+    ##################################################################################################
+
+    def get_port(self): return self._port
+
+    ##################################################################################################
+
+    def get_socket_path(self):
+        """
+        :return: Path of the Unix domain socket to serve on, None to serve on host:port
+        """
+        return self._socket_path if len(self._socket_path) > 0 else None
+
+    ##################################################################################################
+
+    def get_pool_size(self): return self._pool_size
+
+    ##################################################################################################
+
+    def get_cache_entries(self): return self._cache_entries
+
+    ##################################################################################################
+
+    def get_max_results(self): return self._max_results
+
+    ##################################################################################################
+
+    def __handle_serve_settings(self):
+        section = ServeConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            return
+
+        self._host = self._parser.get(section, ServeConfigMixin.HOST_FIELD_NAME, fallback=self._host).strip()
+        self._port = self._parser.getint(section, ServeConfigMixin.PORT_FIELD_NAME, fallback=self._port)
+        self._socket_path = self._parser.get(
+            section, ServeConfigMixin.SOCKET_PATH_FIELD_NAME, fallback=self._socket_path).strip()
+        self._pool_size = self._parser.getint(section, ServeConfigMixin.POOL_SIZE_FIELD_NAME, fallback=self._pool_size)
+        self._cache_entries = self._parser.getint(
+            section, ServeConfigMixin.CACHE_ENTRIES_FIELD_NAME, fallback=self._cache_entries)
+        self._max_results = self._parser.getint(
+            section, ServeConfigMixin.MAX_RESULTS_FIELD_NAME, fallback=self._max_results)
+
+        if self._pool_size < 1:
+            raise ValueError("ERROR: '[{}]' {} must be positive"
+                             .format(section, ServeConfigMixin.POOL_SIZE_FIELD_NAME))
+        if self._cache_entries < 0:
+            raise ValueError("ERROR: '[{}]' {} must not be negative"
+                             .format(section, ServeConfigMixin.CACHE_ENTRIES_FIELD_NAME))
+        if self._max_results < 1:
+            raise ValueError("ERROR: '[{}]' {} must be positive"
+                             .format(section, ServeConfigMixin.MAX_RESULTS_FIELD_NAME))
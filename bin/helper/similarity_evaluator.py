@@ -0,0 +1,193 @@
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import List, Tuple
+
+import numpy as np  # sudo pip install numpy
+
+from .database_helper import EvaluationDataBases, PublicDataBase
+from .evaluation_config_mixin import EvaluationConfigMixin
+from .hash_array_helper import hex_digests_to_array, mix64
+
+
+######################################################################################################
+
+class SimilarFolderEvaluator(object):
+    """
+    Evaluator that finds folders with similar content, e.g. a copy with a few edits.
+
+    The similarity of two folders is the Jaccard similarity of their sets of file content hash tags. It is estimated
+    from MinHash signatures, which are computed for all folders at once with NumPy. Candidate pairs are found by
+    locality sensitive hashing (banding) instead of comparing all pairs of folders.
+    Folders are (root path hash tag, relative path hash tag), i.e. the immediate files of a folder.
+    """
+    ##################################################################################################
+
+    SIMILAR_FOLDERS_TABLE_NAME = "similar_folders"
+
+    BATCH_SIZE = 10000
+
+    # Buckets larger than this are folders with (nearly) the same signature, they are compared to the first member
+    # of the bucket only instead of pairwise.
+    MAX_BUCKET_SIZE = 1000
+
+    ##################################################################################################
+
+    def __init__(self, databases: EvaluationDataBases, evaluation_config: EvaluationConfigMixin):
+        self.index_db = databases.index_db
+        self.evaluation_db = databases.evaluation_db
+
+        self._threshold = evaluation_config.get_similarity_threshold()  # type: float
+        self._num_permutations = evaluation_config.get_minhash_permutations()  # type: int
+        self._num_bands = evaluation_config.get_lsh_bands()  # type: int
+        self._min_files = evaluation_config.get_similarity_min_files()  # type: int
+
+        self._seeds = mix64(np.arange(1, self._num_permutations + 1, dtype=np.uint64))  # type: np.ndarray
+
+    ##################################################################################################
+
+    def evaluate(self):
+        print("\n[SimilarFolderEvaluator START]")
+        start_timestamp = timer()
+
+        self.reset()
+        folders, signatures = self._compute_signatures()
+        print("\tComputed MinHash signatures of {} folders.".format(len(folders)))
+
+        first, second = self._find_candidate_pairs(signatures)
+        print("\tFound {} candidate pairs.".format(len(first)))
+
+        self._insert_into_table_of_similar_folders(folders, signatures, first, second)
+
+        print("[SimilarFolderEvaluator END] Time elapsed {}".format(timedelta(seconds=timer() - start_timestamp)))
+
+    ##################################################################################################
+
+    def reset(self):
+        self.evaluation_db.cursor().execute(
+            "DROP TABLE IF EXISTS {}".format(SimilarFolderEvaluator.SIMILAR_FOLDERS_TABLE_NAME))
+        q = """
+        CREATE TABLE IF NOT EXISTS {tbl}
+        (
+            {prooth}_a TEXT NOT NULL,
+            {prelh}_a TEXT NOT NULL,
+            {prooth}_b TEXT NOT NULL,
+            {prelh}_b TEXT NOT NULL,
+            jaccard REAL NOT NULL
+        )
+        """.format(tbl=SimilarFolderEvaluator.SIMILAR_FOLDERS_TABLE_NAME,
+                   prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+                   prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value)
+        try:
+            self.evaluation_db.cursor().execute(q)
+        except BaseException as e:
+            print(q)
+            raise e
+
+    ##################################################################################################
+
+    def _compute_signatures(self) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+        """
+        Streams the index ordered by folder and computes the MinHash signature of every folder.
+        :return: Tuple of (list of folder keys, signatures of shape (number of folders, permutations))
+        """
+        q = """
+        SELECT
+            {prooth}, {prelh}, {fconth}
+        FROM
+            {tbl}
+        ORDER BY
+            {prooth}, {prelh}
+        """.format(tbl=self.index_db.table_name(),
+                   prooth=PublicDataBase.PublicIndexTableColumnNames.root_path_hash_tag.value,
+                   prelh=PublicDataBase.PublicIndexTableColumnNames.relative_path_hash_tag.value,
+                   fconth=PublicDataBase.PublicIndexTableColumnNames.file_content_hash_tag.value)
+
+        folders = []  # type: List[Tuple[str, str]]
+        folder_sizes = []  # type: List[int]
+        signature_batches = []  # type: List[np.ndarray]
+        cursor = self.index_db.connection().execute(q)
+        for rows in iter(lambda: cursor.fetchmany(SimilarFolderEvaluator.BATCH_SIZE), []):
+            # Folder ids of this batch, a folder continued from the previous batch keeps its id.
+            folder_ids = np.empty(len(rows), dtype=np.int64)
+            first_new_folder = len(folders)
+            for i, (root_path_hash_tag, relative_path_hash_tag, _) in enumerate(rows):
+                if len(folders) == 0 or folders[-1] != (root_path_hash_tag, relative_path_hash_tag):
+                    folders.append((root_path_hash_tag, relative_path_hash_tag))
+                    folder_sizes.append(0)
+                folder_sizes[-1] += 1
+                folder_ids[i] = len(folders) - 1
+
+            # Only the upper 64 bit of the content digests are used as set elements.
+            values = hex_digests_to_array([r[2] for r in rows])[:, 0]
+            hashes = mix64(values[:, np.newaxis] ^ self._seeds[np.newaxis, :])
+
+            starts = np.flatnonzero(np.r_[True, folder_ids[1:] != folder_ids[:-1]])
+            batch_signatures = np.minimum.reduceat(hashes, starts, axis=0)
+            if folder_ids[0] < first_new_folder:
+                # Merge the folder continued from the previous batch.
+                signature_batches[-1][-1] = np.minimum(signature_batches[-1][-1], batch_signatures[0])
+                batch_signatures = batch_signatures[1:]
+            signature_batches.append(batch_signatures)
+
+        if len(signature_batches) == 0:
+            return folders, np.empty((0, self._num_permutations), dtype=np.uint64)
+
+        # Folders with too few files are similar to too many other folders by chance.
+        keep = np.flatnonzero(np.array(folder_sizes) >= self._min_files)
+        return [folders[i] for i in keep], np.concatenate(signature_batches)[keep]
+
+    ##################################################################################################
+
+    def _find_candidate_pairs(self, signatures: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Locality sensitive hashing: folders that agree in all rows of at least one band become candidates.
+        :return: Tuple of index arrays (first, second) of the candidate pairs with first < second
+        """
+        rows_per_band = self._num_permutations // self._num_bands
+        pair_keys = []  # type: List[np.ndarray]
+        num_folders = signatures.shape[0]
+
+        for band in range(self._num_bands):
+            band_signatures = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+            band_keys = np.zeros(num_folders, dtype=np.uint64)
+            for column in range(rows_per_band):
+                band_keys = mix64(band_keys ^ band_signatures[:, column])
+
+            order = np.argsort(band_keys, kind="stable")
+            sorted_keys = band_keys[order]
+            boundaries = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1], True])
+            for start, end in zip(boundaries[:-1], boundaries[1:]):
+                if end - start < 2:
+                    continue
+                members = np.sort(order[start:end])
+                if len(members) > SimilarFolderEvaluator.MAX_BUCKET_SIZE:
+                    first, second = np.full(len(members) - 1, members[0]), members[1:]
+                else:
+                    first, second = np.triu_indices(len(members), k=1)
+                    first, second = members[first], members[second]
+                pair_keys.append(first.astype(np.int64) * num_folders + second)
+
+        if len(pair_keys) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        unique_pairs = np.unique(np.concatenate(pair_keys))
+        return unique_pairs // num_folders, unique_pairs % num_folders
+
+    ##################################################################################################
+
+    def _insert_into_table_of_similar_folders(self, folders: List[Tuple[str, str]], signatures: np.ndarray,
+                                              first: np.ndarray, second: np.ndarray):
+        q = "INSERT INTO {tbl} VALUES (?, ?, ?, ?, ?)".format(tbl=SimilarFolderEvaluator.SIMILAR_FOLDERS_TABLE_NAME)
+
+        num_similar = 0
+        for start in range(0, len(first), SimilarFolderEvaluator.BATCH_SIZE):
+            batch_first = first[start:start + SimilarFolderEvaluator.BATCH_SIZE]
+            batch_second = second[start:start + SimilarFolderEvaluator.BATCH_SIZE]
+            jaccard = np.mean(signatures[batch_first] == signatures[batch_second], axis=1)
+            similar = np.flatnonzero(jaccard >= self._threshold)
+            self.evaluation_db.cursor().executemany(
+                q, [(folders[batch_first[i]][0], folders[batch_first[i]][1],
+                     folders[batch_second[i]][0], folders[batch_second[i]][1],
+                     float(jaccard[i])) for i in similar])
+            num_similar += len(similar)
+
+        print("\tFound {} similar folder pairs (Jaccard >= {}).".format(num_similar, self._threshold))
@@ -0,0 +1,65 @@
+from configparser import ConfigParser
+
+
+##################################################################################################
+
+class WatchConfigMixin(object):
+    ##################################################################################################
+
+    SECTION_NAME = "watch"
+    DEBOUNCE_SECONDS_FIELD_NAME = "debounce_seconds"
+    MAX_BATCH_SIZE_FIELD_NAME = "max_batch_size"
+    FOLDER_HASH_INTERVAL_FIELD_NAME = "folder_hash_interval_seconds"
+
+    ##################################################################################################
+
+    def __init__(self, config_parser: ConfigParser):
+        self._parser = config_parser  # type: ConfigParser
+
+        self._debounce_seconds = 2.0  # type: float
+        self._max_batch_size = 1000  # type: int
+        self._folder_hash_interval_seconds = 60.0  # type: float
+
+    ##################################################################################################
+
+    def read_config(self):
+        self.__handle_watch_settings()
+
+        print("[{}]".format(WatchConfigMixin.SECTION_NAME))
+        print("\t{} = '{}'".format(WatchConfigMixin.DEBOUNCE_SECONDS_FIELD_NAME, self._debounce_seconds))
+        print("\t{} = '{}'".format(WatchConfigMixin.MAX_BATCH_SIZE_FIELD_NAME, self._max_batch_size))
+        print("\t{} = '{}'".format(WatchConfigMixin.FOLDER_HASH_INTERVAL_FIELD_NAME,
+                                   self._folder_hash_interval_seconds))
+
+    ##################################################################################################
+
+    def get_debounce_seconds(self): return self._debounce_seconds
+
+    ##################################################################################################
+
+    def get_max_batch_size(self): return self._max_batch_size
+
+    ##################################################################################################
+
+    def get_folder_hash_interval_seconds(self): return self._folder_hash_interval_seconds
+
+    ##################################################################################################
+
+    def __handle_watch_settings(self):
+        section = WatchConfigMixin.SECTION_NAME
+        if not self._parser.has_section(section):
+            return
+
+        self._debounce_seconds = self._parser.getfloat(
+            section, WatchConfigMixin.DEBOUNCE_SECONDS_FIELD_NAME, fallback=self._debounce_seconds)
+        self._max_batch_size = self._parser.getint(
+            section, WatchConfigMixin.MAX_BATCH_SIZE_FIELD_NAME, fallback=self._max_batch_size)
+        self._folder_hash_interval_seconds = self._parser.getfloat(
+            section, WatchConfigMixin.FOLDER_HASH_INTERVAL_FIELD_NAME, fallback=self._folder_hash_interval_seconds)
+
+        if self._debounce_seconds < 0:
+            raise ValueError("ERROR: '[{}]' {} must not be negative"
+                             .format(section, WatchConfigMixin.DEBOUNCE_SECONDS_FIELD_NAME))
+        if self._max_batch_size < 1:
+            raise ValueError("ERROR: '[{}]' {} must be positive"
+                             .format(section, WatchConfigMixin.MAX_BATCH_SIZE_FIELD_NAME))
@@ -0,0 +1,81 @@
+import errno
+import os
+from typing import Optional
+
+
+##################################################################################################
+
+# Extended attribute holding the content hash of calculate_hash() as "<hex digest> <mtime in ns> <size>".
+XATTR_PREFIX = "user.dirindex."
+XATTR_NAME = XATTR_PREFIX + "md5"
+
+# File systems without (user) extended attributes, read only mounts, files not owned by the user, ...
+# A cache that cannot be read or written is simply not used.
+_UNSUPPORTED_ERRNOS = {errno.ENOTSUP, errno.EOPNOTSUPP, errno.EPERM, errno.EACCES, errno.EROFS, errno.ENOSPC,
+                       errno.E2BIG}
+
+
+##################################################################################################
+
+def is_xattr_supported() -> bool:
+    # os.getxattr() and friends are available on Linux only.
+    return hasattr(os, "getxattr")
+
+
+##################################################################################################
+
+def read_cached_hash(file_path: str, file_stat: os.stat_result) -> Optional[str]:
+    """
+    Helper function that returns the content hash stored in the extended attribute of a file.
+    :param file_stat: Current os.stat() of the file
+    :return: The hex digest if the attribute exists and the file did not change since (same modification time and
+             size), otherwise None
+    """
+    if not is_xattr_supported():
+        return None
+    try:
+        value = os.getxattr(file_path, XATTR_NAME).decode("ascii").split(" ")
+    except (OSError, UnicodeDecodeError):
+        return None
+    if len(value) != 3 or value[1] != str(file_stat.st_mtime_ns) or value[2] != str(file_stat.st_size):
+        return None
+    return value[0]
+
+
+##################################################################################################
+
+def write_cached_hash(file_path: str, file_content_hash_tag: str, file_stat: os.stat_result) -> bool:
+    """
+    Helper function that stores the content hash in the extended attribute of a file.
+    Nothing is stored if the file changed while it was hashed.
+    :param file_stat: os.stat() of the file before it was hashed
+    :return: True if the attribute was written
+    """
+    if not is_xattr_supported():
+        return False
+    try:
+        current_stat = os.stat(file_path)
+        if current_stat.st_mtime_ns != file_stat.st_mtime_ns or current_stat.st_size != file_stat.st_size:
+            return False
+        os.setxattr(file_path, XATTR_NAME, "{} {} {}".format(
+            file_content_hash_tag, file_stat.st_mtime_ns, file_stat.st_size).encode("ascii"))
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            print("\tWARNING: Cannot store the hash of '{}' as extended attribute ({}).".format(file_path, e))
+        return False
+    return True
+
+
+##################################################################################################
+
+def strip_cached_hashes(file_path: str) -> int:
+    """
+    Helper function that removes all extended attributes written by the hash cache from a file.
+    :return: Number of attributes removed
+    """
+    num_removed = 0
+    for name in os.listxattr(file_path):
+        if name.startswith(XATTR_PREFIX):
+            os.removexattr(file_path, name)
+            num_removed += 1
+    return num_removed
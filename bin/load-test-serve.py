@@ -0,0 +1,139 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import threading
+from timeit import default_timer as timer
+from typing import Dict, List
+from urllib.parse import urlencode
+
+from helper.config_file_handler import IndexingConfiguration
+from helper.database_helper import PrivateDataBase, connect_read_only, find_index_table_name
+from helper.index_service import UnixHTTPConnection
+
+
+##################################################################################################
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[min(int(p / 100.0 * len(sorted_values)), len(sorted_values) - 1)]
+
+
+##################################################################################################
+
+
+def sample_requests(database_path: str, num_samples: int) -> Dict[str, List[str]]:
+    """
+    Picks random files of the index and builds the lookups of them (content hash, size, path).
+    """
+    c = PrivateDataBase.PrivateIndexTableColumnNames
+    connection = connect_read_only(database_path)
+    try:
+        rows = connection.execute(
+            "SELECT {}, {}, {}, {}, {} FROM {} ORDER BY RANDOM() LIMIT ?".format(
+                c.root_path.value, c.relative_path.value, c.filename.value, c.file_size.value,
+                c.file_content_hash_tag.value, find_index_table_name(connection)), (num_samples,)).fetchall()
+    finally:
+        connection.close()
+    if len(rows) == 0:
+        raise ValueError("The index '{}' is empty.".format(database_path))
+    return {"hash": ["/hash?" + urlencode({"value": r[4]}) for r in rows],
+            "size": ["/size?" + urlencode({"value": r[3]}) for r in rows],
+            "duplicates": ["/duplicates?" + urlencode({"path": os.path.normpath(os.path.join(*r[:3]))})
+                           for r in rows]}
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test of serve-index.py: sends lookups of random indexed files from several client threads "
+                    "and reports the latency percentiles per lookup.")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file the service was started with.")
+
+    parser.add_argument("-n", "--requests",
+                        required=False, type=int, dest="num_requests", default=10000,
+                        help="Number of requests per lookup (default: 10000).")
+
+    parser.add_argument("-t", "--threads",
+                        required=False, type=int, dest="num_threads", default=8,
+                        help="Number of client threads, each with one keep-alive connection (default: 8).")
+
+    parser.add_argument("-s", "--samples",
+                        required=False, type=int, dest="num_samples", default=1000,
+                        help="Number of distinct random files looked up, fewer samples mean more cache hits "
+                             "(default: 1000).")
+
+    args = parser.parse_args()
+
+    cfg = IndexingConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    requests = sample_requests(cfg.private_index_db_cfg.get_database_path(), args.num_samples)
+    socket_path = cfg.serve_cfg.get_socket_path()
+
+    def connect() -> http.client.HTTPConnection:
+        if socket_path is not None:
+            return UnixHTTPConnection(socket_path)
+        return http.client.HTTPConnection(cfg.serve_cfg.get_host(), cfg.serve_cfg.get_port(), timeout=10.0)
+
+    print("\n{:<12} {:>10} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        "lookup", "requests", "req/s", "p50 ms", "p99 ms", "max ms", "errors"))
+    for lookup, paths in requests.items():
+        latencies = []  # type: List[float]
+        errors = []  # type: List[int]
+        lock = threading.Lock()
+
+        def client(num_requests: int, seed: int):
+            rng = random.Random(seed)
+            connection = connect()
+            thread_latencies = []
+            thread_errors = 0
+            for _ in range(num_requests):
+                start = timer()
+                try:
+                    connection.request("GET", rng.choice(paths))
+                    response = connection.getresponse()
+                    json.loads(response.read())
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    thread_errors += 1
+                    continue
+                thread_latencies.append(timer() - start)
+                thread_errors += 1 if response.status != 200 else 0
+            connection.close()
+            with lock:
+                latencies.extend(thread_latencies)
+                errors.append(thread_errors)
+
+        threads = [threading.Thread(target=client, args=(args.num_requests // args.num_threads
+                                                         + (1 if i < args.num_requests % args.num_threads else 0), i))
+                   for i in range(args.num_threads)]
+        start_timestamp = timer()
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        elapsed = timer() - start_timestamp
+
+        latencies.sort()
+        print("{:<12} {:>10} {:>10.0f} {:>10.3f} {:>10.3f} {:>10.3f} {:>8}".format(
+            lookup, len(latencies), len(latencies) / elapsed, percentile(latencies, 50) * 1000,
+            percentile(latencies, 99) * 1000, latencies[-1] * 1000 if len(latencies) > 0 else 0.0, sum(errors)))
+
+    connection = connect()
+    connection.request("GET", "/stats")
+    print("\nService statistics: {}".format(json.loads(connection.getresponse().read())))
+    connection.close()
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+from datetime import timedelta
+from timeit import default_timer as timer
+from typing import List, Tuple
+
+from helper.config_file_handler import EvaluationConfiguration
+from helper.database_helper import PublicDataBase
+from helper.directory_indexer import calculate_hash
+from helper.membership_filter import MembershipFilter
+
+
+##################################################################################################
+
+
+def collect_hashes(args) -> List[Tuple[str, str]]:
+    """
+    :return: List of (content hash, path or empty string) of the given hashes and files, folders are walked
+    """
+    hashes = []  # type: List[Tuple[str, str]]
+    if args.hashes_file is not None:
+        f = sys.stdin if args.hashes_file == "-" else open(args.hashes_file, mode='r')
+        try:
+            for line in f:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                content_hash = line.split()[0].lower()
+                if len(content_hash) != 32 or any(c not in "0123456789abcdef" for c in content_hash):
+                    print("ERROR: '{}' is not a md5 hex digest.".format(content_hash))
+                    continue
+                hashes.append((content_hash, ""))
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+    for path in args.files:
+        file_paths = [path]
+        if os.path.isdir(path):
+            file_paths = [os.path.join(folder, file_name)
+                          for folder, _, files in os.walk(path) for file_name in sorted(files)]
+        for file_path in file_paths:
+            try:
+                hashes.append((calculate_hash(file_path), file_path))
+            except OSError as e:
+                print("ERROR: Cannot hash '{}' ({}).".format(file_path, e))
+    return hashes
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Builds a membership filter of the content hashes in the public index and checks hashes or "
+                    "files against it without querying the database.")
+    parser.add_argument("command", choices=["build", "check"],
+                        help="build: create or incrementally update the filter, "
+                             "check: report which hashes/files are in the index.")
+
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file to be loaded. "
+                             "An example Configuration can be found in the 'configurations' folder.")
+
+    parser.add_argument("-d", "--filter_directory",
+                        required=False, type=str, dest="filter_directory", default=None,
+                        help="Folder of the filter (default: <public index database>.filter).")
+
+    parser.add_argument("-p", "--false_positive_rate",
+                        required=False, type=float, dest="false_positive_rate", default=0.01,
+                        help="build: false positive rate of a new filter (default: 0.01).")
+
+    parser.add_argument("-e", "--exact",
+                        required=False, action="store_true", dest="exact",
+                        help="build: store the sorted digests too, checks are exact (16 bytes per distinct hash).")
+
+    parser.add_argument("-f", "--full",
+                        required=False, action="store_true", dest="full",
+                        help="build: rebuild the filter from scratch instead of updating it.")
+
+    parser.add_argument("--hashes",
+                        required=False, type=str, dest="hashes_file", default=None,
+                        help="check: file with one md5 hex digest per line ('-' reads stdin).")
+
+    parser.add_argument("--files",
+                        required=False, nargs="+", type=str, dest="files", default=[],
+                        help="check: files or folders whose content is checked.")
+
+    args = parser.parse_args()
+
+    cfg = EvaluationConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    start_timestamp = timer()
+    database_path = cfg.public_index_db_cfg.get_database_path()
+    membership_filter = MembershipFilter(args.filter_directory if args.filter_directory is not None
+                                         else MembershipFilter.default_directory(database_path))
+
+    if args.command == "build" or not membership_filter.is_valid(database_path):
+        index_db = PublicDataBase(cfg.public_index_db_cfg)
+        try:
+            if args.full:
+                membership_filter.build(index_db, args.false_positive_rate, args.exact)
+            else:
+                membership_filter.update(index_db, args.false_positive_rate, args.exact)
+        finally:
+            index_db.close()
+
+    if args.command == "check":
+        hashes = collect_hashes(args)
+        membership_filter.load()
+        result = membership_filter.contains([h for h, _ in hashes])
+        found = "yes" if membership_filter.is_exact() else "maybe"
+        for (content_hash, path), contained in zip(hashes, result):
+            print("{}\t{}\t{}".format(content_hash, found if contained else "no", path))
+        print("\n{} of {} checked hashes are {}in the index.".format(
+            int(result.sum()), len(hashes), "" if membership_filter.is_exact() else "probably "))
+
+    print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import contextlib
+import sys
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from helper.config_file_handler import ResolveConfiguration
+from helper.database_helper import PrivateDataBase
+from helper.record_writer import RecordWriter, create_record_writer
+from helper.result_resolver import ResultResolver
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reconstructs the real paths of an evaluation result (computed on the public database) with the "
+                    "private database.")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file naming the private index and the evaluation database. "
+                             "An example Configuration can be found in the 'configurations' folder.")
+
+    parser.add_argument("table",
+                        type=str, choices=ResultResolver.TABLES, metavar="Table",
+                        help="Evaluation table to resolve: {}.".format(", ".join(ResultResolver.TABLES)))
+
+    parser.add_argument("-f", "--format",
+                        required=False, type=str, dest="output_format", default="jsonl",
+                        choices=RecordWriter.FORMATS,
+                        help="Output format (default: jsonl).")
+
+    parser.add_argument("-o", "--output",
+                        required=False, type=str, dest="output_file", default="-",
+                        help="Output file (default: stdout).")
+
+    parser.add_argument("-m", "--materialize",
+                        required=False, action="store_true", dest="do_materialize",
+                        help="Write the result into the table resolved_<table> of the private database instead.")
+
+    args = parser.parse_args()
+
+    # Progress goes to stderr, stdout may carry the result itself.
+    with contextlib.redirect_stdout(sys.stderr):
+        cfg = ResolveConfiguration(args.cfg_file[0])
+        cfg.read_config()
+
+    start_timestamp = timer()
+    private_db = PrivateDataBase(cfg.private_index_db_cfg)
+    try:
+        resolver = ResultResolver(private_db, cfg.evaluation_db_cfg.get_database_path())
+        if args.do_materialize:
+            resolver.materialize(args.table)
+        else:
+            with create_record_writer(args.output_format, args.output_file, resolver.field_names(args.table)) \
+                    as writer:
+                [writer.write(record) for record in resolver.rows(args.table)]
+            print("Resolved {} rows of '{}'.".format(writer.num_records, args.table), file=sys.stderr)
+    finally:
+        private_db.close()
+
+    print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)), file=sys.stderr)
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
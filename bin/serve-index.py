@@ -0,0 +1,61 @@
+import argparse
+import os
+import signal
+
+from helper.config_file_handler import IndexingConfiguration
+from helper.database_helper import PrivateDataBase
+from helper.index_service import IndexQueryService, create_server
+
+
+##################################################################################################
+
+
+def stop(signal_number, frame):
+    raise KeyboardInterrupt()
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serves lookups in the private index (by content hash, by size, duplicates of a path, files "
+                    "missing in a root) as JSON over local HTTP or a Unix domain socket, see [serve]. "
+                    "Stop with Ctrl+C.")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file to be loaded. "
+                             "An example Configuration can be found in the 'configurations' folder.")
+
+    args = parser.parse_args()
+
+    cfg = IndexingConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    private_db = PrivateDataBase(cfg.private_index_db_cfg)
+    service = IndexQueryService(private_db, cfg.paths_cfg.get_folders(), cfg.serve_cfg)
+    server = create_server(service, cfg.serve_cfg)
+
+    signal.signal(signal.SIGTERM, stop)
+    socket_path = cfg.serve_cfg.get_socket_path()
+    try:
+        print("Serving index '{}' on {} ...".format(
+            private_db.database_path(), "unix:" + socket_path if socket_path is not None
+            else "http://{}:{}".format(cfg.serve_cfg.get_host(), cfg.serve_cfg.get_port())))
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping.")
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+        service.close()
+        private_db.close()
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
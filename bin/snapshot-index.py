@@ -0,0 +1,54 @@
+import argparse
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from helper.columnar_snapshot import ColumnarSnapshot
+from helper.config_file_handler import EvaluationConfiguration
+from helper.database_helper import PublicDataBase
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exports the public index table into a memory-mapped columnar snapshot for fast reloads.")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file to be loaded. "
+                             "An example Configuration can be found in the 'configurations' folder.")
+
+    parser.add_argument("-s", "--snapshot_directory",
+                        required=False, type=str, dest="snapshot_directory", default=None,
+                        help="Folder of the snapshot (default: <public index database>.snapshot).")
+
+    parser.add_argument("-f", "--force",
+                        required=False, action="store_true", dest="force",
+                        help="Export even if the snapshot is up to date.")
+
+    args = parser.parse_args()
+
+    cfg = EvaluationConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    start_timestamp = timer()
+    index_db = PublicDataBase(cfg.public_index_db_cfg)
+    try:
+        snapshot = ColumnarSnapshot(args.snapshot_directory if args.snapshot_directory is not None
+                                    else ColumnarSnapshot.default_directory(index_db.database_path()))
+        if not args.force and snapshot.is_valid(index_db.database_path()):
+            print("Columnar snapshot '{}' is up to date.".format(snapshot.directory()))
+        else:
+            snapshot.export(index_db)
+    finally:
+        index_db.close()
+
+    print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import errno
+import os
+from datetime import timedelta
+from timeit import default_timer as timer
+
+from helper.config_file_handler import IndexingConfiguration
+from helper.xattr_cache import XATTR_PREFIX, is_xattr_supported, strip_cached_hashes
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Removes the content hashes stored as extended attributes ('{}*', [hashing] xattr_cache) "
+                    "from all files below the configured folders.".format(XATTR_PREFIX))
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file to be loaded. "
+                             "An example Configuration can be found in the 'configurations' folder.")
+
+    args = parser.parse_args()
+
+    cfg = IndexingConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    if not is_xattr_supported():
+        print("Extended attributes are not supported on this platform.")
+        return
+
+    start_timestamp = timer()
+    num_files = 0
+    num_attributes = 0
+    num_errors = 0
+    for root_directory in cfg.paths_cfg.get_folders():
+        print("Stripping folder {} ...".format(root_directory))
+        for folder, _, files in os.walk(root_directory):
+            for file_name in files:
+                file_path = os.path.join(folder, file_name)
+                try:
+                    num_removed = strip_cached_hashes(file_path)
+                except OSError as e:
+                    # Nothing to strip on file systems without extended attributes.
+                    if e.errno not in [errno.ENOTSUP, errno.EOPNOTSUPP]:
+                        print("\tERROR: Cannot strip '{}' ({}).".format(file_path, e))
+                        num_errors += 1
+                    continue
+                num_files += 1 if num_removed > 0 else 0
+                num_attributes += num_removed
+
+    print("Removed {} attributes from {} files, {} errors.".format(num_attributes, num_files, num_errors))
+    print("\nOverall elapsed time {}.".format(timedelta(seconds=timer() - start_timestamp)))
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()
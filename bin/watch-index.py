@@ -0,0 +1,54 @@
+import argparse
+import signal
+
+from helper.config_file_handler import IndexingConfiguration
+from helper.database_helper import DataBaseIndexHelper
+from helper.index_watcher import IndexWatcher
+
+
+##################################################################################################
+
+
+def stop(signal_number, frame):
+    raise KeyboardInterrupt()
+
+
+##################################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keeps an existing index up to date by watching the configured folders (Linux inotify). "
+                    "Stop with Ctrl+C.")
+    parser.add_argument("-c", "--configuration_file",
+                        required=True, nargs=1, type=str, dest="cfg_file",
+                        metavar="Configuration",
+                        help="Path to the configuration file to be loaded. "
+                             "An example Configuration can be found in the 'configurations' folder.")
+
+    parser.add_argument("--no-reconcile",
+                        required=False, action="store_false", dest="do_reconcile",
+                        help="Do not compare the folders with the index at start up, i.e. ignore the changes made "
+                             "while the watcher was not running.")
+
+    args = parser.parse_args()
+
+    cfg = IndexingConfiguration(args.cfg_file[0])
+    cfg.read_config()
+
+    watcher = IndexWatcher(cfg.paths_cfg, cfg.hashing_cfg, cfg.watch_cfg, cfg.io_limits_cfg, cfg.archives_cfg)
+    database = DataBaseIndexHelper(cfg.private_index_db_cfg, cfg.public_index_db_cfg, reset_tables=False)
+
+    # Stopped as service (SIGTERM) the pending changes are applied like with Ctrl+C.
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        watcher.run(database, reconcile=args.do_reconcile)
+    finally:
+        database.close()
+
+
+##################################################################################################
+
+
+if __name__ == "__main__":
+    main()